@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from typing import List, Literal
 import os
+import tempfile
 
 
 class Settings(BaseSettings):
@@ -16,15 +17,33 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Refresh tokens: rotan en cada uso; la sesión se extiende mientras haya
+    # actividad (REFRESH_TOKEN_IDLE_HOURS) hasta un máximo de REFRESH_TOKEN_MAX_DAYS
+    REFRESH_TOKEN_IDLE_HOURS: int = 12
+    REFRESH_TOKEN_MAX_DAYS: int = 7
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 30
+    
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000"
     
     # Tipo de base de datos: "sqlite" o "azure"
     DB_TYPE: Literal["sqlite", "azure"] = "sqlite"
     
-    # SQLite (configuración por defecto)
+    # SQLite (configuración por defecto). "sqlite:///:memory:" usa una base en memoria
     DATABASE_URL: str = "sqlite:///./automotriz_jj.db"
     
+    # Sharding de SQLite por sucursal: las ventas de cada provincia van a su
+    # propia base (por defecto en "sucursales/" junto a la central) y los
+    # reportes de varias sucursales consultan las bases en paralelo. Cada
+    # sucursal vende de un cupo de SQLITE_CUPO_STOCK unidades por auto tomado
+    # de la central, y lo vendido se consolida en la central cada
+    # SQLITE_CONSOLIDAR_SECONDS
+    SQLITE_SHARDING: bool = False
+    SQLITE_SHARDS_DIR: str = ""
+    SQLITE_FANOUT_WORKERS: int = 8
+    SQLITE_CUPO_STOCK: int = 10
+    SQLITE_CONSOLIDAR_SECONDS: float = 1.0
+    
     # Azure SQL Database (solo se usa si DB_TYPE = "azure")
     AZURE_SQL_SERVER: str = ""
     AZURE_SQL_DATABASE: str = ""
@@ -33,10 +52,138 @@ class Settings(BaseSettings):
     AZURE_SQL_DRIVER: str = "{ODBC Driver 18 for SQL Server}"
     AZURE_SQL_PORT: int = 1433
     
+    # Conexiones SQLite reutilizadas por proceso (0 desactiva el pool)
+    DB_POOL_SIZE: int = 8
+    
+    # Fallas transitorias de la base: reintentos con backoff y circuit breaker
+    DB_RETRY_ATTEMPTS: int = 3
+    DB_RETRY_BASE_DELAY_SECONDS: float = 0.2
+    DB_RETRY_MAX_DELAY_SECONDS: float = 2.0
+    DB_BREAKER_THRESHOLD: int = 5
+    DB_BREAKER_RESET_SECONDS: float = 30.0
+    
     # Usuarios por defecto
     DEFAULT_USERNAME: str = "admin"
     DEFAULT_PASSWORD: str = "admin123"
     
+    # Perfilado por request (header X-Profile: 1 o muestreo) y log de queries lentas
+    PROFILING_ENABLED: bool = True
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_SAMPLE_RATE: float = 0.0
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    
+    # Export de ventas
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_GLOBAL_ROLES: str = "admin,gerente"
+    
+    # Server-Sent Events del catálogo
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    
+    # Claves de idempotencia para POST /venta/registrar
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    
+    # Despliegue multiproceso (python -m app.serve): cantidad de workers de
+    # uvicorn y si cada worker inicializa la BD al arrancar (el launcher lo
+    # hace una sola vez antes de levantar los workers)
+    WEB_CONCURRENCY: int = 1
+    DB_INIT_ON_STARTUP: bool = True
+    
+    # Estado compartido entre workers (cache, revocación de tokens, contadores):
+    # "auto" usa memoria con un worker y SQLite en /dev/shm con varios
+    SHARED_STATE_BACKEND: Literal["auto", "memory", "sqlite", "redis"] = "auto"
+    SHARED_STATE_PATH: str = ""
+    SHARED_STATE_MAX_ENTRIES: int = 100000
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SSE_RELAY_INTERVAL_SECONDS: float = 0.25
+    
+    # Resumen del dashboard: cache por vendedor e hilos para consultas en paralelo
+    DASHBOARD_CACHE_TTL_SECONDS: int = 30
+    DASHBOARD_WORKERS: int = 4
+    
+    # Simulador de crédito: opciones por defecto (TEA en % y plazos en meses),
+    # límites por simulación y duración del cache de resultados
+    SIMULADOR_TASAS_DEFAULT: str = "12,15,18"
+    SIMULADOR_PLAZOS_DEFAULT: str = "12,24,36,48,60"
+    SIMULADOR_MAX_COMBINACIONES: int = 60
+    SIMULADOR_PLAZO_MAX_MESES: int = 96
+    SIMULADOR_CACHE_TTL_SECONDS: int = 600
+    
+    # Trabajos en segundo plano: hilos por proceso (0 = este proceso no los
+    # ejecuta, por ejemplo si corre `python -m app.worker` aparte), reintentos
+    # con backoff exponencial y directorio de archivos generados
+    JOBS_WORKERS: int = 2
+    JOBS_POLL_INTERVAL_SECONDS: float = 2.0
+    JOBS_MAX_ATTEMPTS: int = 3
+    JOBS_BACKOFF_SECONDS: float = 5.0
+    JOBS_BACKOFF_MAX_SECONDS: float = 300.0
+    JOBS_STALE_SECONDS: int = 600
+    JOBS_RETENTION_DAYS: int = 7
+    JOBS_OUTPUT_DIR: str = ""
+    
+    # Archivo de ventas: registro_venta conserva los últimos ARCHIVE_HOT_MONTHS
+    # meses (incluido el actual); los anteriores se mueven al archivo cada
+    # ARCHIVE_INTERVAL_HOURS. ARCHIVE_DIR es la carpeta de los archivos
+    # mensuales SQLite (por defecto junto a la base). "Ver anteriores" abre
+    # como mucho ARCHIVE_MAX_MESES_CONSULTA meses archivados por request
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_HOT_MONTHS: int = 6
+    ARCHIVE_INTERVAL_HOURS: int = 24
+    ARCHIVE_DIR: str = ""
+    ARCHIVE_MAX_MESES_CONSULTA: int = 12
+    
+    # Pronóstico de demanda: trabajo periódico que agrega las ventas por día
+    # (PRONOSTICO_LOTE_VENTAS ids por transacción) y pronostica la demanda de
+    # cada auto y sucursal sobre los últimos PRONOSTICO_VENTANA_DIAS, de a
+    # PRONOSTICO_LOTE_AUTOS autos. La reposición sugerida cubre el horizonte
+    # más los días de stock de seguridad
+    PRONOSTICO_ENABLED: bool = True
+    PRONOSTICO_INTERVAL_HOURS: int = 24
+    PRONOSTICO_VENTANA_DIAS: int = 120
+    PRONOSTICO_MEDIA_MOVIL_DIAS: int = 28
+    PRONOSTICO_ALFA: float = 0.2
+    PRONOSTICO_HORIZONTE_DIAS: int = 30
+    PRONOSTICO_STOCK_SEGURIDAD_DIAS: int = 7
+    PRONOSTICO_LOTE_VENTAS: int = 50000
+    PRONOSTICO_LOTE_AUTOS: int = 200
+    
+    # Registro de cambios para sistemas externos (/cdc/changes): cambios por
+    # lote leído de la base, máximo por request y días que se conservan
+    CDC_BATCH_SIZE: int = 500
+    CDC_MAX_LIMIT: int = 10000
+    CDC_RETENTION_DAYS: int = 30
+    
+    # Sincronización de clientes de sucursal (/sync): ventas propias por
+    # respuesta, ventas en la primera sincronización y antigüedad máxima de
+    # la hora informada para una venta hecha sin conexión
+    SYNC_MAX_VENTAS: int = 500
+    SYNC_VENTAS_INICIALES: int = 50
+    SYNC_OFFLINE_MAX_HOURS: int = 168
+    SYNC_MAX_VENTAS_OFFLINE: int = 100
+    
+    # Importación de listas de precios al catálogo (/catalogo/importar y
+    # `python -m app.importar_catalogo`): filas por transacción, tamaño máximo
+    # de la lista y roles que pueden importar
+    CATALOGO_IMPORT_BATCH_SIZE: int = 300
+    CATALOGO_IMPORT_MAX_FILAS: int = 20000
+    CATALOGO_IMPORT_MAX_BYTES: int = 5_000_000
+    CATALOGO_ADMIN_ROLES: str = "admin"
+    
+    # Analítica de ventas en memoria (/venta/analitica): cada worker guarda
+    # una copia por columnas de registro_venta y la completa con las ventas
+    # nuevas como mucho cada ANALITICA_REFRESCO_SECONDS. Filas por lectura de
+    # la base y grupos máximos por respuesta
+    ANALITICA_REFRESCO_SECONDS: float = 2.0
+    ANALITICA_LOTE_LECTURA: int = 20000
+    ANALITICA_MAX_GRUPOS: int = 1000
+    
+    # Roles que pueden leer /metrics
+    METRICS_ROLES: str = "admin"
+    
+    # Límite de logins fallidos por usuario e IP dentro de la ventana
+    LOGIN_MAX_ATTEMPTS: int = 10
+    LOGIN_WINDOW_SECONDS: int = 300
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -46,6 +193,63 @@ class Settings(BaseSettings):
         """Convierte string de origenes en lista"""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
     
+    @property
+    def export_global_roles(self) -> List[str]:
+        """Roles que pueden exportar ventas de cualquier sucursal"""
+        return [role.strip() for role in self.EXPORT_GLOBAL_ROLES.split(",") if role.strip()]
+    
+    @property
+    def catalogo_admin_roles(self) -> List[str]:
+        """Roles que pueden importar listas de precios al catálogo"""
+        return [role.strip() for role in self.CATALOGO_ADMIN_ROLES.split(",") if role.strip()]
+    
+    @property
+    def metrics_roles(self) -> List[str]:
+        """Roles que pueden leer las métricas internas"""
+        return [role.strip() for role in self.METRICS_ROLES.split(",") if role.strip()]
+    
+    @property
+    def simulador_tasas(self) -> List[float]:
+        """Tasas efectivas anuales (%) que se simulan si el request no indica otras"""
+        return [float(tasa) for tasa in self.SIMULADOR_TASAS_DEFAULT.split(",") if tasa.strip()]
+    
+    @property
+    def simulador_plazos(self) -> List[int]:
+        """Plazos en meses que se simulan si el request no indica otros"""
+        return [int(plazo) for plazo in self.SIMULADOR_PLAZOS_DEFAULT.split(",") if plazo.strip()]
+    
+    @property
+    def sqlite_database_path(self) -> str:
+        """Ruta (o URI file:) de la base SQLite indicada en DATABASE_URL"""
+        ruta = self.DATABASE_URL
+        for prefijo in ("sqlite:///", "sqlite://"):
+            if ruta.startswith(prefijo):
+                ruta = ruta[len(prefijo):]
+                break
+        return ruta or ":memory:"
+    
+    @property
+    def shared_state_backend(self) -> str:
+        """Backend de estado compartido efectivo (resuelve "auto")"""
+        if self.SHARED_STATE_BACKEND != "auto":
+            return self.SHARED_STATE_BACKEND
+        return "sqlite" if self.WEB_CONCURRENCY > 1 else "memory"
+    
+    @property
+    def shared_state_path(self) -> str:
+        """Archivo del estado compartido SQLite; en /dev/shm (RAM) si existe"""
+        if self.SHARED_STATE_PATH:
+            return self.SHARED_STATE_PATH
+        directorio = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        return os.path.join(directorio, "automotriz_jj_estado.db")
+    
+    @property
+    def jobs_output_dir(self) -> str:
+        """Directorio donde los trabajos dejan sus archivos (exports, reportes)"""
+        if self.JOBS_OUTPUT_DIR:
+            return self.JOBS_OUTPUT_DIR
+        return os.path.join(tempfile.gettempdir(), "automotriz_jj_trabajos")
+    
     @property
     def is_azure_db(self) -> bool:
         """Verifica si se está usando Azure SQL Database"""
@@ -57,6 +261,14 @@ class Settings(BaseSettings):
         if not self.is_azure_db:
             raise ValueError("DB_TYPE debe ser 'azure' para obtener la cadena de conexión de Azure")
         
+        # Se valida al conectar y no al importar: las herramientas que no usan
+        # la base (CLI, auditorías) arrancan aunque falten las variables
+        if not self.validate_azure_config():
+            raise ValueError(
+                "Configuración de Azure SQL Database incompleta. "
+                "Verifica que todas las variables AZURE_SQL_* estén definidas en el archivo .env"
+            )
+        
         return (
             f"DRIVER={self.AZURE_SQL_DRIVER};"
             f"SERVER={self.AZURE_SQL_SERVER},{self.AZURE_SQL_PORT};"
@@ -84,11 +296,4 @@ class Settings(BaseSettings):
 
 
 # Instancia global de configuración
-settings = Settings()
-
-# Validar configuración al importar
-if settings.is_azure_db and not settings.validate_azure_config():
-    raise ValueError(
-        "Configuración de Azure SQL Database incompleta. "
-        "Verifica que todas las variables AZURE_SQL_* estén definidas en el archivo .env"
-    )
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
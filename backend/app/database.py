@@ -1,18 +1,287 @@
 import sqlite3
-import pyodbc
+import contextvars
+import functools
 import logging
+import os
+import queue
 import random
+import re
+import threading
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 from contextlib import contextmanager
 
 from app.config import settings
+from app.utils.circuito import Circuito
+from app.utils.profiling import ConexionPerfilada, perfil_activo
 
 logger = logging.getLogger(__name__)
 
 # Constantes
-SQLITE_DATABASE_PATH = "automotriz_jj.db"
+SQLITE_DATABASE_PATH = settings.sqlite_database_path
+
+# Errores de SQL Server / Azure SQL que suelen resolverse solos al reintentar
+# (https://learn.microsoft.com/azure/azure-sql/database/troubleshoot-common-connectivity-issues)
+ERRORES_CONEXION_AZURE = {
+    4060, 4221, 40197, 40501, 40613, 42108, 42109, 49918, 49919, 49920,
+    10053, 10054, 10060, 10928, 10929, 233, 64, -2
+}
+ERRORES_TRANSITORIOS_AZURE = {1205}  # deadlock: la transacción se puede repetir
+SQLSTATE_CONEXION = ("08001", "08S01", "08S02", "HYT00", "HYT01")
+_CODIGO_NATIVO = re.compile(r"\((-?\d+)\)")
+
+
+class BaseDatosNoDisponibleError(Exception):
+    """
+    La base de datos no respondió por un error transitorio o porque el
+    circuito está abierto. Las rutas lo convierten en un 503.
+    """
+    
+    def __init__(self, mensaje: str, reintentable: bool = False, reintentar_en: float = 0.0):
+        super().__init__(mensaje)
+        self.reintentable = reintentable
+        self.reintentar_en = reintentar_en
+
+
+def clasificar_error(error: BaseException) -> Optional[str]:
+    """
+    "conexion" si la base no está accesible, "transitorio" si la operación se
+    puede repetir (deadlock, base bloqueada) o None si reintentar no sirve.
+    """
+    if isinstance(error, sqlite3.OperationalError):
+        mensaje = str(error).lower()
+        return "transitorio" if "locked" in mensaje or "busy" in mensaje else None
+    
+    # pyodbc.Error: args = (sqlstate, "mensaje ... (código nativo) ...")
+    if type(error).__module__ != "pyodbc":
+        return None
+    if error.args and str(error.args[0]) in SQLSTATE_CONEXION:
+        return "conexion"
+    codigos = {int(c) for c in _CODIGO_NATIVO.findall(str(error))}
+    if codigos & ERRORES_CONEXION_AZURE:
+        return "conexion"
+    if codigos & ERRORES_TRANSITORIOS_AZURE or (error.args and str(error.args[0]) == "40001"):
+        return "transitorio"
+    return None
+
+
+def es_clave_duplicada(error: BaseException) -> bool:
+    """True si el error es una violación de PRIMARY KEY / UNIQUE (IntegrityError del driver)"""
+    if isinstance(error, sqlite3.IntegrityError):
+        return True
+    # pyodbc se importa solo con Azure: se reconoce por el módulo del tipo
+    return type(error).__module__ == "pyodbc" and type(error).__name__ == "IntegrityError"
+
+
+def espera_reintento(intento: int) -> float:
+    """Backoff exponencial con jitter completo, con tope"""
+    espera = min(settings.DB_RETRY_BASE_DELAY_SECONDS * 2 ** (intento - 1), settings.DB_RETRY_MAX_DELAY_SECONDS)
+    return random.uniform(0, espera)
+
+
+class Indice(NamedTuple):
+    """Índice secundario; `incluye` son columnas INCLUDE en Azure y sufijo de la clave en SQLite"""
+    nombre: str
+    tabla: str
+    columnas: Tuple[str, ...]
+    incluye: Tuple[str, ...] = ()
+    
+    def sql_sqlite(self) -> str:
+        return f"{self.tabla}({', '.join(self.columnas + self.incluye)})"
+    
+    def sql_azure(self) -> str:
+        sql = f"{self.tabla}({', '.join(self.columnas)})"
+        if self.incluye:
+            sql += f" INCLUDE ({', '.join(self.incluye)})"
+        return sql
+
+
+# Índices secundarios según las consultas reales de los servicios
+# (revisar con `python -m benchmarks.index_audit` al agregar consultas).
+# Las claves UNIQUE/PRIMARY KEY ya cubren username, codigo_vendedor,
+# (marca, modelo, anio) y los lookups por id.
+INDICES = [
+    # Catálogo: WHERE is_active = 1 AND stock > 0 ORDER BY anio DESC, marca, modelo.
+    # stock va después de las columnas del ORDER BY para que no haga falta ordenar.
+    Indice("idx_autos_catalogo", "autos_disponibles",
+           ("is_active", "anio DESC", "marca", "modelo"), ("stock", "precio_referencial")),
+    # Mis ventas: WHERE vendedor_id = ? ORDER BY fecha_venta DESC (también cubre la FK)
+    Indice("idx_venta_vendedor_fecha", "registro_venta", ("vendedor_id", "fecha_venta")),
+    # Sincronización: WHERE vendedor_id = ? AND id > ? ORDER BY id
+    Indice("idx_venta_vendedor_id", "registro_venta", ("vendedor_id", "id")),
+    # Export por sucursal y rango de fechas
+    Indice("idx_venta_sucursal_fecha", "registro_venta",
+           ("sucursal_provincia", "sucursal_distrito", "fecha_venta")),
+    # Historial de compras por DNI
+    Indice("idx_venta_dni_fecha", "registro_venta", ("dni_comprador", "fecha_venta")),
+    # FK registro_venta.auto_id (ON DELETE/UPDATE CASCADE)
+    Indice("idx_venta_auto", "registro_venta", ("auto_id",)),
+    # Purga de claves expiradas
+    Indice("idx_idempotencia_created", "idempotencia_ventas", ("created_at",)),
+    # Autocompletado de compradores por nombre
+    Indice("idx_compradores_nombre", "compradores", ("nombre_busqueda",)),
+    # Cola de trabajos: siguiente pendiente y trabajos colgados
+    Indice("idx_trabajos_estado", "trabajos", ("estado", "proximo_intento")),
+    # Revocación de una familia de refresh tokens (reuso detectado o logout)
+    Indice("idx_refresh_familia", "refresh_tokens", ("familia",)),
+    # Purga de refresh tokens expirados
+    Indice("idx_refresh_expira", "refresh_tokens", ("expira",)),
+    # Purga de cambios más antiguos que CDC_RETENTION_DAYS
+    Indice("idx_cambios_created", "cambios", ("created_at",)),
+]
+
+# Índices del esquema anterior: de baja cardinalidad, redundantes con una
+# clave UNIQUE o reemplazados por un índice compuesto de INDICES
+INDICES_OBSOLETOS = {
+    "idx_vendedores_username": "vendedores",
+    "idx_vendedores_codigo": "vendedores",
+    "idx_vendedores_provincia": "vendedores",
+    "idx_vendedores_distrito": "vendedores",
+    "idx_vendedores_active": "vendedores",
+    "idx_autos_marca": "autos_disponibles",
+    "idx_autos_modelo": "autos_disponibles",
+    "idx_autos_anio": "autos_disponibles",
+    "idx_autos_active": "autos_disponibles",
+    "idx_autos_marca_modelo": "autos_disponibles",
+    "idx_venta_fecha": "registro_venta",
+    "idx_venta_vendedor": "registro_venta",
+    "idx_venta_tipo_compra": "registro_venta",
+    "idx_venta_dni": "registro_venta",
+    "idx_venta_provincia": "registro_venta",
+    "idx_venta_distrito": "registro_venta",
+    "idx_venta_fecha_vendedor": "registro_venta",
+}
+
+
+def es_sqlite_en_memoria(ruta: str) -> bool:
+    return ruta == ":memory:" or "mode=memory" in ruta
+
+
+def conectar_sqlite(ruta: str, adjuntar: Optional[str] = None, **kwargs) -> sqlite3.Connection:
+    """
+    Abre una conexión SQLite a un archivo o a una URI `file:` (p. ej. memoria
+    compartida). Con `adjuntar`, esa base queda disponible como `central`.
+    """
+    conn = sqlite3.connect(ruta, uri=ruta.startswith("file:"), **kwargs)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    if adjuntar:
+        conn.execute("ATTACH DATABASE ? AS central", (adjuntar,))
+    return conn
+
+
+class ConexionSQLitePool(sqlite3.Connection):
+    """Conexión SQLite cuyo close() la devuelve al pool en vez de cerrarla"""
+    
+    def close(self):
+        pool = getattr(self, "pool", None)
+        if pool is None:
+            super().close()
+        else:
+            pool.devolver(self)
+    
+    def cerrar(self):
+        super().close()
+
+
+class PoolSQLite:
+    """
+    Pool de conexiones SQLite reutilizables entre hilos. Nunca bloquea: si no
+    hay conexiones libres se abre una nueva, y al devolverla solo se conserva
+    si hay menos de `tamano` libres.
+    """
+    
+    def __init__(self, ruta: str, tamano: int, adjuntar: Optional[str] = None):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.adjuntar = adjuntar
+        self._libres: "queue.LifoQueue[ConexionSQLitePool]" = queue.LifoQueue()
+        self.creadas = 0
+        self.reutilizadas = 0
+    
+    def obtener(self) -> ConexionSQLitePool:
+        try:
+            conn = self._libres.get_nowait()
+            self.reutilizadas += 1
+        except queue.Empty:
+            conn = conectar_sqlite(
+                self.ruta, adjuntar=self.adjuntar, factory=ConexionSQLitePool, check_same_thread=False
+            )
+            self.creadas += 1
+        conn.prestada = True
+        conn.pool = self
+        return conn
+    
+    def devolver(self, conn: ConexionSQLitePool):
+        if not getattr(conn, "prestada", False):
+            return  # close() repetido
+        conn.prestada = False
+        
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.cerrar()
+            return
+        
+        if self._libres.qsize() < self.tamano:
+            self._libres.put(conn)
+        else:
+            conn.cerrar()
+    
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse"""
+        self.tamano = 0
+        while True:
+            try:
+                self._libres.get_nowait().cerrar()
+            except queue.Empty:
+                return
+    
+    def estadisticas(self) -> Dict:
+        return {
+            "libres": self._libres.qsize(),
+            "tamano": self.tamano,
+            "creadas": self.creadas,
+            "reutilizadas": self.reutilizadas,
+        }
+
+
+# Sharding por sucursal (SQLITE_SHARDING): cada provincia tiene su propia
+# base de ventas y los ids de registro_venta de la base N empiezan en
+# N * ID_BASE_SUCURSAL. Así siguen siendo únicos entre bases (cursores del
+# registro de cambios, sincronización, archivo) sin coordinar secuencias.
+ID_BASE_SUCURSAL = 10 ** 12
+
+# Registro de bases de ventas, en la central
+SQL_SUCURSALES_VENTAS = '''
+    CREATE TABLE IF NOT EXISTS sucursales_ventas (
+        provincia TEXT PRIMARY KEY,
+        numero INTEGER NOT NULL UNIQUE,
+        created_at TIMESTAMP
+    ) WITHOUT ROWID
+'''
+
+# Unidades de cada auto asignadas como cupo a las sucursales y aún no
+# consolidadas como vendidas, en la central: libres = stock - unidades
+SQL_STOCK_ASIGNADO = '''
+    CREATE TABLE IF NOT EXISTS stock_asignado (
+        auto_id INTEGER PRIMARY KEY,
+        unidades INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+
+def clave_sucursal(provincia: str) -> str:
+    return " ".join(provincia.split()).upper()
+
+
+def _nombre_archivo_sucursal(numero: int, provincia: str) -> str:
+    ascii_ = unicodedata.normalize("NFKD", provincia).encode("ascii", "ignore").decode().lower()
+    return f"ventas_{numero:03d}_{re.sub(r'[^a-z0-9]+', '_', ascii_).strip('_')}.db"
 
 
 class DatabaseManager:
@@ -20,25 +289,264 @@ class DatabaseManager:
     
     def __init__(self):
         self.db_type = settings.DB_TYPE.lower()
+        self._pool: Optional[PoolSQLite] = None
+        self._ancla: Optional[sqlite3.Connection] = None
+        self.ruta_sqlite = ""
+        self.circuito = Circuito("base_datos", settings.DB_BREAKER_THRESHOLD, settings.DB_BREAKER_RESET_SECONDS)
+        self.reintentos = 0
+        
+        # Bases de ventas por sucursal (solo SQLite con SQLITE_SHARDING)
+        self.sharding = self.db_type == "sqlite" and settings.SQLITE_SHARDING
+        self._sucursales: Dict[str, str] = {}
+        self._pools_sucursal: Dict[str, PoolSQLite] = {}
+        self._anclas_sucursal: List[sqlite3.Connection] = []
+        self._lock_sucursales = threading.Lock()
+        self._ejecutor_sucursales: Optional[ThreadPoolExecutor] = None
+        
+        if self.db_type == "sqlite":
+            self.usar_sqlite(SQLITE_DATABASE_PATH)
         logger.info(f"📊 Tipo de base de datos: {self.db_type.upper()}")
     
+    def usar_sqlite(self, ruta: str):
+        """
+        Apunta el gestor a otra base SQLite: un archivo o una URI `file:`.
+        
+        `:memory:` se convierte en una base en memoria con caché compartida,
+        para que todas las conexiones del pool vean los mismos datos. Una
+        base en memoria desaparece al cerrarse su última conexión, así que el
+        gestor mantiene una conexión "ancla" abierta mientras la use.
+        """
+        if ruta == ":memory:":
+            ruta = f"file:automotriz_jj_{id(self)}?mode=memory&cache=shared"
+        
+        pool, ancla = self._pool, self._ancla
+        self._ancla = conectar_sqlite(ruta, check_same_thread=False) if es_sqlite_en_memoria(ruta) else None
+        self._pool = None
+        self.ruta_sqlite = ruta
+        
+        if pool:
+            pool.cerrar()
+        if ancla:
+            ancla.close()
+        self._olvidar_sucursales()
+    
+    def _olvidar_sucursales(self):
+        with self._lock_sucursales:
+            pools, anclas = self._pools_sucursal, self._anclas_sucursal
+            self._sucursales, self._pools_sucursal, self._anclas_sucursal = {}, {}, []
+        for pool in pools.values():
+            pool.cerrar()
+        for ancla in anclas:
+            ancla.close()
+    
+    def clonar_desde(self, origen: str):
+        """
+        Copia otra base SQLite sobre la actual con la API de backup. Copia
+        páginas, así que es mucho más rápido que volver a crear el esquema e
+        insertar los datos.
+        """
+        fuente = conectar_sqlite(origen)
+        destino = self._ancla or conectar_sqlite(self.ruta_sqlite)
+        try:
+            fuente.backup(destino)
+        finally:
+            fuente.close()
+            if destino is not self._ancla:
+                destino.close()
+    
+    def connect(self, sucursal_provincia: Optional[str] = None):
+        """
+        Abre una conexión nueva; si el request se está perfilando, la envuelve.
+        
+        Con sharding y `sucursal_provincia`, la conexión es a la base de
+        ventas de esa provincia, con la central adjunta como `central`: las
+        tablas que no están en la base de la sucursal (catálogo, vendedores,
+        trabajos...) se resuelven en la central, así que las consultas con
+        JOIN no cambian. Sin sharding, `sucursal_provincia` se ignora.
+        """
+        perfil = perfil_activo()
+        if perfil is None:
+            return self._connect_resiliente(sucursal_provincia)
+        
+        with perfil.span("db-connect"):
+            conn = self._connect_resiliente(sucursal_provincia)
+        return ConexionPerfilada(conn, perfil)
+    
+    def _connect_resiliente(self, sucursal_provincia: Optional[str] = None):
+        """
+        Conecta reintentando los errores transitorios con backoff. Con el
+        circuito abierto falla al instante, sin esperar timeouts de conexión.
+        """
+        intento = 1
+        while True:
+            if not self.circuito.permitir():
+                raise BaseDatosNoDisponibleError(
+                    "La base de datos no está disponible",
+                    reintentar_en=self.circuito.reintentar_en()
+                )
+            
+            try:
+                conn = self._connect(sucursal_provincia) if sucursal_provincia else self._connect()
+            except Exception as e:
+                # Solo las caídas cuentan para el circuito; un error que no
+                # se arregla reintentando se propaga sin abrirlo
+                if clasificar_error(e) is None:
+                    self.circuito.liberar()
+                    raise
+                self.circuito.fallo()
+                if intento >= settings.DB_RETRY_ATTEMPTS:
+                    logger.error(f"❌ No se pudo conectar a la base de datos tras {intento} intentos: {e}")
+                    raise BaseDatosNoDisponibleError(
+                        "La base de datos no está disponible",
+                        reintentar_en=self.circuito.reintentar_en()
+                    ) from e
+                logger.warning(f"⚠️ Error transitorio al conectar (intento {intento}): {e}")
+                self.reintentos += 1
+                time.sleep(espera_reintento(intento))
+                intento += 1
+                continue
+            
+            self.circuito.exito()
+            return conn
+    
+    def _connect(self, sucursal_provincia: Optional[str] = None):
+        if self.db_type == "sqlite":
+            if self.sharding and sucursal_provincia:
+                return self._connect_sucursal(sucursal_provincia)
+            if settings.DB_POOL_SIZE > 0:
+                pool = self._pool
+                if pool is None:
+                    pool = self._pool = PoolSQLite(self.ruta_sqlite, settings.DB_POOL_SIZE)
+                return pool.obtener()
+            return conectar_sqlite(self.ruta_sqlite)
+        else:  # azure
+            # Solo los despliegues Azure cargan el driver (y necesitan libodbc).
+            # pyodbc reutiliza conexiones con el pooling del driver manager ODBC
+            import pyodbc
+            return pyodbc.connect(settings.azure_connection_string)
+    
+    def _connect_sucursal(self, provincia: str):
+        ruta = self.ruta_sucursal(provincia)
+        if settings.DB_POOL_SIZE > 0:
+            pool = self._pools_sucursal.get(ruta)
+            if pool is None:
+                with self._lock_sucursales:
+                    pool = self._pools_sucursal.setdefault(
+                        ruta, PoolSQLite(ruta, settings.DB_POOL_SIZE, adjuntar=self.ruta_sqlite)
+                    )
+            return pool.obtener()
+        return conectar_sqlite(ruta, adjuntar=self.ruta_sqlite)
+    
+    # ============================================
+    # BASES DE VENTAS POR SUCURSAL
+    # ============================================
+    
+    def ruta_sucursal(self, provincia: str) -> str:
+        """Base de ventas de la provincia; la registra y crea su esquema la primera vez"""
+        clave = clave_sucursal(provincia)
+        ruta = self._sucursales.get(clave)
+        if ruta is None:
+            with self._lock_sucursales:
+                ruta = self._sucursales.get(clave)
+                if ruta is None:
+                    ruta = self._sucursales[clave] = self._registrar_sucursal(clave)
+        return ruta
+    
+    def _registrar_sucursal(self, provincia: str) -> str:
+        # El número se asigna en la central, así todos los procesos usan el mismo
+        conn = self._connect()
+        try:
+            conn.execute(SQL_SUCURSALES_VENTAS)
+            conn.execute(SQL_STOCK_ASIGNADO)
+            conn.execute('''
+                INSERT OR IGNORE INTO sucursales_ventas (provincia, numero, created_at)
+                SELECT ?, COALESCE(MAX(numero), 0) + 1, ? FROM sucursales_ventas
+            ''', (provincia, datetime.now()))
+            conn.commit()
+            numero = conn.execute(
+                "SELECT numero FROM sucursales_ventas WHERE provincia = ?", (provincia,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        
+        if es_sqlite_en_memoria(self.ruta_sqlite):
+            ruta = f"{self.ruta_sqlite.split('?')[0]}_sucursal_{numero}?mode=memory&cache=shared"
+            self._anclas_sucursal.append(conectar_sqlite(ruta, check_same_thread=False))
+        else:
+            directorio = settings.SQLITE_SHARDS_DIR or os.path.join(
+                os.path.dirname(os.path.abspath(self.ruta_sqlite)), "sucursales"
+            )
+            os.makedirs(directorio, exist_ok=True)
+            ruta = os.path.join(directorio, _nombre_archivo_sucursal(numero, provincia))
+        
+        crear_esquema_sucursal(ruta, numero)
+        logger.info(f"🏬 Base de ventas de {provincia}: {ruta}")
+        return ruta
+    
+    def sucursales_ventas(self) -> List[str]:
+        """Provincias con base de ventas propia (vacío sin sharding)"""
+        if not self.sharding:
+            return []
+        conn = self._connect()
+        try:
+            conn.execute(SQL_SUCURSALES_VENTAS)
+            return [fila[0] for fila in conn.execute("SELECT provincia FROM sucursales_ventas ORDER BY numero")]
+        finally:
+            conn.close()
+    
+    def bases_ventas(self) -> List[Optional[str]]:
+        """Provincias a recorrer una por una para leer todas las ventas; sin sharding, [None] (la central)"""
+        return self.sucursales_ventas() if self.sharding else [None]
+    
+    def en_sucursales(self, funcion: Callable[[Any], Any], provincias: Optional[Iterable[str]] = None) -> List:
+        """
+        Ejecuta `funcion(conn)` en cada base de ventas y retorna sus resultados.
+        
+        Sin sharding hay una sola base (la central) y `funcion` debe filtrar
+        por provincia si corresponde. Con sharding se usa la base de cada una
+        de las `provincias` (por defecto, todas las registradas), en paralelo
+        y en el orden pedido; quien llama combina los resultados.
+        """
+        if not self.sharding:
+            return [self._con_conexion(funcion, None)]
+        
+        provincias = list(provincias) if provincias is not None else self.sucursales_ventas()
+        if len(provincias) <= 1:
+            return [self._con_conexion(funcion, provincia) for provincia in provincias]
+        
+        if self._ejecutor_sucursales is None:
+            with self._lock_sucursales:
+                if self._ejecutor_sucursales is None:
+                    self._ejecutor_sucursales = ThreadPoolExecutor(
+                        max_workers=max(settings.SQLITE_FANOUT_WORKERS, 1), thread_name_prefix="sucursales"
+                    )
+        futuros = [
+            self._ejecutor_sucursales.submit(contextvars.copy_context().run, self._con_conexion, funcion, provincia)
+            for provincia in provincias
+        ]
+        return [futuro.result() for futuro in futuros]
+    
+    def _con_conexion(self, funcion: Callable[[Any], Any], provincia: Optional[str]):
+        conn = self.connect(provincia)
+        try:
+            return funcion(conn)
+        finally:
+            conn.close()
+    
+    def estadisticas_pool(self) -> Optional[Dict]:
+        return self._pool.estadisticas() if self._pool else None
+    
+    def estado_resiliencia(self) -> Dict:
+        return {**self.circuito.estadisticas(), "reintentos": self.reintentos}
+    
     @contextmanager
     def get_connection(self):
         """Context manager para obtener una conexión a la base de datos"""
-        if self.db_type == "sqlite":
-            conn = sqlite3.connect(SQLITE_DATABASE_PATH)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON")
-            try:
-                yield conn
-            finally:
-                conn.close()
-        else:  # azure
-            conn = pyodbc.connect(settings.azure_connection_string)
-            try:
-                yield conn
-            finally:
-                conn.close()
+        conn = self.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
     
     def execute_query(self, query: str, params: tuple = (), fetch: str = None):
         """
@@ -98,18 +606,49 @@ class DatabaseManager:
 db_manager = DatabaseManager()
 
 
-def get_db_connection():
+def get_db_connection(sucursal_provincia: Optional[str] = None):
     """
     Función de compatibilidad para código existente.
-    Retorna una conexión a la base de datos apropiada.
+    Retorna una conexión a la base de datos apropiada; con sharding y
+    `sucursal_provincia`, a la base de ventas de esa provincia.
     """
-    if db_manager.db_type == "sqlite":
-        conn = sqlite3.connect(SQLITE_DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    else:
-        return pyodbc.connect(settings.azure_connection_string)
+    return db_manager.connect(sucursal_provincia)
+
+
+def relanzar_si_transitorio(error: BaseException):
+    """
+    Para los `except Exception` de los servicios: si el error es transitorio
+    lo relanza como BaseDatosNoDisponibleError (503 / reintento) en vez de
+    dejar que se convierta en un resultado vacío.
+    """
+    tipo = clasificar_error(error)
+    if tipo is None:
+        return
+    if tipo == "conexion":
+        db_manager.circuito.fallo()
+    raise BaseDatosNoDisponibleError(f"Error transitorio de base de datos: {error}", reintentable=True) from error
+
+
+def reintentable(func: Callable) -> Callable:
+    """
+    Reintenta una lectura idempotente ante errores transitorios, con backoff
+    y jitter. No usar en escrituras: un reintento podría duplicarlas.
+    """
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        intento = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except BaseDatosNoDisponibleError as e:
+                if not e.reintentable or intento >= settings.DB_RETRY_ATTEMPTS or db_manager.circuito.abierto:
+                    raise
+                logger.warning(f"⚠️ Reintentando {func.__name__} (intento {intento}): {e}")
+            db_manager.reintentos += 1
+            time.sleep(espera_reintento(intento))
+            intento += 1
+    
+    return envoltura
 
 
 def wait_for_azure_db(max_retries: int = 30, retry_delay: int = 2) -> bool:
@@ -214,13 +753,6 @@ def _init_sqlite_database():
             )
         ''')
         
-        # Índices para vendedores
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendedores_username ON vendedores(username)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendedores_codigo ON vendedores(codigo_vendedor)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendedores_provincia ON vendedores(sucursal_provincia)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendedores_distrito ON vendedores(sucursal_distrito)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendedores_active ON vendedores(is_active)')
-        
         logger.info("✅ Tabla 'vendedores' creada con PRIMARY KEY: id")
         
         # Tabla autos_disponibles
@@ -242,13 +774,6 @@ def _init_sqlite_database():
             )
         ''')
         
-        # Índices para autos_disponibles
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_autos_marca ON autos_disponibles(marca)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_autos_modelo ON autos_disponibles(modelo)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_autos_anio ON autos_disponibles(anio)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_autos_active ON autos_disponibles(is_active)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_autos_marca_modelo ON autos_disponibles(marca, modelo)')
-        
         logger.info("✅ Tabla 'autos_disponibles' creada con PRIMARY KEY: id")
         
         # Tabla registro_venta
@@ -285,17 +810,180 @@ def _init_sqlite_database():
             )
         ''')
         
-        # Índices para registro_venta
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_fecha ON registro_venta(fecha_venta)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_vendedor ON registro_venta(vendedor_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_auto ON registro_venta(auto_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_tipo_compra ON registro_venta(tipo_compra)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_dni ON registro_venta(dni_comprador)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_provincia ON registro_venta(sucursal_provincia)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_distrito ON registro_venta(sucursal_distrito)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_venta_fecha_vendedor ON registro_venta(fecha_venta, vendedor_id)')
-        
         logger.info("✅ Tabla 'registro_venta' creada con FOREIGN KEYS")
+        
+        # Tabla idempotencia_ventas (claves Idempotency-Key de /venta/registrar)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotencia_ventas (
+                vendedor_id INTEGER NOT NULL,
+                clave TEXT NOT NULL,
+                huella TEXT NOT NULL,
+                venta_id INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                
+                PRIMARY KEY (vendedor_id, clave)
+            ) WITHOUT ROWID
+        ''')
+        
+        logger.info("✅ Tabla 'idempotencia_ventas' creada")
+        
+        # Tabla compradores (un registro por DNI, mantenido al registrar ventas)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS compradores (
+                dni TEXT PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                nombre_busqueda TEXT NOT NULL,
+                contacto TEXT NOT NULL,
+                total_compras INTEGER NOT NULL DEFAULT 0,
+                primera_compra TIMESTAMP,
+                ultima_compra TIMESTAMP,
+                
+                CONSTRAINT chk_comprador_dni_length CHECK(length(dni) = 8)
+            ) WITHOUT ROWID
+        ''')
+        
+        logger.info("✅ Tabla 'compradores' creada")
+        
+        # Tabla trabajos (cola persistente de trabajos en segundo plano)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                parametros TEXT NOT NULL DEFAULT '{}',
+                resultado TEXT,
+                error TEXT,
+                progreso REAL NOT NULL DEFAULT 0,
+                mensaje TEXT,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                max_intentos INTEGER NOT NULL DEFAULT 3,
+                creado_por INTEGER,
+                worker TEXT,
+                proximo_intento TIMESTAMP NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                iniciado_at TIMESTAMP,
+                actualizado_at TIMESTAMP,
+                finalizado_at TIMESTAMP,
+                
+                FOREIGN KEY (creado_por) REFERENCES vendedores(id),
+                CONSTRAINT chk_trabajo_estado CHECK(estado IN ('pendiente', 'en_curso', 'completado', 'fallido'))
+            )
+        ''')
+        
+        logger.info("✅ Tabla 'trabajos' creada")
+        
+        # Tabla particiones_ventas (meses de registro_venta movidos al archivo)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS particiones_ventas (
+                mes TEXT PRIMARY KEY,
+                ventas INTEGER NOT NULL,
+                ubicacion TEXT NOT NULL,
+                bytes INTEGER,
+                archivado_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+        
+        # Tabla ventas_resumen_mensual (totales por vendedor de los meses archivados)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ventas_resumen_mensual (
+                mes TEXT NOT NULL,
+                sucursal_provincia TEXT NOT NULL,
+                sucursal_distrito TEXT NOT NULL,
+                vendedor_id INTEGER NOT NULL,
+                nombre_vendedor TEXT NOT NULL,
+                unidades INTEGER NOT NULL,
+                monto REAL NOT NULL,
+                
+                PRIMARY KEY (mes, sucursal_provincia, sucursal_distrito, vendedor_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        logger.info("✅ Tablas de archivo de ventas creadas")
+        
+        # Tabla refresh_tokens (sesiones renovables; solo se guarda la huella del secreto)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                id TEXT PRIMARY KEY,
+                huella TEXT NOT NULL,
+                familia TEXT NOT NULL,
+                vendedor_id INTEGER NOT NULL,
+                expira TIMESTAMP NOT NULL,
+                familia_expira TIMESTAMP NOT NULL,
+                usado_at TIMESTAMP,
+                revocado INTEGER NOT NULL DEFAULT 0,
+                
+                FOREIGN KEY (vendedor_id) REFERENCES vendedores(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        
+        logger.info("✅ Tabla 'refresh_tokens' creada")
+        
+        # Tablas de pronóstico de demanda (agregado diario incremental y resultados)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ventas_diarias (
+                auto_id INTEGER NOT NULL,
+                sucursal_provincia TEXT NOT NULL,
+                sucursal_distrito TEXT NOT NULL,
+                fecha TEXT NOT NULL,
+                unidades INTEGER NOT NULL,
+                
+                PRIMARY KEY (auto_id, sucursal_provincia, sucursal_distrito, fecha)
+            ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ventas_diarias_avance (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                ultimo_venta_id INTEGER NOT NULL,
+                actualizado_at TIMESTAMP
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO ventas_diarias_avance (id, ultimo_venta_id) VALUES (1, 0)")
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pronostico_demanda (
+                auto_id INTEGER NOT NULL,
+                sucursal_provincia TEXT NOT NULL,
+                sucursal_distrito TEXT NOT NULL,
+                demanda_diaria REAL NOT NULL,
+                metodo TEXT NOT NULL,
+                error_medio REAL,
+                generado_at TIMESTAMP NOT NULL,
+                
+                PRIMARY KEY (auto_id, sucursal_provincia, sucursal_distrito)
+            ) WITHOUT ROWID
+        ''')
+        
+        logger.info("✅ Tablas de pronóstico de demanda creadas")
+        
+        # Tabla cambios (outbox para /cdc/changes; el id es el cursor de los consumidores)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cambios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entidad TEXT NOT NULL,
+                operacion TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cambios_purgados (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                hasta_id INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO cambios_purgados (id, hasta_id) VALUES (1, 0)")
+        
+        logger.info("✅ Tabla 'cambios' creada")
+        
+        # Bases de ventas por sucursal (SQLITE_SHARDING)
+        cursor.execute(SQL_SUCURSALES_VENTAS)
+        cursor.execute(SQL_STOCK_ASIGNADO)
+        
+        aplicar_indices(cursor)
+        backfill_compradores(cursor)
         conn.commit()
         
     except Exception as e:
@@ -321,6 +1009,8 @@ def _init_azure_database():
         
         if cursor.fetchone()[0] > 0:
             logger.info("Las tablas ya existen en Azure SQL Database")
+            _init_azure_additional_tables(cursor)
+            conn.commit()
             return
         
         # Tabla vendedores
@@ -343,13 +1033,6 @@ def _init_azure_database():
             )
         ''')
         
-        # Índices para vendedores
-        cursor.execute('CREATE INDEX idx_vendedores_username ON vendedores(username)')
-        cursor.execute('CREATE INDEX idx_vendedores_codigo ON vendedores(codigo_vendedor)')
-        cursor.execute('CREATE INDEX idx_vendedores_provincia ON vendedores(sucursal_provincia)')
-        cursor.execute('CREATE INDEX idx_vendedores_distrito ON vendedores(sucursal_distrito)')
-        cursor.execute('CREATE INDEX idx_vendedores_active ON vendedores(is_active)')
-        
         logger.info("✅ Tabla 'vendedores' creada con PRIMARY KEY: id")
         
         # Tabla autos_disponibles
@@ -371,13 +1054,6 @@ def _init_azure_database():
             )
         ''')
         
-        # Índices para autos_disponibles
-        cursor.execute('CREATE INDEX idx_autos_marca ON autos_disponibles(marca)')
-        cursor.execute('CREATE INDEX idx_autos_modelo ON autos_disponibles(modelo)')
-        cursor.execute('CREATE INDEX idx_autos_anio ON autos_disponibles(anio)')
-        cursor.execute('CREATE INDEX idx_autos_active ON autos_disponibles(is_active)')
-        cursor.execute('CREATE INDEX idx_autos_marca_modelo ON autos_disponibles(marca, modelo)')
-        
         logger.info("✅ Tabla 'autos_disponibles' creada con PRIMARY KEY: id")
         
         # Tabla registro_venta
@@ -414,16 +1090,9 @@ def _init_azure_database():
             )
         ''')
         
-        # Índices para registro_venta
-        cursor.execute('CREATE INDEX idx_venta_fecha ON registro_venta(fecha_venta)')
-        cursor.execute('CREATE INDEX idx_venta_vendedor ON registro_venta(vendedor_id)')
-        cursor.execute('CREATE INDEX idx_venta_auto ON registro_venta(auto_id)')
-        cursor.execute('CREATE INDEX idx_venta_tipo_compra ON registro_venta(tipo_compra)')
-        cursor.execute('CREATE INDEX idx_venta_dni ON registro_venta(dni_comprador)')
-        cursor.execute('CREATE INDEX idx_venta_provincia ON registro_venta(sucursal_provincia)')
-        cursor.execute('CREATE INDEX idx_venta_distrito ON registro_venta(sucursal_distrito)')
-        
         logger.info("✅ Tabla 'registro_venta' creada con FOREIGN KEYS")
+        
+        _init_azure_additional_tables(cursor)
         conn.commit()
         
     except Exception as e:
@@ -434,8 +1103,502 @@ def _init_azure_database():
         conn.close()
 
 
+def _init_azure_additional_tables(cursor):
+    """
+    Crea en Azure SQL las tablas agregadas después del esquema inicial.
+    Se ejecuta también sobre bases existentes, por eso cada tabla se crea
+    solo si no existe.
+    """
+    # Tabla idempotencia_ventas (claves Idempotency-Key de /venta/registrar)
+    cursor.execute('''
+        IF OBJECT_ID('idempotencia_ventas', 'U') IS NULL
+        BEGIN
+            CREATE TABLE idempotencia_ventas (
+                vendedor_id INT NOT NULL,
+                clave NVARCHAR(64) NOT NULL,
+                huella CHAR(32) NOT NULL,
+                venta_id INT NOT NULL,
+                created_at DATETIME DEFAULT GETDATE(),
+                
+                CONSTRAINT pk_idempotencia PRIMARY KEY (vendedor_id, clave)
+            )
+        END
+    ''')
+    
+    # Tabla compradores (un registro por DNI, mantenido al registrar ventas)
+    cursor.execute('''
+        IF OBJECT_ID('compradores', 'U') IS NULL
+        BEGIN
+            CREATE TABLE compradores (
+                dni NVARCHAR(8) PRIMARY KEY,
+                nombre NVARCHAR(255) NOT NULL,
+                nombre_busqueda NVARCHAR(255) NOT NULL,
+                contacto NVARCHAR(20) NOT NULL,
+                total_compras INT NOT NULL DEFAULT 0,
+                primera_compra DATETIME,
+                ultima_compra DATETIME,
+                
+                CONSTRAINT chk_comprador_dni_length CHECK(LEN(dni) = 8)
+            )
+        END
+    ''')
+    
+    # Tabla trabajos (cola persistente de trabajos en segundo plano)
+    cursor.execute('''
+        IF OBJECT_ID('trabajos', 'U') IS NULL
+        BEGIN
+            CREATE TABLE trabajos (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                tipo NVARCHAR(64) NOT NULL,
+                estado NVARCHAR(20) NOT NULL DEFAULT 'pendiente',
+                parametros NVARCHAR(MAX) NOT NULL DEFAULT '{}',
+                resultado NVARCHAR(MAX),
+                error NVARCHAR(MAX),
+                progreso FLOAT NOT NULL DEFAULT 0,
+                mensaje NVARCHAR(255),
+                intentos INT NOT NULL DEFAULT 0,
+                max_intentos INT NOT NULL DEFAULT 3,
+                creado_por INT,
+                worker NVARCHAR(128),
+                proximo_intento DATETIME NOT NULL,
+                created_at DATETIME DEFAULT GETDATE(),
+                iniciado_at DATETIME,
+                actualizado_at DATETIME,
+                finalizado_at DATETIME,
+                
+                CONSTRAINT fk_trabajo_vendedor FOREIGN KEY (creado_por) REFERENCES vendedores(id),
+                CONSTRAINT chk_trabajo_estado CHECK(estado IN ('pendiente', 'en_curso', 'completado', 'fallido'))
+            )
+        END
+    ''')
+    
+    # Tabla particiones_ventas (meses de registro_venta movidos al archivo)
+    cursor.execute('''
+        IF OBJECT_ID('particiones_ventas', 'U') IS NULL
+        BEGIN
+            CREATE TABLE particiones_ventas (
+                mes CHAR(7) PRIMARY KEY,
+                ventas INT NOT NULL,
+                ubicacion NVARCHAR(255) NOT NULL,
+                bytes BIGINT,
+                archivado_at DATETIME DEFAULT GETDATE()
+            )
+        END
+    ''')
+    
+    # Tabla ventas_resumen_mensual (totales por vendedor de los meses archivados)
+    cursor.execute('''
+        IF OBJECT_ID('ventas_resumen_mensual', 'U') IS NULL
+        BEGIN
+            CREATE TABLE ventas_resumen_mensual (
+                mes CHAR(7) NOT NULL,
+                sucursal_provincia NVARCHAR(100) NOT NULL,
+                sucursal_distrito NVARCHAR(100) NOT NULL,
+                vendedor_id INT NOT NULL,
+                nombre_vendedor NVARCHAR(255) NOT NULL,
+                unidades INT NOT NULL,
+                monto FLOAT NOT NULL,
+                
+                CONSTRAINT pk_ventas_resumen_mensual
+                    PRIMARY KEY (mes, sucursal_provincia, sucursal_distrito, vendedor_id)
+            )
+        END
+    ''')
+    
+    # Tabla refresh_tokens (sesiones renovables; solo se guarda la huella del secreto)
+    cursor.execute('''
+        IF OBJECT_ID('refresh_tokens', 'U') IS NULL
+        BEGIN
+            CREATE TABLE refresh_tokens (
+                id CHAR(22) PRIMARY KEY,
+                huella CHAR(32) NOT NULL,
+                familia CHAR(22) NOT NULL,
+                vendedor_id INT NOT NULL,
+                expira DATETIME NOT NULL,
+                familia_expira DATETIME NOT NULL,
+                usado_at DATETIME,
+                revocado BIT NOT NULL DEFAULT 0,
+                
+                CONSTRAINT fk_refresh_vendedor FOREIGN KEY (vendedor_id)
+                    REFERENCES vendedores(id) ON DELETE CASCADE
+            )
+        END
+    ''')
+    
+    # Tablas de pronóstico de demanda (agregado diario incremental y resultados)
+    cursor.execute('''
+        IF OBJECT_ID('ventas_diarias', 'U') IS NULL
+        BEGIN
+            CREATE TABLE ventas_diarias (
+                auto_id INT NOT NULL,
+                sucursal_provincia NVARCHAR(100) NOT NULL,
+                sucursal_distrito NVARCHAR(100) NOT NULL,
+                fecha DATE NOT NULL,
+                unidades INT NOT NULL,
+                
+                CONSTRAINT pk_ventas_diarias
+                    PRIMARY KEY (auto_id, sucursal_provincia, sucursal_distrito, fecha)
+            )
+        END
+    ''')
+    
+    cursor.execute('''
+        IF OBJECT_ID('ventas_diarias_avance', 'U') IS NULL
+        BEGIN
+            CREATE TABLE ventas_diarias_avance (
+                id INT PRIMARY KEY CHECK(id = 1),
+                ultimo_venta_id INT NOT NULL,
+                actualizado_at DATETIME
+            );
+            INSERT INTO ventas_diarias_avance (id, ultimo_venta_id) VALUES (1, 0);
+        END
+    ''')
+    
+    # version de cada venta: la analítica y el pronóstico leen las ventas
+    # nuevas por version hasta MIN_ACTIVE_ROWVERSION(), como el registro de
+    # cambios (con RCSI una venta con id menor puede confirmarse después de
+    # otra con id mayor). ultima_version es el avance del pronóstico
+    cursor.execute('''
+        IF COL_LENGTH('registro_venta', 'version') IS NULL
+            ALTER TABLE registro_venta ADD version ROWVERSION
+    ''')
+    cursor.execute('''
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_venta_version' AND object_id = OBJECT_ID('registro_venta'))
+            CREATE INDEX idx_venta_version ON registro_venta(version)
+    ''')
+    cursor.execute('''
+        IF COL_LENGTH('ventas_diarias_avance', 'ultima_version') IS NULL
+            ALTER TABLE ventas_diarias_avance ADD ultima_version BIGINT NULL
+    ''')
+    
+    cursor.execute('''
+        IF OBJECT_ID('pronostico_demanda', 'U') IS NULL
+        BEGIN
+            CREATE TABLE pronostico_demanda (
+                auto_id INT NOT NULL,
+                sucursal_provincia NVARCHAR(100) NOT NULL,
+                sucursal_distrito NVARCHAR(100) NOT NULL,
+                demanda_diaria FLOAT NOT NULL,
+                metodo NVARCHAR(30) NOT NULL,
+                error_medio FLOAT,
+                generado_at DATETIME NOT NULL,
+                
+                CONSTRAINT pk_pronostico_demanda
+                    PRIMARY KEY (auto_id, sucursal_provincia, sucursal_distrito)
+            )
+        END
+    ''')
+    
+    # Tabla cambios (outbox para /cdc/changes; el id es el cursor de los consumidores).
+    # version permite entregar solo cambios de transacciones ya confirmadas
+    cursor.execute('''
+        IF OBJECT_ID('cambios', 'U') IS NULL
+        BEGIN
+            CREATE TABLE cambios (
+                id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                entidad NVARCHAR(20) NOT NULL,
+                operacion NVARCHAR(10) NOT NULL,
+                clave NVARCHAR(50) NOT NULL,
+                datos NVARCHAR(MAX) NOT NULL,
+                created_at DATETIME NOT NULL,
+                version ROWVERSION
+            )
+        END
+    ''')
+    
+    cursor.execute('''
+        IF OBJECT_ID('cambios_purgados', 'U') IS NULL
+        BEGIN
+            CREATE TABLE cambios_purgados (
+                id INT PRIMARY KEY CHECK(id = 1),
+                hasta_id BIGINT NOT NULL
+            );
+            INSERT INTO cambios_purgados (id, hasta_id) VALUES (1, 0);
+        END
+    ''')
+    
+    # Tabla registro_venta_archivo: meses fríos en columnstore (comprimido y
+    # consultable); desnormaliza marca/modelo/anio para no depender del catálogo
+    cursor.execute('''
+        IF OBJECT_ID('registro_venta_archivo', 'U') IS NULL
+        BEGIN
+            CREATE TABLE registro_venta_archivo (
+                id INT NOT NULL,
+                fecha_venta DATETIME NOT NULL,
+                vendedor_id INT NOT NULL,
+                nombre_vendedor NVARCHAR(255) NOT NULL,
+                auto_id INT NOT NULL,
+                marca NVARCHAR(100) NOT NULL,
+                modelo NVARCHAR(100) NOT NULL,
+                anio INT NOT NULL,
+                tipo_compra NVARCHAR(20) NOT NULL,
+                monto_fisco NVARCHAR(50) NOT NULL,
+                nombre_comprador NVARCHAR(255) NOT NULL,
+                dni_comprador NVARCHAR(8) NOT NULL,
+                contacto_comprador NVARCHAR(20) NOT NULL,
+                sucursal_provincia NVARCHAR(100) NOT NULL,
+                sucursal_distrito NVARCHAR(100) NOT NULL,
+                
+                INDEX cci_registro_venta_archivo CLUSTERED COLUMNSTORE,
+                INDEX idx_archivo_vendedor_fecha NONCLUSTERED (vendedor_id, fecha_venta),
+                INDEX idx_archivo_dni_fecha NONCLUSTERED (dni_comprador, fecha_venta),
+                INDEX idx_archivo_sucursal_fecha NONCLUSTERED (sucursal_provincia, sucursal_distrito, fecha_venta)
+            )
+        END
+    ''')
+    
+    aplicar_indices(cursor)
+    backfill_compradores(cursor)
+
+
+def aplicar_indices(cursor):
+    """
+    Lleva los índices secundarios al conjunto declarado en INDICES:
+    elimina los de INDICES_OBSOLETOS y crea los que falten. Es idempotente,
+    así que también migra bases creadas con el esquema anterior.
+    """
+    if db_manager.db_type == "sqlite":
+        for nombre in INDICES_OBSOLETOS:
+            cursor.execute(f'DROP INDEX IF EXISTS {nombre}')
+        for indice in INDICES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {indice.nombre} ON {indice.sql_sqlite()}')
+    else:  # azure
+        for nombre, tabla in INDICES_OBSOLETOS.items():
+            cursor.execute(f'''
+                IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{nombre}' AND object_id = OBJECT_ID('{tabla}'))
+                    DROP INDEX {nombre} ON {tabla}
+            ''')
+        for indice in INDICES:
+            cursor.execute(f'''
+                IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{indice.nombre}' AND object_id = OBJECT_ID('{indice.tabla}'))
+                    CREATE INDEX {indice.nombre} ON {indice.sql_azure()}
+            ''')
+    
+    logger.info(f"✅ Índices aplicados: {len(INDICES)} vigentes, {len(INDICES_OBSOLETOS)} obsoletos eliminados si existían")
+
+
+def backfill_compradores(cursor):
+    """
+    Llena la tabla compradores a partir de registro_venta si está vacía.
+    Toma nombre y contacto de la venta más reciente de cada DNI.
+    """
+    from app.services.cliente_service import normalizar_nombre
+    
+    cursor.execute("SELECT COUNT(*) FROM compradores")
+    if cursor.fetchone()[0] > 0:
+        return
+    
+    cursor.execute('''
+        SELECT rv.dni_comprador, rv.nombre_comprador, rv.contacto_comprador,
+               agg.total, agg.primera, agg.ultima
+        FROM registro_venta rv
+        JOIN (
+            SELECT dni_comprador, COUNT(*) AS total, MIN(fecha_venta) AS primera,
+                   MAX(fecha_venta) AS ultima, MAX(id) AS ultimo_id
+            FROM registro_venta
+            GROUP BY dni_comprador
+        ) agg ON rv.id = agg.ultimo_id
+    ''')
+    filas = [
+        (dni, nombre, normalizar_nombre(nombre), contacto, total, primera, ultima)
+        for dni, nombre, contacto, total, primera, ultima in cursor.fetchall()
+    ]
+    
+    if not filas:
+        return
+    
+    cursor.executemany('''
+        INSERT INTO compradores (
+            dni, nombre, nombre_busqueda, contacto,
+            total_compras, primera_compra, ultima_compra
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', filas)
+    logger.info(f"✅ Tabla 'compradores' poblada con {len(filas)} compradores")
+
+
+def crear_esquema_sucursal(ruta: str, numero: int):
+    """
+    Tablas de una base de ventas de sucursal: registro_venta (sin claves
+    foráneas, porque vendedores y autos están en la central; el cupo de
+    stock de la misma transacción valida el auto) y el avance del agregado
+    diario de sus ventas. Los ids empiezan en numero * ID_BASE_SUCURSAL.
+    
+    Una venta escribe solo en esta base: el cupo de stock de la sucursal
+    (stock_sucursal), sus claves de idempotencia y, con los mismos nombres
+    que en la central, los compradores y cambios pendientes de consolidar
+    (ver consolidacion_service).
+    """
+    conn = conectar_sqlite(ruta)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS registro_venta (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha_venta TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                vendedor_id INTEGER NOT NULL,
+                auto_id INTEGER NOT NULL,
+                tipo_compra TEXT NOT NULL CHECK(tipo_compra IN ('Cash', 'Crédito')),
+                monto_fisco TEXT NOT NULL,
+                nombre_comprador TEXT NOT NULL,
+                dni_comprador TEXT NOT NULL,
+                contacto_comprador TEXT NOT NULL,
+                sucursal_provincia TEXT NOT NULL,
+                sucursal_distrito TEXT NOT NULL,
+                nombre_vendedor TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                
+                CONSTRAINT chk_dni_length CHECK(length(dni_comprador) = 8),
+                CONSTRAINT chk_monto_not_empty CHECK(length(monto_fisco) > 0)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'registro_venta', ?
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'registro_venta')
+        ''', (numero * ID_BASE_SUCURSAL,))
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ventas_diarias_avance (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                ultimo_venta_id INTEGER NOT NULL,
+                actualizado_at TIMESTAMP
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO ventas_diarias_avance (id, ultimo_venta_id) VALUES (1, 0)")
+        
+        # Cupo: unidades asignadas a la sucursal sin vender, y las vendidas
+        # que aún no se descontaron del stock de la central
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_sucursal (
+                auto_id INTEGER PRIMARY KEY,
+                disponible INTEGER NOT NULL DEFAULT 0,
+                vendidas INTEGER NOT NULL DEFAULT 0,
+                
+                CONSTRAINT chk_disponible_positivo CHECK(disponible >= 0)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotencia_ventas (
+                vendedor_id INTEGER NOT NULL,
+                clave TEXT NOT NULL,
+                huella TEXT NOT NULL,
+                venta_id INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                
+                PRIMARY KEY (vendedor_id, clave)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Pendientes de consolidar: compras por DNI desde la última
+        # consolidación y cambios aún no copiados al registro de la central
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS compradores (
+                dni TEXT PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                nombre_busqueda TEXT NOT NULL,
+                contacto TEXT NOT NULL,
+                total_compras INTEGER NOT NULL DEFAULT 0,
+                primera_compra TIMESTAMP,
+                ultima_compra TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cambios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entidad TEXT NOT NULL,
+                operacion TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        
+        for indice in INDICES:
+            if indice.tabla in ("registro_venta", "idempotencia_ventas"):
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {indice.nombre} ON {indice.sql_sqlite()}')
+        conn.commit()
+    
+    except Exception as e:
+        logger.error(f"❌ Error al crear la base de ventas {ruta}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def migrar_ventas_a_sucursales():
+    """
+    Al activar SQLITE_SHARDING sobre una base existente, mueve las ventas de
+    registro_venta de la central a la base de su provincia (con sus ids) y
+    sus claves de idempotencia. Las ya sumadas al agregado diario no se
+    vuelven a sumar. Corre después de sembrar los datos iniciales.
+    """
+    if not db_manager.sharding:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT DISTINCT sucursal_provincia FROM registro_venta")
+        provincias = [fila[0] for fila in cursor.fetchall()]
+        if not provincias:
+            return
+        
+        cursor.execute("SELECT ultimo_venta_id FROM ventas_diarias_avance WHERE id = 1")
+        fila = cursor.fetchone()
+        avance = fila[0] if fila else 0
+        
+        for provincia in provincias:
+            cursor.execute("ATTACH DATABASE ? AS sucursal", (db_manager.ruta_sucursal(provincia),))
+            try:
+                cursor.execute('''
+                    INSERT INTO sucursal.registro_venta
+                    SELECT * FROM main.registro_venta WHERE sucursal_provincia = ?
+                ''', (provincia,))
+                movidas = cursor.rowcount
+                cursor.execute('''
+                    INSERT OR IGNORE INTO sucursal.idempotencia_ventas
+                    SELECT * FROM main.idempotencia_ventas
+                    WHERE venta_id IN (SELECT id FROM main.registro_venta WHERE sucursal_provincia = ?)
+                ''', (provincia,))
+                cursor.execute('''
+                    DELETE FROM main.idempotencia_ventas
+                    WHERE venta_id IN (SELECT id FROM main.registro_venta WHERE sucursal_provincia = ?)
+                ''', (provincia,))
+                cursor.execute("DELETE FROM main.registro_venta WHERE sucursal_provincia = ?", (provincia,))
+                cursor.execute('''
+                    UPDATE sucursal.ventas_diarias_avance SET ultimo_venta_id = ?
+                    WHERE id = 1 AND ultimo_venta_id < ?
+                ''', (avance, avance))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute("DETACH DATABASE sucursal")
+            logger.info(f"🏬 {movidas} ventas de {provincia} movidas a su base de sucursal")
+    
+    except Exception as e:
+        logger.error(f"❌ Error al mover ventas a las bases de sucursal: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 def seed_initial_data():
-    """Inserta datos iniciales en la base de datos"""
+    """
+    Inserta datos iniciales en la base de datos. Con sharding, después mueve
+    las ventas de la central (las sembradas incluidas) a las bases de sucursal.
+    """
+    _insertar_datos_iniciales()
+    migrar_ventas_a_sucursales()
+
+
+def _insertar_datos_iniciales():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -621,6 +1784,7 @@ def seed_initial_data():
             if total_ventas >= 432:
                 break
         
+        backfill_compradores(cursor)
         conn.commit()
         
         logger.info(f"✅ Insertados {total_ventas} registros de ventas")
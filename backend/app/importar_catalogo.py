@@ -0,0 +1,68 @@
+"""
+Importa una lista de precios o de modelos al catálogo desde la línea de
+comandos.
+
+Hace lo mismo que POST /catalogo/importar (ver catalogo_service), pero
+directo contra la base configurada. Sirve para cargas programadas o cuando
+la API no está levantada. Si el estado compartido es multiproceso, los
+clientes conectados a la API reciben el evento `resync`.
+
+Uso (desde backend/):
+    python -m app.importar_catalogo lista_2026.csv
+    python -m app.importar_catalogo lista_2026.json --dry-run
+    python -m app.importar_catalogo lista.csv --reporte diff.json
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importa una lista de precios al catálogo de Automotriz JJ")
+    parser.add_argument("archivo", help="Lista en CSV o JSON")
+    parser.add_argument("--formato", choices=("csv", "json"), help="Por defecto según la extensión del archivo")
+    parser.add_argument("--dry-run", action="store_true", help="Solo muestra el diff, sin escribir")
+    parser.add_argument("--reporte", help="Guarda el diff completo en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from app.services.catalogo_service import ListaPreciosInvalidaError, formato_de, importar_lista, leer_lista
+    from app.utils.broadcaster import catalogo_broadcaster
+    from app.utils.shared_state import get_estado
+
+    with open(args.archivo, "rb") as f:
+        contenido = f.read()
+
+    try:
+        autos = leer_lista(contenido, args.formato or formato_de(args.archivo, contenido))
+    except ListaPreciosInvalidaError as e:
+        logger.error(f"❌ {e}; no se importó ninguna fila:")
+        for error in e.errores:
+            logger.error(f"   - {error}")
+        return 1
+
+    catalogo_broadcaster.conectar(get_estado())
+    reporte = importar_lista(autos, dry_run=args.dry_run)
+
+    for cambio in reporte["cambios"][:20]:
+        if cambio["accion"] == "nuevo":
+            logger.info(f"   + {cambio['marca']} {cambio['modelo']} {cambio['anio']}: {cambio['precio_referencial']}")
+        else:
+            logger.info(f"   ~ {cambio['marca']} {cambio['modelo']} {cambio['anio']}: {cambio['antes']} → {cambio['despues']}")
+    if len(reporte["cambios"]) > 20:
+        logger.info(f"   ... y {len(reporte['cambios']) - 20} cambios más")
+
+    if args.reporte:
+        with open(args.reporte, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 Diff guardado en {args.reporte}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -1,15 +1,38 @@
+import asyncio
 import logging
 import os
-import time
 from datetime import datetime
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import settings
-from app.routes import auth, venta
+from app.routes import auth, catalogo, cdc, dashboard, jobs, sync, venta
+from app.services.auth_service import get_user
+from app.utils import singleflight
+from app.utils.broadcaster import catalogo_broadcaster
+from app.utils.shared_state import get_estado
+from app.utils.security import get_current_user
+from app.utils.profiling import (
+    JSONResponsePerfilada,
+    debe_perfilar,
+    finalizar_perfil,
+    iniciar_perfil
+)
 
 # Importar funciones de database para inicialización
 try:
-    from app.database import init_database, seed_initial_data
+    from app.database import (
+        BaseDatosNoDisponibleError,
+        db_manager,
+        init_database,
+        seed_initial_data,
+        wait_for_azure_db
+    )
+    from app.services.consolidacion_service import consolidador
+    from app.services.idempotencia_service import purgar_claves_expiradas
+    from app.services.ranking_service import reconstruir as reconstruir_rankings
+    from app.services.trabajo_service import ejecutor as ejecutor_trabajos
     DATABASE_AVAILABLE = True
 except ImportError:
     DATABASE_AVAILABLE = False
@@ -27,13 +50,19 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Log dedicado para queries lentas detectadas por el perfilado
+_slow_query_handler = logging.FileHandler('slow_queries.log', encoding='utf-8')
+_slow_query_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+logging.getLogger("app.slow_queries").addHandler(_slow_query_handler)
+
 # Crear instancia de FastAPI
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="API para el sistema de gestión de Automotriz JJ",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=JSONResponsePerfilada
 )
 
 # Configurar CORS
@@ -64,9 +93,40 @@ async def log_requests(request: Request, call_next):
     
     return response
 
+# Middleware de perfilado opcional (header X-Profile o muestreo)
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not debe_perfilar(request.headers):
+        return await call_next(request)
+    
+    perfil, token = iniciar_perfil()
+    try:
+        response = await call_next(request)
+    finally:
+        finalizar_perfil(token)
+    
+    response.headers["Server-Timing"] = perfil.server_timing()
+    return response
+
+# Base de datos caída o con errores transitorios: 503 con Retry-After en vez de un 500
+if DATABASE_AVAILABLE:
+    @app.exception_handler(BaseDatosNoDisponibleError)
+    async def base_datos_no_disponible(request: Request, exc: BaseDatosNoDisponibleError):
+        logger.warning(f"⚠️ Base de datos no disponible en {request.method} {request.url.path}: {exc}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Servicio temporalmente no disponible, intente nuevamente"},
+            headers={"Retry-After": str(max(int(exc.reintentar_en + 0.999), 1))}
+        )
+
 # Incluir routers
 app.include_router(auth.router)
 app.include_router(venta.router)
+app.include_router(dashboard.router)
+app.include_router(jobs.router)
+app.include_router(cdc.router)
+app.include_router(sync.router)
+app.include_router(catalogo.router)
 
 
 @app.get("/")
@@ -83,15 +143,52 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Endpoint para verificar el estado del servidor"""
+    """
+    Endpoint para verificar el estado del servidor. Responde 200 aunque la
+    base de datos esté caída (el proceso sigue vivo); en ese caso el estado
+    es "degraded" y `base_datos` muestra el circuit breaker.
+    """
     logger.info("Health check accessed")
+    base_datos = db_manager.estado_resiliencia() if DATABASE_AVAILABLE else None
     return {
-        "status": "healthy",
+        "status": "degraded" if base_datos and base_datos["estado"] != "cerrado" else "healthy",
         "service": settings.APP_NAME,
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "base_datos": base_datos
+    }
+
+
+def _metricas() -> dict:
+    return {
+        "estado_compartido": get_estado().estadisticas(),
+        "pool_sqlite": db_manager.estadisticas_pool() if DATABASE_AVAILABLE else None,
+        "single_flight": singleflight.estadisticas(),
+        "sse": {
+            "catalogo": catalogo_broadcaster.estadisticas()
+        },
+        "trabajos": ejecutor_trabajos.estadisticas() if DATABASE_AVAILABLE else None
     }
 
 
+@app.get("/metrics")
+async def metrics(current_user: dict = Depends(get_current_user)):
+    """
+    Métricas internas del worker: coalescencia de consultas, SSE, trabajos y
+    estado compartido. Solo para los roles de METRICS_ROLES.
+    """
+    user = await run_in_threadpool(get_user, current_user["username"])
+    
+    if not user or user.get("role") not in settings.metrics_roles:
+        logger.warning(f"Métricas denegadas - Usuario: {current_user['username']}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para leer las métricas"
+        )
+    
+    # El estado compartido (SQLite o Redis) se consulta fuera del event loop
+    return await run_in_threadpool(_metricas)
+
+
 # ============================================
 # FUNCIONES DE INICIALIZACIÓN DE BASE DE DATOS
 # ============================================
@@ -112,49 +209,12 @@ def wait_for_database(max_retries=10, retry_delay=5):
         return False
     
     # Solo esperar si estamos usando Azure SQL
-    db_type = os.getenv('DB_TYPE', 'sqlite').lower()
-    if db_type != 'azure':
+    if db_manager.db_type != 'azure':
         logger.info("Usando SQLite, no es necesario esperar")
         return True
     
-    import pyodbc
-    
-    server = os.getenv('AZURE_SQL_SERVER')
-    database = os.getenv('AZURE_SQL_DATABASE')
-    username = os.getenv('AZURE_SQL_USERNAME')
-    password = os.getenv('AZURE_SQL_PASSWORD')
-    driver = os.getenv('AZURE_SQL_DRIVER', '{ODBC Driver 18 for SQL Server}')
-    
-    connection_string = (
-        f'DRIVER={driver};'
-        f'SERVER={server};'
-        f'DATABASE={database};'
-        f'UID={username};'
-        f'PWD={password};'
-        f'Encrypt=yes;'
-        f'TrustServerCertificate=no;'
-        f'Connection Timeout=30;'
-    )
-    
-    logger.info("🔄 Esperando a que Azure SQL Database esté disponible...")
-    
-    for attempt in range(1, max_retries + 1):
-        try:
-            logger.info(f"Intento {attempt}/{max_retries} de conexión a {server}/{database}")
-            conn = pyodbc.connect(connection_string)
-            conn.close()
-            logger.info("✅ Base de datos disponible!")
-            return True
-        except Exception as e:
-            logger.warning(f"⚠️ Intento {attempt} falló: {e}")
-            if attempt < max_retries:
-                logger.info(f"Reintentando en {retry_delay} segundos...")
-                time.sleep(retry_delay)
-            else:
-                logger.error("❌ No se pudo conectar a la base de datos después de múltiples intentos")
-                return False
-    
-    return False
+    # Reutiliza la conexión del gestor: pyodbc solo se importa en despliegues Azure
+    return wait_for_azure_db(max_retries=max_retries, retry_delay=retry_delay)
 
 
 def initialize_database():
@@ -203,22 +263,35 @@ async def startup_event():
     logger.info(f"🚀 Iniciando {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info("=" * 70)
     
+    # Estado compartido entre workers y broadcaster de cambios del catálogo
+    estado = get_estado()
+    logger.info(f"👷 Worker PID {os.getpid()} - Workers: {settings.WEB_CONCURRENCY} - Estado compartido: {estado.nombre}")
+    catalogo_broadcaster.iniciar(
+        asyncio.get_running_loop(),
+        estado,
+        intervalo_relay=settings.SSE_RELAY_INTERVAL_SECONDS
+    )
+    
     # Verificar tipo de base de datos
     db_type = os.getenv('DB_TYPE', 'sqlite').lower()
     logger.info(f"📊 Tipo de base de datos: {db_type.upper()}")
     
-    # Inicializar base de datos
+    # Inicializar base de datos (en un hilo: crear el esquema, migrar y
+    # sembrar puede tardar, y el event loop no debe quedar bloqueado)
     try:
-        if DATABASE_AVAILABLE:
+        if not settings.DB_INIT_ON_STARTUP:
+            logger.info("⏭️ Inicialización de BD omitida (la hizo el launcher antes de iniciar los workers)")
+        elif DATABASE_AVAILABLE:
             # Esperar a que la base de datos esté disponible (solo para Azure SQL)
             if db_type == 'azure':
-                if not wait_for_database():
+                if not await asyncio.to_thread(wait_for_database):
                     logger.error("❌ Base de datos no disponible, pero continuando...")
                     logger.error("⚠️ La aplicación puede no funcionar correctamente")
             
             # Inicializar base de datos
-            if initialize_database():
+            if await asyncio.to_thread(initialize_database):
                 logger.info("✅ Base de datos lista")
+                await asyncio.to_thread(purgar_claves_expiradas)
             else:
                 logger.error("❌ Error al inicializar base de datos")
                 logger.error("⚠️ La aplicación puede no funcionar correctamente")
@@ -228,6 +301,16 @@ async def startup_event():
         logger.error(f"❌ Error crítico al inicializar base de datos: {e}")
         logger.error("⚠️ La aplicación continuará pero puede no funcionar correctamente")
     
+    # Rankings de vendedores en memoria de este worker
+    if DATABASE_AVAILABLE:
+        await asyncio.to_thread(reconstruir_rankings)
+        
+        # Hilos que ejecutan los trabajos en segundo plano encolados
+        ejecutor_trabajos.iniciar(settings.JOBS_WORKERS)
+    
+        # Con sharding, pasa a la central lo que registran las sucursales
+        consolidador.iniciar(settings.SQLITE_CONSOLIDAR_SECONDS)
+    
     logger.info("")
     logger.info(f"📝 Documentación disponible en: /docs")
     logger.info(f"🔐 Usuario de prueba: {settings.DEFAULT_USERNAME}")
@@ -238,6 +321,10 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Se ejecuta cuando la aplicación se cierra"""
+    catalogo_broadcaster.detener()
+    if DATABASE_AVAILABLE:
+        ejecutor_trabajos.detener()
+        consolidador.detener()
     logger.info("=" * 70)
     logger.info(f"👋 Cerrando {settings.APP_NAME}")
     logger.info("=" * 70)
\ No newline at end of file
@@ -1,10 +1,25 @@
 import logging
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from app.schemas.token import Token
+from app.schemas.token import RefreshRequest, Token
 from app.services.auth_service import authenticate_user, get_user
-from app.utils.security import create_access_token, get_current_user
+from app.services.sesion_service import (
+    RefreshTokenInvalidoError,
+    emitir_refresh,
+    revocar_sesion,
+    rotar_refresh
+)
+from app.utils.security import (
+    create_access_token,
+    get_current_user,
+    limpiar_logins_fallidos,
+    login_bloqueado,
+    registrar_login_fallido,
+    revocar_token
+)
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -12,31 +27,39 @@ router = APIRouter(prefix="/auth", tags=["Autenticación"])
 
 
 @router.post("/login", response_model=dict)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     """Endpoint de login para autenticar usuarios"""
     logger.info(f"Intento de login para usuario: {form_data.username}")
     
-    user = authenticate_user(form_data.username, form_data.password)
+    ip = request.client.host if request.client else "desconocida"
+    
+    if await run_in_threadpool(login_bloqueado, form_data.username, ip):
+        logger.warning(f"Login bloqueado por intentos fallidos: {form_data.username} desde {ip}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos fallidos. Intente nuevamente más tarde",
+            headers={"Retry-After": str(settings.LOGIN_WINDOW_SECONDS)},
+        )
+    
+    user = await run_in_threadpool(authenticate_user, form_data.username, form_data.password)
     
     if not user:
         logger.warning(f"Login fallido para usuario: {form_data.username}")
+        await run_in_threadpool(registrar_login_fallido, form_data.username, ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["username"]},
-        expires_delta=access_token_expires
-    )
+    await run_in_threadpool(limpiar_logins_fallidos, form_data.username, ip)
+    
+    tokens = _emitir_tokens(user["username"], await run_in_threadpool(emitir_refresh, user["id"]))
     
     logger.info(f"Login exitoso para usuario: {form_data.username} - Rol: {user.get('role')} - Sucursal: {user.get('sucursal_provincia')}/{user.get('sucursal_distrito')}")
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": {
             "username": user["username"],
             "full_name": user["full_name"],
@@ -49,13 +72,45 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     }
 
 
+def _emitir_tokens(username: str, refresh_token: str) -> dict:
+    access_token = create_access_token(
+        data={"sub": username},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    ).model_dump()
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(datos: RefreshRequest):
+    """
+    Renueva el access token con un refresh token, sin pedir la contraseña.
+    El refresh token se rota: el enviado deja de servir y se entrega uno nuevo.
+    """
+    try:
+        sesion = await run_in_threadpool(rotar_refresh, datos.refresh_token)
+    except RefreshTokenInvalidoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    logger.info(f"Sesión renovada para usuario: {sesion['username']}")
+    return _emitir_tokens(sesion["username"], sesion["refresh_token"])
+
+
 @router.get("/me", response_model=dict)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Obtiene la información del usuario autenticado actualmente"""
     username = current_user["username"]
     logger.info(f"Solicitud de información de usuario: {username}")
     
-    user = get_user(username)
+    user = await run_in_threadpool(get_user, username)
     
     if not user:
         logger.error(f"Usuario no encontrado: {username}")
@@ -76,8 +131,19 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 
 
 @router.post("/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
-    """Endpoint de logout"""
+async def logout(
+    datos: Optional[RefreshRequest] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Endpoint de logout: revoca el token actual en todos los workers y, si se
+    envía, la sesión del refresh token
+    """
+    await run_in_threadpool(revocar_token, current_user["payload"])
+    if datos:
+        user = await run_in_threadpool(get_user, current_user["username"])
+        if user:
+            await run_in_threadpool(revocar_sesion, datos.refresh_token, user["id"])
     logger.info(f"Logout exitoso para usuario: {current_user['username']}")
     return {
         "message": f"Usuario {current_user['username']} ha cerrado sesión exitosamente"
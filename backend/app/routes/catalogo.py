@@ -0,0 +1,90 @@
+import logging
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.services.auth_service import get_user
+from app.services.catalogo_service import ListaPreciosInvalidaError, formato_de, importar_lista, leer_lista
+from app.utils.security import get_current_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/catalogo", tags=["Catálogo"])
+
+
+def _demasiado_grande(maximo: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"La lista supera los {maximo} bytes"
+    )
+
+
+async def _leer_cuerpo(request: Request, maximo: int) -> bytes:
+    """
+    Lee el cuerpo sin pasar de `maximo` bytes: rechaza por Content-Length
+    antes de leer y, si no viene (chunked) o miente, corta la lectura en
+    cuanto el acumulado lo supera.
+    """
+    declarado = request.headers.get("content-length", "")
+    if declarado.isdigit() and int(declarado) > maximo:
+        raise _demasiado_grande(maximo)
+    
+    partes = []
+    leidos = 0
+    async for parte in request.stream():
+        leidos += len(parte)
+        if leidos > maximo:
+            raise _demasiado_grande(maximo)
+        partes.append(parte)
+    return b"".join(partes)
+
+
+@router.post("/importar")
+async def importar_catalogo(
+    request: Request,
+    formato: Optional[Literal["csv", "json"]] = Query(None, description="Formato del cuerpo (por defecto según Content-Type)"),
+    dry_run: bool = Query(False, description="Solo calcula el diff, sin escribir"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Importa una lista de precios o de modelos al catálogo (altas y
+    actualizaciones por marca, modelo y año).
+    
+    El cuerpo es el archivo tal cual: CSV (`text/csv`) con encabezados
+    marca, modelo, anio, precio_referencial y opcionalmente stock e
+    is_active, o JSON (`application/json`) con una lista de objetos con esos
+    campos. Retorna el diff aplicado: nuevos, actualizados (antes y después)
+    y sin cambios. Con errores de validación no se importa ninguna fila.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") not in settings.catalogo_admin_roles:
+        logger.warning(f"Importación de catálogo denegada - Usuario: {username}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para modificar el catálogo"
+        )
+    
+    contenido = await _leer_cuerpo(request, settings.CATALOGO_IMPORT_MAX_BYTES)
+    
+    if formato is None:
+        tipo = request.headers.get("content-type", "")
+        formato = "json" if "json" in tipo else "csv" if "csv" in tipo else formato_de(None, contenido)
+    
+    try:
+        autos = await run_in_threadpool(leer_lista, contenido, formato)
+    except ListaPreciosInvalidaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"mensaje": str(e), "errores": e.errores}
+        )
+    
+    logger.info(f"Importando catálogo - Usuario: {username}, Filas: {len(autos)}, Simulación: {dry_run}")
+    
+    return await run_in_threadpool(importar_lista, autos, dry_run)
\ No newline at end of file
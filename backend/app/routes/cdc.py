@@ -0,0 +1,59 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.services.auth_service import get_user
+from app.services.cdc_service import CursorExpiradoError, generar_ndjson, iter_cambios, validar_cursor
+from app.utils.security import get_current_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/cdc", tags=["Cambios"])
+
+
+@router.get("/changes")
+async def obtener_cambios(
+    since: int = Query(0, ge=0, description="Cursor del último cambio recibido (0 = desde el inicio)"),
+    limit: int = Query(1000, ge=1, description="Máximo de cambios a entregar"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Cambios de ventas y catálogo posteriores a `since`, en orden, como NDJSON
+    (una línea por cambio). El `cursor` de la última línea es el `since` del
+    siguiente pedido; menos de `limit` líneas indica que el consumidor está
+    al día.
+    
+    Solo para los roles con acceso global (los mismos que exportan ventas de
+    cualquier sucursal).
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") not in settings.export_global_roles:
+        logger.warning(f"Cambios denegados - Usuario: {username}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para leer el registro de cambios"
+        )
+    
+    try:
+        ultimo = await run_in_threadpool(validar_cursor, since)
+    except CursorExpiradoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"{e}; vuelva a cargar los datos desde el export"
+        )
+    
+    limit = min(limit, settings.CDC_MAX_LIMIT)
+    
+    return StreamingResponse(
+        generar_ndjson(iter_cambios(since, limit, batch_size=settings.CDC_BATCH_SIZE)),
+        media_type="application/x-ndjson",
+        headers={"X-CDC-Last-Cursor": str(ultimo)}
+    )
\ No newline at end of file
@@ -0,0 +1,117 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.services.auth_service import get_user
+from app.services.dashboard_service import get_resumen
+from app.services.pronostico_service import get_reposicion
+from app.services.ranking_service import get_ranking
+from app.utils.security import get_current_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+
+
+@router.get("/resumen")
+async def obtener_resumen(
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Perfil, últimas ventas, totales del mes y ranking de la sucursal del
+    vendedor en una sola respuesta (cacheada unos segundos por vendedor)
+    """
+    user = await run_in_threadpool(get_user, current_user["username"])
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    resumen, desde_cache = await run_in_threadpool(get_resumen, user)
+    response.headers["X-Cache"] = "HIT" if desde_cache else "MISS"
+    
+    return resumen
+
+
+@router.get("/ranking")
+async def obtener_ranking(
+    periodo: str = Query("mes", pattern="^(mes|anio|historico)$", description="Periodo: mes, anio o historico"),
+    criterio: str = Query("unidades", pattern="^(unidades|monto)$", description="Ordenar por unidades o monto"),
+    top: int = Query(10, ge=1, le=100),
+    provincia: Optional[str] = Query(None, description="Provincia de la sucursal"),
+    distrito: Optional[str] = Query(None, description="Distrito de la sucursal"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Ranking de vendedores de una sucursal en el periodo en curso, con el
+    puesto del vendedor actual.
+    
+    Un vendedor solo ve el ranking de su sucursal; los usuarios con rol con
+    acceso global pueden elegir cualquier sucursal.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") in settings.export_global_roles:
+        provincia = provincia or user["sucursal_provincia"]
+        distrito = distrito or user["sucursal_distrito"]
+    else:
+        if (provincia and provincia != user["sucursal_provincia"]) or \
+                (distrito and distrito != user["sucursal_distrito"]):
+            logger.warning(f"Ranking denegado - Vendedor: {username} solicitó {provincia}/{distrito}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puede ver el ranking de su sucursal"
+            )
+        provincia = user["sucursal_provincia"]
+        distrito = user["sucursal_distrito"]
+    
+    return await run_in_threadpool(
+        get_ranking, provincia, distrito, periodo, criterio, top, user["id"]
+    )
+
+
+@router.get("/reposicion")
+async def obtener_reposicion(
+    top: int = Query(50, ge=1, le=500),
+    provincia: Optional[str] = Query(None, description="Provincia de la sucursal"),
+    distrito: Optional[str] = Query(None, description="Distrito de la sucursal"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Demanda pronosticada, días de stock restantes y unidades a reponer por
+    auto, de los más urgentes a los menos urgentes.
+    
+    Un vendedor ve los autos que se venden en su sucursal; los usuarios con
+    rol con acceso global ven todas las sucursales o filtran por una.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") not in settings.export_global_roles:
+        if (provincia and provincia != user["sucursal_provincia"]) or \
+                (distrito and distrito != user["sucursal_distrito"]):
+            logger.warning(f"Reposición denegada - Vendedor: {username} solicitó {provincia}/{distrito}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puede ver la reposición de su sucursal"
+            )
+        provincia = user["sucursal_provincia"]
+        distrito = user["sucursal_distrito"]
+    
+    return await run_in_threadpool(get_reposicion, provincia, distrito, top)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import logging
+import os
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from app.config import settings
+from app.services import tareas  # noqa: F401 - registra las tareas
+from app.services.auth_service import get_user
+from app.services.trabajo_service import (
+    TipoTrabajoDesconocidoError,
+    encolar,
+    get_trabajo,
+    tareas_registradas
+)
+from app.utils.security import get_current_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/jobs", tags=["Trabajos"])
+
+
+class TrabajoCreate(BaseModel):
+    """Esquema para encolar un trabajo de mantenimiento"""
+    tipo: str = Field(..., description="Tipo de trabajo")
+    parametros: Dict = Field(default_factory=dict, description="Parámetros de la tarea")
+    max_intentos: Optional[int] = Field(None, ge=1, le=10, description="Intentos antes de marcarlo fallido")
+
+
+async def _usuario(current_user: dict) -> dict:
+    user = await run_in_threadpool(get_user, current_user["username"])
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
+    return user
+
+
+def _vista(trabajo: Dict) -> Dict:
+    """Trabajo sin rutas internas del servidor"""
+    resultado = dict(trabajo["resultado"]) if trabajo["resultado"] else None
+    if resultado and resultado.pop("archivo", None):
+        resultado["descarga"] = f"/jobs/{trabajo['id']}/descarga"
+    return {**trabajo, "resultado": resultado}
+
+
+async def _trabajo_visible(trabajo_id: int, user: dict) -> Dict:
+    """El trabajo si existe y el usuario lo creó (o tiene rol con acceso global)"""
+    trabajo = await run_in_threadpool(get_trabajo, trabajo_id)
+
+    if not trabajo or (
+        trabajo["creado_por"] != user["id"] and user.get("role") not in settings.export_global_roles
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo no encontrado"
+        )
+
+    return trabajo
+
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def crear_trabajo(
+    trabajo: TrabajoCreate,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """Encola un trabajo de cualquier tipo (solo roles con acceso global)"""
+    user = await _usuario(current_user)
+
+    if user.get("role") not in settings.export_global_roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para encolar trabajos"
+        )
+
+    try:
+        trabajo_id = await run_in_threadpool(
+            encolar, trabajo.tipo, trabajo.parametros, user["id"], trabajo.max_intentos
+        )
+    except TipoTrabajoDesconocidoError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tipo de trabajo desconocido. Disponibles: {', '.join(tareas_registradas())}"
+        )
+
+    logger.info(f"Trabajo encolado - Usuario: {user['username']}, Tipo: {trabajo.tipo}, ID: {trabajo_id}")
+    response.headers["Location"] = f"/jobs/{trabajo_id}"
+    return {"id": trabajo_id, "estado": "pendiente"}
+
+
+@router.get("/{trabajo_id}")
+async def obtener_trabajo(
+    trabajo_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Estado, progreso y resultado de un trabajo"""
+    user = await _usuario(current_user)
+    trabajo = await _trabajo_visible(trabajo_id, user)
+    return _vista(trabajo)
+
+
+@router.get("/{trabajo_id}/descarga")
+async def descargar_resultado(
+    trabajo_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Descarga el archivo generado por un trabajo completado"""
+    user = await _usuario(current_user)
+    trabajo = await _trabajo_visible(trabajo_id, user)
+
+    if trabajo["estado"] != "completado":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El trabajo está {trabajo['estado']}"
+        )
+
+    resultado = trabajo["resultado"] or {}
+    archivo = resultado.get("archivo")
+    if not archivo or not os.path.exists(archivo):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="El trabajo no generó un archivo o ya fue eliminado"
+        )
+
+    return FileResponse(archivo, filename=resultado.get("nombre") or os.path.basename(archivo))
\ No newline at end of file
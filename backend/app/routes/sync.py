@@ -0,0 +1,71 @@
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.config import settings
+from app.routes.venta import IDEMPOTENCY_KEY_PATTERN, VentaCreate
+from app.services.auth_service import get_user
+from app.services.sync_service import sincronizar
+from app.utils.security import get_current_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/sync", tags=["Sincronización"])
+
+
+class VersionCliente(BaseModel):
+    """Vector de versiones que el cliente ya tiene"""
+    catalogo: Optional[int] = Field(None, ge=0, description="Cursor de cambios del catálogo (sin valor = catálogo completo)")
+    ventas: Optional[int] = Field(None, ge=0, description="ID de la última venta propia recibida (sin valor = primera vez)")
+
+
+class VentaOffline(VentaCreate):
+    """Venta registrada en el cliente sin conexión"""
+    id_local: str = Field(..., pattern=IDEMPOTENCY_KEY_PATTERN.pattern, description="ID generado por el cliente (UUID)")
+    registrada_en: Optional[datetime] = Field(None, description="Hora en que se registró en el cliente")
+
+
+class Sincronizacion(BaseModel):
+    """Esquema del pedido de sincronización"""
+    version: VersionCliente = Field(default_factory=VersionCliente)
+    ventas_offline: List[VentaOffline] = Field(
+        default_factory=list, max_length=settings.SYNC_MAX_VENTAS_OFFLINE,
+        description="Ventas pendientes, en el orden en que se registraron"
+    )
+
+
+@router.post("")
+async def sincronizar_cliente(
+    pedido: Sincronizacion,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Sincroniza un cliente de sucursal.
+    
+    Registra las `ventas_offline` (el `id_local` hace seguros los reenvíos) y
+    retorna solo lo que cambió desde `version`: autos del catálogo con
+    cambios, ids de autos que ya no están a la venta y las ventas nuevas del
+    vendedor. Las filas van como listas en el orden de `columnas`. La
+    `version` de la respuesta es la que se envía en el siguiente pedido;
+    con `ventas.hay_mas` conviene volver a sincronizar enseguida.
+    
+    Si el auto de una venta sin conexión ya no tiene stock, la venta se
+    rechaza (`estado: rechazada`, `motivo: sin_stock`) y el catálogo de la
+    respuesta trae el stock real. Las ventas con `estado: error` se
+    reenvían en la siguiente sincronización.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    ventas = [venta.model_dump() for venta in pedido.ventas_offline]
+    if ventas:
+        logger.info(f"🔁 Sincronizando {len(ventas)} ventas sin conexión - Vendedor: {username}")
+    
+    return await run_in_threadpool(sincronizar, user, pedido.version.model_dump(), ventas)
\ No newline at end of file
@@ -1,18 +1,43 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Optional
+import re
+from datetime import date, datetime, time, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field
+from app.config import settings
 from app.services.venta_service import (
+    EXPORT_COLUMNAS,
+    StockInsuficienteError,
     get_autos_disponibles,
     registrar_venta,
-    get_ventas_by_vendedor
+    get_ventas_by_vendedor,
+    iter_ventas_export
 )
+from app.services.idempotencia_service import (
+    ClaveIdempotenciaConflictoError,
+    ClaveIdempotenciaDuplicadaError,
+    ejecutar_idempotente,
+    huella_payload
+)
+from app.services.analitica_service import ConsultaAnaliticaInvalidaError, consultar_ventas
+from app.services.cliente_service import buscar_compradores, get_comprador
+from app.services.credito_service import SimulacionInvalidaError, simular_credito
+from app.services.export_service import PARQUET_AVAILABLE, generar_csv, generar_parquet
+from app.services import tareas  # noqa: F401 - registra las tareas
+from app.services.trabajo_service import encolar
 from app.services.auth_service import get_user
-from app.utils.security import get_current_user
+from app.utils.broadcaster import catalogo_broadcaster
+from app.utils.profiling import RespuestaFilas
+from app.utils.security import get_current_user, get_current_user_stream
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/venta", tags=["Ventas"])
 
+# Formato aceptado para el header Idempotency-Key (UUID u otro identificador corto)
+IDEMPOTENCY_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+
 
 class VentaCreate(BaseModel):
     """Esquema para crear una venta"""
@@ -24,6 +49,18 @@ class VentaCreate(BaseModel):
     contacto_comprador: str = Field(..., min_length=6, description="Contacto del comprador")
 
 
+class SimulacionCredito(BaseModel):
+    """Esquema para simular el financiamiento de un auto"""
+    auto_id: int = Field(..., description="ID del auto")
+    cuota_inicial: float = Field(0.0, ge=0, description="Cuota inicial en soles")
+    tasas_anuales: Optional[List[Annotated[float, Field(ge=0, le=100)]]] = Field(
+        None, min_length=1, description="TEA a simular, en % (por defecto SIMULADOR_TASAS_DEFAULT)"
+    )
+    plazos: Optional[List[Annotated[int, Field(ge=1)]]] = Field(
+        None, min_length=1, description="Plazos a simular, en meses (por defecto SIMULADOR_PLAZOS_DEFAULT)"
+    )
+
+
 @router.get("/autos")
 async def listar_autos(
     search: Optional[str] = Query(None, description="Término de búsqueda"),
@@ -32,22 +69,63 @@ async def listar_autos(
     """Lista autos disponibles con búsqueda opcional"""
     logger.info(f"Listando autos - Usuario: {current_user['username']}, Búsqueda: {search}")
     
-    autos = get_autos_disponibles(search)
+    autos = await run_in_threadpool(get_autos_disponibles, search)
     
-    return {
+    return RespuestaFilas({
         "total": len(autos),
         "autos": autos
-    }
+    })
+
+
+@router.get("/autos/stream")
+async def stream_autos(
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: dict = Depends(get_current_user_stream)
+):
+    """
+    Stream SSE con los cambios de stock del catálogo.
+    
+    EventSource no permite enviar headers, por eso el token también se acepta
+    como parámetro `?token=`. Un evento `resync` (importación del catálogo o
+    eventos perdidos) indica que el cliente debe recargar /venta/autos completo.
+    """
+    logger.info(f"Suscripción a cambios del catálogo - Usuario: {current_user['username']}")
+    
+    return StreamingResponse(
+        catalogo_broadcaster.suscribir(
+            desde=last_event_id,
+            heartbeat=settings.SSE_HEARTBEAT_SECONDS
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 
 @router.post("/registrar")
 async def crear_venta(
     venta: VentaCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Registra una nueva venta"""
+    """
+    Registra una nueva venta.
+    
+    Con el header `Idempotency-Key` los reintentos del cliente son seguros:
+    la misma clave retorna el `venta_id` original sin registrar otra venta.
+    """
     username = current_user["username"]
-    user = get_user(username)
+    
+    if idempotency_key is not None and not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key inválido (máximo 64 caracteres alfanuméricos, '-', '_', '.' o ':')"
+        )
+    
+    user = await run_in_threadpool(get_user, username)
     
     if not user:
         raise HTTPException(
@@ -57,19 +135,49 @@ async def crear_venta(
     
     logger.info(f"Registrando venta - Vendedor: {user['full_name']} ({user['sucursal_provincia']}/{user['sucursal_distrito']})")
     
+    huella = huella_payload(venta.model_dump()) if idempotency_key else None
+    
+    def registrar():
+        return registrar_venta(
+            vendedor_id=user['id'],
+            auto_id=venta.auto_id,
+            tipo_compra=venta.tipo_compra,
+            monto_fisco=venta.monto_fisco,
+            nombre_comprador=venta.nombre_comprador,
+            dni_comprador=venta.dni_comprador,
+            contacto_comprador=venta.contacto_comprador,
+            sucursal_provincia=user['sucursal_provincia'],
+            sucursal_distrito=user['sucursal_distrito'],
+            nombre_vendedor=user['full_name'],
+            clave_idempotencia=idempotency_key,
+            huella_idempotencia=huella
+        )
+    
     # Registrar la venta
-    venta_id = registrar_venta(
-        vendedor_id=user['id'],
-        auto_id=venta.auto_id,
-        tipo_compra=venta.tipo_compra,
-        monto_fisco=venta.monto_fisco,
-        nombre_comprador=venta.nombre_comprador,
-        dni_comprador=venta.dni_comprador,
-        contacto_comprador=venta.contacto_comprador,
-        sucursal_provincia=user['sucursal_provincia'],
-        sucursal_distrito=user['sucursal_distrito'],
-        nombre_vendedor=user['full_name']
-    )
+    replay = False
+    try:
+        if idempotency_key:
+            venta_id, replay = await run_in_threadpool(
+                ejecutar_idempotente, user['id'], idempotency_key, huella, registrar,
+                user['sucursal_provincia']
+            )
+        else:
+            venta_id = await run_in_threadpool(registrar)
+    except StockInsuficienteError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El auto seleccionado ya no tiene stock disponible"
+        )
+    except ClaveIdempotenciaConflictoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except ClaveIdempotenciaDuplicadaError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Otra petición con la misma Idempotency-Key está en curso; reintente"
+        )
     
     if not venta_id:
         raise HTTPException(
@@ -77,6 +185,10 @@ async def crear_venta(
             detail="Error al registrar la venta"
         )
     
+    if replay:
+        logger.info(f"♻️ Reintento idempotente - Vendedor: {username}, Clave: {idempotency_key}, Venta: {venta_id}")
+        response.headers["Idempotent-Replayed"] = "true"
+    
     return {
         "success": True,
         "message": "Venta registrada exitosamente",
@@ -87,11 +199,15 @@ async def crear_venta(
 @router.get("/mis-ventas")
 async def obtener_mis_ventas(
     limit: int = Query(50, ge=1, le=100),
+    incluir_archivo: bool = Query(False, description="Completar con ventas de meses archivados (ver anteriores)"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Obtiene las ventas del vendedor actual"""
+    """
+    Obtiene las ventas del vendedor actual de los meses recientes. Con
+    `incluir_archivo=true` se completan con el archivo si no alcanzan.
+    """
     username = current_user["username"]
-    user = get_user(username)
+    user = await run_in_threadpool(get_user, username)
     
     if not user:
         raise HTTPException(
@@ -101,11 +217,293 @@ async def obtener_mis_ventas(
     
     logger.info(f"Obteniendo ventas - Vendedor: {user['full_name']}")
     
-    ventas = get_ventas_by_vendedor(user['id'], limit)
+    ventas = await run_in_threadpool(
+        get_ventas_by_vendedor, user['id'], limit, user['sucursal_provincia'], incluir_archivo
+    )
     
-    return {
+    return RespuestaFilas({
         "total": len(ventas),
         "vendedor": user['full_name'],
         "sucursal": f"{user['sucursal_provincia']}/{user['sucursal_distrito']}",
         "ventas": ventas
-    }
\ No newline at end of file
+    })
+
+
+@router.get("/clientes")
+async def buscar_clientes(
+    q: str = Query(..., min_length=2, description="Prefijo de DNI o nombre del comprador"),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    """Autocompletado de compradores por prefijo de DNI o nombre"""
+    clientes = await run_in_threadpool(buscar_compradores, q, limit)
+    
+    return RespuestaFilas({
+        "total": len(clientes),
+        "clientes": clientes
+    })
+
+
+@router.get("/clientes/{dni}")
+async def obtener_cliente(
+    dni: str,
+    limit: int = Query(20, ge=1, le=100),
+    incluir_archivo: bool = Query(False, description="Completar con compras de meses archivados (ver anteriores)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Obtiene un comprador por DNI con su historial de compras"""
+    if len(dni) != 8 or not dni.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El DNI debe tener 8 dígitos"
+        )
+    
+    cliente = await run_in_threadpool(get_comprador, dni, limit, incluir_archivo)
+    
+    if not cliente:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comprador no encontrado"
+        )
+    
+    return RespuestaFilas(cliente)
+
+
+@router.post("/simulador-credito")
+async def simulador_credito(
+    simulacion: SimulacionCredito,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Cronogramas de cuota fija para un auto del catálogo (precio referencial
+    menos cuota inicial) en todas las combinaciones de tasa y plazo.
+    """
+    try:
+        resultado = await run_in_threadpool(
+            simular_credito,
+            simulacion.auto_id,
+            simulacion.cuota_inicial,
+            simulacion.tasas_anuales,
+            simulacion.plazos
+        )
+    except SimulacionInvalidaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    
+    if not resultado:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Auto no encontrado"
+        )
+    
+    return resultado
+
+
+@router.get("/analitica")
+async def analitica_ventas(
+    agrupar: Optional[List[str]] = Query(None, description="Dimensiones: sucursal_provincia, sucursal_distrito, marca, modelo, anio, tipo_compra, vendedor, mes o dia"),
+    orden: str = Query("monto", pattern="^(monto|ventas|grupo)$", description="Ordenar grupos por monto, ventas o dimensiones"),
+    top: int = Query(100, ge=1, le=settings.ANALITICA_MAX_GRUPOS),
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    provincia: Optional[List[str]] = Query(None, description="Provincias de la sucursal"),
+    distrito: Optional[List[str]] = Query(None, description="Distritos de la sucursal"),
+    marca: Optional[List[str]] = Query(None),
+    modelo: Optional[List[str]] = Query(None),
+    anio: Optional[List[int]] = Query(None),
+    tipo_compra: Optional[List[str]] = Query(None),
+    vendedor_id: Optional[List[int]] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Ventas y monto total de las ventas que cumplen los filtros, agrupados
+    por las dimensiones pedidas (por ejemplo `?agrupar=marca&agrupar=mes`).
+    Cada filtro acepta varios valores.
+    
+    Un vendedor solo ve las ventas de su sucursal; los usuarios con rol con
+    acceso global pueden filtrar por cualquier sucursal.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") not in settings.export_global_roles:
+        if any(p != user["sucursal_provincia"] for p in provincia or []) or \
+                any(d != user["sucursal_distrito"] for d in distrito or []):
+            logger.warning(f"Analítica denegada - Vendedor: {username} solicitó {provincia}/{distrito}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puede consultar las ventas de su sucursal"
+            )
+        provincia = [user["sucursal_provincia"]]
+        distrito = [user["sucursal_distrito"]]
+    
+    if desde and hasta and desde > hasta:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha inicial no puede ser posterior a la final"
+        )
+    
+    filtros = {
+        "sucursal_provincia": provincia,
+        "sucursal_distrito": distrito,
+        "marca": marca,
+        "modelo": modelo,
+        "anio": anio,
+        "tipo_compra": tipo_compra,
+        "vendedor_id": vendedor_id
+    }
+    
+    try:
+        return await run_in_threadpool(
+            consultar_ventas,
+            filtros,
+            datetime.combine(desde, time.min) if desde else None,
+            datetime.combine(hasta + timedelta(days=1), time.min) if hasta else None,
+            agrupar or [],
+            orden,
+            top
+        )
+    except ConsultaAnaliticaInvalidaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+
+
+def _validar_export(
+    user: Optional[dict],
+    username: str,
+    formato: str,
+    desde: Optional[date],
+    hasta: Optional[date],
+    provincia: Optional[str],
+    distrito: Optional[str]
+):
+    """
+    Valida los parámetros de un export y retorna la sucursal (provincia,
+    distrito) que el usuario puede exportar.
+    """
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    if user.get("role") in settings.export_global_roles:
+        provincia = provincia or user["sucursal_provincia"]
+    else:
+        if (provincia and provincia != user["sucursal_provincia"]) or \
+                (distrito and distrito != user["sucursal_distrito"]):
+            logger.warning(f"Export denegado - Vendedor: {username} solicitó {provincia}/{distrito}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puede exportar las ventas de su sucursal"
+            )
+        provincia = user["sucursal_provincia"]
+        distrito = user["sucursal_distrito"]
+    
+    if desde and hasta and desde > hasta:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha inicial no puede ser posterior a la final"
+        )
+    
+    if formato == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Exportación Parquet no disponible en este servidor"
+        )
+    
+    return provincia, distrito
+
+
+def _nombre_export(formato: str, provincia: str, distrito: Optional[str], desde: Optional[date], hasta: Optional[date]) -> str:
+    nombre = f"ventas_{provincia}_{distrito or 'todas'}_{desde or 'inicio'}_{hasta or 'hoy'}".replace(" ", "_")
+    return f"{nombre}.{formato}"
+
+
+@router.get("/export")
+async def exportar_ventas(
+    formato: str = Query("csv", pattern="^(csv|parquet)$", description="Formato: csv o parquet"),
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    provincia: Optional[str] = Query(None, description="Provincia de la sucursal"),
+    distrito: Optional[str] = Query(None, description="Distrito de la sucursal"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta en streaming las ventas de una sucursal y rango de fechas.
+    
+    Un vendedor solo puede exportar las ventas de su propia sucursal; los
+    usuarios con rol con acceso global pueden elegir cualquier sucursal.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    provincia, distrito = _validar_export(user, username, formato, desde, hasta, provincia, distrito)
+    
+    logger.info(f"Exportando ventas - Usuario: {username}, Sucursal: {provincia}/{distrito or '*'}, Rango: {desde} a {hasta}, Formato: {formato}")
+    
+    lotes = iter_ventas_export(
+        sucursal_provincia=provincia,
+        sucursal_distrito=distrito,
+        fecha_desde=datetime.combine(desde, time.min) if desde else None,
+        fecha_hasta=datetime.combine(hasta + timedelta(days=1), time.min) if hasta else None,
+        batch_size=settings.EXPORT_BATCH_SIZE
+    )
+    
+    nombre = _nombre_export(formato, provincia, distrito, desde, hasta)
+    
+    if formato == "parquet":
+        contenido = generar_parquet(EXPORT_COLUMNAS, lotes)
+        media_type = "application/vnd.apache.parquet"
+    else:
+        contenido = generar_csv(EXPORT_COLUMNAS, lotes)
+        media_type = "text/csv; charset=utf-8"
+    
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+
+@router.post("/export/async", status_code=status.HTTP_202_ACCEPTED)
+async def exportar_ventas_async(
+    response: Response,
+    formato: str = Query("csv", pattern="^(csv|parquet)$", description="Formato: csv o parquet"),
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    provincia: Optional[str] = Query(None, description="Provincia de la sucursal"),
+    distrito: Optional[str] = Query(None, description="Distrito de la sucursal"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Encola el export como trabajo en segundo plano y responde de inmediato.
+    
+    El progreso se consulta en `GET /jobs/{id}` y el archivo se descarga en
+    `GET /jobs/{id}/descarga` cuando el trabajo termina.
+    """
+    username = current_user["username"]
+    user = await run_in_threadpool(get_user, username)
+    provincia, distrito = _validar_export(user, username, formato, desde, hasta, provincia, distrito)
+    
+    trabajo_id = await run_in_threadpool(encolar, "exportar_ventas", {
+        "formato": formato,
+        "provincia": provincia,
+        "distrito": distrito,
+        "desde": datetime.combine(desde, time.min).isoformat() if desde else None,
+        "hasta": datetime.combine(hasta + timedelta(days=1), time.min).isoformat() if hasta else None,
+        "nombre": _nombre_export(formato, provincia, distrito, desde, hasta)
+    }, user["id"])
+    
+    logger.info(f"Export encolado - Usuario: {username}, Sucursal: {provincia}/{distrito or '*'}, Trabajo: {trabajo_id}")
+    response.headers["Location"] = f"/jobs/{trabajo_id}"
+    return {"id": trabajo_id, "estado": "pendiente"}
\ No newline at end of file
@@ -6,6 +6,13 @@ class Token(BaseModel):
     """Esquema de respuesta de token"""
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    """Refresh token a renovar o revocar"""
+    refresh_token: str
 
 
 class TokenData(BaseModel):
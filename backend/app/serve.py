@@ -0,0 +1,90 @@
+"""
+Launcher multiproceso de la API.
+
+Calcula la cantidad de workers, inicializa la base de datos una sola vez
+(para que N workers no creen tablas ni siembren datos a la vez) y levanta
+uvicorn con los workers configurados para compartir estado (cache,
+revocación de tokens, límites de login y eventos SSE).
+
+Uso (desde backend/):
+    python -m app.serve                      # workers automáticos
+    python -m app.serve --workers 4 --port 8000
+    python -m app.serve --workers 1          # un proceso, estado en memoria
+
+Heurística de workers (si no se indica --workers ni WEB_CONCURRENCY):
+- SQLite: hasta 4 workers. Las escrituras se serializan en el archivo, así
+  que más procesos solo agregan contención.
+- Azure SQL: 2 por CPU (los workers esperan red), hasta 16 para no agotar
+  las conexiones del plan de Azure.
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS_SQLITE = 4
+MAX_WORKERS_AZURE = 16
+
+
+def cpus_disponibles() -> int:
+    """CPUs que el proceso puede usar (respeta afinidad y cgroups de contenedores)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def calcular_workers(db_type: str, cpus: Optional[int] = None) -> int:
+    """Cantidad de workers recomendada para el tipo de base de datos"""
+    cpus = cpus or cpus_disponibles()
+    if db_type == "azure":
+        return max(1, min(cpus * 2, MAX_WORKERS_AZURE))
+    return max(1, min(cpus, MAX_WORKERS_SQLITE))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Levanta la API de Automotriz JJ con varios workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", default=os.getenv("WEB_CONCURRENCY", "auto"),
+                        help="Cantidad de workers o 'auto' (por defecto WEB_CONCURRENCY o auto)")
+    parser.add_argument("--skip-init", action="store_true",
+                        help="No inicializar la base de datos antes de levantar los workers")
+    args = parser.parse_args(argv)
+
+    db_type = os.getenv("DB_TYPE", "sqlite").lower()
+    workers = calcular_workers(db_type) if args.workers == "auto" else int(args.workers)
+
+    # Los workers leen esta configuración al importar app.config
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    os.environ["DB_INIT_ON_STARTUP"] = "true" if workers == 1 else "false"
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.info(f"🚀 Levantando {workers} worker(s) en {args.host}:{args.port} ({db_type.upper()}, {cpus_disponibles()} CPUs)")
+
+    if workers > 1 and not args.skip_init:
+        from app.database import init_database, seed_initial_data
+        from app.services.idempotencia_service import purgar_claves_expiradas
+
+        logger.info("📊 Inicializando base de datos antes de iniciar los workers...")
+        init_database()
+        seed_initial_data()
+        purgar_claves_expiradas()
+
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        proxy_headers=True,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,477 @@
+"""
+Analítica de ventas en memoria: filtros y agrupaciones ad-hoc sobre
+registro_venta (sucursal, modelo, año, tipo de compra, vendedor, fechas).
+
+Cada worker guarda una copia por columnas (NumPy) de registro_venta unida
+con marca, modelo y año de autos_disponibles:
+
+- Textos codificados por diccionario: cada valor distinto se guarda una
+  vez y la columna guarda su código (int32).
+- Montos en céntimos (int64): `monto_fisco` se interpreta al cargar, no en
+  cada consulta.
+- Fechas como datetime64, más el día y el mes ya calculados (días y meses
+  desde 1970) para agrupar sin convertir fechas en cada consulta.
+
+La copia se completa con las ventas nuevas, en lotes cortos que no
+bloquean a quien registra ventas, y como mucho cada
+ANALITICA_REFRESCO_SECONDS. Con sharding cada base de ventas tiene su
+propio tope:
+
+- SQLite: por id (clave primaria) desde el último visto; con una sola
+  escritura a la vez, los ids se confirman en orden.
+- Azure SQL: por `version` (rowversion) hasta MIN_ACTIVE_ROWVERSION(), como
+  el registro de cambios (cdc_service). Con RCSI una venta con id menor
+  puede confirmarse después de leer una con id mayor; por id se perdería. Los meses que pasan al archivo se
+descartan, así que la copia responde lo mismo que registro_venta.
+
+Una consulta filtra con máscaras y agrupa con bincount sobre los códigos:
+no toca la base y tarda milisegundos con millones de filas.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.config import settings
+from app.database import db_manager, get_db_connection, relanzar_si_transitorio
+from app.services import archivo_service
+from app.utils.montos import parse_monto
+
+logger = logging.getLogger(__name__)
+
+# Columnas leídas de la base, en orden
+CAMPOS = (
+    "id", "fecha_venta", "vendedor_id", "nombre_vendedor", "auto_id", "marca", "modelo",
+    "anio", "tipo_compra", "monto_fisco", "sucursal_provincia", "sucursal_distrito"
+)
+
+_COLUMNAS_SQL = ", ".join(f"a.{c}" if c in ("marca", "modelo", "anio") else f"rv.{c}" for c in CAMPOS)
+
+# Columnas de texto: se guardan como códigos de su diccionario
+TEXTOS = ("nombre_vendedor", "marca", "modelo", "tipo_compra", "sucursal_provincia", "sucursal_distrito")
+
+TIPOS = {
+    "id": "int64",
+    "fecha": "datetime64[s]",
+    "dia": "int32",
+    "mes": "int32",
+    "vendedor_id": "int32",
+    "auto_id": "int32",
+    "anio": "int16",
+    "monto": "int64",
+    **{campo: "int32" for campo in TEXTOS},
+}
+
+FILTROS = ("sucursal_provincia", "sucursal_distrito", "marca", "modelo", "anio", "tipo_compra", "vendedor_id")
+DIMENSIONES = ("sucursal_provincia", "sucursal_distrito", "marca", "modelo", "anio", "tipo_compra", "vendedor", "mes", "dia")
+ORDENES = ("monto", "ventas", "grupo")
+
+# Con menos combinaciones posibles que esto (o que 4 por fila) se cuenta
+# con bincount directo sobre la clave; si no, se ordenan las claves
+BINCOUNT_MAX_CLAVES = 1 << 20
+
+
+class ConsultaAnaliticaInvalidaError(ValueError):
+    """Dimensión u orden que la analítica no conoce"""
+
+
+class _Diccionario:
+    """Valores distintos de una columna de texto; el código es la posición"""
+    __slots__ = ("valores", "codigos")
+
+    def __init__(self):
+        self.valores: List[str] = []
+        self.codigos: Dict[str, int] = {}
+
+    def codificar(self, textos: Sequence[str]) -> List[int]:
+        codigos = self.codigos
+        return [codigos[texto] if texto in codigos else self._agregar(texto) for texto in textos]
+
+    def _agregar(self, texto: str) -> int:
+        codigo = self.codigos[texto] = len(self.valores)
+        self.valores.append(texto)
+        return codigo
+
+    def buscar(self, textos: Sequence[str]) -> List[int]:
+        """Códigos de los valores conocidos (los desconocidos no tienen filas)"""
+        return [self.codigos[texto] for texto in textos if texto in self.codigos]
+
+
+def _centimos(textos: Sequence) -> List[int]:
+    # Los montos se repiten mucho (precios de lista): se interpreta cada texto una vez por lote
+    memo: Dict = {}
+    return [memo[t] if t in memo else memo.setdefault(t, round(parse_monto(t) * 100)) for t in textos]
+
+
+class InstantaneaVentas:
+    """
+    Ventas por columnas. Un solo hilo agrega o descarta filas (el que
+    refresca); las consultas leen en paralelo una vista de las filas
+    confirmadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columnas: Dict = {}
+        self._filas = 0
+        self.diccionarios = {campo: _Diccionario() for campo in TEXTOS}
+        self.nombres_vendedor: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._filas
+
+    def agregar(self, filas: Sequence[tuple]):
+        """Agrega filas con las columnas de CAMPOS"""
+        import numpy as np
+
+        if not filas:
+            return
+        datos = dict(zip(CAMPOS, zip(*filas)))
+        nuevas = {
+            "id": np.array(datos["id"], dtype=np.int64),
+            # SQLite devuelve texto ISO y Azure datetime; str() deja ambos en ISO
+            "fecha": np.array([str(f) for f in datos["fecha_venta"]], dtype="datetime64[us]").astype("datetime64[s]"),
+            "vendedor_id": np.array(datos["vendedor_id"], dtype=np.int32),
+            "auto_id": np.array(datos["auto_id"], dtype=np.int32),
+            "anio": np.array(datos["anio"], dtype=np.int16),
+            "monto": np.array(_centimos(datos["monto_fisco"]), dtype=np.int64),
+        }
+        nuevas["dia"] = nuevas["fecha"].astype("datetime64[D]").astype(np.int32)
+        nuevas["mes"] = nuevas["fecha"].astype("datetime64[M]").astype(np.int32)
+        for campo in TEXTOS:
+            nuevas[campo] = np.array(self.diccionarios[campo].codificar(datos[campo]), dtype=np.int32)
+        self.nombres_vendedor.update(zip(datos["vendedor_id"], datos["nombre_vendedor"]))
+
+        with self._lock:
+            inicio, fin = self._filas, self._filas + len(filas)
+            capacidad = len(self._columnas["id"]) if self._columnas else 0
+            if fin > capacidad:
+                # Crece al doble: agregar de a lotes cuesta O(1) amortizado por fila
+                capacidad = max(fin, capacidad * 2, 1024)
+                columnas = {}
+                for nombre, tipo in TIPOS.items():
+                    columna = np.empty(capacidad, dtype=tipo)
+                    if inicio:
+                        columna[:inicio] = self._columnas[nombre][:inicio]
+                    columnas[nombre] = columna
+                self._columnas = columnas
+            # Las vistas tomadas antes terminan en `inicio`: no ven estas filas
+            for nombre, valores in nuevas.items():
+                self._columnas[nombre][inicio:fin] = valores
+            self._filas = fin
+
+    def descartar_meses(self, meses: Sequence[str]) -> int:
+        """Quita las filas de los meses ("AAAA-MM") dados; retorna cuántas"""
+        import numpy as np
+
+        with self._lock:
+            if not self._filas or not meses:
+                return 0
+            n = self._filas
+            fechas = self._columnas["fecha"][:n].astype("datetime64[M]")
+            conservar = ~np.isin(fechas, np.array(meses, dtype="datetime64[M]"))
+            descartadas = n - int(np.count_nonzero(conservar))
+            if descartadas:
+                # Columnas nuevas: las vistas de las consultas en curso siguen válidas
+                self._columnas = {nombre: columna[:n][conservar] for nombre, columna in self._columnas.items()}
+                self._filas = n - descartadas
+            return descartadas
+
+    def vista(self) -> Tuple[Dict, Dict[str, int]]:
+        """Columnas con las filas actuales y tamaño de cada diccionario"""
+        with self._lock:
+            n = self._filas
+            columnas = {nombre: columna[:n] for nombre, columna in self._columnas.items()}
+            tamanos = {campo: len(diccionario.valores) for campo, diccionario in self.diccionarios.items()}
+        return columnas, tamanos
+
+    def consultar(
+        self,
+        filtros: Dict[str, Sequence],
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        agrupar: Sequence[str] = (),
+        orden: str = "monto",
+        top: int = 100
+    ) -> Dict:
+        """
+        Ventas y monto de las filas que cumplen los filtros (valores
+        aceptados por columna de FILTROS, fechas en [desde, hasta)) y, si se
+        indica, por grupo de las dimensiones de `agrupar`.
+        """
+        import numpy as np
+
+        for dimension in agrupar:
+            if dimension not in DIMENSIONES:
+                raise ConsultaAnaliticaInvalidaError(
+                    f"No se puede agrupar por '{dimension}' (opciones: {', '.join(DIMENSIONES)})"
+                )
+        if orden not in ORDENES:
+            raise ConsultaAnaliticaInvalidaError(f"Orden '{orden}' inválido (opciones: {', '.join(ORDENES)})")
+
+        columnas, tamanos = self.vista()
+        filas = len(columnas["id"]) if columnas else 0
+        if not filas:
+            return {"ventas": 0, "monto_total": 0.0, "total_grupos": 0, "grupos": [], "filas_en_memoria": 0}
+
+        mascara = None
+        for campo in FILTROS:
+            valores = filtros.get(campo)
+            if not valores:
+                continue
+            if campo in TEXTOS:
+                # Tabla código -> aceptado: una lectura por fila, sin importar cuántos valores
+                tabla = np.zeros(tamanos[campo] + 1, dtype=bool)
+                tabla[self.diccionarios[campo].buscar(valores)] = True
+                condicion = tabla[columnas[campo]]
+            elif len(valores) == 1:
+                condicion = columnas[campo] == valores[0]
+            else:
+                condicion = np.isin(columnas[campo], np.array(valores, dtype=columnas[campo].dtype))
+            mascara = condicion if mascara is None else mascara & condicion
+        for limite, es_desde in ((desde, True), (hasta, False)):
+            if limite is None:
+                continue
+            limite = np.datetime64(limite, "s")
+            condicion = columnas["fecha"] >= limite if es_desde else columnas["fecha"] < limite
+            mascara = condicion if mascara is None else mascara & condicion
+
+        # Solo se copian las columnas que hacen falta
+        necesarias = {"monto"} | {_COLUMNA_DIMENSION.get(d, d) for d in agrupar}
+        seleccion = {
+            nombre: (columnas[nombre] if mascara is None else columnas[nombre][mascara])
+            for nombre in necesarias
+        }
+        montos = seleccion["monto"]
+
+        resultado = {
+            "ventas": int(len(montos)),
+            "monto_total": int(montos.sum()) / 100,
+            "total_grupos": 0,
+            "grupos": [],
+            "filas_en_memoria": filas,
+        }
+        if agrupar and len(montos):
+            resultado["total_grupos"], resultado["grupos"] = self._agrupar(seleccion, tamanos, agrupar, orden, top)
+        return resultado
+
+    def _agrupar(self, seleccion: Dict, tamanos: Dict[str, int], agrupar: Sequence[str], orden: str, top: int):
+        import numpy as np
+
+        dimensiones = [self._dimension(d, seleccion, tamanos) for d in agrupar]
+        codigos = [codigo for codigo, _, _, _ in dimensiones]
+        tamanos_clave = tuple(max(tamano, 1) for _, tamano, _, _ in dimensiones)
+        montos = seleccion["monto"]
+
+        combinaciones = 1
+        for tamano in tamanos_clave:
+            combinaciones *= tamano
+
+        if combinaciones < 2 ** 62:
+            # Una clave entera por combinación de códigos
+            clave = codigos[0].astype(np.int64)
+            for codigo, tamano in zip(codigos[1:], tamanos_clave[1:]):
+                clave = clave * tamano + codigo
+            if combinaciones <= max(BINCOUNT_MAX_CLAVES, 4 * len(clave)):
+                ventas = np.bincount(clave, minlength=combinaciones)
+                claves = np.flatnonzero(ventas)
+                ventas = ventas[claves]
+                sumas = np.bincount(clave, weights=montos, minlength=combinaciones)[claves]
+            else:
+                claves, inversa = np.unique(clave, return_inverse=True)
+                ventas = np.bincount(inversa)
+                sumas = np.bincount(inversa, weights=montos)
+            partes = np.unravel_index(claves, tamanos_clave)
+        else:
+            distintas, inversa = np.unique(np.stack(codigos, axis=1), axis=0, return_inverse=True)
+            inversa = inversa.reshape(-1)
+            ventas = np.bincount(inversa)
+            sumas = np.bincount(inversa, weights=montos)
+            partes = tuple(distintas[:, i] for i in range(len(codigos)))
+
+        if orden == "grupo":
+            # lexsort ordena por la última clave primero
+            claves_orden = [rango[parte] if rango is not None else parte
+                            for parte, (_, _, _, rango) in zip(partes, dimensiones)]
+            indices = np.lexsort(claves_orden[::-1])[:top]
+        else:
+            principal = sumas if orden == "monto" else ventas
+            indices = np.argsort(-principal, kind="stable")[:top]
+
+        grupos = []
+        for i in indices.tolist():
+            grupo = {}
+            for parte, (_, _, decodificar, _) in zip(partes, dimensiones):
+                grupo.update(decodificar(int(parte[i])))
+            total = int(round(sumas[i]))
+            grupo.update({
+                "ventas": int(ventas[i]),
+                "monto_total": total / 100,
+                "ticket_promedio": round(total / int(ventas[i]) / 100, 2),
+            })
+            grupos.append(grupo)
+        return len(ventas), grupos
+
+    def _dimension(self, dimension: str, seleccion: Dict, tamanos: Dict[str, int]):
+        """(códigos, cantidad de códigos, código -> campos del grupo, rango de orden por código o None)"""
+        import numpy as np
+
+        if dimension in TEXTOS:
+            valores = self.diccionarios[dimension].valores[:tamanos[dimension]]
+            rango = np.empty(len(valores), dtype=np.int64)
+            rango[sorted(range(len(valores)), key=valores.__getitem__)] = np.arange(len(valores))
+            return seleccion[dimension], len(valores), lambda c: {dimension: valores[c]}, rango
+
+        if dimension == "anio":
+            codigo, tamano, valor_de = _densificar(seleccion["anio"])
+            return codigo, tamano, lambda c: {"anio": valor_de(c)}, None
+        if dimension == "vendedor":
+            codigo, tamano, valor_de = _densificar(seleccion["vendedor_id"])
+            nombres = self.nombres_vendedor
+
+            def vendedor(c):
+                vendedor_id = valor_de(c)
+                return {"vendedor_id": vendedor_id, "nombre_vendedor": nombres.get(vendedor_id)}
+            return codigo, tamano, vendedor, None
+
+        # mes o dia: meses o días desde 1970
+        unidad = "M" if dimension == "mes" else "D"
+        codigo, tamano, valor_de = _densificar(seleccion[dimension])
+        return codigo, tamano, lambda c: {dimension: str(np.datetime64(valor_de(c), unidad))}, None
+
+
+# Columna de la que sale cada dimensión que no es una columna
+_COLUMNA_DIMENSION = {"vendedor": "vendedor_id"}
+
+
+def _densificar(valores) -> Tuple[object, int, Callable[[int], int]]:
+    """Códigos 0..n-1 que conservan el orden de `valores` (enteros), su cantidad y el valor de cada código"""
+    import numpy as np
+
+    minimo = int(valores.min())
+    desplazados = valores.astype(np.int64) - minimo
+    rango = int(desplazados.max()) + 1
+    if rango <= max(len(valores), 1 << 16):
+        return desplazados, rango, lambda c: minimo + c
+    unicos, inversa = np.unique(valores, return_inverse=True)
+    return inversa.reshape(-1), len(unicos), lambda c: int(unicos[c])
+
+
+# ============================================
+# COPIA DEL WORKER
+# ============================================
+
+_lock = threading.Lock()
+_instantanea = InstantaneaVentas()
+# Por base de ventas ("" sin sharding): las ventas con id (version en Azure)
+# <= tope ya están en la copia
+_topes: Dict[str, int] = {}
+_meses_archivados: Set[str] = set()
+_refrescado = 0.0
+_actualizado_at: Optional[datetime] = None
+
+
+def _leer_lote(provincia: Optional[str], desde: int, limite: int) -> Tuple[List[tuple], int]:
+    """
+    Hasta `limite` ventas posteriores al tope `desde` (id en SQLite, version
+    en Azure SQL) y el tope de la última leída
+    """
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+
+    try:
+        # Una consulta corta por lote: no se mantiene abierta una lectura
+        # larga mientras se registran ventas
+        if db_manager.db_type == "sqlite":
+            cursor.execute(f'''
+                SELECT {_COLUMNAS_SQL}
+                FROM registro_venta rv
+                JOIN autos_disponibles a ON rv.auto_id = a.id
+                WHERE rv.id > ?
+                ORDER BY rv.id
+                LIMIT ?
+            ''', (desde, limite))
+            filas = [tuple(fila) for fila in cursor.fetchall()]
+            return filas, filas[-1][0] if filas else desde
+
+        # Solo versiones menores que la de la transacción abierta más
+        # antigua: lo que se confirme después tendrá una versión mayor al tope
+        cursor.execute(f'''
+            SELECT TOP (?) {_COLUMNAS_SQL}, CAST(rv.version AS BIGINT)
+            FROM registro_venta rv
+            JOIN autos_disponibles a ON rv.auto_id = a.id
+            WHERE rv.version > CAST(CAST(? AS BIGINT) AS BINARY(8))
+              AND rv.version < MIN_ACTIVE_ROWVERSION()
+            ORDER BY rv.version
+        ''', (limite, desde))
+        filas = [tuple(fila) for fila in cursor.fetchall()]
+        return [fila[:-1] for fila in filas], filas[-1][-1] if filas else desde
+    finally:
+        conn.close()
+
+
+def refrescar(forzar: bool = False) -> InstantaneaVentas:
+    """
+    Completa la copia con las ventas nuevas de cada base de ventas y quita
+    los meses archivados. Sin `forzar`, no hace nada si se refrescó hace
+    menos de ANALITICA_REFRESCO_SECONDS.
+    """
+    global _refrescado, _actualizado_at
+
+    with _lock:
+        if not forzar and _refrescado and time.monotonic() - _refrescado < settings.ANALITICA_REFRESCO_SECONDS:
+            return _instantanea
+
+        lote = max(settings.ANALITICA_LOTE_LECTURA, 1)
+        agregadas = 0
+        try:
+            for provincia in db_manager.bases_ventas():
+                base = provincia or ""
+                while True:
+                    filas, _topes[base] = _leer_lote(provincia, _topes.get(base, 0), lote)
+                    _instantanea.agregar(filas)
+                    agregadas += len(filas)
+                    if len(filas) < lote:
+                        break
+
+            # Después de leer: un mes archivado mientras tanto se descarta igual
+            archivados = {particion["mes"] for particion in archivo_service.meses_archivados()}
+            descartadas = _instantanea.descartar_meses(sorted(archivados - _meses_archivados))
+            _meses_archivados.update(archivados)
+
+        except Exception as e:
+            relanzar_si_transitorio(e)
+            # Con un error no transitorio se responde con la copia que hay
+            logger.error(f"❌ Error al refrescar la analítica de ventas: {e}")
+            return _instantanea
+
+        _refrescado = time.monotonic()
+        _actualizado_at = datetime.now()
+        if agregadas or descartadas:
+            logger.info(f"📊 Analítica de ventas: +{agregadas} ventas, -{descartadas} archivadas, {len(_instantanea)} en memoria")
+        return _instantanea
+
+
+def consultar_ventas(
+    filtros: Dict[str, Sequence],
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    agrupar: Sequence[str] = (),
+    orden: str = "monto",
+    top: int = 100
+) -> Dict:
+    """Consulta la copia del worker (ver InstantaneaVentas.consultar), refrescada si corresponde"""
+    inicio = time.perf_counter()
+    instantanea = refrescar()
+    refresco_ms = (time.perf_counter() - inicio) * 1000
+
+    resultado = instantanea.consultar(filtros, desde, hasta, agrupar, orden, min(top, settings.ANALITICA_MAX_GRUPOS))
+    resultado.update({
+        "agrupar": list(agrupar),
+        "orden": orden,
+        "actualizado_at": _actualizado_at,
+        "refresco_ms": round(refresco_ms, 2),
+        "consulta_ms": round((time.perf_counter() - inicio) * 1000 - refresco_ms, 2),
+    })
+    return resultado
\ No newline at end of file
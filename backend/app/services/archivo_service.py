@@ -0,0 +1,589 @@
+"""
+Particionado por mes y archivo de registro_venta.
+
+`registro_venta` conserva solo los meses recientes (ARCHIVE_HOT_MONTHS,
+incluido el actual), así sus índices y las consultas de mis ventas, el
+dashboard y los rankings trabajan sobre pocas filas. El trabajo
+`archivar_ventas` mueve cada mes frío al archivo:
+
+- SQLite: un archivo por mes (`ventas_AAAA_MM.db.gz` en ARCHIVE_DIR): una
+  base con la tabla `ventas`, compactada con VACUUM y comprimida con gzip.
+  Para leerla se usa una copia descomprimida en disco (`lectura/` dentro de
+  ARCHIVE_DIR), que se rehace cuando el .gz cambia; una consulta nunca
+  carga el mes completo en memoria.
+- Azure SQL: la tabla `registro_venta_archivo`, con índice columnstore
+  (comprimido) e índices para las búsquedas por vendedor, DNI y sucursal.
+
+Cada mes archivado queda registrado en `particiones_ventas` y sus totales
+por vendedor en `ventas_resumen_mensual` (los rankings no recorren el
+archivo). Las filas archivadas guardan marca, modelo y año del auto, así
+que se leen sin JOIN al catálogo.
+"""
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.database import db_manager, es_sqlite_en_memoria, get_db_connection
+from app.utils.montos import parse_monto
+
+logger = logging.getLogger(__name__)
+
+TABLA_ARCHIVO_AZURE = "registro_venta_archivo"
+
+# Mismo orden que EXPORT_COLUMNAS de venta_service
+COLUMNAS = (
+    "id", "fecha_venta", "vendedor_id", "nombre_vendedor", "auto_id",
+    "marca", "modelo", "anio", "tipo_compra", "monto_fisco",
+    "nombre_comprador", "dni_comprador", "contacto_comprador",
+    "sucursal_provincia", "sucursal_distrito"
+)
+
+_ESQUEMA_SQLITE = '''
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY,
+        fecha_venta TIMESTAMP NOT NULL,
+        vendedor_id INTEGER NOT NULL,
+        nombre_vendedor TEXT NOT NULL,
+        auto_id INTEGER NOT NULL,
+        marca TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        anio INTEGER NOT NULL,
+        tipo_compra TEXT NOT NULL,
+        monto_fisco TEXT NOT NULL,
+        nombre_comprador TEXT NOT NULL,
+        dni_comprador TEXT NOT NULL,
+        contacto_comprador TEXT NOT NULL,
+        sucursal_provincia TEXT NOT NULL,
+        sucursal_distrito TEXT NOT NULL
+    )
+'''
+
+# Índices de cada archivo mensual (las mismas búsquedas que en registro_venta)
+_INDICES_SQLITE = (
+    ("idx_ventas_vendedor_fecha", "vendedor_id, fecha_venta"),
+    ("idx_ventas_dni_fecha", "dni_comprador, fecha_venta"),
+    ("idx_ventas_sucursal_fecha", "sucursal_provincia, sucursal_distrito, fecha_venta"),
+)
+
+_SELECT_HOT = '''
+    SELECT rv.id, rv.fecha_venta, rv.vendedor_id, rv.nombre_vendedor, rv.auto_id,
+           a.marca, a.modelo, a.anio, rv.tipo_compra, rv.monto_fisco,
+           rv.nombre_comprador, rv.dni_comprador, rv.contacto_comprador,
+           rv.sucursal_provincia, rv.sucursal_distrito
+    FROM registro_venta rv
+    JOIN autos_disponibles a ON rv.auto_id = a.id
+    WHERE rv.fecha_venta >= ? AND rv.fecha_venta < ?
+'''
+
+
+# ============================================
+# MESES
+# ============================================
+
+def _sumar_meses(anio: int, mes: int, delta: int) -> Tuple[int, int]:
+    total = anio * 12 + (mes - 1) + delta
+    return total // 12, total % 12 + 1
+
+
+def rango_mes(mes: str) -> Tuple[datetime, datetime]:
+    """Inicio (inclusive) y fin (exclusivo) de un mes 'AAAA-MM'"""
+    anio, numero = int(mes[:4]), int(mes[5:7])
+    anio_fin, mes_fin = _sumar_meses(anio, numero, 1)
+    return datetime(anio, numero, 1), datetime(anio_fin, mes_fin, 1)
+
+
+def inicio_zona_caliente(ahora: Optional[datetime] = None) -> datetime:
+    """Primer instante que se conserva en registro_venta"""
+    ahora = ahora or datetime.now()
+    anio, mes = _sumar_meses(ahora.year, ahora.month, -(max(settings.ARCHIVE_HOT_MONTHS, 1) - 1))
+    return datetime(anio, mes, 1)
+
+
+def directorio_archivo() -> str:
+    if settings.ARCHIVE_DIR:
+        return settings.ARCHIVE_DIR
+    if es_sqlite_en_memoria(db_manager.ruta_sqlite):
+        return os.path.join(tempfile.gettempdir(), f"automotriz_jj_archivo_{os.getpid()}")
+    return os.path.join(os.path.dirname(os.path.abspath(db_manager.ruta_sqlite)), "archivo_ventas")
+
+
+def _ruta_mes(mes: str, comprimido: bool = True) -> str:
+    """Archivo del mes; sin comprimir es el formato de los meses archivados antes de gzip"""
+    nombre = f"ventas_{mes.replace('-', '_')}.db"
+    return os.path.join(directorio_archivo(), f"{nombre}.gz" if comprimido else nombre)
+
+
+def _comprimir(origen: str, destino: str):
+    """Escribe `origen` comprimido en `destino` (reemplazo atómico)"""
+    temporal = f"{destino}.tmp"
+    with open(origen, "rb") as entrada, gzip.open(temporal, "wb", compresslevel=6) as salida:
+        shutil.copyfileobj(entrada, salida, 1 << 20)
+    os.replace(temporal, destino)
+
+
+def _descomprimir(origen: str, destino: str):
+    with gzip.open(origen, "rb") as entrada, open(destino, "wb") as salida:
+        shutil.copyfileobj(entrada, salida, 1 << 20)
+
+
+def meses_archivados() -> List[Dict]:
+    """Particiones archivadas, de la más antigua a la más reciente"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT mes, ventas, ubicacion, bytes, archivado_at
+            FROM particiones_ventas
+            ORDER BY mes
+        ''')
+        columnas = [c[0] for c in cursor.description]
+        return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+    except Exception as e:
+        logger.error(f"❌ Error al obtener particiones archivadas: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def _meses_en_rango(desde: Optional[datetime], hasta: Optional[datetime]) -> List[Dict]:
+    """Particiones archivadas que se superponen con [desde, hasta)"""
+    particiones = []
+    for particion in meses_archivados():
+        inicio, fin = rango_mes(particion["mes"])
+        if (desde is None or fin > desde) and (hasta is None or inicio < hasta):
+            particiones.append(particion)
+    return particiones
+
+
+def meses_por_archivar() -> List[str]:
+    """Meses anteriores a la zona caliente que aún tienen filas en registro_venta"""
+    corte = inicio_zona_caliente()
+
+    def leer(conn):
+        cursor = conn.cursor()
+        # Recorre las ventas viejas; corre en un trabajo, no en un request
+        if db_manager.db_type == "sqlite":
+            cursor.execute('''
+                SELECT DISTINCT substr(fecha_venta, 1, 7)
+                FROM registro_venta
+                WHERE fecha_venta < ?
+            ''', (corte,))
+        else:
+            cursor.execute('''
+                SELECT DISTINCT FORMAT(fecha_venta, 'yyyy-MM')
+                FROM registro_venta
+                WHERE fecha_venta < ?
+            ''', (corte,))
+        return [fila[0] for fila in cursor.fetchall()]
+
+    try:
+        # Con sharding, la unión de los meses de todas las bases de ventas
+        return sorted({mes for meses in db_manager.en_sucursales(leer) for mes in meses})
+
+    except Exception as e:
+        logger.error(f"❌ Error al buscar meses por archivar: {e}")
+        return []
+
+
+# ============================================
+# ARCHIVADO
+# ============================================
+
+def _resumir(filas) -> List[tuple]:
+    """Totales por sucursal y vendedor a partir de (provincia, distrito, vendedor_id, nombre, monto_fisco)"""
+    totales: Dict[Tuple[str, str, int], List] = {}
+    for provincia, distrito, vendedor_id, nombre_vendedor, monto_fisco in filas:
+        fila = totales.setdefault((provincia, distrito, vendedor_id), [nombre_vendedor, 0, 0.0])
+        fila[1] += 1
+        fila[2] += parse_monto(monto_fisco)
+    return [
+        (provincia, distrito, vendedor_id, nombre, unidades, round(monto, 2))
+        for (provincia, distrito, vendedor_id), (nombre, unidades, monto) in totales.items()
+    ]
+
+
+def _registrar_particion(cursor, mes: str, ventas: int, ubicacion: str, bytes_: Optional[int], resumen: List[tuple]):
+    cursor.execute("DELETE FROM ventas_resumen_mensual WHERE mes = ?", (mes,))
+    cursor.executemany('''
+        INSERT INTO ventas_resumen_mensual (
+            mes, sucursal_provincia, sucursal_distrito, vendedor_id, nombre_vendedor, unidades, monto
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(mes, *fila) for fila in resumen])
+
+    cursor.execute("DELETE FROM particiones_ventas WHERE mes = ?", (mes,))
+    cursor.execute('''
+        INSERT INTO particiones_ventas (mes, ventas, ubicacion, bytes, archivado_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (mes, ventas, ubicacion, bytes_, datetime.now()))
+
+
+def _archivar_mes_sqlite(mes: str, provincia: Optional[str] = None) -> Optional[Dict]:
+    """
+    Archiva las ventas del mes de una base de ventas (`provincia` con
+    sharding; None es la central). Retorna None si esa base no tiene ventas
+    del mes y hay sharding.
+    """
+    inicio, fin = rango_mes(mes)
+    ruta = _ruta_mes(mes)
+    ruta_anterior = _ruta_mes(mes, comprimido=False)
+    temporal = f"{ruta_anterior}.tmp"
+    descomprimido = f"{ruta_anterior}.anterior"
+    os.makedirs(directorio_archivo(), exist_ok=True)
+    for archivo in (temporal, descomprimido):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+
+    # 1. Se arma el archivo completo aparte: las filas que ya estaban
+    #    archivadas (si el mes se vuelve a archivar, o de otra sucursal)
+    #    más las del mes
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM registro_venta WHERE fecha_venta >= ? AND fecha_venta < ?",
+                       (inicio, fin))
+        tope = cursor.fetchone()[0]
+        if not tope and db_manager.sharding:
+            return None
+
+        cursor.execute("ATTACH DATABASE ? AS archivo", (temporal,))
+        try:
+            cursor.execute(_ESQUEMA_SQLITE.format(tabla="archivo.ventas"))
+            if os.path.exists(ruta):
+                _descomprimir(ruta, descomprimido)
+                ruta_anterior = descomprimido
+            if os.path.exists(ruta_anterior):
+                cursor.execute("ATTACH DATABASE ? AS anterior", (ruta_anterior,))
+                cursor.execute("INSERT INTO archivo.ventas SELECT * FROM anterior.ventas")
+            cursor.execute(
+                f"INSERT OR REPLACE INTO archivo.ventas {_SELECT_HOT} AND rv.id <= ? ORDER BY rv.fecha_venta, rv.id",
+                (inicio, fin, tope)
+            )
+            for nombre, columnas in _INDICES_SQLITE:
+                cursor.execute(f"CREATE INDEX archivo.{nombre} ON ventas ({columnas})")
+            conn.commit()
+
+            cursor.execute("SELECT COUNT(*) FROM archivo.ventas")
+            ventas = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT sucursal_provincia, sucursal_distrito, vendedor_id, nombre_vendedor, monto_fisco
+                FROM archivo.ventas
+            ''')
+            resumen = _resumir(cursor.fetchall())
+        finally:
+            conn.rollback()
+            for base in ("anterior", "archivo"):
+                try:
+                    cursor.execute(f"DETACH DATABASE {base}")
+                except sqlite3.OperationalError:
+                    pass
+    finally:
+        conn.close()
+        if os.path.exists(descomprimido):
+            os.remove(descomprimido)
+
+    # 2. Compactar, comprimir y reemplazar el archivo del mes
+    compactar = sqlite3.connect(temporal)
+    try:
+        compactar.execute("VACUUM")
+    finally:
+        compactar.close()
+    _comprimir(temporal, ruta)
+    os.remove(temporal)
+    bytes_ = os.path.getsize(ruta)
+
+    # 3. En una transacción: catálogo, resumen y borrado de las filas calientes
+    #    (con sharding, la central está adjunta a la base de la sucursal)
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+    try:
+        _registrar_particion(cursor, mes, ventas, ruta, bytes_, resumen)
+        cursor.execute('''
+            DELETE FROM registro_venta
+            WHERE fecha_venta >= ? AND fecha_venta < ? AND id <= ?
+        ''', (inicio, fin, tope))
+        movidas = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    # El archivo sin comprimir de un archivado anterior ya quedó incluido
+    sin_comprimir = _ruta_mes(mes, comprimido=False)
+    if os.path.exists(sin_comprimir):
+        os.remove(sin_comprimir)
+
+    return {"mes": mes, "movidas": movidas, "ventas": ventas, "bytes": bytes_}
+
+
+def _archivar_mes_azure(mes: str) -> Dict:
+    inicio, fin = rango_mes(mes)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f'''
+            INSERT INTO {TABLA_ARCHIVO_AZURE} ({", ".join(COLUMNAS)})
+            {_SELECT_HOT}
+        ''', (inicio, fin))
+        movidas = cursor.rowcount
+
+        cursor.execute(f'''
+            SELECT sucursal_provincia, sucursal_distrito, vendedor_id, nombre_vendedor, monto_fisco
+            FROM {TABLA_ARCHIVO_AZURE}
+            WHERE fecha_venta >= ? AND fecha_venta < ?
+        ''', (inicio, fin))
+        filas = cursor.fetchall()
+
+        _registrar_particion(cursor, mes, len(filas), TABLA_ARCHIVO_AZURE, None, _resumir(filas))
+        cursor.execute("DELETE FROM registro_venta WHERE fecha_venta >= ? AND fecha_venta < ?", (inicio, fin))
+        conn.commit()
+        return {"mes": mes, "movidas": movidas, "ventas": len(filas), "bytes": None}
+
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def archivar_mes(mes: str) -> Dict:
+    """Mueve las ventas de un mes al archivo"""
+    if db_manager.db_type == "sqlite":
+        # Con sharding, una base de ventas a la vez: cada una agrega sus
+        # filas al archivo del mes y las borra en su propia transacción
+        resultado = {"mes": mes, "movidas": 0, "ventas": 0, "bytes": None}
+        for provincia in db_manager.bases_ventas():
+            parcial = _archivar_mes_sqlite(mes, provincia)
+            if parcial:
+                resultado = {**parcial, "movidas": resultado["movidas"] + parcial["movidas"]}
+    else:
+        resultado = _archivar_mes_azure(mes)
+    logger.info(f"🗄️ Mes {mes} archivado: {resultado['movidas']} ventas movidas ({resultado['ventas']} en el archivo)")
+    return resultado
+
+
+def archivar_meses_frios(progreso: Optional[Callable[[float, str], None]] = None) -> List[Dict]:
+    """Archiva todos los meses anteriores a la zona caliente"""
+    meses = meses_por_archivar()
+    resultados = []
+    for i, mes in enumerate(meses):
+        if progreso:
+            progreso(i * 100 / len(meses), f"Archivando {mes}")
+        resultados.append(archivar_mes(mes))
+    return resultados
+
+
+# ============================================
+# LECTURA DEL ARCHIVO
+# ============================================
+
+def _copia_lectura(ubicacion: str) -> str:
+    """
+    Copia descomprimida de un mes .gz, en `lectura/` junto al archivo. La
+    copia lleva la fecha de modificación del .gz: si no coincide (el mes se
+    volvió a archivar), se rehace. Se escribe aparte y se renombra, así otro
+    hilo o proceso nunca lee una copia a medias.
+    """
+    destino = os.path.join(os.path.dirname(ubicacion), "lectura", os.path.basename(ubicacion)[:-len(".gz")])
+    modificado = os.stat(ubicacion).st_mtime_ns
+    try:
+        if os.stat(destino).st_mtime_ns == modificado:
+            return destino
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        _descomprimir(ubicacion, temporal)
+        os.utime(temporal, ns=(modificado, modificado))
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return destino
+
+
+def _abrir_mes(particion: Dict) -> sqlite3.Connection:
+    """Base del mes en solo lectura; las comprimidas, desde su copia de lectura"""
+    ubicacion = particion["ubicacion"]
+    if ubicacion.endswith(".gz"):
+        ubicacion = _copia_lectura(ubicacion)
+    return sqlite3.connect(f"file:{ubicacion}?mode=ro", uri=True)
+
+
+def _filtros(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str],
+    fecha_desde: Optional[datetime],
+    fecha_hasta: Optional[datetime]
+) -> Tuple[str, tuple]:
+    condiciones = ["sucursal_provincia = ?"]
+    params: list = [sucursal_provincia]
+    if sucursal_distrito:
+        condiciones.append("sucursal_distrito = ?")
+        params.append(sucursal_distrito)
+    if fecha_desde:
+        condiciones.append("fecha_venta >= ?")
+        params.append(fecha_desde)
+    if fecha_hasta:
+        condiciones.append("fecha_venta < ?")
+        params.append(fecha_hasta)
+    return " AND ".join(condiciones), tuple(params)
+
+
+def _conexiones(particiones: List[Dict]) -> Iterator[Tuple[object, str]]:
+    """(conexión, tabla) a consultar: un archivo por mes en SQLite, la tabla de archivo en Azure"""
+    if db_manager.db_type == "sqlite":
+        for particion in particiones:
+            yield _abrir_mes(particion), "ventas"
+    else:
+        yield get_db_connection(), TABLA_ARCHIVO_AZURE
+
+
+def contar_ventas(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None
+) -> int:
+    """Cantidad de ventas archivadas de la sucursal en el rango"""
+    particiones = _meses_en_rango(fecha_desde, fecha_hasta)
+    if not particiones:
+        return 0
+
+    where, params = _filtros(sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta)
+    total = 0
+    for conn, tabla in _conexiones(particiones):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {where}", params)
+            total += cursor.fetchone()[0]
+        finally:
+            conn.close()
+    return total
+
+
+def iter_ventas(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> Iterator[List[tuple]]:
+    """
+    Ventas archivadas de una sucursal en el rango, en lotes y en orden de
+    fecha (columnas de COLUMNAS). Solo abre los meses del rango.
+    """
+    particiones = _meses_en_rango(fecha_desde, fecha_hasta)
+    if not particiones:
+        return
+
+    where, params = _filtros(sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta)
+    for conn, tabla in _conexiones(particiones):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {", ".join(COLUMNAS)}
+                FROM {tabla}
+                WHERE {where}
+                ORDER BY fecha_venta, id
+            ''', params)
+            while True:
+                filas = cursor.fetchmany(batch_size)
+                if not filas:
+                    break
+                yield [tuple(fila) for fila in filas]
+        finally:
+            conn.close()
+
+
+def ultimas_ventas(columna: str, valor, limit: int) -> List[Dict]:
+    """
+    Ventas archivadas más recientes con `columna = valor` (vendedor_id o
+    dni_comprador), recorriendo los meses del más nuevo al más viejo hasta
+    juntar `limit`. Abre como mucho ARCHIVE_MAX_MESES_CONSULTA meses; para
+    un vendedor, solo los que tienen ventas suyas según el resumen mensual.
+    """
+    if columna not in ("vendedor_id", "dni_comprador") or limit <= 0:
+        return []
+
+    try:
+        if db_manager.db_type != "sqlite":
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT TOP (?) {", ".join(COLUMNAS)}
+                    FROM {TABLA_ARCHIVO_AZURE}
+                    WHERE {columna} = ?
+                    ORDER BY fecha_venta DESC
+                ''', (limit, valor))
+                return [dict(zip(COLUMNAS, fila)) for fila in cursor.fetchall()]
+            finally:
+                conn.close()
+
+        particiones = list(reversed(meses_archivados()))
+        if columna == "vendedor_id":
+            con_ventas = {fila["mes"] for fila in resumen_mensual() if fila["vendedor_id"] == valor}
+            particiones = [p for p in particiones if p["mes"] in con_ventas]
+
+        ventas: List[Dict] = []
+        for particion in particiones[:max(settings.ARCHIVE_MAX_MESES_CONSULTA, 1)]:
+            conn = _abrir_mes(particion)
+            try:
+                filas = conn.execute(f'''
+                    SELECT {", ".join(COLUMNAS)}
+                    FROM ventas
+                    WHERE {columna} = ?
+                    ORDER BY fecha_venta DESC
+                    LIMIT ?
+                ''', (valor, limit - len(ventas))).fetchall()
+            finally:
+                conn.close()
+            ventas.extend(dict(zip(COLUMNAS, fila)) for fila in filas)
+            if len(ventas) >= limit:
+                break
+        return ventas
+
+    except Exception as e:
+        logger.error(f"❌ Error al leer ventas archivadas: {e}")
+        return []
+
+
+def resumen_mensual(cursor=None) -> List[Dict]:
+    """
+    Totales por vendedor de cada mes archivado (para reconstruir rankings).
+    Con `cursor` se lee en esa conexión, dentro de su transacción.
+    """
+    if cursor is not None:
+        return _leer_resumen(cursor)
+
+    conn = get_db_connection()
+    try:
+        return _leer_resumen(conn.cursor())
+    except Exception as e:
+        logger.error(f"❌ Error al obtener resumen mensual: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def _leer_resumen(cursor) -> List[Dict]:
+    cursor.execute('''
+        SELECT mes, sucursal_provincia, sucursal_distrito, vendedor_id, nombre_vendedor, unidades, monto
+        FROM ventas_resumen_mensual
+    ''')
+    columnas = [c[0] for c in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
\ No newline at end of file
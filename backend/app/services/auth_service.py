@@ -1,17 +1,35 @@
 from typing import Optional
 import hashlib
 import logging
-from app.database import get_db_connection
+from app.database import get_db_connection, reintentable, relanzar_si_transitorio
+from app.utils.filas import Fila, MapaFilas
+from app.utils.singleflight import single_flight
 
 logger = logging.getLogger(__name__)
 
+_COLUMNAS_USUARIO = {
+    "id": int,
+    "username": str,
+    "full_name": str,
+    "email": Optional[str],
+    "role": str,
+    "codigo_vendedor": str,
+    "sucursal_provincia": str,
+    "sucursal_distrito": str,
+    "is_active": int,
+}
+
+USUARIO = MapaFilas("Usuario", _COLUMNAS_USUARIO)
+USUARIO_LOGIN = MapaFilas("UsuarioLogin", {**_COLUMNAS_USUARIO, "password_hash": str})
+
 
 def simple_verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificación simple de contraseña"""
     return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
 
 
-def authenticate_user(username: str, password: str) -> Optional[dict]:
+@reintentable
+def authenticate_user(username: str, password: str) -> Optional[Fila]:
     """
     Autentica un usuario verificando sus credenciales en la base de datos
     """
@@ -20,25 +38,23 @@ def authenticate_user(username: str, password: str) -> Optional[dict]:
     
     try:
         cursor.execute('''
-            SELECT id, username, password_hash, full_name, email, role, 
-                   codigo_vendedor, sucursal_provincia, sucursal_distrito, is_active
+            SELECT id, username, full_name, email, role, 
+                   codigo_vendedor, sucursal_provincia, sucursal_distrito, is_active, password_hash
             FROM vendedores
             WHERE username = ?
         ''', (username,))
         
-        user_row = cursor.fetchone()
+        user = USUARIO_LOGIN.una(cursor)
         
-        if not user_row:
+        if not user:
             logger.warning(f"❌ Usuario no encontrado: {username}")
             return None
         
-        user = dict(user_row)
-        
-        if not simple_verify_password(password, user["password_hash"]):
+        if not simple_verify_password(password, user.password_hash):
             logger.warning(f"❌ Contraseña incorrecta para usuario: {username}")
             return None
         
-        if not user.get("is_active", 0):
+        if not user.is_active:
             logger.warning(f"❌ Usuario inactivo: {username}")
             return None
         
@@ -46,13 +62,16 @@ def authenticate_user(username: str, password: str) -> Optional[dict]:
         return user
         
     except Exception as e:
+        relanzar_si_transitorio(e)
         logger.error(f"❌ Error al autenticar usuario: {e}")
         return None
     finally:
         conn.close()
 
 
-def get_user(username: str) -> Optional[dict]:
+@single_flight("get_user")
+@reintentable
+def get_user(username: str) -> Optional[Fila]:
     """Obtiene un usuario por su nombre de usuario"""
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -65,20 +84,19 @@ def get_user(username: str) -> Optional[dict]:
             WHERE username = ?
         ''', (username,))
         
-        user_row = cursor.fetchone()
-        
-        if user_row:
-            return dict(user_row)
-        return None
+        return USUARIO.una(cursor)
         
     except Exception as e:
+        relanzar_si_transitorio(e)
         logger.error(f"❌ Error al obtener usuario: {e}")
         return None
     finally:
         conn.close()
 
 
-def get_user_by_id(user_id: int) -> Optional[dict]:
+@single_flight("get_user_by_id")
+@reintentable
+def get_user_by_id(user_id: int) -> Optional[Fila]:
     """Obtiene un usuario por su ID"""
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -91,13 +109,10 @@ def get_user_by_id(user_id: int) -> Optional[dict]:
             WHERE id = ?
         ''', (user_id,))
         
-        user_row = cursor.fetchone()
-        
-        if user_row:
-            return dict(user_row)
-        return None
+        return USUARIO.una(cursor)
         
     except Exception as e:
+        relanzar_si_transitorio(e)
         logger.error(f"❌ Error al obtener usuario por ID: {e}")
         return None
     finally:
@@ -0,0 +1,377 @@
+"""
+Importación masiva de listas de precios y modelos al catálogo.
+
+Una lista (CSV o JSON) trae una fila por auto con marca, modelo, anio y
+precio_referencial, y opcionalmente stock e is_active. La identidad de cada
+auto es (marca, modelo, anio), la restricción `uq_auto`: una fila de un
+auto existente actualiza su precio (y stock/estado si vienen) y las demás
+dan de alta el modelo. Sin stock, un modelo nuevo queda con stock 0 y uno
+existente conserva el suyo.
+
+La lista se valida completa antes de escribir: con errores no se importa
+nada. Después se aplica en lotes de CATALOGO_IMPORT_BATCH_SIZE filas, cada
+uno en su transacción:
+
+1. Lee los autos del lote con el bloqueo de escritura tomado (BEGIN
+   IMMEDIATE en SQLite, UPDLOCK/HOLDLOCK en Azure SQL) y arma el diff:
+   nuevos, actualizados (campo por campo, antes y después) y sin cambios.
+2. Escribe los nuevos y actualizados en una sola sentencia: `INSERT ... ON
+   CONFLICT(marca, modelo, anio) DO UPDATE` en SQLite y `MERGE` en Azure SQL.
+3. Agrega cada cambio al registro de cambios (cdc_service). Con eso la
+   sincronización de sucursales y los sistemas externos reciben el catálogo
+   nuevo.
+
+Al terminar se publica un solo evento `resync` en el canal del catálogo,
+uno por importación y no uno por fila, para que los clientes conectados
+recarguen /venta/autos. Con `dry_run` se arma el diff y cada lote se descarta.
+"""
+import csv
+import io
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.database import db_manager, get_db_connection, relanzar_si_transitorio
+from app.services import cdc_service
+from app.services.cdc_service import registrar_cambio
+from app.utils.broadcaster import catalogo_broadcaster
+from app.utils.montos import parse_monto_estricto
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = ("marca", "modelo", "anio", "precio_referencial", "stock", "is_active")
+OBLIGATORIAS = ("marca", "modelo", "anio", "precio_referencial")
+
+# Encabezados alternativos frecuentes en listas de fabricantes
+_ALIAS = {"año": "anio", "ano": "anio", "precio": "precio_referencial", "activo": "is_active"}
+
+# Azure SQL acepta hasta 2100 parámetros por sentencia
+_MAX_PARAMETROS_AZURE = 2000
+
+# Errores que se informan como máximo (la lista puede tener miles de filas)
+_MAX_ERRORES = 50
+
+NUEVO = "nuevo"
+ACTUALIZADO = "actualizado"
+
+
+class ListaPreciosInvalidaError(ValueError):
+    """La lista no se puede importar; `errores` indica fila y motivo"""
+
+    def __init__(self, errores: List[str]):
+        self.errores = errores
+        super().__init__(f"La lista de precios tiene {len(errores)} error(es)")
+
+
+# ============================================
+# LECTURA Y VALIDACIÓN
+# ============================================
+
+def formato_de(nombre: Optional[str], contenido: bytes) -> str:
+    """'csv' o 'json' según la extensión del archivo o, si no hay, el contenido"""
+    if nombre and nombre.lower().endswith((".csv", ".txt")):
+        return "csv"
+    if nombre and nombre.lower().endswith(".json"):
+        return "json"
+    return "json" if contenido.lstrip()[:1] in (b"[", b"{") else "csv"
+
+
+def _filas_csv(texto: str) -> List[Tuple[str, Dict]]:
+    # Las planillas en español suelen exportar con ";"
+    try:
+        dialecto = csv.Sniffer().sniff(texto.split("\n", 1)[0], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+    return [(f"línea {lector.line_num}", fila) for fila in lector]
+
+
+def _filas_json(texto: str) -> List[Tuple[str, Dict]]:
+    datos = json.loads(texto)
+    if isinstance(datos, dict):
+        datos = datos.get("autos")
+    if not isinstance(datos, list):
+        raise ListaPreciosInvalidaError(['Se esperaba una lista de autos (o {"autos": [...]})'])
+    return [(f"fila {i}", fila) for i, fila in enumerate(datos, start=1)]
+
+
+def _texto(valor) -> str:
+    return " ".join(str(valor).split()) if valor is not None else ""
+
+
+def _normalizar(fila: Dict) -> Dict:
+    normalizada = {}
+    for clave, valor in fila.items():
+        if clave is None:
+            continue
+        nombre = _texto(clave).lower().replace(" ", "_")
+        normalizada[_ALIAS.get(nombre, nombre)] = valor.strip() if isinstance(valor, str) else valor
+    return normalizada
+
+
+def _validar(fila: Dict) -> Tuple[Optional[Dict], List[str]]:
+    fila = _normalizar(fila)
+    errores = [f"falta {campo}" for campo in OBLIGATORIAS if fila.get(campo) in (None, "")]
+    if errores:
+        return None, errores
+
+    auto = {"marca": _texto(fila["marca"]), "modelo": _texto(fila["modelo"])}
+    for campo in ("marca", "modelo"):
+        if len(auto[campo]) > 100:
+            errores.append(f"{campo} supera los 100 caracteres")
+
+    try:
+        auto["anio"] = int(str(fila["anio"]).strip())
+        if not 2020 <= auto["anio"] <= 2030:
+            errores.append(f"anio {auto['anio']} fuera de rango (2020-2030)")
+    except ValueError:
+        errores.append(f"anio inválido: {fila['anio']!r}")
+
+    precio = parse_monto_estricto(fila["precio_referencial"])
+    auto["precio_referencial"] = round(precio, 2) if precio is not None else None
+    if precio is None or auto["precio_referencial"] <= 0:
+        errores.append(f"precio_referencial inválido: {fila['precio_referencial']!r}")
+
+    auto["stock"] = None
+    if fila.get("stock") not in (None, ""):
+        try:
+            auto["stock"] = int(str(fila["stock"]).strip())
+            if auto["stock"] < 0:
+                errores.append("stock negativo")
+        except ValueError:
+            errores.append(f"stock inválido: {fila['stock']!r}")
+
+    auto["is_active"] = None
+    if fila.get("is_active") not in (None, ""):
+        valor = str(fila["is_active"]).strip().lower()
+        if valor in ("1", "true", "si", "sí", "s"):
+            auto["is_active"] = 1
+        elif valor in ("0", "false", "no", "n"):
+            auto["is_active"] = 0
+        else:
+            errores.append(f"is_active inválido: {fila['is_active']!r}")
+
+    return auto, errores
+
+
+def leer_lista(contenido: bytes, formato: str) -> List[Dict]:
+    """
+    Interpreta y valida una lista de precios. Lanza ListaPreciosInvalidaError
+    con todos los problemas encontrados (hasta _MAX_ERRORES).
+    """
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ListaPreciosInvalidaError(["El archivo debe estar en UTF-8"])
+
+    try:
+        filas = _filas_json(texto) if formato == "json" else _filas_csv(texto)
+    except (json.JSONDecodeError, csv.Error) as e:
+        raise ListaPreciosInvalidaError([f"{formato.upper()} inválido: {e}"])
+
+    if not filas:
+        raise ListaPreciosInvalidaError(["La lista no tiene filas"])
+    if len(filas) > settings.CATALOGO_IMPORT_MAX_FILAS:
+        raise ListaPreciosInvalidaError([
+            f"La lista tiene {len(filas)} filas; el máximo es {settings.CATALOGO_IMPORT_MAX_FILAS}"
+        ])
+
+    autos, errores, vistos = [], [], {}
+    for donde, fila in filas:
+        if not isinstance(fila, dict):
+            errores.append(f"{donde}: se esperaba un objeto")
+            continue
+        auto, problemas = _validar(fila)
+        if auto and not problemas:
+            # Azure compara sin distinguir mayúsculas: se rechazan ambos casos
+            clave = (auto["marca"].casefold(), auto["modelo"].casefold(), auto["anio"])
+            if clave in vistos:
+                problemas.append(f"repite {auto['marca']} {auto['modelo']} {auto['anio']} ({vistos[clave]})")
+            vistos.setdefault(clave, donde)
+        if not problemas:
+            autos.append(auto)
+            continue
+        errores.extend(f"{donde}: {problema}" for problema in problemas)
+        if len(errores) >= _MAX_ERRORES:
+            errores.append("... (se omiten los errores siguientes)")
+            break
+
+    if errores:
+        raise ListaPreciosInvalidaError(errores)
+    return autos
+
+
+# ============================================
+# IMPORTACIÓN
+# ============================================
+
+def _tamano_lote() -> int:
+    tamano = max(settings.CATALOGO_IMPORT_BATCH_SIZE, 1)
+    if db_manager.db_type != "sqlite":
+        tamano = min(tamano, _MAX_PARAMETROS_AZURE // len(COLUMNAS))
+    return tamano
+
+
+def _clave(auto: Dict) -> Tuple[str, str, int]:
+    """Clave de uq_auto tal como la compara cada motor (Azure SQL no distingue mayúsculas)"""
+    if db_manager.db_type == "sqlite":
+        return auto["marca"], auto["modelo"], auto["anio"]
+    return auto["marca"].casefold(), auto["modelo"].casefold(), auto["anio"]
+
+
+def _existentes(cursor, lote: Sequence[Dict]) -> Dict[Tuple[str, str, int], Dict]:
+    """Autos del lote que ya están en el catálogo, por (marca, modelo, anio)"""
+    condicion = " OR ".join(["(marca = ? AND modelo = ? AND anio = ?)"] * len(lote))
+    params = tuple(valor for auto in lote for valor in (auto["marca"], auto["modelo"], auto["anio"]))
+    bloqueo = "" if db_manager.db_type == "sqlite" else " WITH (UPDLOCK, HOLDLOCK)"
+    cursor.execute(f'''
+        SELECT id, marca, modelo, anio, precio_referencial, stock, is_active
+        FROM autos_disponibles{bloqueo}
+        WHERE {condicion}
+    ''', params)
+    columnas = ("id",) + COLUMNAS
+    existentes = {}
+    for fila in cursor.fetchall():
+        auto = dict(zip(columnas, fila))
+        if auto["precio_referencial"] is not None:
+            auto["precio_referencial"] = float(auto["precio_referencial"])
+        existentes[_clave(auto)] = auto
+    return existentes
+
+
+def _diff(lote: Sequence[Dict], existentes: Dict) -> Tuple[List[Dict], List[Dict], int]:
+    """(filas a escribir, detalle de cada cambio, sin cambios)"""
+    escribir, cambios, sin_cambios = [], [], 0
+    for auto in lote:
+        actual = existentes.get(_clave(auto))
+        if actual is None:
+            fila = {
+                **auto,
+                "stock": auto["stock"] or 0,
+                "is_active": 1 if auto["is_active"] is None else auto["is_active"],
+            }
+            escribir.append(fila)
+            cambios.append({"accion": NUEVO, **fila})
+            continue
+
+        fila = {
+            **auto,
+            "stock": actual["stock"] if auto["stock"] is None else auto["stock"],
+            "is_active": actual["is_active"] if auto["is_active"] is None else auto["is_active"],
+        }
+        campos = [c for c in ("precio_referencial", "stock", "is_active") if fila[c] != actual[c]]
+        if not campos:
+            sin_cambios += 1
+            continue
+        escribir.append(fila)
+        cambios.append({
+            "accion": ACTUALIZADO,
+            "id": actual["id"],
+            "marca": auto["marca"],
+            "modelo": auto["modelo"],
+            "anio": auto["anio"],
+            "antes": {c: actual[c] for c in campos},
+            "despues": {c: fila[c] for c in campos},
+        })
+    return escribir, cambios, sin_cambios
+
+
+def _upsert(cursor, filas: Sequence[Dict]):
+    valores = ", ".join(["(?, ?, ?, ?, ?, ?)"] * len(filas))
+    params = tuple(fila[c] for fila in filas for c in COLUMNAS)
+    if db_manager.db_type == "sqlite":
+        cursor.execute(f'''
+            INSERT INTO autos_disponibles ({", ".join(COLUMNAS)})
+            VALUES {valores}
+            ON CONFLICT(marca, modelo, anio) DO UPDATE SET
+                precio_referencial = excluded.precio_referencial,
+                stock = excluded.stock,
+                is_active = excluded.is_active
+        ''', params)
+    else:  # azure
+        cursor.execute(f'''
+            MERGE autos_disponibles WITH (HOLDLOCK) AS destino
+            USING (VALUES {valores}) AS origen ({", ".join(COLUMNAS)})
+            ON destino.marca = origen.marca
+               AND destino.modelo = origen.modelo
+               AND destino.anio = origen.anio
+            WHEN MATCHED THEN UPDATE SET
+                precio_referencial = origen.precio_referencial,
+                stock = origen.stock,
+                is_active = origen.is_active
+            WHEN NOT MATCHED THEN INSERT ({", ".join(COLUMNAS)})
+                VALUES (origen.marca, origen.modelo, origen.anio,
+                        origen.precio_referencial, origen.stock, origen.is_active);
+        ''', params)
+
+
+def _aplicar_lote(lote: Sequence[Dict], dry_run: bool) -> Tuple[List[Dict], int]:
+    """Diff y escritura de un lote en una transacción; retorna (cambios, sin cambios)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if db_manager.db_type == "sqlite":
+            # Bloqueo de escritura antes de leer: ninguna venta cambia el
+            # stock entre el diff y el upsert
+            cursor.execute("BEGIN IMMEDIATE")
+
+        escribir, cambios, sin_cambios = _diff(lote, _existentes(cursor, lote))
+        if dry_run or not escribir:
+            conn.rollback()
+            return cambios, sin_cambios
+
+        _upsert(cursor, escribir)
+
+        # Ids de las altas y estado final para el registro de cambios
+        finales = _existentes(cursor, escribir)
+        for cambio in cambios:
+            auto = finales[_clave(cambio)]
+            cambio["id"] = auto["id"]
+            registrar_cambio(
+                cursor, cdc_service.AUTO,
+                cdc_service.INSERT if cambio["accion"] == NUEVO else cdc_service.UPDATE,
+                auto["id"], auto
+            )
+
+        conn.commit()
+        return cambios, sin_cambios
+
+    except Exception as e:
+        conn.rollback()
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al importar lote del catálogo: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def importar_lista(autos: Sequence[Dict], dry_run: bool = False) -> Dict:
+    """
+    Aplica una lista ya validada (leer_lista) y retorna el reporte: totales
+    de nuevos, actualizados y sin cambios, y el detalle de cada cambio.
+    """
+    tamano = _tamano_lote()
+    reporte = {"dry_run": dry_run, "filas": len(autos), "nuevos": 0, "actualizados": 0, "sin_cambios": 0,
+               "lotes": 0, "cambios": []}
+
+    try:
+        for i in range(0, len(autos), tamano):
+            cambios, sin_cambios = _aplicar_lote(autos[i:i + tamano], dry_run)
+            reporte["lotes"] += 1
+            reporte["sin_cambios"] += sin_cambios
+            reporte["nuevos"] += sum(1 for c in cambios if c["accion"] == NUEVO)
+            reporte["actualizados"] += sum(1 for c in cambios if c["accion"] == ACTUALIZADO)
+            reporte["cambios"].extend(cambios)
+    finally:
+        # Una sola invalidación por importación, también si falló a mitad
+        # (los lotes ya confirmados quedan aplicados)
+        if not dry_run and (reporte["nuevos"] or reporte["actualizados"]):
+            catalogo_broadcaster.publicar("resync", {"motivo": "importacion"})
+
+    logger.info(
+        f"📥 Catálogo {'(simulación) ' if dry_run else ''}importado: {reporte['nuevos']} nuevos, "
+        f"{reporte['actualizados']} actualizados, {reporte['sin_cambios']} sin cambios en {reporte['lotes']} lotes"
+    )
+    return reporte
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Registro de cambios (outbox) para sistemas externos: contabilidad y data
+warehouse.
+
+Cada operación que modifica ventas o el catálogo agrega filas a la tabla
+`cambios` con el cursor de la misma transacción. El id de cada fila es el
+cursor: los consumidores piden `/cdc/changes?since=<último cursor>` y
+reciben solo lo nuevo, en orden. No hace falta volver a leer
+registro_venta ni autos_disponibles completos. La carga inicial se hace con
+el export de ventas, antes de empezar a consumir cambios.
+
+Un cambio solo se entrega cuando ya no puede aparecer otro con un id menor:
+
+- SQLite: una sola escritura a la vez, así que los ids se confirman en orden.
+- Azure SQL: la columna `version` (rowversion) se compara con
+  MIN_ACTIVE_ROWVERSION(). Los cambios de transacciones aún abiertas
+  esperan a la siguiente lectura, aunque tengan un id menor.
+
+Con sharding, una venta escribe sus cambios en la tabla `cambios` de la base
+de su sucursal, y la consolidación (consolidacion_service) los copia en orden
+al registro de la central, donde reciben su cursor.
+
+Los cambios se conservan CDC_RETENTION_DAYS. Un cursor anterior a lo purgado
+responde 410 y el consumidor debe volver a cargar desde el export. Mover
+meses al archivo no genera cambios, porque las ventas no se eliminan.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from app.config import settings
+from app.database import db_manager, get_db_connection, relanzar_si_transitorio
+
+logger = logging.getLogger(__name__)
+
+VENTA = "venta"
+AUTO = "auto"
+
+INSERT = "insert"
+UPDATE = "update"
+
+
+class CursorExpiradoError(Exception):
+    """El cursor apunta a cambios ya purgados; hay que volver a cargar desde cero"""
+
+
+def registrar_cambio(cursor, entidad: str, operacion: str, clave, datos: Dict):
+    """Agrega un cambio usando el cursor de la transacción que lo produce"""
+    cursor.execute('''
+        INSERT INTO cambios (entidad, operacion, clave, datos, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        entidad,
+        operacion,
+        str(clave),
+        json.dumps(datos, default=str, ensure_ascii=False, separators=(",", ":")),
+        datetime.now()
+    ))
+
+
+def purgado_hasta(cursor) -> int:
+    cursor.execute("SELECT hasta_id FROM cambios_purgados WHERE id = 1")
+    fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def ultimo_confirmado(cursor) -> int:
+    """Cursor más alto que ya se puede entregar (ver la nota sobre Azure SQL arriba)"""
+    if db_manager.db_type == "sqlite":
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cambios")
+    else:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cambios WHERE version < MIN_ACTIVE_ROWVERSION()")
+    return cursor.fetchone()[0]
+
+
+def validar_cursor(desde: int) -> int:
+    """
+    Lanza CursorExpiradoError si `desde` es anterior a los cambios purgados.
+    Retorna el cursor más reciente disponible.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if desde < purgado_hasta(cursor):
+            raise CursorExpiradoError(f"El cursor {desde} es anterior a los cambios conservados")
+        return ultimo_confirmado(cursor)
+
+    except CursorExpiradoError:
+        raise
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al validar cursor de cambios: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def iter_cambios(desde: int, limite: int, batch_size: int = 500) -> Iterator[List[tuple]]:
+    """
+    Recorre hasta `limite` cambios posteriores a `desde`, en orden de cursor y
+    en lotes de `batch_size`: (id, entidad, operacion, clave, datos, created_at).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if db_manager.db_type == "sqlite":
+            cursor.execute('''
+                SELECT id, entidad, operacion, clave, datos, created_at
+                FROM cambios
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (desde, limite))
+        else:  # azure
+            cursor.execute('''
+                SELECT TOP (?) id, entidad, operacion, clave, datos, created_at
+                FROM cambios
+                WHERE id > ? AND version < MIN_ACTIVE_ROWVERSION()
+                ORDER BY id
+            ''', (limite, desde))
+
+        while True:
+            filas = cursor.fetchmany(batch_size)
+            if not filas:
+                break
+            yield [tuple(fila) for fila in filas]
+
+    except Exception as e:
+        logger.error(f"❌ Error al leer cambios: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def generar_ndjson(lotes: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    Una línea JSON por cambio. `datos` ya está guardado como JSON y se
+    copia tal cual, sin volver a parsearlo.
+    """
+    for lote in lotes:
+        yield "".join(
+            '{"cursor":%d,"entidad":%s,"operacion":%s,"clave":%s,"fecha":%s,"datos":%s}\n' % (
+                id_, json.dumps(entidad), json.dumps(operacion), json.dumps(clave),
+                json.dumps(str(created_at)), datos
+            )
+            for id_, entidad, operacion, clave, datos, created_at in lote
+        ).encode("utf-8")
+
+
+def purgar_cambios(dias: Optional[int] = None) -> int:
+    """Elimina los cambios más antiguos que la retención y avanza la marca de purgado"""
+    limite = datetime.now() - timedelta(days=dias if dias is not None else settings.CDC_RETENTION_DAYS)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Por el índice de created_at (MAX(id) recorrería hacia atrás los cambios recientes)
+        if db_manager.db_type == "sqlite":
+            cursor.execute('''
+                SELECT id FROM cambios WHERE created_at < ?
+                ORDER BY created_at DESC, id DESC LIMIT 1
+            ''', (limite,))
+        else:
+            cursor.execute('''
+                SELECT TOP 1 id FROM cambios WHERE created_at < ?
+                ORDER BY created_at DESC, id DESC
+            ''', (limite,))
+        fila = cursor.fetchone()
+        hasta = fila[0] if fila else 0
+        if not hasta or hasta <= purgado_hasta(cursor):
+            return 0
+
+        cursor.execute("DELETE FROM cambios WHERE id <= ?", (hasta,))
+        eliminados = cursor.rowcount
+        cursor.execute("UPDATE cambios_purgados SET hasta_id = ? WHERE id = 1 AND hasta_id < ?", (hasta, hasta))
+        conn.commit()
+
+        if eliminados:
+            logger.info(f"🧹 Eliminados {eliminados} cambios anteriores a {limite:%Y-%m-%d}")
+        return eliminados
+
+    except Exception as e:
+        logger.error(f"❌ Error al purgar cambios: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+Compradores identificados por DNI.
+
+La tabla compradores guarda un registro por DNI (último nombre y contacto,
+total de compras) y se mantiene en la misma transacción que cada venta, de
+modo que el vendedor puede autocompletar los datos de un cliente recurrente
+y ver su historial sin recorrer registro_venta completo. Con sharding, la
+venta escribe en la tabla compradores de la base de su sucursal y la
+consolidación (consolidacion_service) suma esas compras a la central.
+"""
+import logging
+import unicodedata
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.database import db_manager, get_db_connection
+from app.services import archivo_service
+from app.utils.filas import Fila, MapaFilas, mas_recientes
+
+logger = logging.getLogger(__name__)
+
+COMPRA = MapaFilas("Compra", {
+    "id": int,
+    "fecha_venta": datetime,
+    "monto_fisco": str,
+    "tipo_compra": str,
+    "auto": str,
+    "nombre_vendedor": str,
+    "sucursal_provincia": str,
+    "sucursal_distrito": str,
+})
+
+COMPRADOR_RESUMEN = MapaFilas("CompradorResumen", {
+    "dni": str,
+    "nombre": str,
+    "contacto": str,
+    "total_compras": int,
+    "ultima_compra": datetime,
+})
+
+_CAMPOS_COMPRADOR = ("dni", "nombre", "contacto", "total_compras", "primera_compra", "ultima_compra")
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Minúsculas y sin tildes, para búsquedas por prefijo de nombre"""
+    descompuesto = unicodedata.normalize("NFKD", nombre.strip().lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _rango_prefijo(prefijo: str) -> Tuple[str, str]:
+    """
+    Rango [prefijo, siguiente) equivalente a LIKE 'prefijo%' que ambos
+    motores resuelven como un index seek sobre la columna ordenada.
+    """
+    return prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def upsert_comprador(
+    cursor,
+    dni: str,
+    nombre: str,
+    contacto: str,
+    fecha_venta: datetime
+):
+    """
+    Crea o actualiza el comprador usando el cursor de la transacción de la
+    venta: guarda el último nombre/contacto y suma una compra.
+    """
+    if db_manager.db_type == "sqlite":
+        cursor.execute('''
+            INSERT INTO compradores (
+                dni, nombre, nombre_busqueda, contacto,
+                total_compras, primera_compra, ultima_compra
+            ) VALUES (?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(dni) DO UPDATE SET
+                nombre = excluded.nombre,
+                nombre_busqueda = excluded.nombre_busqueda,
+                contacto = excluded.contacto,
+                total_compras = compradores.total_compras + 1,
+                ultima_compra = excluded.ultima_compra
+        ''', (dni, nombre, normalizar_nombre(nombre), contacto, fecha_venta, fecha_venta))
+    else:  # azure
+        cursor.execute('''
+            MERGE compradores WITH (HOLDLOCK) AS destino
+            USING (SELECT ? AS dni, ? AS nombre, ? AS nombre_busqueda, ? AS contacto, ? AS fecha) AS origen
+            ON destino.dni = origen.dni
+            WHEN MATCHED THEN UPDATE SET
+                nombre = origen.nombre,
+                nombre_busqueda = origen.nombre_busqueda,
+                contacto = origen.contacto,
+                total_compras = destino.total_compras + 1,
+                ultima_compra = origen.fecha
+            WHEN NOT MATCHED THEN INSERT (
+                dni, nombre, nombre_busqueda, contacto,
+                total_compras, primera_compra, ultima_compra
+            ) VALUES (
+                origen.dni, origen.nombre, origen.nombre_busqueda, origen.contacto,
+                1, origen.fecha, origen.fecha
+            );
+        ''', (dni, nombre, normalizar_nombre(nombre), contacto, fecha_venta))
+
+
+def get_comprador(dni: str, limit: int = 20, incluir_archivo: bool = False) -> Optional[Dict]:
+    """
+    Obtiene un comprador por DNI con sus últimas compras. Un cliente puede
+    comprar en cualquier sucursal: con sharding, el historial y las compras
+    aún sin consolidar se consultan en paralelo en todas las bases de ventas.
+    
+    Las compras son las de los meses recientes; con `incluir_archivo` se
+    completan con el archivo si el comprador tiene más compras que esas.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            SELECT dni, nombre, contacto, total_compras, primera_compra, ultima_compra
+            FROM compradores
+            WHERE dni = ?
+        ''', (dni,))
+    
+        row = cursor.fetchone()
+        comprador = dict(zip(_CAMPOS_COMPRADOR, row)) if row else None
+    
+        if db_manager.sharding:
+            sucursales = db_manager.en_sucursales(
+                lambda c: (_pendiente(c.cursor(), dni), _compras(c.cursor(), dni, limit))
+            )
+            for pendiente, _ in sucursales:
+                if pendiente:
+                    comprador = _sumar_pendiente(comprador, pendiente)
+            if comprador is None:
+                return None
+            comprador["compras"] = mas_recientes([compras for _, compras in sucursales], limit)
+        else:
+            if comprador is None:
+                return None
+            comprador["compras"] = _compras(cursor, dni, limit)
+    
+        # Compras de meses ya archivados
+        faltan = min(limit, comprador["total_compras"]) - len(comprador["compras"])
+        if incluir_archivo and faltan > 0:
+            for venta in archivo_service.ultimas_ventas("dni_comprador", dni, faltan):
+                comprador["compras"].append(COMPRA.desde_dict({
+                    **venta,
+                    "auto": f"{venta['marca']} {venta['modelo']} {venta['anio']}"
+                }))
+        return comprador
+    
+    except Exception as e:
+        logger.error(f"❌ Error al obtener comprador: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _pendiente(cursor, dni: str) -> Optional[Dict]:
+    """Compras del DNI en la base de la sucursal aún no consolidadas en la central"""
+    cursor.execute(f'''
+        SELECT {", ".join(_CAMPOS_COMPRADOR)}
+        FROM main.compradores
+        WHERE dni = ?
+    ''', (dni,))
+    row = cursor.fetchone()
+    return dict(zip(_CAMPOS_COMPRADOR, row)) if row else None
+
+
+def _sumar_pendiente(comprador: Optional[Dict], pendiente: Dict) -> Dict:
+    if comprador is None:
+        return pendiente
+    return {
+        **comprador,
+        "nombre": pendiente["nombre"],
+        "contacto": pendiente["contacto"],
+        "total_compras": comprador["total_compras"] + pendiente["total_compras"],
+        "primera_compra": min(comprador["primera_compra"], pendiente["primera_compra"]),
+        "ultima_compra": max(comprador["ultima_compra"], pendiente["ultima_compra"]),
+    }
+
+
+def _compras(cursor, dni: str, limit: int) -> List[Fila]:
+    cursor.execute('''
+        SELECT
+            rv.id,
+            rv.fecha_venta,
+            rv.monto_fisco,
+            rv.tipo_compra,
+            a.marca || ' ' || a.modelo || ' ' || a.anio AS auto,
+            rv.nombre_vendedor,
+            rv.sucursal_provincia,
+            rv.sucursal_distrito
+        FROM registro_venta rv
+        JOIN autos_disponibles a ON rv.auto_id = a.id
+        WHERE rv.dni_comprador = ?
+        ORDER BY rv.fecha_venta DESC
+        LIMIT ?
+    ''', (dni, limit))
+    return COMPRA.todas(cursor)
+
+
+def buscar_compradores(texto: str, limit: int = 10) -> List[Fila]:
+    """
+    Autocompletado de compradores: prefijo de DNI si el texto es numérico,
+    si no, prefijo del nombre (sin distinguir mayúsculas ni tildes). Con
+    sharding lee la central: las compras más recientes aparecen tras la
+    siguiente consolidación.
+    """
+    texto = texto.strip()
+    if texto.isdigit():
+        columna, prefijo = "dni", texto
+    else:
+        columna, prefijo = "nombre_busqueda", normalizar_nombre(texto)
+    
+    if not prefijo:
+        return []
+    
+    desde, hasta = _rango_prefijo(prefijo)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'''
+            SELECT dni, nombre, contacto, total_compras, ultima_compra
+            FROM compradores
+            WHERE {columna} >= ? AND {columna} < ?
+            ORDER BY {columna}
+            LIMIT ?
+        ''', (desde, hasta, limit))
+    
+        return COMPRADOR_RESUMEN.todas(cursor)
+    
+    except Exception as e:
+        logger.error(f"❌ Error al buscar compradores: {e}")
+        return []
+    finally:
+        conn.close()
\ No newline at end of file
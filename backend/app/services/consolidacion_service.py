@@ -0,0 +1,239 @@
+"""
+Consolidación de las bases de ventas por sucursal (SQLITE_SHARDING).
+
+Una venta solo escribe en la base de su sucursal, así que las ventas de
+distintas sucursales no compiten por el bloqueo de escritura de la central:
+
+- Stock: cada sucursal vende de un cupo por auto (stock_sucursal) que toma
+  de la central (stock_asignado) de a SQLITE_CUPO_STOCK unidades cuando se
+  le acaba, o de a una si ya no quedan tantas libres. Solo esa toma escribe
+  en la central.
+- Compradores, claves de idempotencia y registro de cambios: la venta los
+  escribe en tablas con el mismo nombre en la base de la sucursal. Las
+  claves se quedan ahí; compradores y cambios quedan pendientes.
+
+Cada SQLITE_CONSOLIDAR_SECONDS, un hilo por proceso pasa lo pendiente de
+cada sucursal a la central en una transacción: descuenta del stock las
+unidades vendidas, suma las compras a compradores, copia los cambios al
+registro de la central (en orden, seguidos del nuevo stock de cada auto) y
+publica el stock a los clientes del catálogo. También devuelve los cupos
+sin vender de autos inactivos o sin unidades libres, para que otra
+sucursal pueda venderlos.
+
+El stock del catálogo, los compradores y /cdc/changes de la central se
+ponen al día con ese retraso. Un auto desactivado se puede seguir vendiendo
+del cupo que la sucursal ya tenía hasta la siguiente consolidación.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import db_manager, get_db_connection
+from app.services.cdc_service import AUTO, UPDATE, registrar_cambio
+from app.utils.broadcaster import catalogo_broadcaster
+
+logger = logging.getLogger(__name__)
+
+# Cupos que se devuelven a la central: autos inactivos o sin unidades libres
+_SELECT_CUPOS_A_DEVOLVER = '''
+    SELECT s.auto_id, s.disponible
+    FROM main.stock_sucursal s
+    JOIN central.autos_disponibles a ON a.id = s.auto_id
+    LEFT JOIN central.stock_asignado x ON x.auto_id = s.auto_id
+    WHERE s.disponible > 0 AND (a.is_active = 0 OR a.stock - COALESCE(x.unidades, 0) <= 0)
+'''
+
+
+# ============================================
+# VENTA (conexión de la sucursal)
+# ============================================
+
+def descontar_stock(cursor, auto_id: int) -> bool:
+    """
+    Descuenta una unidad del cupo de la sucursal usando el cursor de la
+    venta; si el cupo se agotó, toma uno nuevo de la central. Retorna False
+    si el auto está inactivo o no le quedan unidades libres.
+    """
+    if _vender_del_cupo(cursor, auto_id):
+        return True
+    return _tomar_cupo(cursor, auto_id) and _vender_del_cupo(cursor, auto_id)
+
+
+def _vender_del_cupo(cursor, auto_id: int) -> bool:
+    cursor.execute('''
+        UPDATE main.stock_sucursal
+        SET disponible = disponible - 1, vendidas = vendidas + 1
+        WHERE auto_id = ? AND disponible > 0
+    ''', (auto_id,))
+    return cursor.rowcount == 1
+
+
+def _tomar_cupo(cursor, auto_id: int) -> bool:
+    # Un lote completo si alcanza; si no, una sola unidad. El INSERT toma el
+    # bloqueo de escritura de la central antes de leer las unidades libres
+    for unidades in dict.fromkeys((max(settings.SQLITE_CUPO_STOCK, 1), 1)):
+        cursor.execute('''
+            INSERT INTO central.stock_asignado (auto_id, unidades)
+            SELECT a.id, ?
+            FROM central.autos_disponibles a
+            LEFT JOIN central.stock_asignado x ON x.auto_id = a.id
+            WHERE a.id = ? AND a.is_active = 1 AND a.stock - COALESCE(x.unidades, 0) >= ?
+            ON CONFLICT(auto_id) DO UPDATE SET unidades = unidades + excluded.unidades
+        ''', (unidades, auto_id, unidades))
+        if cursor.rowcount == 1:
+            cursor.execute('''
+                INSERT INTO main.stock_sucursal (auto_id, disponible) VALUES (?, ?)
+                ON CONFLICT(auto_id) DO UPDATE SET disponible = disponible + excluded.disponible
+            ''', (auto_id, unidades))
+            return True
+    return False
+
+
+# ============================================
+# CONSOLIDACIÓN
+# ============================================
+
+def _hay_pendientes(cursor) -> bool:
+    cursor.execute('''
+        SELECT EXISTS (SELECT 1 FROM main.stock_sucursal WHERE vendidas > 0)
+            OR EXISTS (SELECT 1 FROM main.cambios)
+            OR EXISTS (SELECT 1 FROM main.compradores)
+    ''')
+    if cursor.fetchone()[0]:
+        return True
+    cursor.execute(f"SELECT EXISTS ({_SELECT_CUPOS_A_DEVOLVER})")
+    return bool(cursor.fetchone()[0])
+
+
+def consolidar_sucursal(provincia: str) -> Dict[str, int]:
+    """Pasa a la central lo pendiente de la base de una sucursal, en una transacción"""
+    resultado = {"vendidas": 0, "compradores": 0, "cambios": 0, "devueltas": 0}
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+
+    try:
+        if not _hay_pendientes(cursor):
+            return resultado
+
+        # Bloquea la base de la sucursal y la central: lo leído no cambia
+        # hasta el commit
+        cursor.execute("BEGIN IMMEDIATE")
+
+        stock = {}
+        cursor.execute("SELECT auto_id, vendidas FROM main.stock_sucursal WHERE vendidas > 0")
+        for auto_id, vendidas in cursor.fetchall():
+            cursor.execute(
+                "UPDATE central.autos_disponibles SET stock = MAX(stock - ?, 0) WHERE id = ?",
+                (vendidas, auto_id)
+            )
+            cursor.execute(
+                "UPDATE central.stock_asignado SET unidades = MAX(unidades - ?, 0) WHERE auto_id = ?",
+                (vendidas, auto_id)
+            )
+            cursor.execute("SELECT stock FROM central.autos_disponibles WHERE id = ?", (auto_id,))
+            stock[auto_id] = cursor.fetchone()[0]
+            # Va al registro de la sucursal, después de los cambios de sus ventas
+            registrar_cambio(cursor, AUTO, UPDATE, auto_id, {"id": auto_id, "stock": stock[auto_id]})
+            resultado["vendidas"] += vendidas
+        cursor.execute("UPDATE main.stock_sucursal SET vendidas = 0 WHERE vendidas > 0")
+
+        cursor.execute(_SELECT_CUPOS_A_DEVOLVER)
+        for auto_id, disponible in cursor.fetchall():
+            cursor.execute(
+                "UPDATE central.stock_asignado SET unidades = MAX(unidades - ?, 0) WHERE auto_id = ?",
+                (disponible, auto_id)
+            )
+            cursor.execute("UPDATE main.stock_sucursal SET disponible = 0 WHERE auto_id = ?", (auto_id,))
+            resultado["devueltas"] += disponible
+
+        # El nombre y contacto más recientes ganan, como en upsert_comprador
+        cursor.execute('''
+            INSERT INTO central.compradores (
+                dni, nombre, nombre_busqueda, contacto,
+                total_compras, primera_compra, ultima_compra
+            )
+            SELECT dni, nombre, nombre_busqueda, contacto, total_compras, primera_compra, ultima_compra
+            FROM main.compradores
+            WHERE true
+            ON CONFLICT(dni) DO UPDATE SET
+                nombre = excluded.nombre,
+                nombre_busqueda = excluded.nombre_busqueda,
+                contacto = excluded.contacto,
+                total_compras = total_compras + excluded.total_compras,
+                primera_compra = MIN(primera_compra, excluded.primera_compra),
+                ultima_compra = MAX(ultima_compra, excluded.ultima_compra)
+        ''')
+        resultado["compradores"] = cursor.rowcount
+        cursor.execute("DELETE FROM main.compradores")
+
+        cursor.execute('''
+            INSERT INTO central.cambios (entidad, operacion, clave, datos, created_at)
+            SELECT entidad, operacion, clave, datos, created_at
+            FROM main.cambios
+            ORDER BY id
+        ''')
+        resultado["cambios"] = cursor.rowcount
+        cursor.execute("DELETE FROM main.cambios")
+
+        conn.commit()
+
+        for auto_id, unidades in stock.items():
+            catalogo_broadcaster.publicar("stock", {"id": auto_id, "stock": unidades})
+        return resultado
+
+    except Exception as e:
+        logger.error(f"❌ Error al consolidar la sucursal {provincia}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def consolidar() -> Dict[str, int]:
+    """Consolida todas las bases de sucursal, una por una (nada sin sharding)"""
+    total = {"vendidas": 0, "compradores": 0, "cambios": 0, "devueltas": 0}
+    for provincia in db_manager.sucursales_ventas():
+        try:
+            resultado = consolidar_sucursal(provincia)
+        except Exception:
+            continue  # ya registrado; se reintenta en la próxima consolidación
+        for clave, valor in resultado.items():
+            total[clave] += valor
+    return total
+
+
+class Consolidador:
+    """Hilo que consolida las sucursales cada `intervalo` segundos, y una última vez al detenerse"""
+
+    def __init__(self):
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+
+    def iniciar(self, intervalo: float):
+        if self._hilo is not None or not db_manager.sharding:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, args=(intervalo,), name="consolidacion", daemon=True)
+        self._hilo.start()
+        logger.info(f"🏬 Consolidación de sucursales cada {intervalo:g} s")
+
+    def detener(self, timeout: float = 10.0):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        self._hilo = None
+
+    def _bucle(self, intervalo: float):
+        while True:
+            detener = self._detener.wait(max(intervalo, 0.05))
+            try:
+                consolidar()
+            except Exception as e:
+                logger.error(f"❌ Error en la consolidación de sucursales: {e}")
+            if detener:
+                return
+
+
+consolidador = Consolidador()
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Simulador de financiamiento para ventas a Crédito.
+
+Arma cronogramas de cuota fija (sistema francés) sobre el precio
+referencial del auto menos la cuota inicial, para todas las combinaciones
+de tasa y plazo pedidas a la vez. Las tasas son TEA (tasa efectiva anual,
+en %), convertidas a tasa mensual equivalente.
+
+El cálculo es vectorial con NumPy: el saldo de cada mes sale de la fórmula
+cerrada de la anualidad sobre una matriz combinaciones x meses, sin
+recorrer los meses en Python. Los cronogramas se devuelven por columnas
+(listas de mes, cuota, interés, amortización y saldo).
+
+Las simulaciones se cachean en el estado compartido durante
+SIMULADOR_CACHE_TTL_SECONDS. El precio forma parte de la clave, así que un
+cambio de precio no devuelve cuotas viejas.
+"""
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from app.config import settings
+from app.database import get_db_connection, relanzar_si_transitorio
+from app.utils.filas import MapaFilas
+from app.utils.shared_state import get_estado
+
+logger = logging.getLogger(__name__)
+
+AUTO_PRECIO = MapaFilas("AutoPrecio", {
+    "id": int,
+    "marca": str,
+    "modelo": str,
+    "anio": int,
+    "precio_referencial": Optional[float],
+})
+
+
+class SimulacionInvalidaError(ValueError):
+    """Parámetros de simulación fuera de rango"""
+
+
+def get_auto_precio(auto_id: int):
+    """Auto activo con su precio referencial, o None"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT id, marca, modelo, anio, precio_referencial
+            FROM autos_disponibles
+            WHERE id = ? AND is_active = 1
+        ''', (auto_id,))
+        return AUTO_PRECIO.una(cursor)
+
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al obtener precio del auto: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def tablas_amortizacion(monto: float, tasas_anuales: Sequence[float], plazos: Sequence[int]) -> List[Dict]:
+    """
+    Cronogramas de cuota fija para cada (tasa, plazo), en el orden
+    tasas x plazos. Las tasas son TEA en porcentaje.
+    """
+    import numpy as np
+
+    tea = np.repeat(np.asarray(tasas_anuales, dtype=np.float64), len(plazos)) / 100
+    n = np.tile(np.asarray(plazos, dtype=np.int64), len(tasas_anuales))
+    i = np.power(1 + tea, 1 / 12) - 1
+
+    # Cuota fija; con tasa 0 es el monto dividido en partes iguales
+    con_tasa = i > 0
+    factor = np.where(con_tasa, -np.expm1(-n * np.log1p(i)), 1.0)
+    cuota = np.where(con_tasa, monto * i / np.where(con_tasa, factor, 1.0), monto / n)
+
+    # Saldo al cierre de cada mes k: monto(1+i)^k - cuota((1+i)^k - 1)/i
+    meses = np.arange(1, int(n.max()) + 1)
+    crecimiento = np.power.outer(1 + i, meses)
+    acumulado = np.where(
+        con_tasa[:, None],
+        (crecimiento - 1) / np.where(con_tasa, i, 1.0)[:, None],
+        meses[None, :]
+    )
+    saldo = monto * crecimiento - cuota[:, None] * acumulado
+    vigente = meses[None, :] <= n[:, None]
+    saldo = np.where(vigente, np.maximum(saldo, 0.0), 0.0)
+    saldo[np.arange(len(n)), n - 1] = 0.0
+
+    saldo_previo = np.concatenate([np.full((len(n), 1), float(monto)), saldo[:, :-1]], axis=1)
+    interes = saldo_previo * i[:, None]
+    amortizacion = saldo_previo - saldo
+
+    # Una sola conversión a listas de Python por matriz; cada opción toma su tramo
+    columnas = zip(
+        (tea * 100).tolist(),
+        np.round(i * 100, 4).tolist(),
+        n.tolist(),
+        np.round(cuota, 2).tolist(),
+        np.round(cuota * n - monto, 2).tolist(),
+        np.round(cuota * n, 2).tolist(),
+        np.round(interes, 2).tolist(),
+        np.round(amortizacion, 2).tolist(),
+        np.round(saldo, 2).tolist(),
+    )
+    lista_meses = meses.tolist()
+
+    return [
+        {
+            "tasa_anual": tasa,
+            "tasa_mensual": mensual,
+            "plazo_meses": plazo,
+            "cuota": cuota_k,
+            "total_intereses": intereses,
+            "total_pagado": pagado,
+            "cronograma": {
+                "mes": lista_meses[:plazo],
+                "cuota": [cuota_k] * plazo,
+                "interes": interes_k[:plazo],
+                "amortizacion": amortizacion_k[:plazo],
+                "saldo": saldo_k[:plazo],
+            },
+        }
+        for tasa, mensual, plazo, cuota_k, intereses, pagado, interes_k, amortizacion_k, saldo_k in columnas
+    ]
+
+
+def _normalizar(valores: Optional[Sequence], defecto: Sequence) -> List:
+    return sorted(set(valores)) if valores else list(defecto)
+
+
+def _clave_cache(auto_id: int, precio: float, inicial: float, tasas: List[float], plazos: List[int]) -> str:
+    firma = f"{auto_id}|{precio:.2f}|{inicial:.2f}|{','.join(map(str, tasas))}|{','.join(map(str, plazos))}"
+    return "simulador_credito:" + hashlib.sha1(firma.encode()).hexdigest()
+
+
+def simular_credito(
+    auto_id: int,
+    cuota_inicial: float = 0.0,
+    tasas_anuales: Optional[Sequence[float]] = None,
+    plazos: Optional[Sequence[int]] = None
+) -> Optional[Dict]:
+    """
+    Simulación para un auto del catálogo. Retorna None si el auto no existe;
+    lanza SimulacionInvalidaError si la cuota inicial o las opciones no son válidas.
+    """
+    tasas = _normalizar(tasas_anuales, settings.simulador_tasas)
+    meses = _normalizar(plazos, settings.simulador_plazos)
+
+    if len(tasas) * len(meses) > settings.SIMULADOR_MAX_COMBINACIONES:
+        raise SimulacionInvalidaError(
+            f"Máximo {settings.SIMULADOR_MAX_COMBINACIONES} combinaciones de tasa y plazo por simulación"
+        )
+    if meses[-1] > settings.SIMULADOR_PLAZO_MAX_MESES:
+        raise SimulacionInvalidaError(f"El plazo máximo es {settings.SIMULADOR_PLAZO_MAX_MESES} meses")
+
+    auto = get_auto_precio(auto_id)
+    if not auto:
+        return None
+    if not auto.precio_referencial:
+        raise SimulacionInvalidaError("El auto no tiene precio referencial")
+
+    precio = float(auto.precio_referencial)
+    if cuota_inicial >= precio:
+        raise SimulacionInvalidaError("La cuota inicial debe ser menor al precio del auto")
+
+    estado = get_estado()
+    clave = _clave_cache(auto_id, precio, cuota_inicial, tasas, meses)
+    simulacion = estado.get(clave)
+    if simulacion is not None:
+        return simulacion
+
+    monto = round(precio - cuota_inicial, 2)
+    simulacion = {
+        "auto": {
+            "id": auto.id,
+            "descripcion": f"{auto.marca} {auto.modelo} {auto.anio}",
+            "precio_referencial": precio,
+        },
+        "cuota_inicial": cuota_inicial,
+        "monto_financiado": monto,
+        "opciones": tablas_amortizacion(monto, tasas, meses),
+    }
+    estado.set(clave, simulacion, ttl=settings.SIMULADOR_CACHE_TTL_SECONDS)
+    return simulacion
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Resumen del dashboard del vendedor en una sola respuesta.
+
+Reúne perfil, últimas ventas, totales del mes y ranking de la sucursal. Las
+consultas son independientes, así que se ejecutan en paralelo sobre
+conexiones del pool; el ranking sale de las tablas en memoria de
+ranking_service. El resultado se guarda por vendedor en el estado
+compartido durante DASHBOARD_CACHE_TTL_SECONDS y se invalida cuando ese
+vendedor registra una venta.
+
+Un error transitorio de la base se propaga (503). Si una parte falla por
+otro motivo se responde el resumen con esa parte vacía y "parcial": true,
+pero no se cachea.
+"""
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import db_manager, relanzar_si_transitorio
+from app.services import ranking_service, venta_service
+from app.utils.montos import parse_monto
+from app.utils.shared_state import get_estado
+from app.utils.singleflight import grupo
+
+logger = logging.getLogger(__name__)
+
+_ejecutor = ThreadPoolExecutor(max_workers=settings.DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+_vuelos = grupo("dashboard_resumen")
+
+VENTAS_RECIENTES = 10
+RANKING_TOP = 10
+
+
+def _clave_cache(vendedor_id: int) -> str:
+    return f"dashboard:{vendedor_id}"
+
+
+def _clave_version(vendedor_id: int) -> str:
+    return f"dashboard_version:{vendedor_id}"
+
+
+def inicio_de_mes(ahora: datetime) -> datetime:
+    return ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _totales_vacios() -> Dict:
+    return {"unidades": 0, "monto": 0.0, "cash": 0, "credito": 0}
+
+
+def get_totales_mes(vendedor_id: int, desde: datetime, sucursal_provincia: Optional[str] = None) -> Optional[Dict]:
+    """
+    Unidades y monto vendidos por el vendedor desde `desde`, por tipo de
+    compra. Con sharding, `sucursal_provincia` limita la consulta a la base
+    de esa sucursal (sin ella se consultan todas). None si la consulta falla.
+    """
+    def leer(conn):
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT tipo_compra, monto_fisco
+            FROM registro_venta
+            WHERE vendedor_id = ? AND fecha_venta >= ?
+        ''', (vendedor_id, desde))
+        return cursor.fetchall()
+
+    try:
+        totales = _totales_vacios()
+        for filas in db_manager.en_sucursales(leer, [sucursal_provincia] if sucursal_provincia else None):
+            for tipo_compra, monto_fisco in filas:
+                totales["unidades"] += 1
+                totales["monto"] += parse_monto(monto_fisco)
+                totales["cash" if tipo_compra == "Cash" else "credito"] += 1
+        totales["monto"] = round(totales["monto"], 2)
+        return totales
+
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al obtener totales del mes: {e}")
+        return None
+
+
+def _en_paralelo(fn, *args) -> Future:
+    """Ejecuta fn en el pool del dashboard conservando el contexto (perfilado)"""
+    return _ejecutor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _ventas_recientes(vendedor_id: int, provincia: str) -> Optional[list]:
+    """Últimas ventas del vendedor; None si la consulta falla"""
+    try:
+        return venta_service.ultimas_ventas_vendedor(vendedor_id, VENTAS_RECIENTES, provincia)
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al obtener ventas recientes del dashboard: {e}")
+        return None
+
+
+def _construir_resumen(user: Dict) -> Dict:
+    ahora = datetime.now()
+    desde = inicio_de_mes(ahora)
+
+    provincia = user["sucursal_provincia"]
+    ventas = _en_paralelo(_ventas_recientes, user["id"], provincia)
+    totales = _en_paralelo(get_totales_mes, user["id"], desde, provincia)
+    ranking = ranking_service.get_ranking(
+        user["sucursal_provincia"], user["sucursal_distrito"], "mes",
+        top=RANKING_TOP, vendedor_id=user["id"]
+    )
+    ventas_recientes = ventas.result()
+    totales_mes = totales.result()
+
+    return {
+        "perfil": {
+            "username": user["username"],
+            "full_name": user["full_name"],
+            "email": user["email"],
+            "role": user.get("role", "vendedor"),
+            "codigo_vendedor": user.get("codigo_vendedor", ""),
+            "sucursal_provincia": user["sucursal_provincia"],
+            "sucursal_distrito": user["sucursal_distrito"]
+        },
+        "ventas_recientes": ventas_recientes if ventas_recientes is not None else [],
+        "totales_mes": {**(totales_mes or _totales_vacios()), "desde": desde.date().isoformat()},
+        "ranking_sucursal": {
+            "mi_puesto": ranking["yo"]["puesto"] if ranking["yo"] else None,
+            "vendedores": ranking["vendedores"]
+        },
+        "generado_en": ahora.isoformat(timespec="seconds"),
+        "parcial": ventas_recientes is None or totales_mes is None
+    }
+
+
+def get_resumen(user: Dict) -> Tuple[Dict, bool]:
+    """
+    Retorna (resumen, desde_cache). Las peticiones simultáneas del mismo
+    vendedor con el cache vacío comparten una sola construcción.
+    """
+    estado = get_estado()
+    clave = _clave_cache(user["id"])
+
+    resumen = estado.get(clave)
+    if resumen is not None:
+        return resumen, True
+
+    version = estado.get(_clave_version(user["id"]))
+    resumen, compartido = _vuelos.do(user["id"], lambda: _construir_resumen(user))
+
+    # Si hubo una venta mientras se construía, el resumen ya está viejo:
+    # se responde igual pero no se guarda. Tampoco se guarda uno parcial.
+    if not compartido and not resumen["parcial"] and estado.get(_clave_version(user["id"])) == version:
+        estado.set(clave, resumen, ttl=settings.DASHBOARD_CACHE_TTL_SECONDS)
+    return resumen, False
+
+
+def invalidar_resumen(vendedor_id: int):
+    """Descarta el resumen cacheado del vendedor (en todos los workers)"""
+    estado = get_estado()
+    estado.incr(_clave_version(vendedor_id), ttl=86400)
+    estado.delete(_clave_cache(vendedor_id))
\ No newline at end of file
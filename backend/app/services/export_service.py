@@ -0,0 +1,133 @@
+"""
+Serialización en streaming de lotes de filas a CSV o Parquet.
+
+Cada función recibe un iterable de lotes (listas de tuplas) y produce los
+bytes de salida lote por lote, sin acumular el archivo completo en memoria.
+"""
+import csv
+import importlib.util
+import io
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# pyarrow es opcional: solo se necesita para exportar en Parquet. Tarda en
+# cargar, así que se importa recién en el primer export Parquet
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# Tipos Parquet para las columnas numéricas y de fecha del export de ventas;
+# el resto se escribe como texto
+_TIPOS_PARQUET = {
+    "id": "int64",
+    "vendedor_id": "int64",
+    "auto_id": "int64",
+    "anio": "int32",
+    "fecha_venta": "timestamp",
+}
+
+
+def generar_csv(columnas: Sequence[str], lotes: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Genera un CSV UTF-8 (con BOM para Excel) un lote a la vez"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow(columnas)
+
+    for lote in lotes:
+        writer.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _SalidaEnMemoria(io.RawIOBase):
+    """Archivo de solo escritura que entrega lo escrito y se vacía"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._partes.append(bytes(data))
+        return len(data)
+
+    def vaciar(self) -> bytes:
+        data = b"".join(self._partes)
+        self._partes.clear()
+        return data
+
+
+def _a_timestamp(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(str(valor))
+
+
+def _esquema_parquet(columnas: Sequence[str]):
+    import pyarrow as pa
+
+    campos = []
+    for columna in columnas:
+        tipo = _TIPOS_PARQUET.get(columna, "string")
+        if tipo == "timestamp":
+            campos.append(pa.field(columna, pa.timestamp("us")))
+        elif tipo == "int64":
+            campos.append(pa.field(columna, pa.int64()))
+        elif tipo == "int32":
+            campos.append(pa.field(columna, pa.int32()))
+        else:
+            campos.append(pa.field(columna, pa.string()))
+    return pa.schema(campos)
+
+
+def generar_parquet(columnas: Sequence[str], lotes: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """
+    Genera un archivo Parquet escribiendo un row group por lote.
+
+    Los bytes de cada row group se entregan apenas se escriben; el footer
+    con los metadatos se entrega al final.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow no está instalado; no se puede exportar en Parquet")
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = _esquema_parquet(columnas)
+    conversores = [
+        _a_timestamp if _TIPOS_PARQUET.get(c) == "timestamp"
+        else (lambda v: None if v is None else str(v)) if c not in _TIPOS_PARQUET
+        else None
+        for c in columnas
+    ]
+
+    salida = _SalidaEnMemoria()
+    writer = pq.ParquetWriter(salida, esquema, compression="snappy")
+
+    try:
+        for lote in lotes:
+            arrays = []
+            for i, campo in enumerate(esquema):
+                valores = [fila[i] for fila in lote]
+                if conversores[i] is not None:
+                    valores = [conversores[i](v) for v in valores]
+                arrays.append(pa.array(valores, type=campo.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+
+            data = salida.vaciar()
+            if data:
+                yield data
+    finally:
+        writer.close()
+
+    data = salida.vaciar()
+    if data:
+        yield data
\ No newline at end of file
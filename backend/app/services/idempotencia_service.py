@@ -0,0 +1,242 @@
+"""
+Claves de idempotencia para el registro de ventas.
+
+Un cliente que reintenta `POST /venta/registrar` con el mismo header
+`Idempotency-Key` recibe el `venta_id` original en lugar de crear una venta
+duplicada. La clave se guarda en la misma transacción que la venta, en una
+tabla compacta (vendedor, clave, huella del payload, venta_id), en un
+cache LRU en memoria con expiración y en el estado compartido entre workers.
+Con sharding, la tabla es la de la base de la sucursal del vendedor.
+Las peticiones concurrentes con la misma clave esperan a una sola ejecución
+en curso (single-flight).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import db_manager, es_clave_duplicada, get_db_connection
+from app.utils.shared_state import get_estado
+from app.utils.singleflight import grupo
+
+logger = logging.getLogger(__name__)
+
+
+class ClaveIdempotenciaConflictoError(Exception):
+    """La clave ya se usó con un payload distinto"""
+
+
+class ClaveIdempotenciaDuplicadaError(Exception):
+    """Otra petición guardó la misma clave primero (carrera entre procesos)"""
+
+
+_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[int, str], Tuple[str, int, float]]" = OrderedDict()
+_vuelos = grupo("idempotencia_ventas")
+
+
+def huella_payload(payload: Dict) -> str:
+    """Huella corta y estable del payload para detectar reutilización de claves"""
+    canonico = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonico.encode()).hexdigest()[:32]
+
+
+def _clave_compartida(vendedor_id: int, clave: str) -> str:
+    return f"idempotencia:{vendedor_id}:{clave}"
+
+
+def _recordar(vendedor_id: int, clave: str, huella: str, venta_id: int, compartir: bool = True):
+    ttl = settings.IDEMPOTENCY_TTL_HOURS * 3600
+    if compartir:
+        get_estado().set(_clave_compartida(vendedor_id, clave), [huella, venta_id], ttl=ttl)
+
+    expira = time.monotonic() + ttl
+    with _lock:
+        _cache[(vendedor_id, clave)] = (huella, venta_id, expira)
+        _cache.move_to_end((vendedor_id, clave))
+        while len(_cache) > settings.IDEMPOTENCY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _buscar_en_cache(vendedor_id: int, clave: str) -> Optional[Tuple[str, int]]:
+    with _lock:
+        entrada = _cache.get((vendedor_id, clave))
+        if entrada is None:
+            return None
+        huella, venta_id, expira = entrada
+        if expira < time.monotonic():
+            del _cache[(vendedor_id, clave)]
+            return None
+        return huella, venta_id
+
+
+def _buscar_en_db(vendedor_id: int, clave: str, sucursal_provincia: Optional[str]) -> Optional[Tuple[str, int]]:
+    limite = datetime.now() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    conn = get_db_connection(sucursal_provincia)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT huella, venta_id
+            FROM idempotencia_ventas
+            WHERE vendedor_id = ? AND clave = ? AND created_at >= ?
+        ''', (vendedor_id, clave, limite))
+
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+
+    except Exception as e:
+        logger.error(f"❌ Error al buscar clave de idempotencia: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def buscar_venta_registrada(
+    vendedor_id: int,
+    clave: str,
+    sucursal_provincia: Optional[str] = None
+) -> Optional[Tuple[str, int]]:
+    """
+    Retorna (huella, venta_id) si la clave ya se usó y no expiró. Busca en el
+    cache del proceso, luego en el estado compartido y por último en la BD
+    (con sharding, la de `sucursal_provincia`).
+    """
+    encontrada = _buscar_en_cache(vendedor_id, clave)
+    if encontrada is not None:
+        return encontrada
+
+    compartida = get_estado().get(_clave_compartida(vendedor_id, clave))
+    if compartida is not None:
+        huella, venta_id = compartida
+        _recordar(vendedor_id, clave, huella, venta_id, compartir=False)
+        return huella, venta_id
+
+    encontrada = _buscar_en_db(vendedor_id, clave, sucursal_provincia)
+    if encontrada is not None:
+        _recordar(vendedor_id, clave, *encontrada)
+    return encontrada
+
+
+def guardar_clave(cursor, vendedor_id: int, clave: str, huella: str, venta_id: int):
+    """
+    Inserta la clave usando el cursor de la transacción de la venta. Una
+    clave expirada que la purga aún no eliminó se reemplaza.
+    Lanza ClaveIdempotenciaDuplicadaError si la clave ya existe; cualquier
+    otro error (base bloqueada, conexión caída) se propaga tal cual.
+    """
+    limite = datetime.now() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    try:
+        cursor.execute('''
+            DELETE FROM idempotencia_ventas
+            WHERE vendedor_id = ? AND clave = ? AND created_at < ?
+        ''', (vendedor_id, clave, limite))
+        cursor.execute('''
+            INSERT INTO idempotencia_ventas (vendedor_id, clave, huella, venta_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (vendedor_id, clave, huella, venta_id, datetime.now()))
+    except Exception as e:
+        if not es_clave_duplicada(e):
+            raise
+        raise ClaveIdempotenciaDuplicadaError(str(e)) from e
+
+
+def _verificar_huella(huella_guardada: str, huella: str):
+    if huella_guardada != huella:
+        raise ClaveIdempotenciaConflictoError(
+            "La clave de idempotencia ya se usó con datos de venta distintos"
+        )
+
+
+def ejecutar_idempotente(
+    vendedor_id: int,
+    clave: str,
+    huella: str,
+    funcion: Callable[[], Optional[int]],
+    sucursal_provincia: Optional[str] = None
+) -> Tuple[Optional[int], bool]:
+    """
+    Ejecuta `funcion` una sola vez por (vendedor, clave). `sucursal_provincia`
+    es la del vendedor, donde `funcion` guarda la clave con sharding.
+
+    Retorna (venta_id, replay). `replay` es True cuando el resultado viene de
+    una ejecución anterior o de otra petición concurrente con la misma clave.
+    """
+    encontrada = buscar_venta_registrada(vendedor_id, clave, sucursal_provincia)
+    if encontrada is not None:
+        _verificar_huella(encontrada[0], huella)
+        return encontrada[1], True
+
+    (huella_original, venta_id, replay), compartido = _vuelos.do(
+        (vendedor_id, clave),
+        lambda: _ejecutar(vendedor_id, clave, huella, funcion, sucursal_provincia)
+    )
+
+    if compartido:
+        _verificar_huella(huella_original, huella)
+        return venta_id, True
+    return venta_id, replay
+
+
+def _ejecutar(
+    vendedor_id: int,
+    clave: str,
+    huella: str,
+    funcion: Callable[[], Optional[int]],
+    sucursal_provincia: Optional[str]
+) -> Tuple[str, Optional[int], bool]:
+    """Ejecución líder: retorna (huella guardada, venta_id, replay)"""
+    try:
+        venta_id = funcion()
+    except ClaveIdempotenciaDuplicadaError:
+        # Otro proceso registró la misma clave justo antes que nosotros
+        encontrada = _buscar_en_db(vendedor_id, clave, sucursal_provincia)
+        if encontrada is None:
+            raise
+        _recordar(vendedor_id, clave, *encontrada)
+        _verificar_huella(encontrada[0], huella)
+        return encontrada[0], encontrada[1], True
+
+    if venta_id:
+        _recordar(vendedor_id, clave, huella, venta_id)
+    return huella, venta_id, False
+
+
+def _purgar(conn, limite: datetime) -> int:
+    cursor = conn.cursor()
+    try:
+        cursor.execute('DELETE FROM idempotencia_ventas WHERE created_at < ?', (limite,))
+        eliminadas = cursor.rowcount
+        conn.commit()
+        return eliminadas
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def purgar_claves_expiradas() -> int:
+    """
+    Elimina las claves más antiguas que IDEMPOTENCY_TTL_HOURS (con sharding,
+    también en la base de cada sucursal)
+    """
+    limite = datetime.now() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    conn = get_db_connection()
+
+    try:
+        eliminadas = _purgar(conn, limite)
+        if db_manager.sharding:
+            eliminadas += sum(db_manager.en_sucursales(lambda c: _purgar(c, limite)))
+        if eliminadas:
+            logger.info(f"🧹 Eliminadas {eliminadas} claves de idempotencia expiradas")
+        return eliminadas
+
+    except Exception as e:
+        logger.error(f"❌ Error al purgar claves de idempotencia: {e}")
+        return 0
+    finally:
+        conn.close()
\ No newline at end of file
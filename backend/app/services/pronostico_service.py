@@ -0,0 +1,459 @@
+"""
+Pronóstico de demanda y recomendaciones de reposición por modelo y sucursal.
+
+El trabajo nocturno `pronosticar_demanda` hace dos pasadas:
+
+1. Agregado incremental: suma a `ventas_diarias` las unidades por (auto,
+   sucursal, día) de las ventas nuevas de registro_venta. Avanza por rangos
+   de id (clave primaria) desde el último procesado, guardado en
+   `ventas_diarias_avance`. En Azure SQL avanza por `version` (rowversion)
+   hasta MIN_ACTIVE_ROWVERSION(), como la analítica: con RCSI una venta con
+   id menor puede confirmarse después de otra con id mayor. Cada rango se
+   agrupa en la base y se confirma junto con el avance, así que la memoria
+   no depende del total de ventas. Si dos procesos corren a la vez, solo
+   uno confirma cada rango. Los agregados sobreviven al archivo de meses
+   fríos.
+
+2. Pronóstico: para cada lote de autos arma la matriz series x días de los
+   últimos PRONOSTICO_VENTANA_DIAS (sin el día en curso) con NumPy. Ajusta
+   media móvil y suavizado exponencial simple, y se queda por serie con el
+   de menor error absoluto medio a un paso. El resultado (unidades por día)
+   se guarda en `pronostico_demanda`.
+
+La recomendación se calcula al consultar, con el stock vigente. El stock es
+del catálogo, no por sucursal, así que los días de stock usan la demanda de
+todas las sucursales. Se sugiere reponer hasta cubrir
+PRONOSTICO_HORIZONTE_DIAS + PRONOSTICO_STOCK_SEGURIDAD_DIAS.
+"""
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import db_manager, get_db_connection, relanzar_si_transitorio
+from app.utils.filas import MapaFilas
+
+logger = logging.getLogger(__name__)
+
+MEDIA_MOVIL = "media_movil"
+SUAVIZADO = "suavizado_exponencial"
+
+PRONOSTICO = MapaFilas("Pronostico", {
+    "auto_id": int,
+    "marca": str,
+    "modelo": str,
+    "anio": int,
+    "stock": int,
+    "sucursal_provincia": str,
+    "sucursal_distrito": str,
+    "demanda_diaria": float,
+    "metodo": str,
+    "error_medio": Optional[float],
+    "generado_at": datetime,
+})
+
+
+# ============================================
+# AGREGADO DIARIO INCREMENTAL
+# ============================================
+
+# Rango de ventas de cada pasada: por id en SQLite, por version en Azure SQL
+_RANGO_AZURE = "version > CAST(CAST(? AS BIGINT) AS BINARY(8)) AND version <= CAST(CAST(? AS BIGINT) AS BINARY(8))"
+
+
+def _sumar_dias(cursor, desde: int, hasta: int) -> int:
+    """
+    Suma a ventas_diarias las ventas del rango (desde, hasta] (ids en
+    SQLite, versiones en Azure SQL); retorna las series-día tocadas
+    """
+    if db_manager.db_type == "sqlite":
+        cursor.execute('''
+            SELECT auto_id, sucursal_provincia, sucursal_distrito, date(fecha_venta), COUNT(*)
+            FROM registro_venta
+            WHERE id > ? AND id <= ?
+            GROUP BY auto_id, sucursal_provincia, sucursal_distrito, date(fecha_venta)
+        ''', (desde, hasta))
+        filas = cursor.fetchall()
+        cursor.executemany('''
+            INSERT INTO ventas_diarias (auto_id, sucursal_provincia, sucursal_distrito, fecha, unidades)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(auto_id, sucursal_provincia, sucursal_distrito, fecha) DO UPDATE SET
+                unidades = ventas_diarias.unidades + excluded.unidades
+        ''', filas)
+    else:  # azure
+        cursor.execute(f'''
+            SELECT auto_id, sucursal_provincia, sucursal_distrito, CAST(fecha_venta AS DATE), COUNT(*)
+            FROM registro_venta
+            WHERE {_RANGO_AZURE}
+            GROUP BY auto_id, sucursal_provincia, sucursal_distrito, CAST(fecha_venta AS DATE)
+        ''', (desde, hasta))
+        filas = [tuple(fila) for fila in cursor.fetchall()]
+        if filas:
+            cursor.executemany('''
+                MERGE ventas_diarias WITH (HOLDLOCK) AS destino
+                USING (SELECT ? AS auto_id, ? AS sucursal_provincia, ? AS sucursal_distrito,
+                              ? AS fecha, ? AS unidades) AS origen
+                ON destino.auto_id = origen.auto_id
+                   AND destino.sucursal_provincia = origen.sucursal_provincia
+                   AND destino.sucursal_distrito = origen.sucursal_distrito
+                   AND destino.fecha = origen.fecha
+                WHEN MATCHED THEN UPDATE SET unidades = destino.unidades + origen.unidades
+                WHEN NOT MATCHED THEN INSERT (auto_id, sucursal_provincia, sucursal_distrito, fecha, unidades)
+                    VALUES (origen.auto_id, origen.sucursal_provincia, origen.sucursal_distrito,
+                            origen.fecha, origen.unidades);
+            ''', filas)
+    return len(filas)
+
+
+def actualizar_ventas_diarias(progreso: Optional[Callable[[float, str], None]] = None) -> Dict:
+    """
+    Agrega a ventas_diarias las ventas registradas desde la última pasada.
+    Con sharding recorre las bases de ventas una por una; cada base guarda
+    su propio avance y los agregados van a la central.
+    """
+    bases = db_manager.bases_ventas()
+    total = {"ultimo_venta_id": 0, "ids_procesados": 0, "series_dia": 0}
+
+    for i, provincia in enumerate(bases):
+        def progreso_base(porcentaje: float, mensaje: str, i=i):
+            progreso((i * 50 + porcentaje) / len(bases), mensaje)
+
+        if db_manager.db_type == "sqlite":
+            parcial = _actualizar_base(provincia, progreso_base if progreso else None)
+        else:
+            parcial = _actualizar_azure(progreso_base if progreso else None)
+        total = {
+            "ultimo_venta_id": max(total["ultimo_venta_id"], parcial["ultimo_venta_id"]),
+            "ids_procesados": total["ids_procesados"] + parcial["ids_procesados"],
+            "series_dia": total["series_dia"] + parcial["series_dia"],
+        }
+    return total
+
+
+def _actualizar_base(provincia: Optional[str], progreso: Optional[Callable[[float, str], None]]) -> Dict:
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+    procesadas = 0
+    series_dia = 0
+
+    try:
+        cursor.execute("SELECT ultimo_venta_id FROM ventas_diarias_avance WHERE id = 1")
+        fila = cursor.fetchone()
+        avance = fila[0] if fila else 0
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM registro_venta")
+        tope = cursor.fetchone()[0]
+        inicial = avance
+
+        while avance < tope:
+            # Los rangos empiezan en la siguiente venta: salta los huecos de
+            # ids (con sharding, los de cada base empiezan en N * ID_BASE_SUCURSAL)
+            cursor.execute("SELECT MIN(id) FROM registro_venta WHERE id > ?", (avance,))
+            desde = max(avance, cursor.fetchone()[0] - 1)
+            hasta = min(desde + settings.PRONOSTICO_LOTE_VENTAS, tope)
+            series_dia += _sumar_dias(cursor, desde, hasta)
+
+            # El avance se mueve en la misma transacción y solo si nadie más lo movió
+            cursor.execute('''
+                UPDATE ventas_diarias_avance SET ultimo_venta_id = ?, actualizado_at = ?
+                WHERE id = 1 AND ultimo_venta_id = ?
+            ''', (hasta, datetime.now(), avance))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                logger.warning("⚠️ Otro proceso está agregando ventas diarias; se omite esta pasada")
+                break
+            conn.commit()
+
+            procesadas += hasta - desde
+            avance = hasta
+            if progreso:
+                progreso((avance - inicial) * 50 / (tope - inicial), f"Ventas agregadas hasta id {avance}")
+
+        return {"ultimo_venta_id": avance, "ids_procesados": procesadas, "series_dia": series_dia}
+
+    except Exception as e:
+        conn.rollback()
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al agregar ventas diarias: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def _actualizar_azure(progreso: Optional[Callable[[float, str], None]]) -> Dict:
+    """
+    Como _actualizar_base, pero por version: solo toma ventas con version
+    menor que MIN_ACTIVE_ROWVERSION(), así una venta que se confirme después
+    siempre queda por encima del avance.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    procesadas = 0
+    series_dia = 0
+
+    try:
+        cursor.execute("SELECT ultimo_venta_id, ultima_version FROM ventas_diarias_avance WHERE id = 1")
+        ultimo_id, avance = cursor.fetchone()
+        if avance is None:
+            # Primera pasada por version: lo agregado hasta ultimo_venta_id
+            cursor.execute(
+                "SELECT COALESCE(MAX(CAST(version AS BIGINT)), 0) FROM registro_venta WHERE id <= ?",
+                (ultimo_id,)
+            )
+            avance = cursor.fetchone()[0]
+            cursor.execute(
+                "UPDATE ventas_diarias_avance SET ultima_version = ? WHERE id = 1 AND ultima_version IS NULL",
+                (avance,)
+            )
+            conn.commit()
+            cursor.execute("SELECT ultima_version FROM ventas_diarias_avance WHERE id = 1")
+            avance = cursor.fetchone()[0]
+
+        cursor.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT) - 1")
+        tope = cursor.fetchone()[0]
+        inicial = avance
+
+        while avance < tope:
+            cursor.execute(f'''
+                SELECT MAX(version), MAX(id), COUNT(*)
+                FROM (
+                    SELECT TOP (?) CAST(version AS BIGINT) AS version, id
+                    FROM registro_venta
+                    WHERE {_RANGO_AZURE}
+                    ORDER BY version
+                ) lote
+            ''', (settings.PRONOSTICO_LOTE_VENTAS, avance, tope))
+            hasta, hasta_id, cantidad = cursor.fetchone()
+            if not cantidad:
+                break
+            series_dia += _sumar_dias(cursor, avance, hasta)
+
+            # El avance se mueve en la misma transacción y solo si nadie más lo movió
+            cursor.execute('''
+                UPDATE ventas_diarias_avance
+                SET ultima_version = ?,
+                    ultimo_venta_id = CASE WHEN ultimo_venta_id > ? THEN ultimo_venta_id ELSE ? END,
+                    actualizado_at = ?
+                WHERE id = 1 AND ultima_version = ?
+            ''', (hasta, hasta_id, hasta_id, datetime.now(), avance))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                logger.warning("⚠️ Otro proceso está agregando ventas diarias; se omite esta pasada")
+                break
+            conn.commit()
+
+            procesadas += cantidad
+            ultimo_id = max(ultimo_id, hasta_id)
+            avance = hasta
+            if progreso:
+                progreso((avance - inicial) * 50 / (tope - inicial), f"Ventas agregadas hasta id {ultimo_id}")
+
+        return {"ultimo_venta_id": ultimo_id, "ids_procesados": procesadas, "series_dia": series_dia}
+
+    except Exception as e:
+        conn.rollback()
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al agregar ventas diarias: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+# ============================================
+# MODELOS
+# ============================================
+
+def ajustar_series(matriz, dias_media: int, alfa: float):
+    """
+    Ajusta media móvil y suavizado exponencial a cada fila de `matriz`
+    (series x días). Retorna (pronostico, metodo, error): unidades por día,
+    método elegido (True = suavizado) y su error absoluto medio a un paso.
+    """
+    import numpy as np
+
+    series, dias = matriz.shape
+    m = max(1, min(dias_media, dias - 1))
+
+    # Media móvil de los m días previos a cada día t >= m
+    acumulado = np.concatenate([np.zeros((series, 1)), np.cumsum(matriz, axis=1)], axis=1)
+    media = (acumulado[:, m:dias] - acumulado[:, :dias - m]) / m
+
+    # Suavizado exponencial: recorre los días, vectorial sobre todas las series
+    nivel = matriz[:, :m].mean(axis=1)
+    suavizado = np.empty((series, dias - m))
+    for t in range(m, dias):
+        suavizado[:, t - m] = nivel
+        nivel = alfa * matriz[:, t] + (1 - alfa) * nivel
+
+    real = matriz[:, m:]
+    error_media = np.abs(media - real).mean(axis=1)
+    error_suavizado = np.abs(suavizado - real).mean(axis=1)
+
+    usar_suavizado = error_suavizado < error_media
+    pronostico = np.where(usar_suavizado, nivel, matriz[:, -m:].mean(axis=1))
+    error = np.where(usar_suavizado, error_suavizado, error_media)
+    return pronostico, usar_suavizado, error
+
+
+def _matriz_lote(cursor, autos: Tuple[int, int], inicio: datetime, dias: int):
+    """Series (auto, provincia, distrito) del rango de autos y su matriz series x días"""
+    import numpy as np
+
+    cursor.execute('''
+        SELECT auto_id, sucursal_provincia, sucursal_distrito, fecha, unidades
+        FROM ventas_diarias
+        WHERE auto_id >= ? AND auto_id <= ? AND fecha >= ? AND fecha < ?
+    ''', (autos[0], autos[1], inicio.date().isoformat(), (inicio + timedelta(days=dias)).date().isoformat()))
+    filas = cursor.fetchall()
+
+    series: Dict[Tuple, int] = {}
+    indices = [series.setdefault((auto_id, provincia, distrito), len(series))
+               for auto_id, provincia, distrito, _, _ in filas]
+    matriz = np.zeros((len(series), dias))
+    if filas:
+        fechas = np.array([str(fila[3])[:10] for fila in filas], dtype="datetime64[D]")
+        offsets = (fechas - np.datetime64(inicio.date(), "D")).astype(np.int64)
+        np.add.at(matriz, (np.array(indices), offsets), np.array([fila[4] for fila in filas], dtype=np.float64))
+    return list(series), matriz
+
+
+def _rangos_autos(cursor) -> List[Tuple[int, int]]:
+    cursor.execute("SELECT id FROM autos_disponibles ORDER BY id")
+    ids = [fila[0] for fila in cursor.fetchall()]
+    lote = max(settings.PRONOSTICO_LOTE_AUTOS, 1)
+    return [(ids[i], ids[min(i + lote, len(ids)) - 1]) for i in range(0, len(ids), lote)]
+
+
+def calcular_pronosticos(progreso: Optional[Callable[[float, str], None]] = None) -> Dict:
+    """Recalcula pronostico_demanda para todas las series con ventas en la ventana"""
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dias = max(settings.PRONOSTICO_VENTANA_DIAS, 2)
+    inicio = hoy - timedelta(days=dias)
+    generado_at = datetime.now()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    total_series = 0
+
+    try:
+        rangos = _rangos_autos(cursor)
+        for n, (primero, ultimo) in enumerate(rangos):
+            series, matriz = _matriz_lote(cursor, (primero, ultimo), inicio, dias)
+
+            filas = []
+            if series:
+                pronostico, usar_suavizado, error = ajustar_series(
+                    matriz, settings.PRONOSTICO_MEDIA_MOVIL_DIAS, settings.PRONOSTICO_ALFA
+                )
+                filas = [
+                    (auto_id, provincia, distrito, round(demanda, 4),
+                     SUAVIZADO if suavizado else MEDIA_MOVIL, round(mae, 4), generado_at)
+                    for (auto_id, provincia, distrito), demanda, suavizado, mae
+                    in zip(series, pronostico.tolist(), usar_suavizado.tolist(), error.tolist())
+                ]
+
+            # Reemplazo por rango de autos en una transacción: quien consulta
+            # ve el pronóstico anterior o el nuevo, nunca uno a medias
+            cursor.execute(
+                "DELETE FROM pronostico_demanda WHERE auto_id >= ? AND auto_id <= ?", (primero, ultimo)
+            )
+            if filas:
+                cursor.executemany('''
+                    INSERT INTO pronostico_demanda (
+                        auto_id, sucursal_provincia, sucursal_distrito,
+                        demanda_diaria, metodo, error_medio, generado_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', filas)
+            conn.commit()
+
+            total_series += len(filas)
+            if progreso:
+                progreso(50 + (n + 1) * 50 / len(rangos), f"{total_series} series pronosticadas")
+
+        return {"series": total_series, "ventana_dias": dias, "desde": inicio.date().isoformat()}
+
+    except Exception as e:
+        conn.rollback()
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al calcular pronósticos: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+# ============================================
+# CONSULTA
+# ============================================
+
+def _recomendacion(auto: Dict) -> Dict:
+    cobertura = settings.PRONOSTICO_HORIZONTE_DIAS + settings.PRONOSTICO_STOCK_SEGURIDAD_DIAS
+    demanda = auto["demanda_diaria"]
+    auto["demanda_diaria"] = round(demanda, 3)
+    auto["demanda_horizonte"] = round(demanda * settings.PRONOSTICO_HORIZONTE_DIAS, 1)
+    auto["dias_stock"] = round(auto["stock"] / demanda, 1) if demanda > 0 else None
+    auto["reponer"] = max(math.ceil(demanda * cobertura - auto["stock"]), 0)
+    return auto
+
+
+def get_reposicion(
+    provincia: Optional[str] = None,
+    distrito: Optional[str] = None,
+    top: int = 50
+) -> Dict:
+    """
+    Autos con demanda pronosticada, del más urgente (menos días de stock) al
+    menos urgente, con la demanda por sucursal. Con provincia/distrito solo
+    incluye los autos que se venden en esa sucursal y su desglose.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT p.auto_id, a.marca, a.modelo, a.anio, a.stock,
+                   p.sucursal_provincia, p.sucursal_distrito,
+                   p.demanda_diaria, p.metodo, p.error_medio, p.generado_at
+            FROM pronostico_demanda p
+            JOIN autos_disponibles a ON a.id = p.auto_id
+            WHERE a.is_active = 1
+        ''')
+        filas = PRONOSTICO.todas(cursor)
+
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al obtener pronósticos: {e}")
+        filas = []
+    finally:
+        conn.close()
+
+    autos: Dict[int, Dict] = {}
+    for fila in filas:
+        auto = autos.setdefault(fila.auto_id, {
+            "auto_id": fila.auto_id,
+            "descripcion": f"{fila.marca} {fila.modelo} {fila.anio}",
+            "stock": fila.stock,
+            "demanda_diaria": 0.0,
+            "sucursales": [],
+        })
+        auto["demanda_diaria"] += fila.demanda_diaria
+        if (provincia is None or fila.sucursal_provincia == provincia) and \
+                (distrito is None or fila.sucursal_distrito == distrito):
+            auto["sucursales"].append({
+                "provincia": fila.sucursal_provincia,
+                "distrito": fila.sucursal_distrito,
+                "demanda_diaria": round(fila.demanda_diaria, 3),
+                "metodo": fila.metodo,
+                "error_medio": fila.error_medio,
+            })
+
+    recomendaciones = [_recomendacion(auto) for auto in autos.values() if auto["sucursales"]]
+    recomendaciones.sort(key=lambda a: (a["dias_stock"] is None, a["dias_stock"] or 0, -a["demanda_diaria"]))
+
+    return {
+        "generado_at": max((f.generado_at for f in filas), default=None),
+        "horizonte_dias": settings.PRONOSTICO_HORIZONTE_DIAS,
+        "stock_seguridad_dias": settings.PRONOSTICO_STOCK_SEGURIDAD_DIAS,
+        "total": len(recomendaciones),
+        "por_reponer": sum(1 for a in recomendaciones if a["reponer"] > 0),
+        "autos": recomendaciones[:top],
+    }
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+Rankings de vendedores por sucursal y periodo (mes, año e histórico).
+
+Cada worker mantiene en memoria una `Leaderboard` por sucursal y periodo.
+Se reconstruyen al iniciar desde `registro_venta` y los totales de los meses
+archivados, y luego se actualizan con cada venta: `registrar_venta` publica
+la venta en el canal "ranking" del estado compartido y cada worker aplica
+los eventos pendientes antes de responder, así todos ven las ventas de
+todos. Si un worker se atrasó más
+de lo que conserva el canal, reconstruye desde la base.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.database import clave_sucursal, db_manager, get_db_connection
+from app.services import archivo_service
+from app.utils.leaderboard import Leaderboard
+from app.utils.montos import parse_monto
+from app.utils.shared_state import get_estado
+
+logger = logging.getLogger(__name__)
+
+CANAL = "ranking"
+PERIODOS = ("mes", "anio", "historico")
+LOTE_RECONSTRUCCION = 1000
+
+_lock = threading.Lock()
+_tablas: Dict[Tuple[str, str, str, str], Leaderboard] = {}
+_secuencia = 0
+# Por base de ventas: las ventas con id <= tope ya están en las tablas (se
+# ignoran sus eventos)
+_topes: Dict[str, int] = {}
+_construido = False
+
+
+def periodos_de(fecha) -> Dict[str, str]:
+    """Clave de cada periodo para una fecha (datetime o texto ISO de SQLite)"""
+    texto = str(fecha)
+    return {"mes": texto[:7], "anio": texto[:4], "historico": "*"}
+
+
+def _periodos_vigentes() -> Dict[str, str]:
+    return periodos_de(datetime.now())
+
+
+def _sumar(venta: Dict, vigentes: Dict[str, str]):
+    for periodo, clave in periodos_de(venta["fecha_venta"]).items():
+        # Solo se mantienen los periodos en curso
+        if clave != vigentes[periodo]:
+            continue
+        clave_tabla = (venta["sucursal_provincia"], venta["sucursal_distrito"], periodo, clave)
+        if clave_tabla not in _tablas:
+            _tablas[clave_tabla] = Leaderboard()
+        _tablas[clave_tabla].sumar(
+            venta["vendedor_id"],
+            venta["nombre_vendedor"],
+            venta.get("unidades", 1),
+            venta["monto"] if "monto" in venta else parse_monto(venta["monto_fisco"])
+        )
+
+
+def _descartar_periodos_cerrados(vigentes: Dict[str, str]):
+    for clave in [c for c in _tablas if c[3] != vigentes[c[2]]]:
+        del _tablas[clave]
+
+
+def _base(provincia: Optional[str]) -> str:
+    """Base de ventas de la provincia ("" sin sharding: una sola base)"""
+    return clave_sucursal(provincia) if db_manager.sharding and provincia else ""
+
+
+def _sumar_resumen(resumenes: List[Dict], vigentes: Dict[str, str]) -> int:
+    for resumen in resumenes:
+        _sumar({**resumen, "fecha_venta": resumen["mes"]}, vigentes)
+    return sum(resumen["unidades"] for resumen in resumenes)
+
+
+def _leer_base(provincia: Optional[str], vigentes: Dict[str, str]) -> Tuple[int, int]:
+    """Suma las ventas de una base de ventas; retorna (tope, ventas)"""
+    conn = get_db_connection(provincia)
+    cursor = conn.cursor()
+
+    try:
+        # Ventas calientes y totales archivados en la misma lectura, para
+        # no contar dos veces (ni perder) un mes que se archiva mientras tanto
+        if db_manager.db_type == "sqlite":
+            cursor.execute("BEGIN")
+
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM registro_venta")
+        tope = cursor.fetchone()[0]
+
+        cursor.execute('''
+            SELECT id, fecha_venta, vendedor_id, nombre_vendedor,
+                   sucursal_provincia, sucursal_distrito, monto_fisco
+            FROM registro_venta
+            WHERE id <= ?
+        ''', (tope,))
+
+        columnas = [c[0] for c in cursor.description]
+        ventas = 0
+        while True:
+            filas = cursor.fetchmany(LOTE_RECONSTRUCCION)
+            if not filas:
+                break
+            for fila in filas:
+                _sumar(dict(zip(columnas, fila)), vigentes)
+            ventas += len(filas)
+
+        # Meses archivados: totales por vendedor, sin recorrer el archivo.
+        # Con sharding, solo los de las provincias de esta base
+        base = _base(provincia)
+        ventas += _sumar_resumen(
+            [r for r in archivo_service.resumen_mensual(cursor) if _base(r["sucursal_provincia"]) == base],
+            vigentes
+        )
+        return tope, ventas
+
+    finally:
+        conn.close()
+
+
+def reconstruir():
+    """Recalcula todas las tablas desde la base de datos (con sharding, una base de ventas a la vez)"""
+    global _secuencia, _topes, _construido
+
+    estado = get_estado()
+
+    try:
+        with _lock:
+            # La secuencia se toma antes de leer: los eventos posteriores que
+            # ya estén en la lectura se descartan por id
+            secuencia = estado.ultima_secuencia(CANAL)
+
+            vigentes = _periodos_vigentes()
+            _tablas.clear()
+            topes: Dict[str, int] = {}
+            ventas = 0
+            for provincia in db_manager.bases_ventas():
+                topes[_base(provincia)], leidas = _leer_base(provincia, vigentes)
+                ventas += leidas
+
+            if db_manager.sharding:
+                # Provincias con meses archivados pero sin base de ventas
+                # (no vendieron desde que se activó el sharding)
+                ventas += _sumar_resumen(
+                    [r for r in archivo_service.resumen_mensual() if _base(r["sucursal_provincia"]) not in topes],
+                    vigentes
+                )
+
+            _secuencia, _topes, _construido = secuencia, topes, True
+            logger.info(f"🏆 Rankings reconstruidos: {ventas} ventas, {len(_tablas)} tablas")
+
+    except Exception as e:
+        logger.error(f"❌ Error al reconstruir rankings: {e}")
+
+
+def _sincronizar():
+    """Aplica los eventos de venta publicados desde la última sincronización"""
+    global _secuencia
+
+    if not _construido:
+        reconstruir()
+        return
+
+    estado = get_estado()
+    with _lock:
+        eventos = estado.leer(CANAL, _secuencia)
+        if eventos and eventos[0][0] > _secuencia + 1:
+            motivo = "Eventos de ranking perdidos"
+        elif not eventos and estado.ultima_secuencia(CANAL) < _secuencia:
+            # El canal volvió a empezar (Redis vaciado o reiniciado, archivo
+            # de /dev/shm recreado): leer desde _secuencia no traería nada nunca
+            motivo = "El canal de ranking se reinició"
+        else:
+            motivo = None
+            vigentes = _periodos_vigentes()
+            _descartar_periodos_cerrados(vigentes)
+            for secuencia, mensaje in eventos:
+                venta = json.loads(mensaje)
+                if venta["id"] > _topes.get(_base(venta["sucursal_provincia"]), 0):
+                    _sumar(venta, vigentes)
+                _secuencia = secuencia
+
+    if motivo:
+        logger.warning(f"⚠️ {motivo}, reconstruyendo desde la base")
+        reconstruir()
+
+
+def registrar_venta(venta: Dict):
+    """Publica una venta confirmada para que todos los workers la sumen"""
+    try:
+        get_estado().publicar(CANAL, json.dumps(venta, ensure_ascii=False, default=str))
+    except Exception as e:
+        logger.error(f"❌ Error al publicar venta en rankings: {e}")
+
+
+def get_ranking(
+    provincia: str,
+    distrito: str,
+    periodo: str = "mes",
+    criterio: str = "unidades",
+    top: int = 10,
+    vendedor_id: Optional[int] = None
+) -> Dict:
+    """Top-N de la sucursal y, si se indica, el puesto del vendedor"""
+    _sincronizar()
+    clave = _periodos_vigentes()[periodo]
+
+    with _lock:
+        tabla = _tablas.get((provincia, distrito, periodo, clave)) or Leaderboard()
+        return {
+            "sucursal_provincia": provincia,
+            "sucursal_distrito": distrito,
+            "periodo": periodo,
+            "clave_periodo": clave,
+            "criterio": criterio,
+            "total_vendedores": len(tabla),
+            "vendedores": tabla.top(top, criterio),
+            "yo": tabla.fila(vendedor_id, criterio) if vendedor_id is not None else None
+        }
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+Refresh tokens para renovar el access token sin volver a pedir la contraseña.
+
+El refresh token es opaco: `<id>.<secreto>`. En la base solo se guarda el id
+y una huella SHA-256 corta del secreto, así que renovar cuesta una búsqueda
+por clave primaria y un hash barato (nada de bcrypt ni verificación de
+contraseña).
+
+Cada renovación rota el token. El anterior queda marcado como usado y el
+nuevo hereda la familia de la sesión. Si un token ya usado vuelve a
+presentarse fuera del margen REFRESH_TOKEN_REUSE_GRACE_SECONDS, se asume
+robado y se revoca toda la familia. El margen existe porque dos pestañas
+pueden renovar a la vez.
+
+La sesión se extiende mientras haya actividad: cada token vence a las
+REFRESH_TOKEN_IDLE_HOURS. Nunca pasa de REFRESH_TOKEN_MAX_DAYS desde el
+login.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import get_db_connection, relanzar_si_transitorio
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenInvalidoError(Exception):
+    """Refresh token inexistente, vencido, revocado o ya usado"""
+
+
+def _huella(secreto: str) -> str:
+    return hashlib.sha256(secreto.encode()).hexdigest()[:32]
+
+
+def _fecha(valor) -> datetime:
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor))
+
+
+def _insertar(cursor, vendedor_id: int, familia: str, familia_expira: datetime, ahora: datetime) -> str:
+    token_id = secrets.token_urlsafe(16)
+    secreto = secrets.token_urlsafe(32)
+    expira = min(ahora + timedelta(hours=settings.REFRESH_TOKEN_IDLE_HOURS), familia_expira)
+
+    cursor.execute('''
+        INSERT INTO refresh_tokens (id, huella, familia, vendedor_id, expira, familia_expira)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (token_id, _huella(secreto), familia, vendedor_id, expira, familia_expira))
+
+    return f"{token_id}.{secreto}"
+
+
+def emitir_refresh(vendedor_id: int) -> str:
+    """Crea el refresh token de una sesión nueva (login)"""
+    ahora = datetime.now()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        token = _insertar(
+            cursor,
+            vendedor_id,
+            secrets.token_urlsafe(16),
+            ahora + timedelta(days=settings.REFRESH_TOKEN_MAX_DAYS),
+            ahora
+        )
+        conn.commit()
+        return token
+
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _revocar_familia(cursor, familia: str):
+    cursor.execute('UPDATE refresh_tokens SET revocado = 1 WHERE familia = ?', (familia,))
+
+
+def rotar_refresh(token: str) -> Dict:
+    """
+    Valida el refresh token y lo reemplaza por uno nuevo de la misma familia.
+    Retorna {"vendedor_id", "username", "refresh_token"}; lanza
+    RefreshTokenInvalidoError si no se puede renovar.
+    """
+    token_id, _, secreto = (token or "").partition(".")
+    if not token_id or not secreto:
+        raise RefreshTokenInvalidoError("Refresh token inválido")
+
+    ahora = datetime.now()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT rt.huella, rt.familia, rt.vendedor_id, rt.expira, rt.familia_expira,
+                   rt.usado_at, rt.revocado, v.username, v.is_active
+            FROM refresh_tokens rt
+            JOIN vendedores v ON v.id = rt.vendedor_id
+            WHERE rt.id = ?
+        ''', (token_id,))
+        row = cursor.fetchone()
+
+        if not row or not hmac.compare_digest(row[0], _huella(secreto)):
+            raise RefreshTokenInvalidoError("Refresh token inválido")
+
+        _, familia, vendedor_id, expira, familia_expira, usado_at, revocado, username, is_active = row
+
+        if revocado or not is_active or _fecha(expira) <= ahora:
+            raise RefreshTokenInvalidoError("La sesión expiró o fue cerrada")
+
+        if usado_at is not None:
+            if ahora - _fecha(usado_at) > timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+                _revocar_familia(cursor, familia)
+                conn.commit()
+                logger.warning(f"🚨 Reuso de refresh token del usuario {username}: sesión revocada")
+            raise RefreshTokenInvalidoError("El refresh token ya fue usado")
+
+        # Solo una renovación concurrente gana la rotación
+        cursor.execute('''
+            UPDATE refresh_tokens SET usado_at = ?
+            WHERE id = ? AND usado_at IS NULL
+        ''', (ahora, token_id))
+        if cursor.rowcount != 1:
+            conn.rollback()
+            raise RefreshTokenInvalidoError("El refresh token ya fue usado")
+
+        nuevo = _insertar(cursor, vendedor_id, familia, _fecha(familia_expira), ahora)
+        conn.commit()
+
+        return {"vendedor_id": vendedor_id, "username": username, "refresh_token": nuevo}
+
+    except RefreshTokenInvalidoError:
+        raise
+    except Exception as e:
+        conn.rollback()
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al renovar sesión: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def revocar_sesion(token: str, vendedor_id: Optional[int] = None) -> bool:
+    """Revoca la familia del refresh token (logout); ignora tokens inválidos o ajenos"""
+    token_id, _, secreto = (token or "").partition(".")
+    if not token_id or not secreto:
+        return False
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT huella, familia, vendedor_id FROM refresh_tokens WHERE id = ?', (token_id,))
+        row = cursor.fetchone()
+        if (
+            not row
+            or not hmac.compare_digest(row[0], _huella(secreto))
+            or (vendedor_id is not None and row[2] != vendedor_id)
+        ):
+            return False
+
+        _revocar_familia(cursor, row[1])
+        conn.commit()
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Error al revocar sesión: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
+def purgar_refresh_expirados() -> int:
+    """Elimina los refresh tokens vencidos (los usados se conservan hasta vencer para detectar reuso)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM refresh_tokens WHERE expira < ?', (datetime.now(),))
+        eliminados = cursor.rowcount
+        conn.commit()
+        if eliminados:
+            logger.info(f"🧹 Eliminados {eliminados} refresh tokens vencidos")
+        return eliminados
+
+    except Exception as e:
+        logger.error(f"❌ Error al purgar refresh tokens: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
\ No newline at end of file
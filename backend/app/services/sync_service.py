@@ -0,0 +1,274 @@
+"""
+Sincronización incremental para clientes de sucursal con conexión inestable.
+
+El cliente guarda el catálogo y sus ventas y envía su vector de versiones:
+
+- `catalogo`: cursor del registro de cambios (cdc_service) hasta el que
+  tiene el catálogo al día
+- `ventas`: id de la última venta propia que recibió
+
+La respuesta trae solo lo que cambió desde esas versiones: los autos con
+cambios (una fila por auto con su estado actual, aunque haya cambiado
+varias veces) y las ventas nuevas del vendedor. El trabajo del servidor
+depende de la cantidad de cambios, no del tamaño del catálogo ni del
+historial. Las filas van como listas con los nombres de columna una sola
+vez por respuesta.
+
+Sin versión (primera sincronización), o con un cursor ya purgado del registro de cambios, el catálogo
+se envía completo (`completo: true`) y el cliente lo reemplaza.
+
+Las ventas registradas sin conexión llegan en el mismo request y se
+resuelven antes de calcular el delta, así que su venta y el nuevo stock
+ya vienen en la respuesta. El `id_local` de cada venta es su clave de
+idempotencia (la misma que el Idempotency-Key de /venta/registrar):
+reenviarla nunca la duplica. Si el auto se quedó sin stock
+mientras el cliente estaba desconectado, gana el servidor. La venta se
+rechaza y el cliente recibe el stock actual del auto.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.database import db_manager, get_db_connection, relanzar_si_transitorio
+from app.services import venta_service
+from app.services.cdc_service import AUTO, purgado_hasta, ultimo_confirmado
+from app.services.consolidacion_service import consolidar_sucursal
+from app.services.idempotencia_service import (
+    ClaveIdempotenciaConflictoError,
+    ClaveIdempotenciaDuplicadaError,
+    ejecutar_idempotente,
+    huella_payload
+)
+from app.services.venta_service import VENTA_VENDEDOR, StockInsuficienteError
+
+logger = logging.getLogger(__name__)
+
+CATALOGO_COLUMNAS = ("id", "marca", "modelo", "anio", "precio_referencial", "stock")
+VENTAS_COLUMNAS = VENTA_VENDEDOR.campos
+
+REGISTRADA = "registrada"
+DUPLICADA = "duplicada"
+RECHAZADA = "rechazada"
+ERROR = "error"
+
+_SELECT_VENTAS = '''
+    SELECT
+        rv.id,
+        rv.fecha_venta,
+        rv.monto_fisco,
+        rv.nombre_comprador,
+        rv.dni_comprador,
+        rv.contacto_comprador,
+        a.marca || ' ' || a.modelo || ' ' || a.anio AS auto,
+        rv.tipo_compra,
+        rv.sucursal_provincia,
+        rv.sucursal_distrito
+    FROM registro_venta rv
+    JOIN autos_disponibles a ON rv.auto_id = a.id
+'''
+
+
+# ============================================
+# VENTAS SIN CONEXIÓN
+# ============================================
+
+def fecha_offline(registrada_en: Optional[datetime], ahora: datetime) -> datetime:
+    """
+    Hora original de una venta sin conexión. Si falta, está en el futuro o
+    es más antigua que SYNC_OFFLINE_MAX_HOURS (reloj del equipo desfasado),
+    se usa la hora de llegada.
+    """
+    if registrada_en is None:
+        return ahora
+    registrada_en = registrada_en.replace(tzinfo=None)
+    if registrada_en > ahora or ahora - registrada_en > timedelta(hours=settings.SYNC_OFFLINE_MAX_HOURS):
+        return ahora
+    return registrada_en
+
+
+def registrar_ventas_offline(user, ventas: Iterable[Dict]) -> List[Dict]:
+    """Registra las ventas hechas sin conexión, en orden; retorna el resultado de cada una"""
+    resultados = []
+    ahora = datetime.now()
+
+    for venta in ventas:
+        datos = {k: v for k, v in venta.items() if k not in ("id_local", "registrada_en")}
+        # Misma huella que /venta/registrar: una venta que llegó al servidor
+        # pero cuya respuesta se perdió se reconoce como duplicada
+        huella = huella_payload(datos)
+        resultado = {"id_local": venta["id_local"], "estado": REGISTRADA, "venta_id": None}
+
+        def registrar():
+            return venta_service.registrar_venta(
+                vendedor_id=user["id"],
+                sucursal_provincia=user["sucursal_provincia"],
+                sucursal_distrito=user["sucursal_distrito"],
+                nombre_vendedor=user["full_name"],
+                clave_idempotencia=venta["id_local"],
+                huella_idempotencia=huella,
+                fecha_venta=fecha_offline(venta.get("registrada_en"), ahora),
+                **datos
+            )
+
+        try:
+            venta_id, replay = ejecutar_idempotente(
+                user["id"], venta["id_local"], huella, registrar, user["sucursal_provincia"]
+            )
+            resultado["venta_id"] = venta_id
+            if replay:
+                resultado["estado"] = DUPLICADA
+            elif not venta_id:
+                resultado.update(estado=ERROR, motivo="No se pudo registrar; reintente en la próxima sincronización")
+        except StockInsuficienteError:
+            resultado.update(estado=RECHAZADA, motivo="sin_stock")
+        except ClaveIdempotenciaConflictoError:
+            resultado.update(estado=RECHAZADA, motivo="id_local_reutilizado")
+        except ClaveIdempotenciaDuplicadaError:
+            # Otra sincronización la está registrando; la próxima recibe su venta_id
+            resultado.update(estado=ERROR, motivo="En proceso en otra sincronización; reintente")
+        except Exception as e:
+            # Una venta que falla no debe impedir sincronizar las demás: el
+            # cliente la conserva y la reenvía en la próxima sincronización
+            logger.error(f"❌ Error al registrar la venta sin conexión {venta['id_local']}: {e}")
+            resultado.update(estado=ERROR, motivo="No se pudo registrar; reintente en la próxima sincronización")
+
+        if resultado["estado"] != REGISTRADA:
+            logger.info(f"🔁 Venta sin conexión {venta['id_local']}: {resultado['estado']} ({resultado.get('motivo', '-')})")
+        resultados.append(resultado)
+
+    return resultados
+
+
+# ============================================
+# DELTAS
+# ============================================
+
+def _catalogo_completo(cursor) -> Tuple[List[list], List[int]]:
+    cursor.execute(f'''
+        SELECT {", ".join(CATALOGO_COLUMNAS)}
+        FROM autos_disponibles
+        WHERE is_active = 1 AND stock > 0
+        ORDER BY anio DESC, marca, modelo
+    ''')
+    return [list(fila) for fila in cursor.fetchall()], []
+
+
+def _catalogo_delta(cursor, desde: int, hasta: int) -> Tuple[List[list], List[int]]:
+    """Estado actual de los autos con cambios en (desde, hasta]; los que ya no se venden van en eliminados"""
+    # Recorre el rango por la clave primaria; los repetidos se descartan acá
+    cursor.execute('''
+        SELECT clave FROM cambios
+        WHERE id > ? AND id <= ? AND entidad = ?
+    ''', (desde, hasta, AUTO))
+    ids = list(dict.fromkeys(int(fila[0]) for fila in cursor.fetchall()))
+
+    filas, eliminados = [], set(ids)
+    lote = 500
+    for i in range(0, len(ids), lote):
+        grupo = ids[i:i + lote]
+        cursor.execute(f'''
+            SELECT {", ".join(CATALOGO_COLUMNAS)}
+            FROM autos_disponibles
+            WHERE id IN ({", ".join("?" * len(grupo))}) AND is_active = 1 AND stock > 0
+        ''', tuple(grupo))
+        for fila in cursor.fetchall():
+            filas.append(list(fila))
+            eliminados.discard(fila[0])
+    return filas, sorted(eliminados)
+
+
+def _ventas_delta(cursor, vendedor_id: int, desde: Optional[int]) -> Tuple[List[list], bool]:
+    limite = settings.SYNC_MAX_VENTAS
+    if desde is not None:
+        cursor.execute(_SELECT_VENTAS + '''
+            WHERE rv.vendedor_id = ? AND rv.id > ?
+            ORDER BY rv.id
+            LIMIT ?
+        ''', (vendedor_id, desde, limite + 1))
+        filas = [list(fila) for fila in cursor.fetchall()]
+    else:
+        # Primera sincronización: solo las más recientes (el historial está en mis-ventas)
+        cursor.execute(_SELECT_VENTAS + '''
+            WHERE rv.vendedor_id = ?
+            ORDER BY rv.id DESC
+            LIMIT ?
+        ''', (vendedor_id, settings.SYNC_VENTAS_INICIALES))
+        filas = [list(fila) for fila in reversed(cursor.fetchall())]
+        return filas, False
+
+    hay_mas = len(filas) > limite
+    return filas[:limite], hay_mas
+
+
+def sincronizar(user, version: Dict[str, Optional[int]], ventas_offline: Iterable[Dict] = ()) -> Dict:
+    """
+    Registra las ventas sin conexión y retorna los cambios desde `version`
+    ({"catalogo": cursor, "ventas": id}; None si el cliente aún no tiene datos).
+    """
+    resultados = registrar_ventas_offline(user, ventas_offline) if ventas_offline else []
+    if resultados and db_manager.sharding:
+        # Así el nuevo stock de las ventas recién registradas ya viene en la respuesta
+        try:
+            consolidar_sucursal(user["sucursal_provincia"])
+        except Exception as e:
+            # Un error transitorio responde 503: el cliente reenvía y las
+            # ventas ya registradas se reconocen por su clave de idempotencia
+            relanzar_si_transitorio(e)
+            logger.warning(f"⚠️ No se pudo consolidar {user['sucursal_provincia']} al sincronizar "
+                           f"(el stock llega en la próxima sincronización): {e}")
+
+    desde_catalogo = version.get("catalogo")
+    desde_ventas = version.get("ventas")
+
+    # El catálogo y el registro de cambios están en la central; con sharding,
+    # las ventas del vendedor en la base de su sucursal
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    conn_ventas = None
+
+    try:
+        # El cursor se toma antes de leer los autos: un cambio posterior puede
+        # llegar dos veces (ya aplicado), pero nunca perderse
+        hasta = ultimo_confirmado(cursor)
+        completo = (
+            desde_catalogo is None
+            or desde_catalogo < purgado_hasta(cursor)
+            or desde_catalogo > hasta
+        )
+        if completo:
+            autos, eliminados = _catalogo_completo(cursor)
+        else:
+            autos, eliminados = _catalogo_delta(cursor, desde_catalogo, hasta)
+
+        if db_manager.sharding:
+            conn_ventas = get_db_connection(user["sucursal_provincia"])
+        ventas, hay_mas = _ventas_delta((conn_ventas or conn).cursor(), user["id"], desde_ventas)
+
+    except Exception as e:
+        relanzar_si_transitorio(e)
+        logger.error(f"❌ Error al sincronizar: {e}")
+        raise
+    finally:
+        conn.close()
+        if conn_ventas is not None:
+            conn_ventas.close()
+
+    return {
+        "version": {
+            "catalogo": hasta,
+            "ventas": ventas[-1][0] if ventas else (desde_ventas or 0),
+        },
+        "catalogo": {
+            "completo": completo,
+            "columnas": CATALOGO_COLUMNAS,
+            "filas": autos,
+            "eliminados": eliminados,
+        },
+        "ventas": {
+            "columnas": VENTAS_COLUMNAS,
+            "filas": ventas,
+            "hay_mas": hay_mas,
+        },
+        "ventas_offline": resultados,
+    }
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Tareas que se pueden encolar como trabajos en segundo plano.
+
+Importar este módulo registra las tareas en trabajo_service; lo hacen el
+ejecutor de trabajos y los endpoints que encolan.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List
+
+from app.config import settings
+from app.services import archivo_service, venta_service
+from app.services.export_service import generar_csv, generar_parquet
+from app.services.trabajo_service import ContextoTrabajo, tarea
+
+logger = logging.getLogger(__name__)
+
+
+def _con_progreso(
+    lotes: Iterable[List[tuple]], total: int, ctx: ContextoTrabajo, conteo: Dict
+) -> Iterator[List[tuple]]:
+    for lote in lotes:
+        conteo["filas"] += len(lote)
+        ctx.progreso(min(conteo["filas"] * 100 / total, 99) if total else 99, f"{conteo['filas']}/{total} ventas")
+        yield lote
+
+
+@tarea("exportar_ventas")
+def exportar_ventas(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Genera el export de ventas en un archivo en JOBS_OUTPUT_DIR"""
+    formato = parametros.get("formato", "csv")
+    provincia = parametros["provincia"]
+    distrito = parametros.get("distrito")
+    desde = datetime.fromisoformat(parametros["desde"]) if parametros.get("desde") else None
+    hasta = datetime.fromisoformat(parametros["hasta"]) if parametros.get("hasta") else None
+
+    total = venta_service.contar_ventas_export(provincia, distrito, desde, hasta)
+    ctx.progreso(0, f"0/{total} ventas")
+
+    conteo = {"filas": 0}
+    lotes = _con_progreso(
+        venta_service.iter_ventas_export(provincia, distrito, desde, hasta, batch_size=settings.EXPORT_BATCH_SIZE),
+        total,
+        ctx,
+        conteo
+    )
+    if formato == "parquet":
+        contenido = generar_parquet(venta_service.EXPORT_COLUMNAS, lotes)
+    else:
+        contenido = generar_csv(venta_service.EXPORT_COLUMNAS, lotes)
+
+    os.makedirs(settings.jobs_output_dir, exist_ok=True)
+    archivo = os.path.join(settings.jobs_output_dir, f"trabajo_{ctx.id}.{formato}")
+    parcial = f"{archivo}.parcial"
+
+    # Se escribe aparte y se renombra: un reintento nunca deja un archivo a medias
+    with open(parcial, "wb") as salida:
+        for parte in contenido:
+            salida.write(parte)
+    os.replace(parcial, archivo)
+
+    return {
+        "archivo": archivo,
+        "nombre": parametros.get("nombre", f"ventas.{formato}"),
+        "formato": formato,
+        "filas": conteo["filas"],
+        "bytes": os.path.getsize(archivo)
+    }
+
+
+@tarea("inicializar_base")
+def inicializar_base(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Crea/actualiza el esquema e inserta los datos iniciales que falten"""
+    from app.database import init_database, seed_initial_data
+
+    ctx.progreso(0, "Creando tablas")
+    init_database()
+    ctx.progreso(50, "Insertando datos iniciales")
+    seed_initial_data()
+    return {"mensaje": "Base de datos inicializada"}
+
+
+@tarea("purgar_idempotencia", cada_segundos=3600)
+def purgar_idempotencia(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Elimina las claves de idempotencia expiradas"""
+    from app.services.idempotencia_service import purgar_claves_expiradas
+
+    return {"eliminadas": purgar_claves_expiradas()}
+
+
+@tarea("purgar_refresh_tokens", cada_segundos=6 * 3600)
+def purgar_refresh_tokens(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Elimina los refresh tokens vencidos"""
+    from app.services.sesion_service import purgar_refresh_expirados
+
+    return {"eliminados": purgar_refresh_expirados()}
+
+
+@tarea("purgar_cambios", cada_segundos=24 * 3600)
+def purgar_cambios(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Elimina los cambios de /cdc/changes más antiguos que CDC_RETENTION_DAYS"""
+    from app.services.cdc_service import purgar_cambios as purgar
+
+    return {"eliminados": purgar(parametros.get("dias"))}
+
+
+@tarea("archivar_ventas", cada_segundos=settings.ARCHIVE_INTERVAL_HOURS * 3600 if settings.ARCHIVE_ENABLED else None)
+def archivar_ventas(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Mueve al archivo los meses anteriores a los ARCHIVE_HOT_MONTHS recientes"""
+    meses = archivo_service.archivar_meses_frios(ctx.progreso)
+    return {
+        "meses": [m["mes"] for m in meses],
+        "ventas_movidas": sum(m["movidas"] for m in meses)
+    }
+
+
+@tarea("pronosticar_demanda", cada_segundos=settings.PRONOSTICO_INTERVAL_HOURS * 3600 if settings.PRONOSTICO_ENABLED else None)
+def pronosticar_demanda(parametros: Dict, ctx: ContextoTrabajo) -> Dict:
+    """Agrega las ventas nuevas por día y recalcula el pronóstico de demanda"""
+    from app.services import pronostico_service
+
+    agregado = pronostico_service.actualizar_ventas_diarias(ctx.progreso)
+    pronostico = pronostico_service.calcular_pronosticos(ctx.progreso)
+    return {**agregado, **pronostico}
\ No newline at end of file
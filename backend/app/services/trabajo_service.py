@@ -0,0 +1,499 @@
+"""
+Trabajos en segundo plano con cola persistente.
+
+Las tareas pesadas (exports grandes, reinicialización de la base, purgas)
+no se ejecutan dentro del request: el endpoint las encola en la tabla
+`trabajos` y responde de inmediato con el id. Hilos del propio proceso (o
+un proceso aparte con `python -m app.worker`) reclaman los pendientes de a
+uno, reportan progreso y, si fallan, los reprograman con backoff
+exponencial hasta `max_intentos`.
+
+Las tareas se registran con el decorador `@tarea("nombre")` y reciben los
+parámetros del trabajo y un `ContextoTrabajo` para reportar progreso; lo
+que retornan (serializable a JSON) queda como resultado del trabajo.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+from app.database import db_manager, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_FINALES = ("completado", "fallido")
+
+# Segundos mínimos entre escrituras de progreso del mismo trabajo
+INTERVALO_PROGRESO = 1.0
+
+_tareas: Dict[str, Callable] = {}
+# Tareas que el ejecutor encola solo cada tantos segundos
+_periodicas: Dict[str, float] = {}
+
+# Se activa al encolar para que los hilos de este proceso no esperen al
+# siguiente sondeo; los demás procesos lo ven en su próximo sondeo
+hay_trabajo = threading.Event()
+
+
+class TipoTrabajoDesconocidoError(Exception):
+    """No hay una tarea registrada con ese nombre"""
+
+
+def tarea(nombre: str, cada_segundos: Optional[float] = None):
+    """
+    Registra una función como tarea ejecutable en segundo plano. Con
+    `cada_segundos` el ejecutor además la encola periódicamente.
+    """
+    def decorador(fn: Callable) -> Callable:
+        _tareas[nombre] = fn
+        if cada_segundos:
+            _periodicas[nombre] = cada_segundos
+        return fn
+    return decorador
+
+
+def tareas_registradas() -> List[str]:
+    return sorted(_tareas)
+
+
+def _a_dict(cursor, fila) -> Dict:
+    trabajo = dict(zip([c[0] for c in cursor.description], fila))
+    trabajo["parametros"] = json.loads(trabajo["parametros"] or "{}")
+    if "resultado" in trabajo:
+        trabajo["resultado"] = json.loads(trabajo["resultado"]) if trabajo["resultado"] else None
+    return trabajo
+
+
+def calcular_backoff(intentos: int) -> float:
+    """Espera antes del siguiente intento: exponencial con jitter, con tope"""
+    espera = min(settings.JOBS_BACKOFF_SECONDS * 2 ** (intentos - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+    return random.uniform(espera / 2, espera)
+
+
+def encolar(
+    tipo: str,
+    parametros: Optional[Dict] = None,
+    creado_por: Optional[int] = None,
+    max_intentos: Optional[int] = None
+) -> int:
+    """Guarda un trabajo pendiente y retorna su id"""
+    if tipo not in _tareas:
+        raise TipoTrabajoDesconocidoError(f"Tipo de trabajo desconocido: {tipo}")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        valores = (
+            tipo,
+            json.dumps(parametros or {}, ensure_ascii=False, default=str),
+            max_intentos or settings.JOBS_MAX_ATTEMPTS,
+            creado_por,
+            datetime.now()
+        )
+        if db_manager.db_type == "sqlite":
+            cursor.execute('''
+                INSERT INTO trabajos (tipo, parametros, max_intentos, creado_por, proximo_intento)
+                VALUES (?, ?, ?, ?, ?)
+            ''', valores)
+            trabajo_id = cursor.lastrowid
+        else:
+            cursor.execute('''
+                INSERT INTO trabajos (tipo, parametros, max_intentos, creado_por, proximo_intento)
+                OUTPUT INSERTED.id
+                VALUES (?, ?, ?, ?, ?)
+            ''', valores)
+            trabajo_id = cursor.fetchone()[0]
+        conn.commit()
+
+        logger.info(f"📥 Trabajo {trabajo_id} encolado: {tipo}")
+        hay_trabajo.set()
+        return trabajo_id
+
+    except Exception as e:
+        logger.error(f"❌ Error al encolar trabajo {tipo}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def get_trabajo(trabajo_id: int) -> Optional[Dict]:
+    """Estado, progreso y resultado de un trabajo"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT id, tipo, estado, parametros, resultado, error, progreso, mensaje,
+                   intentos, max_intentos, creado_por, created_at, iniciado_at,
+                   finalizado_at, proximo_intento
+            FROM trabajos
+            WHERE id = ?
+        ''', (trabajo_id,))
+
+        fila = cursor.fetchone()
+        return _a_dict(cursor, fila) if fila else None
+
+    except Exception as e:
+        logger.error(f"❌ Error al obtener trabajo {trabajo_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def reclamar_siguiente(worker: str) -> Optional[Dict]:
+    """
+    Marca como en curso el siguiente trabajo pendiente y lo retorna. El
+    UPDATE es atómico, así que dos hilos o procesos nunca reclaman el mismo.
+    """
+    ahora = datetime.now()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if db_manager.db_type == "sqlite":
+            cursor.execute('''
+                UPDATE trabajos
+                SET estado = 'en_curso', worker = ?, intentos = intentos + 1,
+                    iniciado_at = ?, actualizado_at = ?
+                WHERE id = (
+                    SELECT id FROM trabajos
+                    WHERE estado = 'pendiente' AND proximo_intento <= ?
+                    ORDER BY proximo_intento
+                    LIMIT 1
+                )
+                RETURNING id, tipo, parametros, intentos, max_intentos
+            ''', (worker, ahora, ahora, ahora))
+        else:
+            # READPAST: cada proceso salta las filas que otro ya está reclamando
+            cursor.execute('''
+                WITH siguiente AS (
+                    SELECT TOP 1 *
+                    FROM trabajos WITH (ROWLOCK, UPDLOCK, READPAST)
+                    WHERE estado = 'pendiente' AND proximo_intento <= ?
+                    ORDER BY proximo_intento
+                )
+                UPDATE siguiente
+                SET estado = 'en_curso', worker = ?, intentos = intentos + 1,
+                    iniciado_at = ?, actualizado_at = ?
+                OUTPUT inserted.id, inserted.tipo, inserted.parametros,
+                       inserted.intentos, inserted.max_intentos
+            ''', (ahora, worker, ahora, ahora))
+
+        fila = cursor.fetchone()
+        trabajo = _a_dict(cursor, fila) if fila else None
+        conn.commit()
+        return trabajo
+
+    except Exception as e:
+        logger.error(f"❌ Error al reclamar trabajo: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def _actualizar_propio(trabajo: Dict, worker: str, asignaciones: str, params: tuple) -> bool:
+    """
+    Actualiza el trabajo solo si sigue siendo de este worker en este intento
+    (si se dio por colgado y otro lo reclamó, la escritura se descarta).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f'''
+            UPDATE trabajos
+            SET {asignaciones}
+            WHERE id = ? AND worker = ? AND intentos = ? AND estado = 'en_curso'
+        ''', params + (trabajo["id"], worker, trabajo["intentos"]))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    except Exception as e:
+        logger.error(f"❌ Error al actualizar trabajo {trabajo['id']}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
+def reportar_progreso(trabajo: Dict, worker: str, progreso: float, mensaje: Optional[str] = None) -> bool:
+    return _actualizar_propio(
+        trabajo, worker,
+        "progreso = ?, mensaje = ?, actualizado_at = ?",
+        (round(min(max(progreso, 0.0), 100.0), 1), mensaje, datetime.now())
+    )
+
+
+def completar(trabajo: Dict, worker: str, resultado: Optional[Dict]) -> bool:
+    ahora = datetime.now()
+    return _actualizar_propio(
+        trabajo, worker,
+        "estado = 'completado', progreso = 100, mensaje = NULL, resultado = ?, error = NULL, "
+        "actualizado_at = ?, finalizado_at = ?",
+        (json.dumps(resultado, ensure_ascii=False, default=str) if resultado is not None else None, ahora, ahora)
+    )
+
+
+def registrar_fallo(trabajo: Dict, worker: str, error: str, reintentar: bool = True) -> str:
+    """Reprograma el trabajo con backoff o lo marca fallido; retorna el estado nuevo"""
+    ahora = datetime.now()
+    if reintentar and trabajo["intentos"] < trabajo["max_intentos"]:
+        proximo = ahora + timedelta(seconds=calcular_backoff(trabajo["intentos"]))
+        _actualizar_propio(
+            trabajo, worker,
+            "estado = 'pendiente', error = ?, proximo_intento = ?, actualizado_at = ?",
+            (error, proximo, ahora)
+        )
+        return "pendiente"
+
+    _actualizar_propio(
+        trabajo, worker,
+        "estado = 'fallido', error = ?, actualizado_at = ?, finalizado_at = ?",
+        (error, ahora, ahora)
+    )
+    return "fallido"
+
+
+def recuperar_colgados() -> int:
+    """
+    Devuelve a la cola los trabajos en curso sin actividad hace más de
+    JOBS_STALE_SECONDS (el proceso que los tenía murió o se reinició). Mientras
+    el proceso vive, el latido del ejecutor mantiene actualizado_at al día
+    aunque la tarea no reporte progreso.
+    """
+    ahora = datetime.now()
+    limite = ahora - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE trabajos
+            SET estado = CASE WHEN intentos >= max_intentos THEN 'fallido' ELSE 'pendiente' END,
+                finalizado_at = CASE WHEN intentos >= max_intentos THEN ? ELSE NULL END,
+                error = 'Sin actividad del worker (colgado o reiniciado)',
+                proximo_intento = ?
+            WHERE estado = 'en_curso' AND actualizado_at < ?
+        ''', (ahora, ahora, limite))
+        recuperados = cursor.rowcount
+        conn.commit()
+
+        if recuperados:
+            logger.warning(f"⚠️ {recuperados} trabajo(s) colgado(s) devueltos a la cola")
+        return recuperados
+
+    except Exception as e:
+        logger.error(f"❌ Error al recuperar trabajos colgados: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+
+def programar_periodicas() -> List[int]:
+    """
+    Encola las tareas periódicas que no tienen un trabajo pendiente, en
+    curso o creado dentro de su intervalo. Si dos procesos la encolan a la
+    vez se ejecuta dos veces, así que las tareas periódicas deben poder
+    repetirse sin efectos.
+    """
+    encolados = []
+    for tipo, cada_segundos in _periodicas.items():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                SELECT COUNT(*) FROM trabajos
+                WHERE tipo = ? AND (estado IN ('pendiente', 'en_curso') OR iniciado_at >= ?)
+            ''', (tipo, datetime.now() - timedelta(seconds=cada_segundos)))
+            recientes = cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ Error al revisar tarea periódica {tipo}: {e}")
+            continue
+        finally:
+            conn.close()
+
+        if not recientes:
+            encolados.append(encolar(tipo))
+    return encolados
+
+
+def purgar_finalizados() -> int:
+    """Elimina los trabajos terminados hace más de JOBS_RETENTION_DAYS y sus archivos"""
+    limite = datetime.now() - timedelta(days=settings.JOBS_RETENTION_DAYS)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT id, resultado FROM trabajos
+            WHERE estado IN ('completado', 'fallido') AND finalizado_at < ?
+        ''', (limite,))
+        filas = cursor.fetchall()
+
+        for trabajo_id, resultado in filas:
+            archivo = (json.loads(resultado) or {}).get("archivo") if resultado else None
+            if archivo and os.path.exists(archivo):
+                os.remove(archivo)
+            cursor.execute("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+        conn.commit()
+
+        if filas:
+            logger.info(f"🧹 {len(filas)} trabajo(s) finalizado(s) eliminados")
+        return len(filas)
+
+    except Exception as e:
+        logger.error(f"❌ Error al purgar trabajos finalizados: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+
+class ContextoTrabajo:
+    """Lo que recibe una tarea para identificarse y reportar progreso"""
+
+    def __init__(self, trabajo: Dict, worker: str):
+        self.id = trabajo["id"]
+        self.intento = trabajo["intentos"]
+        self._trabajo = trabajo
+        self._worker = worker
+        self._ultimo = 0.0
+
+    def progreso(self, porcentaje: float, mensaje: Optional[str] = None):
+        """Guarda el avance (0-100); también indica que el trabajo sigue vivo"""
+        ahora = time.monotonic()
+        if porcentaje < 100 and ahora - self._ultimo < INTERVALO_PROGRESO:
+            return
+        self._ultimo = ahora
+        reportar_progreso(self._trabajo, self._worker, porcentaje, mensaje)
+
+
+def _latido(trabajo: Dict, worker: str, terminado: threading.Event):
+    """
+    Renueva actualizado_at cada JOBS_STALE_SECONDS / 3 hasta que termina la
+    tarea, para que un paso largo sin progreso (una consulta pesada, un
+    VACUUM) no se tome como trabajo colgado y se ejecute dos veces
+    """
+    intervalo = max(settings.JOBS_STALE_SECONDS / 3, 1.0)
+    while not terminado.wait(intervalo):
+        _actualizar_propio(trabajo, worker, "actualizado_at = ?", (datetime.now(),))
+
+
+class EjecutorTrabajos:
+    """Hilos que reclaman y ejecutan trabajos de la cola"""
+
+    def __init__(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._hilos: List[threading.Thread] = []
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._proximo_mantenimiento = 0.0
+        self._en_curso = 0
+        self._contadores = {"completados": 0, "reintentos": 0, "fallidos": 0}
+
+    def iniciar(self, hilos: int):
+        if self._hilos or hilos <= 0:
+            return
+        # Tras un fork (varios workers de uvicorn) el pid cambió
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._detener.clear()
+        for i in range(hilos):
+            hilo = threading.Thread(target=self._bucle, name=f"trabajos-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info(f"⚙️ Ejecutor de trabajos iniciado ({hilos} hilo(s), tareas: {', '.join(tareas_registradas())})")
+
+    def detener(self, timeout: float = 5.0):
+        self._detener.set()
+        hay_trabajo.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            trabajo = None
+            try:
+                self._mantenimiento()
+                trabajo = reclamar_siguiente(self.worker)
+            except Exception as e:
+                logger.error(f"❌ Error en el ejecutor de trabajos: {e}")
+
+            if trabajo is None:
+                hay_trabajo.wait(settings.JOBS_POLL_INTERVAL_SECONDS)
+                hay_trabajo.clear()
+                continue
+
+            self.ejecutar(trabajo)
+
+    def _mantenimiento(self):
+        """
+        Recupera trabajos colgados, encola las tareas periódicas y purga los
+        viejos (a lo sumo una vez por minuto)
+        """
+        with self._lock:
+            if time.monotonic() < self._proximo_mantenimiento:
+                return
+            self._proximo_mantenimiento = time.monotonic() + 60
+        recuperar_colgados()
+        programar_periodicas()
+        purgar_finalizados()
+
+    def _contar(self, clave: str):
+        with self._lock:
+            self._contadores[clave] += 1
+
+    def ejecutar(self, trabajo: Dict):
+        """Ejecuta un trabajo ya reclamado y registra su resultado"""
+        fn = _tareas.get(trabajo["tipo"])
+        if fn is None:
+            registrar_fallo(trabajo, self.worker, f"Tipo de trabajo desconocido: {trabajo['tipo']}", reintentar=False)
+            self._contar("fallidos")
+            return
+
+        logger.info(f"▶️ Trabajo {trabajo['id']} ({trabajo['tipo']}) - intento {trabajo['intentos']}/{trabajo['max_intentos']}")
+        inicio = time.perf_counter()
+        with self._lock:
+            self._en_curso += 1
+        terminado = threading.Event()
+        threading.Thread(
+            target=_latido, args=(trabajo, self.worker, terminado),
+            name=f"latido-{trabajo['id']}", daemon=True
+        ).start()
+
+        try:
+            resultado = fn(trabajo["parametros"], ContextoTrabajo(trabajo, self.worker))
+            completar(trabajo, self.worker, resultado)
+            self._contar("completados")
+            logger.info(f"✅ Trabajo {trabajo['id']} completado en {time.perf_counter() - inicio:.1f}s")
+
+        except Exception as e:
+            estado = registrar_fallo(trabajo, self.worker, f"{type(e).__name__}: {e}")
+            self._contar("reintentos" if estado == "pendiente" else "fallidos")
+            logger.error(f"❌ Trabajo {trabajo['id']} falló (intento {trabajo['intentos']}): {e} - queda {estado}")
+        finally:
+            terminado.set()
+            with self._lock:
+                self._en_curso -= 1
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "worker": self.worker,
+                "hilos": len(self._hilos),
+                "en_curso": self._en_curso,
+                **self._contadores
+            }
+
+
+ejecutor = EjecutorTrabajos()
\ No newline at end of file
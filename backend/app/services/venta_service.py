@@ -1,13 +1,54 @@
 import logging
-from typing import List, Optional, Dict
-from app.database import get_db_connection
+from typing import Iterator, List, Optional, Dict, Tuple
+from app.database import db_manager, get_db_connection, reintentable, relanzar_si_transitorio
+from app.services.cliente_service import upsert_comprador
+from app.services import archivo_service, cdc_service, dashboard_service, ranking_service
+from app.services.cdc_service import registrar_cambio
+from app.services.consolidacion_service import descontar_stock
+from app.services.idempotencia_service import ClaveIdempotenciaDuplicadaError, guardar_clave
+from app.utils.broadcaster import catalogo_broadcaster
+from app.utils.filas import Fila, MapaFilas, mas_recientes
+from app.utils.singleflight import single_flight
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+AUTO = MapaFilas("Auto", {
+    "id": int,
+    "marca": str,
+    "modelo": str,
+    "anio": int,
+    "precio_referencial": Optional[float],
+    "stock": int,
+})
 
-def get_autos_disponibles(search: Optional[str] = None) -> List[Dict]:
-    """Obtiene lista de autos disponibles, con búsqueda opcional"""
+VENTA_VENDEDOR = MapaFilas("VentaVendedor", {
+    "id": int,
+    "fecha_venta": datetime,
+    "monto_fisco": str,
+    "nombre_comprador": str,
+    "dni_comprador": str,
+    "contacto_comprador": str,
+    "auto": str,
+    "tipo_compra": str,
+    "sucursal_provincia": str,
+    "sucursal_distrito": str,
+})
+
+
+class StockInsuficienteError(Exception):
+    """El auto no existe, está inactivo o no tiene stock disponible"""
+
+
+@single_flight("autos_disponibles", key=lambda search=None: (search or "").strip().lower())
+@reintentable
+def get_autos_disponibles(search: Optional[str] = None) -> List[Fila]:
+    """
+    Obtiene lista de autos disponibles, con búsqueda opcional.
+    Las búsquedas idénticas concurrentes comparten una sola consulta; la
+    búsqueda ignora espacios al inicio/fin y mayúsculas, igual que la clave.
+    """
+    search = search.strip() if search else None
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -32,10 +73,10 @@ def get_autos_disponibles(search: Optional[str] = None) -> List[Dict]:
                 ORDER BY anio DESC, marca, modelo
             ''')
         
-        autos = [dict(row) for row in cursor.fetchall()]
-        return autos
+        return AUTO.todas(cursor)
         
     except Exception as e:
+        relanzar_si_transitorio(e)
         logger.error(f"❌ Error al obtener autos disponibles: {e}")
         return []
     finally:
@@ -52,13 +93,43 @@ def registrar_venta(
     contacto_comprador: str,
     sucursal_provincia: str,
     sucursal_distrito: str,
-    nombre_vendedor: str
+    nombre_vendedor: str,
+    clave_idempotencia: Optional[str] = None,
+    huella_idempotencia: Optional[str] = None,
+    fecha_venta: Optional[datetime] = None
 ) -> Optional[int]:
-    """Registra una nueva venta en la base de datos"""
-    conn = get_db_connection()
+    """
+    Registra una nueva venta y descuenta una unidad del stock del auto en la
+    misma transacción. Lanza StockInsuficienteError si el auto no tiene stock.
+    
+    Si se indica `clave_idempotencia`, la clave se guarda en la misma
+    transacción; si ya existe se lanza ClaveIdempotenciaDuplicadaError y
+    no se registra nada. `fecha_venta` (por defecto ahora) permite registrar
+    ventas hechas sin conexión con su hora original. Con sharding, todo se
+    escribe en la base de la sucursal (el stock sale de su cupo) y se
+    consolida en la central después (ver consolidacion_service).
+    """
+    conn = get_db_connection(sucursal_provincia)
     cursor = conn.cursor()
     
+    fecha_venta = fecha_venta or datetime.now()
+    
     try:
+        if db_manager.sharding:
+            descontado = descontar_stock(cursor, auto_id)
+        else:
+            cursor.execute('''
+                UPDATE autos_disponibles
+                SET stock = stock - 1
+                WHERE id = ? AND is_active = 1 AND stock > 0
+            ''', (auto_id,))
+            descontado = cursor.rowcount == 1
+        
+        if not descontado:
+            conn.rollback()
+            logger.warning(f"⚠️ Venta rechazada - Auto {auto_id} sin stock o inactivo")
+            raise StockInsuficienteError(f"El auto {auto_id} no tiene stock disponible")
+        
         cursor.execute('''
             INSERT INTO registro_venta (
                 vendedor_id, auto_id, tipo_compra, monto_fisco,
@@ -68,10 +139,38 @@ def registrar_venta(
         ''', (
             vendedor_id, auto_id, tipo_compra, monto_fisco,
             nombre_comprador, dni_comprador, contacto_comprador,
-            sucursal_provincia, sucursal_distrito, nombre_vendedor, datetime.now()
+            sucursal_provincia, sucursal_distrito, nombre_vendedor, fecha_venta
         ))
         
         venta_id = cursor.lastrowid
+        
+        upsert_comprador(cursor, dni_comprador, nombre_comprador, contacto_comprador, fecha_venta)
+        
+        if clave_idempotencia:
+            guardar_clave(cursor, vendedor_id, clave_idempotencia, huella_idempotencia, venta_id)
+        
+        registrar_cambio(cursor, cdc_service.VENTA, cdc_service.INSERT, venta_id, {
+            "id": venta_id,
+            "fecha_venta": fecha_venta,
+            "vendedor_id": vendedor_id,
+            "nombre_vendedor": nombre_vendedor,
+            "auto_id": auto_id,
+            "tipo_compra": tipo_compra,
+            "monto_fisco": monto_fisco,
+            "nombre_comprador": nombre_comprador,
+            "dni_comprador": dni_comprador,
+            "contacto_comprador": contacto_comprador,
+            "sucursal_provincia": sucursal_provincia,
+            "sucursal_distrito": sucursal_distrito
+        })
+        
+        # Con sharding, el nuevo stock lo registra y publica la consolidación
+        stock_actual = None
+        if not db_manager.sharding:
+            cursor.execute('SELECT stock FROM autos_disponibles WHERE id = ?', (auto_id,))
+            stock_actual = cursor.fetchone()[0]
+            registrar_cambio(cursor, cdc_service.AUTO, cdc_service.UPDATE, auto_id, {"id": auto_id, "stock": stock_actual})
+        
         conn.commit()
         
         logger.info(f"✅ Venta registrada exitosamente - ID: {venta_id}")
@@ -79,22 +178,66 @@ def registrar_venta(
         logger.info(f"   - Comprador: {nombre_comprador} (DNI: {dni_comprador})")
         logger.info(f"   - Monto: {monto_fisco}")
         
+        if stock_actual is not None:
+            catalogo_broadcaster.publicar("stock", {"id": auto_id, "stock": stock_actual})
+        ranking_service.registrar_venta({
+            "id": venta_id,
+            "fecha_venta": fecha_venta,
+            "vendedor_id": vendedor_id,
+            "nombre_vendedor": nombre_vendedor,
+            "sucursal_provincia": sucursal_provincia,
+            "sucursal_distrito": sucursal_distrito,
+            "monto_fisco": monto_fisco
+        })
+        dashboard_service.invalidar_resumen(vendedor_id)
+        
         return venta_id
         
+    except StockInsuficienteError:
+        raise
+    except ClaveIdempotenciaDuplicadaError:
+        conn.rollback()
+        logger.info(f"ℹ️ Clave de idempotencia ya registrada por otra petición: {clave_idempotencia}")
+        raise
     except Exception as e:
         logger.error(f"❌ Error al registrar venta: {e}")
+        # Sin reintento (no es idempotente); al cerrar la conexión se descarta
+        # la transacción, y el cliente puede repetir con la misma clave de idempotencia
+        relanzar_si_transitorio(e)
         conn.rollback()
         return None
     finally:
         conn.close()
 
 
-def get_ventas_by_vendedor(vendedor_id: int, limit: int = 50) -> List[Dict]:
-    """Obtiene las últimas ventas de un vendedor"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _venta_archivada(venta: Dict) -> Fila:
+    """Fila del archivo con las mismas columnas que get_ventas_by_vendedor"""
+    return VENTA_VENDEDOR.desde_dict({
+        **venta,
+        "auto": f"{venta['marca']} {venta['modelo']} {venta['anio']}"
+    })
+
+
+@reintentable
+def ultimas_ventas_vendedor(
+    vendedor_id: int,
+    limit: int = 50,
+    sucursal_provincia: Optional[str] = None,
+    incluir_archivo: bool = False
+) -> List[Fila]:
+    """
+    Obtiene las últimas ventas de un vendedor. Con sharding, `sucursal_provincia`
+    limita la consulta a la base de esa sucursal (sin ella se consultan todas
+    y se combinan por fecha).
     
-    try:
+    Solo lee los meses recientes de registro_venta; con `incluir_archivo`
+    ("ver anteriores") completa con el archivo si no alcanzan.
+    
+    Propaga los errores; get_ventas_by_vendedor es la variante que responde
+    una lista vacía ante errores no transitorios.
+    """
+    def leer(conn):
+        cursor = conn.cursor()
         cursor.execute('''
             SELECT 
                 rv.id,
@@ -113,12 +256,155 @@ def get_ventas_by_vendedor(vendedor_id: int, limit: int = 50) -> List[Dict]:
             ORDER BY rv.fecha_venta DESC
             LIMIT ?
         ''', (vendedor_id, limit))
-        
-        ventas = [dict(row) for row in cursor.fetchall()]
-        return ventas
+        return VENTA_VENDEDOR.todas(cursor)
+    
+    ventas = mas_recientes(
+        db_manager.en_sucursales(leer, [sucursal_provincia] if sucursal_provincia else None),
+        limit
+    )
+    
+    if incluir_archivo and len(ventas) < limit:
+        archivadas = archivo_service.ultimas_ventas("vendedor_id", vendedor_id, limit - len(ventas))
+        ventas.extend(_venta_archivada(venta) for venta in archivadas)
+    return ventas
+
+
+def get_ventas_by_vendedor(
+    vendedor_id: int,
+    limit: int = 50,
+    sucursal_provincia: Optional[str] = None,
+    incluir_archivo: bool = False
+) -> List[Fila]:
+    """Como ultimas_ventas_vendedor, pero responde [] ante errores no transitorios"""
+    try:
+        return ultimas_ventas_vendedor(vendedor_id, limit, sucursal_provincia, incluir_archivo)
         
     except Exception as e:
+        relanzar_si_transitorio(e)
         logger.error(f"❌ Error al obtener ventas del vendedor: {e}")
         return []
+
+
+# Columnas del export de ventas, en el orden en que se escriben
+EXPORT_COLUMNAS = (
+    "id", "fecha_venta", "vendedor_id", "nombre_vendedor", "auto_id",
+    "marca", "modelo", "anio", "tipo_compra", "monto_fisco",
+    "nombre_comprador", "dni_comprador", "contacto_comprador",
+    "sucursal_provincia", "sucursal_distrito"
+)
+
+
+def _filtros_export(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str],
+    fecha_desde: Optional[datetime],
+    fecha_hasta: Optional[datetime]
+) -> Tuple[List[str], list]:
+    condiciones = ["rv.sucursal_provincia = ?"]
+    params: list = [sucursal_provincia]
+    
+    if sucursal_distrito:
+        condiciones.append("rv.sucursal_distrito = ?")
+        params.append(sucursal_distrito)
+    if fecha_desde:
+        condiciones.append("rv.fecha_venta >= ?")
+        params.append(fecha_desde)
+    if fecha_hasta:
+        condiciones.append("rv.fecha_venta < ?")
+        params.append(fecha_hasta)
+    
+    return condiciones, params
+
+
+def contar_ventas_export(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None
+) -> int:
+    """Cantidad de ventas que incluiría el export (para reportar progreso)"""
+    condiciones, params = _filtros_export(sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta)
+    conn = get_db_connection(sucursal_provincia)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'''
+            SELECT COUNT(*)
+            FROM registro_venta rv
+            WHERE {" AND ".join(condiciones)}
+        ''', tuple(params))
+        
+        return cursor.fetchone()[0] + archivo_service.contar_ventas(
+            sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Error al contar ventas del export: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def iter_ventas_export(
+    sucursal_provincia: str,
+    sucursal_distrito: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> Iterator[List[tuple]]:
+    """
+    Recorre las ventas de una sucursal en lotes de `batch_size` filas.
+    
+    La conexión permanece abierta mientras se consume el generador y las
+    filas se leen con fetchmany, por lo que la memoria usada no depende del
+    total de ventas. `fecha_hasta` es exclusiva. Los meses archivados del
+    rango se leen primero (son los más antiguos).
+    """
+    yield from archivo_service.iter_ventas(
+        sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta, batch_size
+    )
+    
+    condiciones, params = _filtros_export(sucursal_provincia, sucursal_distrito, fecha_desde, fecha_hasta)
+    
+    conn = get_db_connection(sucursal_provincia)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'''
+            SELECT 
+                rv.id,
+                rv.fecha_venta,
+                rv.vendedor_id,
+                rv.nombre_vendedor,
+                rv.auto_id,
+                a.marca,
+                a.modelo,
+                a.anio,
+                rv.tipo_compra,
+                rv.monto_fisco,
+                rv.nombre_comprador,
+                rv.dni_comprador,
+                rv.contacto_comprador,
+                rv.sucursal_provincia,
+                rv.sucursal_distrito
+            FROM registro_venta rv
+            JOIN autos_disponibles a ON rv.auto_id = a.id
+            WHERE {" AND ".join(condiciones)}
+            ORDER BY rv.fecha_venta, rv.id
+        ''', tuple(params))
+        
+        total = 0
+        while True:
+            filas = cursor.fetchmany(batch_size)
+            if not filas:
+                break
+            total += len(filas)
+            yield [tuple(fila) for fila in filas]
+        
+        logger.info(f"✅ Export de ventas completado - {sucursal_provincia}/{sucursal_distrito or '*'}: {total} filas")
+        
+    except Exception as e:
+        logger.error(f"❌ Error al exportar ventas: {e}")
+        raise
     finally:
         conn.close()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Difusión en proceso de eventos a muchos suscriptores (SSE).
+
+Los eventos se guardan una sola vez en un buffer circular con número de
+secuencia; cada suscriptor solo recuerda la última secuencia que envió, de
+modo que miles de conexiones inactivas cuestan un entero y una corrutina
+cada una. Un suscriptor lento que queda detrás del buffer recibe un evento
+`resync` para que recargue el estado completo en lugar de acumular cola.
+
+Con varios workers los eventos se publican en un canal del estado compartido
+y un relay en cada worker los copia a su buffer local, de modo que todos los
+workers ven los mismos eventos con la misma numeración (el Last-Event-ID
+sirve aunque el navegador reconecte a otro worker).
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.utils.shared_state import EstadoCompartido
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """Buffer circular de eventos con notificación a suscriptores asyncio"""
+
+    def __init__(self, nombre: str, buffer_size: int = 1024):
+        self.nombre = nombre
+        self._buffer: Deque[Tuple[int, str, str]] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._secuencia = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evento: Optional[asyncio.Event] = None
+        self._estado: Optional[EstadoCompartido] = None
+        self._relay: Optional[asyncio.Task] = None
+        self._relay_pendiente: Optional[asyncio.Event] = None
+        self.suscriptores = 0
+
+    def iniciar(self, loop: asyncio.AbstractEventLoop,
+                estado: Optional[EstadoCompartido] = None,
+                intervalo_relay: float = 0.25):
+        """
+        Asocia el broadcaster al event loop del servidor. Si el estado es
+        compartido entre procesos, los eventos pasan por él y se inicia el relay.
+        """
+        self._loop = loop
+        self._evento = asyncio.Event()
+
+        if estado is not None and estado.multiproceso:
+            self._estado = estado
+            self._secuencia = estado.ultima_secuencia(self.nombre)
+            self._relay_pendiente = asyncio.Event()
+            self._relay = loop.create_task(self._relay_eventos(intervalo_relay))
+
+    def conectar(self, estado: EstadoCompartido):
+        """
+        Para procesos sin event loop (scripts de línea de comandos): si el
+        estado es compartido, los eventos se publican en él y los relays de
+        los workers de la API los entregan a sus suscriptores.
+        """
+        if estado.multiproceso:
+            self._estado = estado
+
+    def detener(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            self._relay = None
+
+    @property
+    def secuencia(self) -> int:
+        return self._secuencia
+
+    def publicar(self, tipo: str, data: Dict):
+        """
+        Publica un evento. Es seguro llamarlo desde cualquier hilo; si no hay
+        event loop asociado (por ejemplo en scripts), solo se guarda en el buffer.
+        """
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+
+        if self._estado is not None:
+            # Varios workers: el relay de cada worker (este incluido) lo
+            # agrega a su buffer; se despierta el de este worker para no
+            # esperar al siguiente intervalo
+            self._estado.publicar(self.nombre, json.dumps([tipo, payload]))
+            if self._relay_pendiente is not None:
+                self._en_loop(self._relay_pendiente.set)
+            return
+
+        with self._lock:
+            self._secuencia += 1
+            self._buffer.append((self._secuencia, tipo, payload))
+
+        self._en_loop(self._despertar)
+
+    def _en_loop(self, callback):
+        """Ejecuta callback en el event loop, desde cualquier hilo"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            if _loop_actual() is loop:
+                callback()
+            else:
+                loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # El loop se cerró entre la verificación y la llamada
+            pass
+
+    async def _relay_eventos(self, intervalo: float):
+        """Copia al buffer local los eventos publicados por cualquier worker"""
+        while True:
+            try:
+                eventos = await asyncio.to_thread(self._estado.leer, self.nombre, self._secuencia)
+            except Exception as e:
+                logger.warning(f"⚠️ Relay de eventos '{self.nombre}' falló: {e}")
+                eventos = []
+
+            if eventos:
+                with self._lock:
+                    for secuencia, mensaje in eventos:
+                        tipo, payload = json.loads(mensaje)
+                        self._buffer.append((secuencia, tipo, payload))
+                        self._secuencia = secuencia
+                self._despertar()
+
+            try:
+                await asyncio.wait_for(self._relay_pendiente.wait(), timeout=intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._relay_pendiente.clear()
+
+    def _despertar(self):
+        evento, self._evento = self._evento, asyncio.Event()
+        if evento is not None:
+            evento.set()
+
+    def _pendientes(self, desde: int) -> Tuple[bool, list]:
+        """Eventos con secuencia > desde; el bool indica si hubo pérdida"""
+        with self._lock:
+            if desde > self._secuencia:
+                # Last-Event-ID de otra numeración (el servidor o el canal del
+                # estado compartido se reiniciaron): lo que se perdió no se sabe
+                return True, []
+            if not self._buffer:
+                return False, []
+            primera = self._buffer[0][0]
+            if desde < primera - 1:
+                return True, []
+            return False, [e for e in self._buffer if e[0] > desde]
+
+    async def suscribir(self, desde: Optional[int] = None,
+                        heartbeat: float = 15.0) -> AsyncIterator[str]:
+        """
+        Genera mensajes SSE ya formateados para un suscriptor.
+
+        `desde` es el Last-Event-ID que envía el navegador al reconectar; si
+        no se indica, el suscriptor solo recibe eventos nuevos.
+        """
+        if self._evento is None:
+            self.iniciar(asyncio.get_running_loop())
+
+        ultima = self._secuencia if desde is None else desde
+        self.suscriptores += 1
+        try:
+            yield f"retry: 3000\nevent: hola\ndata: {json.dumps({'secuencia': self._secuencia})}\n\n"
+
+            while True:
+                evento = self._evento
+                perdidos, eventos = self._pendientes(ultima)
+
+                if perdidos:
+                    ultima = self._secuencia
+                    yield f"id: {ultima}\nevent: resync\ndata: {{}}\n\n"
+                    continue
+
+                if eventos:
+                    partes = []
+                    for secuencia, tipo, payload in eventos:
+                        partes.append(f"id: {secuencia}\nevent: {tipo}\ndata: {payload}\n\n")
+                        ultima = secuencia
+                    yield "".join(partes)
+                    continue
+
+                try:
+                    await asyncio.wait_for(evento.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            self.suscriptores -= 1
+
+    def estadisticas(self) -> Dict:
+        return {
+            "suscriptores": self.suscriptores,
+            "secuencia": self._secuencia,
+            "buffer": len(self._buffer),
+            "relay": self._relay is not None,
+        }
+
+
+def _loop_actual() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+# Cambios del catálogo de autos: stock de cada venta y `resync` tras una importación
+catalogo_broadcaster = Broadcaster("catalogo")
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Circuit breaker para dependencias externas (la base de datos).
+
+Tras `umbral` fallos consecutivos el circuito se abre y las llamadas fallan
+al instante durante `espera_segundos`, en vez de acumular requests colgados
+en timeouts de conexión. Pasada la espera deja pasar una sola llamada de
+prueba (semiabierto): si funciona se cierra, si falla vuelve a abrirse.
+"""
+import threading
+import time
+from typing import Dict
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class Circuito:
+    """Estado del circuit breaker de una dependencia (por proceso)"""
+
+    def __init__(self, nombre: str, umbral: int, espera_segundos: float):
+        self.nombre = nombre
+        self.umbral = max(umbral, 1)
+        self.espera_segundos = espera_segundos
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._sonda_en_curso = False
+        self.aperturas = 0
+        self.rechazadas = 0
+
+    def permitir(self) -> bool:
+        """True si la llamada puede intentarse"""
+        with self._lock:
+            if self._estado == CERRADO:
+                return True
+
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.espera_segundos:
+                self._estado = SEMIABIERTO
+                self._sonda_en_curso = False
+
+            if self._estado == SEMIABIERTO and not self._sonda_en_curso:
+                self._sonda_en_curso = True
+                return True
+
+            self.rechazadas += 1
+            return False
+
+    def exito(self):
+        with self._lock:
+            self._estado = CERRADO
+            self._fallos = 0
+            self._sonda_en_curso = False
+
+    def liberar(self):
+        """
+        La llamada falló por un error propio (ruta o credenciales inválidas),
+        no por la dependencia: no cuenta como fallo ni cierra el circuito,
+        solo libera la llamada de prueba si la había.
+        """
+        with self._lock:
+            self._sonda_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._estado == SEMIABIERTO or (self._estado == CERRADO and self._fallos >= self.umbral):
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._sonda_en_curso = False
+                self.aperturas += 1
+
+    def reintentar_en(self) -> float:
+        """Segundos hasta que el circuito deje pasar una llamada de prueba"""
+        with self._lock:
+            if self._estado != ABIERTO:
+                return 0.0
+            return max(self.espera_segundos - (time.monotonic() - self._abierto_desde), 0.0)
+
+    @property
+    def abierto(self) -> bool:
+        return self._estado != CERRADO
+
+    def estadisticas(self) -> Dict:
+        return {
+            "estado": self._estado,
+            "fallos_consecutivos": self._fallos,
+            "aperturas": self.aperturas,
+            "rechazadas": self.rechazadas,
+            "reintentar_en": round(self.reintentar_en(), 1),
+        }
\ No newline at end of file
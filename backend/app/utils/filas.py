@@ -0,0 +1,129 @@
+"""
+Filas de consultas como objetos compactos y tipados.
+
+`dict(row)` depende del motor: sqlite3.Row lo soporta, pyodbc.Row no. Además
+cada fila como dict ocupa varias veces más memoria que sus valores. Un
+MapaFilas se declara una vez por consulta (columnas y tipos, en el orden
+del SELECT) y convierte cada fila, por posición, en una instancia de una
+clase con `__slots__`. Funciona igual con cualquier cursor DB-API.
+
+Las filas se leen como atributos (`auto.marca`) o como mapping
+(`auto["marca"]`, `auto.get("stock")`, `dict(auto)`, `{**auto}`), así que
+reemplazan a los dicts sin cambiar a quien las usa. FastAPI y el estado
+compartido las serializan a JSON como objetos; las rutas que retornan
+muchas filas usan RespuestaFilas (app/utils/profiling.py), que las codifica
+con `a_json` sin pasar por jsonable_encoder.
+"""
+import heapq
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class Fila(Mapping):
+    """Base de las clases generadas por MapaFilas"""
+
+    __slots__ = ()
+    _campos: Tuple[str, ...] = ()
+    _conjunto: frozenset = frozenset()
+
+    def __getitem__(self, campo: str) -> Any:
+        if campo in self._conjunto:
+            return getattr(self, campo)
+        raise KeyError(campo)
+
+    def __iter__(self):
+        return iter(self._campos)
+
+    def __len__(self) -> int:
+        return len(self._campos)
+
+    def __contains__(self, campo) -> bool:
+        return campo in self._conjunto
+
+    def get(self, campo: str, defecto: Any = None) -> Any:
+        return getattr(self, campo) if campo in self._conjunto else defecto
+
+    def a_dict(self) -> Dict[str, Any]:
+        # Cada clase generada lo reemplaza por un dict literal precompilado
+        return {campo: getattr(self, campo) for campo in self._campos}
+
+    def __repr__(self) -> str:
+        valores = ", ".join(f"{campo}={getattr(self, campo)!r}" for campo in self._campos)
+        return f"{type(self).__name__}({valores})"
+
+
+class MapaFilas:
+    """
+    Mapeo precompilado de las columnas de una consulta a una clase Fila.
+    `columnas` es {nombre: tipo} en el orden del SELECT.
+    """
+
+    def __init__(self, nombre: str, columnas: Dict[str, type]):
+        campos = tuple(columnas)
+        for campo in campos:
+            if not campo.isidentifier() or campo.startswith("_"):
+                raise ValueError(f"Columna inválida para {nombre}: {campo!r}")
+
+        # Un __init__ generado que desempaqueta la fila en los slots: es la
+        # forma más rápida de llenar un objeto con __slots__ desde Python. Lo
+        # mismo para a_dict: un dict literal con los nombres ya compilados
+        # (la mitad del costo de dict(zip(campos, valores)) al codificar JSON)
+        espacio: Dict[str, Any] = {}
+        destino = ", ".join(f"self.{campo}" for campo in campos)
+        literal = ", ".join(f"{campo!r}: self.{campo}" for campo in campos)
+        exec(
+            f"def __init__(self, fila):\n    {destino}, = fila\n"
+            f"def a_dict(self):\n    return {{{literal}}}\n",
+            espacio
+        )
+
+        self.campos = campos
+        self.clase = type(nombre, (Fila,), {
+            "__slots__": campos,
+            "__annotations__": dict(columnas),
+            "__init__": espacio["__init__"],
+            "a_dict": espacio["a_dict"],
+            "_campos": campos,
+            "_conjunto": frozenset(campos),
+        })
+
+    def fila(self, valores: Iterable) -> Fila:
+        return self.clase(valores)
+
+    def una(self, cursor) -> Optional[Fila]:
+        fila = cursor.fetchone()
+        return self.clase(fila) if fila is not None else None
+
+    def todas(self, cursor) -> List[Fila]:
+        return list(map(self.clase, cursor.fetchall()))
+
+    def desde_dict(self, datos: Dict[str, Any]) -> Fila:
+        return self.clase([datos[campo] for campo in self.campos])
+
+
+def mas_recientes(listas: List[List[Fila]], limit: int, campo: str = "fecha_venta") -> List[Fila]:
+    """
+    Combina listas ya ordenadas por `campo` descendente (p. ej. una por base
+    de ventas con sharding) y retorna las `limit` primeras.
+    """
+    if len(listas) == 1:
+        return listas[0][:limit]
+    return list(islice(heapq.merge(*listas, key=attrgetter(campo), reverse=True), limit))
+
+
+def a_json(valor: Any) -> Any:
+    """
+    `default` de json.dumps: filas como objetos, fechas en ISO 8601 y
+    Decimal como número (igual que jsonable_encoder); el resto como texto
+    """
+    if isinstance(valor, Fila):
+        return valor.a_dict()
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return int(valor) if valor.as_tuple().exponent >= 0 else float(valor)
+    return str(valor)
\ No newline at end of file
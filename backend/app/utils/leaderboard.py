@@ -0,0 +1,73 @@
+"""
+Tabla de posiciones ordenada, actualizable de a una venta.
+
+Guarda el puntaje de cada vendedor y dos listas ordenadas de claves (por
+unidades y por monto). Con `bisect` la búsqueda del puesto de un vendedor
+es O(log n) y el top-N es un slice; actualizar un puntaje quita y vuelve a
+insertar su clave (búsqueda O(log n) más el corrimiento de la lista, que
+para los vendedores de una sucursal es despreciable).
+"""
+from bisect import bisect_left, insort
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+CRITERIOS = ("unidades", "monto")
+
+
+class Puntaje(NamedTuple):
+    vendedor_id: int
+    nombre_vendedor: str
+    unidades: int
+    monto: float
+
+
+def _clave(puntaje: Puntaje, criterio: str) -> Tuple:
+    # Orden descendente por el criterio, desempate por el otro y luego por id
+    if criterio == "monto":
+        return (-puntaje.monto, -puntaje.unidades, puntaje.vendedor_id)
+    return (-puntaje.unidades, -puntaje.monto, puntaje.vendedor_id)
+
+
+class Leaderboard:
+    """Ranking de vendedores por unidades y por monto"""
+
+    def __init__(self):
+        self._puntajes: Dict[int, Puntaje] = {}
+        self._orden: Dict[str, List[Tuple]] = {criterio: [] for criterio in CRITERIOS}
+
+    def __len__(self) -> int:
+        return len(self._puntajes)
+
+    def sumar(self, vendedor_id: int, nombre_vendedor: str, unidades: int, monto: float):
+        """Suma unidades y monto al vendedor y reubica sus claves"""
+        anterior = self._puntajes.get(vendedor_id)
+        if anterior is not None:
+            for criterio, claves in self._orden.items():
+                del claves[bisect_left(claves, _clave(anterior, criterio))]
+            unidades += anterior.unidades
+            monto += anterior.monto
+
+        puntaje = Puntaje(vendedor_id, nombre_vendedor, unidades, round(monto, 2))
+        self._puntajes[vendedor_id] = puntaje
+        for criterio, claves in self._orden.items():
+            insort(claves, _clave(puntaje, criterio))
+
+    def top(self, n: int, criterio: str = "unidades") -> List[Dict]:
+        """Los n primeros con su puesto (1 = primero)"""
+        return [
+            self._fila(clave[-1], puesto)
+            for puesto, clave in enumerate(self._orden[criterio][:n], start=1)
+        ]
+
+    def puesto(self, vendedor_id: int, criterio: str = "unidades") -> Optional[int]:
+        """Puesto del vendedor, o None si no tiene ventas en el periodo"""
+        puntaje = self._puntajes.get(vendedor_id)
+        if puntaje is None:
+            return None
+        return bisect_left(self._orden[criterio], _clave(puntaje, criterio)) + 1
+
+    def fila(self, vendedor_id: int, criterio: str = "unidades") -> Optional[Dict]:
+        puesto = self.puesto(vendedor_id, criterio)
+        return None if puesto is None else self._fila(vendedor_id, puesto)
+
+    def _fila(self, vendedor_id: int, puesto: int) -> Dict:
+        return {**self._puntajes[vendedor_id]._asdict(), "puesto": puesto}
\ No newline at end of file
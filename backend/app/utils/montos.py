@@ -0,0 +1,79 @@
+"""
+Conversión de montos de venta a número.
+
+`registro_venta.monto_fisco` es texto libre: los datos sembrados usan
+"S/. 45,000.00" y el formulario acepta lo que escribe el vendedor ("45000",
+"45,000", "45.000,50"). Para totales y rankings se interpreta aquí, en un
+solo lugar.
+"""
+import math
+import re
+from typing import Optional
+
+_NO_NUMERICO = re.compile(r"[^0-9.,]")
+_MILES_CON_COMA = re.compile(r"^\d{1,3}(,\d{3})+$")
+_MILES_CON_PUNTO = re.compile(r"^\d{1,3}(\.\d{3})+$")
+
+# Montos aceptados en importaciones: signo y "S/." opcionales, y un número
+# sin miles, con miles "," y decimal "." o con miles "." y decimal ","
+_MONTO_ESTRICTO = re.compile(
+    r"^(?P<signo>[+-])?\s*(?:S/\.?\s*)?(?:"
+    r"(?P<simple>\d+(?:[.,]\d{1,2})?)"
+    r"|(?P<miles_coma>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?)"
+    r"|(?P<miles_punto>\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?)"
+    r")$",
+    re.IGNORECASE
+)
+
+
+def parse_monto(texto) -> float:
+    """Interpreta un monto en soles; retorna 0.0 si no se puede interpretar"""
+    if texto is None:
+        return 0.0
+    if isinstance(texto, (int, float)):
+        return float(texto)
+
+    numero = _NO_NUMERICO.sub("", str(texto)).strip(".,")
+    if not numero:
+        return 0.0
+
+    if "," in numero and "." in numero:
+        # El separador que aparece último es el decimal
+        if numero.rfind(",") > numero.rfind("."):
+            numero = numero.replace(".", "").replace(",", ".")
+        else:
+            numero = numero.replace(",", "")
+    elif "," in numero:
+        numero = numero.replace(",", "") if _MILES_CON_COMA.match(numero) else numero.replace(",", ".")
+    elif _MILES_CON_PUNTO.match(numero):
+        numero = numero.replace(".", "")
+
+    try:
+        return float(numero)
+    except ValueError:
+        return 0.0
+
+
+def parse_monto_estricto(texto) -> Optional[float]:
+    """
+    Interpreta un monto escrito en uno de los formatos conocidos ("85000",
+    "-85000.50", "S/. 85,000.00", "85.000,50"); retorna None si el texto
+    tiene cualquier otra cosa. A diferencia de parse_monto, no descarta
+    caracteres: sirve para validar datos que se van a guardar.
+    """
+    if isinstance(texto, bool) or texto is None:
+        return None
+    if isinstance(texto, (int, float)):
+        return float(texto) if math.isfinite(texto) else None
+
+    coincidencia = _MONTO_ESTRICTO.match(str(texto).strip())
+    if not coincidencia:
+        return None
+
+    if coincidencia["simple"]:
+        numero = coincidencia["simple"].replace(",", ".")
+    elif coincidencia["miles_coma"]:
+        numero = coincidencia["miles_coma"].replace(",", "")
+    else:
+        numero = coincidencia["miles_punto"].replace(".", "").replace(",", ".")
+    return -float(numero) if coincidencia["signo"] == "-" else float(numero)
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Perfilado opcional por request y log de queries lentas.
+
+El perfilado se activa por request enviando el header `X-Profile: 1` o por
+muestreo (`PROFILING_SAMPLE_RATE`). Mientras está activo se registran spans
+para cada fase (dependencia de autenticación, conexión a la BD, cada
+`cursor.execute` y codificación de la respuesta) que se devuelven en el
+header `Server-Timing`. Las queries que superan `SLOW_QUERY_THRESHOLD_MS`
+se escriben en el logger `app.slow_queries` con el SQL y la forma de sus
+parámetros (nunca los valores).
+
+Cuando el perfilado está apagado el costo es una lectura de ContextVar por
+conexión: las conexiones y cursores no se envuelven.
+"""
+import json
+import logging
+import random
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.utils.filas import a_json
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+_perfil_actual: ContextVar[Optional["PerfilRequest"]] = ContextVar("perfil_actual", default=None)
+
+# Context manager reutilizable para el camino rápido (perfilado apagado)
+_SIN_PERFIL = nullcontext()
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+class _Span:
+    """Context manager que mide una fase y la agrega al perfil"""
+
+    __slots__ = ("perfil", "nombre", "inicio")
+
+    def __init__(self, perfil: "PerfilRequest", nombre: str):
+        self.perfil = perfil
+        self.nombre = nombre
+        self.inicio = 0.0
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.perfil.agregar(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+
+class PerfilRequest:
+    """Spans acumulados durante un request perfilado"""
+
+    __slots__ = ("spans", "inicio")
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.inicio = time.perf_counter()
+
+    def agregar(self, nombre: str, segundos: float):
+        self.spans.append((nombre, segundos))
+
+    def span(self, nombre: str) -> _Span:
+        return _Span(self, nombre)
+
+    def resumen(self) -> Dict[str, Tuple[float, int]]:
+        """Agrupa los spans por nombre: {nombre: (segundos_totales, cantidad)}"""
+        agrupado: Dict[str, Tuple[float, int]] = {}
+        for nombre, segundos in self.spans:
+            total, cantidad = agrupado.get(nombre, (0.0, 0))
+            agrupado[nombre] = (total + segundos, cantidad + 1)
+        return agrupado
+
+    def server_timing(self) -> str:
+        """Genera el valor del header Server-Timing"""
+        partes = []
+        for nombre, (segundos, cantidad) in self.resumen().items():
+            parte = f"{nombre};dur={segundos * 1000:.3f}"
+            if cantidad > 1:
+                parte += f';desc="{cantidad}x"'
+            partes.append(parte)
+        total = time.perf_counter() - self.inicio
+        partes.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(partes)
+
+
+def perfil_activo() -> Optional[PerfilRequest]:
+    """Retorna el perfil del request actual o None si no se está perfilando"""
+    return _perfil_actual.get()
+
+
+def medir(nombre: str):
+    """Context manager que mide una fase solo si el request se está perfilando"""
+    perfil = _perfil_actual.get()
+    if perfil is None:
+        return _SIN_PERFIL
+    return perfil.span(nombre)
+
+
+def debe_perfilar(headers) -> bool:
+    """Decide si un request debe perfilarse según header o tasa de muestreo"""
+    if not settings.PROFILING_ENABLED:
+        return False
+    valor = headers.get(settings.PROFILING_HEADER)
+    if valor is not None:
+        return valor.lower() in ("1", "true", "yes", "on")
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def iniciar_perfil():
+    """Activa un perfil nuevo en el contexto actual; retorna (perfil, token)"""
+    perfil = PerfilRequest()
+    return perfil, _perfil_actual.set(perfil)
+
+
+def finalizar_perfil(token):
+    _perfil_actual.reset(token)
+
+
+def _forma_parametros(params: Any) -> str:
+    """Describe los parámetros por tipo sin exponer sus valores"""
+    if len(params) == 1 and isinstance(params[0], (tuple, list)):
+        params = params[0]
+    return "(" + ", ".join(type(p).__name__ for p in params) + ")"
+
+
+class CursorPerfilado:
+    """Envuelve un cursor DB-API midiendo cada execute"""
+
+    __slots__ = ("_cursor", "_perfil")
+
+    def __init__(self, cursor, perfil: PerfilRequest):
+        self._cursor = cursor
+        self._perfil = perfil
+
+    def execute(self, sql: str, *params):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *params)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self._perfil.agregar("db-execute", duracion)
+            if duracion * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                slow_query_logger.warning(
+                    f"🐢 Query lenta ({duracion * 1000:.1f} ms) "
+                    f"params={_forma_parametros(params)} sql={_ESPACIOS.sub(' ', sql).strip()}"
+                )
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionPerfilada:
+    """Envuelve una conexión DB-API para que sus cursores se perfilen"""
+
+    __slots__ = ("_conn", "_perfil")
+
+    def __init__(self, conn, perfil: PerfilRequest):
+        self._conn = conn
+        self._perfil = perfil
+
+    def cursor(self, *args, **kwargs):
+        return CursorPerfilado(self._conn.cursor(*args, **kwargs), self._perfil)
+
+    def execute(self, sql: str, *params):
+        return self.cursor().execute(sql, *params)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+class JSONResponsePerfilada(JSONResponse):
+    """JSONResponse que mide la codificación del cuerpo como span 'encode'"""
+
+    def render(self, content: Any) -> bytes:
+        with medir("encode"):
+            return super().render(content)
+
+
+class RespuestaFilas(JSONResponsePerfilada):
+    """
+    Respuesta para rutas que retornan muchas filas (app/utils/filas.py).
+    Retornarla directamente evita jsonable_encoder, que recorre cada fila
+    campo por campo en Python; aquí json.dumps las codifica con `a_json`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with medir("encode"):
+            return json.dumps(
+                content,
+                ensure_ascii=False,
+                allow_nan=False,
+                indent=None,
+                separators=(",", ":"),
+                default=a_json,
+            ).encode("utf-8")
\ No newline at end of file
@@ -1,26 +1,34 @@
+import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from app.config import settings
+from app.utils.profiling import medir
+from app.utils.shared_state import get_estado
 
-# Contexto para encriptar contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Contexto para encriptar contraseñas (passlib/bcrypt se cargan en el primer uso)"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña es correcta"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Genera hash de una contraseña"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -32,7 +40,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # jti identifica el token para poder revocarlo en el logout
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     
     return encoded_jwt
@@ -40,6 +50,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def decode_access_token(token: str) -> Optional[dict]:
     """Decodifica y valida un token JWT"""
+    # python-jose (y su backend criptográfico) se carga en el primer token
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
@@ -47,15 +60,71 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+def revocar_token(payload: dict):
+    """Marca el token como revocado hasta su expiración, en todos los workers"""
+    jti = payload.get("jti")
+    if not jti:
+        return
+    restante = payload["exp"] - datetime.utcnow().timestamp()
+    if restante > 0:
+        get_estado().set(f"token_revocado:{jti}", True, ttl=restante)
+
+
+def token_revocado(payload: dict) -> bool:
+    jti = payload.get("jti")
+    return bool(jti) and get_estado().get(f"token_revocado:{jti}") is not None
+
+
+def _clave_login(username: str, ip: str) -> str:
+    return f"login_fallido:{username.strip().lower()}:{ip}"
+
+
+def login_bloqueado(username: str, ip: str) -> bool:
+    """True si el usuario superó LOGIN_MAX_ATTEMPTS fallos desde esa IP en la ventana"""
+    fallos = get_estado().get(_clave_login(username, ip))
+    return fallos is not None and fallos >= settings.LOGIN_MAX_ATTEMPTS
+
+
+def registrar_login_fallido(username: str, ip: str):
+    get_estado().incr(_clave_login(username, ip), ttl=settings.LOGIN_WINDOW_SECONDS)
+
+
+def limpiar_logins_fallidos(username: str, ip: str):
+    get_estado().delete(_clave_login(username, ip))
+
+
+# Dependencias síncronas a propósito: FastAPI las corre en el threadpool, y
+# token_revocado consulta el estado compartido (SQLite o Redis con varios
+# workers), que no debe bloquear el event loop
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """Obtiene el usuario actual desde el token"""
+    return _user_from_token(token)
+
+
+def get_current_user_stream(
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    token: Optional[str] = Query(None, description="Token JWT (EventSource no envía headers)")
+) -> dict:
+    """Como get_current_user, pero acepta el token también como parámetro ?token="""
+    return _user_from_token(header_token or token)
+
+
+def _user_from_token(token: Optional[str]) -> dict:
+    """Valida el token JWT y retorna los datos del usuario"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = decode_access_token(token)
+    if not token:
+        raise credentials_exception
+    
+    with medir("auth"):
+        payload = decode_access_token(token)
+        if payload is not None and token_revocado(payload):
+            payload = None
     
     if payload is None:
         raise credentials_exception
@@ -65,4 +134,4 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     if username is None:
         raise credentials_exception
     
-    return {"username": username, "token": token}
\ No newline at end of file
+    return {"username": username, "token": token, "payload": payload}
\ No newline at end of file
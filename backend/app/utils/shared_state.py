@@ -0,0 +1,360 @@
+"""
+Estado compartido entre workers de uvicorn.
+
+Con un solo worker todo puede vivir en memoria del proceso, pero con
+`--workers N` cada proceso tendría su propio cache, su propia lista de
+tokens revocados y sus propios contadores. Este módulo ofrece una interfaz
+mínima (clave/valor con expiración, contadores y canales de eventos) con
+tres backends:
+
+- memory: diccionario en el proceso (un solo worker, valor por defecto)
+- sqlite: archivo SQLite en /dev/shm compartido por los workers de la misma
+  máquina; no requiere servicios externos
+- redis:  cualquier servidor que hable el protocolo Redis (requiere el
+  paquete `redis`)
+
+Los valores deben ser serializables a JSON.
+"""
+import importlib.util
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.filas import a_json
+
+logger = logging.getLogger(__name__)
+
+# redis es opcional: solo se necesita (y se importa) con SHARED_STATE_BACKEND=redis
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
+
+# Eventos que se conservan por canal (suficiente para reconexiones SSE)
+EVENTOS_POR_CANAL = 1024
+
+
+class EstadoCompartido:
+    """Interfaz común de los backends"""
+
+    nombre = "base"
+    # True si el estado es visible para otros procesos
+    multiproceso = False
+
+    def get(self, clave: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, clave: str):
+        raise NotImplementedError
+
+    def incr(self, clave: str, ttl: float) -> int:
+        """
+        Incrementa un contador y retorna el nuevo valor. La expiración se fija
+        al crear el contador (ventana fija de `ttl` segundos).
+        """
+        raise NotImplementedError
+
+    def publicar(self, canal: str, mensaje: str) -> int:
+        """Agrega un mensaje al canal y retorna su número de secuencia"""
+        raise NotImplementedError
+
+    def leer(self, canal: str, desde: int) -> List[Tuple[int, str]]:
+        """Mensajes del canal con secuencia mayor a `desde`, en orden"""
+        raise NotImplementedError
+
+    def ultima_secuencia(self, canal: str) -> int:
+        raise NotImplementedError
+
+    def limpiar_expirados(self) -> int:
+        return 0
+
+    def estadisticas(self) -> Dict:
+        return {"backend": self.nombre, "pid": os.getpid()}
+
+
+class EstadoMemoria(EstadoCompartido):
+    """Estado en memoria del proceso, con límite de entradas (LRU)"""
+
+    nombre = "memory"
+
+    def __init__(self, max_entradas: int):
+        self._lock = threading.Lock()
+        self._datos: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._canales: Dict[str, Deque[Tuple[int, str]]] = {}
+        self._secuencias: Dict[str, int] = {}
+        self._max_entradas = max_entradas
+
+    def _vigente(self, clave: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entrada = self._datos.get(clave)
+        if entrada is not None and entrada[1] is not None and entrada[1] < time.time():
+            del self._datos[clave]
+            return None
+        return entrada
+
+    def get(self, clave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._vigente(clave)
+            if entrada is None:
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[0]
+
+    def set(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        expira = time.time() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self._max_entradas:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave: str):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def incr(self, clave: str, ttl: float) -> int:
+        with self._lock:
+            entrada = self._vigente(clave)
+            if entrada is None:
+                valor, expira = 1, time.time() + ttl
+            else:
+                valor, expira = entrada[0] + 1, entrada[1]
+            self._datos[clave] = (valor, expira)
+            return valor
+
+    def publicar(self, canal: str, mensaje: str) -> int:
+        with self._lock:
+            secuencia = self._secuencias.get(canal, 0) + 1
+            self._secuencias[canal] = secuencia
+            self._canales.setdefault(canal, deque(maxlen=EVENTOS_POR_CANAL)).append((secuencia, mensaje))
+            return secuencia
+
+    def leer(self, canal: str, desde: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            return [e for e in self._canales.get(canal, ()) if e[0] > desde]
+
+    def ultima_secuencia(self, canal: str) -> int:
+        return self._secuencias.get(canal, 0)
+
+    def limpiar_expirados(self) -> int:
+        ahora = time.time()
+        with self._lock:
+            expiradas = [c for c, (_, expira) in self._datos.items() if expira is not None and expira < ahora]
+            for clave in expiradas:
+                del self._datos[clave]
+        return len(expiradas)
+
+    def estadisticas(self) -> Dict:
+        return {**super().estadisticas(), "entradas": len(self._datos)}
+
+
+class EstadoSQLite(EstadoCompartido):
+    """
+    Estado en un archivo SQLite compartido por los procesos de la máquina.
+    En /dev/shm el archivo vive en RAM; cada hilo usa su propia conexión.
+    """
+
+    nombre = "sqlite"
+    multiproceso = True
+
+    # Cada cuántas escrituras se eliminan las claves expiradas
+    _LIMPIEZA_CADA = 1000
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escrituras = 0
+
+        conn = self._conexion()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS kv (
+                clave TEXT PRIMARY KEY,
+                valor,
+                expira REAL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS eventos (
+                canal TEXT NOT NULL,
+                secuencia INTEGER NOT NULL,
+                mensaje TEXT NOT NULL,
+                PRIMARY KEY (canal, secuencia)
+            ) WITHOUT ROWID;
+        ''')
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit: cada sentencia es su propia transacción
+            conn = sqlite3.connect(self.ruta, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn = conn
+        return conn
+
+    def _contar_escritura(self):
+        self._escrituras += 1
+        if self._escrituras % self._LIMPIEZA_CADA == 0:
+            self.limpiar_expirados()
+
+    def get(self, clave: str) -> Optional[Any]:
+        row = self._conexion().execute(
+            "SELECT valor FROM kv WHERE clave = ? AND (expira IS NULL OR expira >= ?)",
+            (clave, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0] if isinstance(row[0], (int, float)) else json.loads(row[0])
+
+    def set(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        expira = time.time() + ttl if ttl else None
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO kv (clave, valor, expira) VALUES (?, ?, ?)",
+            (clave, json.dumps(valor, default=a_json), expira)
+        )
+        self._contar_escritura()
+
+    def delete(self, clave: str):
+        self._conexion().execute("DELETE FROM kv WHERE clave = ?", (clave,))
+
+    def incr(self, clave: str, ttl: float) -> int:
+        ahora = time.time()
+        row = self._conexion().execute('''
+            INSERT INTO kv (clave, valor, expira) VALUES (?, 1, ?)
+            ON CONFLICT(clave) DO UPDATE SET
+                valor = CASE WHEN kv.expira < ? THEN 1 ELSE kv.valor + 1 END,
+                expira = CASE WHEN kv.expira < ? THEN excluded.expira ELSE kv.expira END
+            RETURNING valor
+        ''', (clave, ahora + ttl, ahora, ahora)).fetchone()
+        self._contar_escritura()
+        return row[0]
+
+    def publicar(self, canal: str, mensaje: str) -> int:
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            secuencia = conn.execute(
+                "SELECT COALESCE(MAX(secuencia), 0) + 1 FROM eventos WHERE canal = ?", (canal,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO eventos (canal, secuencia, mensaje) VALUES (?, ?, ?)",
+                (canal, secuencia, mensaje)
+            )
+            conn.execute(
+                "DELETE FROM eventos WHERE canal = ? AND secuencia <= ?",
+                (canal, secuencia - EVENTOS_POR_CANAL)
+            )
+            conn.execute("COMMIT")
+            return secuencia
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def leer(self, canal: str, desde: int) -> List[Tuple[int, str]]:
+        return self._conexion().execute(
+            "SELECT secuencia, mensaje FROM eventos WHERE canal = ? AND secuencia > ? ORDER BY secuencia",
+            (canal, desde)
+        ).fetchall()
+
+    def ultima_secuencia(self, canal: str) -> int:
+        return self._conexion().execute(
+            "SELECT COALESCE(MAX(secuencia), 0) FROM eventos WHERE canal = ?", (canal,)
+        ).fetchone()[0]
+
+    def limpiar_expirados(self) -> int:
+        cursor = self._conexion().execute("DELETE FROM kv WHERE expira < ?", (time.time(),))
+        return cursor.rowcount
+
+    def estadisticas(self) -> Dict:
+        entradas = self._conexion().execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+        return {**super().estadisticas(), "ruta": self.ruta, "entradas": entradas}
+
+
+class EstadoRedis(EstadoCompartido):
+    """Estado en un servidor con protocolo Redis"""
+
+    nombre = "redis"
+    multiproceso = True
+
+    # Asigna la secuencia y agrega el mensaje en un solo paso atómico para que
+    # los lectores nunca vean una secuencia mayor antes que una menor
+    _PUBLICAR = """
+        local secuencia = redis.call('INCR', KEYS[2])
+        redis.call('ZADD', KEYS[1], secuencia, secuencia .. ':' .. ARGV[1])
+        redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[2]) + 1))
+        return secuencia
+    """
+
+    def __init__(self, url: str):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("El paquete redis no está instalado; no se puede usar SHARED_STATE_BACKEND=redis")
+        import redis
+
+        self.url = url
+        self._redis = redis.Redis.from_url(url)
+        self._publicar = self._redis.register_script(self._PUBLICAR)
+
+    def get(self, clave: str) -> Optional[Any]:
+        valor = self._redis.get(clave)
+        return None if valor is None else json.loads(valor)
+
+    def set(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        px = int(ttl * 1000) if ttl else None
+        self._redis.set(clave, json.dumps(valor, default=a_json), px=px)
+
+    def delete(self, clave: str):
+        self._redis.delete(clave)
+
+    def incr(self, clave: str, ttl: float) -> int:
+        pipe = self._redis.pipeline()
+        pipe.set(clave, 0, px=int(ttl * 1000), nx=True)
+        pipe.incr(clave)
+        return pipe.execute()[1]
+
+    def publicar(self, canal: str, mensaje: str) -> int:
+        return int(self._publicar(
+            keys=[f"eventos:{canal}", f"eventos:{canal}:secuencia"],
+            args=[mensaje, EVENTOS_POR_CANAL]
+        ))
+
+    def leer(self, canal: str, desde: int) -> List[Tuple[int, str]]:
+        miembros = self._redis.zrangebyscore(f"eventos:{canal}", f"({desde}", "+inf")
+        eventos = []
+        for miembro in miembros:
+            secuencia, mensaje = miembro.decode().split(":", 1)
+            eventos.append((int(secuencia), mensaje))
+        return eventos
+
+    def ultima_secuencia(self, canal: str) -> int:
+        return int(self._redis.get(f"eventos:{canal}:secuencia") or 0)
+
+    def estadisticas(self) -> Dict:
+        return {**super().estadisticas(), "url": self.url.split("@")[-1]}
+
+
+_estado: Optional[EstadoCompartido] = None
+_estado_lock = threading.Lock()
+
+
+def get_estado() -> EstadoCompartido:
+    """Retorna el backend de estado compartido configurado (se crea una vez por proceso)"""
+    global _estado
+    if _estado is None:
+        with _estado_lock:
+            if _estado is None:
+                _estado = _crear_estado(settings.shared_state_backend)
+    return _estado
+
+
+def _crear_estado(backend: str) -> EstadoCompartido:
+    if backend == "redis":
+        estado = EstadoRedis(settings.REDIS_URL)
+    elif backend == "sqlite":
+        estado = EstadoSQLite(settings.shared_state_path)
+    else:
+        estado = EstadoMemoria(settings.SHARED_STATE_MAX_ENTRIES)
+    logger.info(f"🔗 Estado compartido: {estado.nombre}")
+    return estado
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Coalescencia de llamadas idénticas concurrentes (single-flight).
+
+Cuando varias peticiones ejecutan a la vez la misma consulta de solo lectura
+(por ejemplo muchos vendedores escribiendo "toy" en el buscador), solo la
+primera llega a la base de datos; las demás esperan y reciben el mismo
+resultado. No es un cache: en cuanto termina la ejecución, la siguiente
+llamada vuelve a consultar.
+
+Los resultados se comparten entre llamadores, por lo que no deben
+modificarse.
+"""
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.utils.profiling import medir
+
+
+class _Llamada:
+    __slots__ = ("evento", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado: Any = None
+        self.error: Optional[BaseException] = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """Grupo de llamadas coalescidas por clave"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[Hashable, _Llamada] = {}
+        self.ejecuciones = 0
+        self.compartidas = 0
+        self.max_esperando = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecuta `fn` o se une a una ejecución en curso con la misma clave.
+        Retorna (resultado, compartido).
+        """
+        with self._lock:
+            llamada = self._en_vuelo.get(key)
+            if llamada is None:
+                llamada = _Llamada()
+                self._en_vuelo[key] = llamada
+                self.ejecuciones += 1
+                lider = True
+            else:
+                llamada.esperando += 1
+                self.compartidas += 1
+                self.max_esperando = max(self.max_esperando, llamada.esperando)
+                lider = False
+
+        if not lider:
+            with medir("singleflight-wait"):
+                llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado, True
+
+        try:
+            llamada.resultado = fn()
+            return llamada.resultado, False
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(key, None)
+            llamada.evento.set()
+
+    def estadisticas(self) -> Dict:
+        # Solo conteos: las claves llevan usuarios, búsquedas y claves de idempotencia
+        with self._lock:
+            en_vuelo = len(self._en_vuelo)
+            esperando = sum(v.esperando for v in self._en_vuelo.values())
+        return {
+            "ejecuciones": self.ejecuciones,
+            "compartidas": self.compartidas,
+            "max_esperando": self.max_esperando,
+            "en_vuelo": en_vuelo,
+            "esperando": esperando,
+        }
+
+
+_grupos: Dict[str, SingleFlight] = {}
+_grupos_lock = threading.Lock()
+
+
+def grupo(nombre: str) -> SingleFlight:
+    """Retorna (o crea) el grupo single-flight con ese nombre"""
+    with _grupos_lock:
+        if nombre not in _grupos:
+            _grupos[nombre] = SingleFlight(nombre)
+        return _grupos[nombre]
+
+
+def single_flight(nombre: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Decorador para funciones de servicio de solo lectura.
+
+    `key` recibe los mismos argumentos que la función y retorna la clave de
+    coalescencia; por defecto se usan los argumentos tal cual.
+    """
+    def decorador(fn):
+        vuelos = grupo(nombre)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            clave = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            resultado, _ = vuelos.do(clave, lambda: fn(*args, **kwargs))
+            return resultado
+
+        wrapper.single_flight = vuelos
+        return wrapper
+
+    return decorador
+
+
+def estadisticas() -> Dict[str, Dict]:
+    """Métricas de todos los grupos single-flight"""
+    with _grupos_lock:
+        grupos = list(_grupos.values())
+    return {g.nombre: g.estadisticas() for g in grupos}
\ No newline at end of file
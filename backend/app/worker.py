@@ -0,0 +1,49 @@
+"""
+Proceso dedicado a ejecutar trabajos en segundo plano.
+
+Útil cuando los trabajos pesados no deben competir por CPU con la API: se
+levanta la API con JOBS_WORKERS=0 y uno o más de estos procesos, que
+reclaman trabajos de la misma tabla `trabajos`.
+
+Uso (desde backend/):
+    python -m app.worker               # JOBS_WORKERS hilos (mínimo 1)
+    python -m app.worker --hilos 4
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Ejecuta los trabajos en segundo plano de Automotriz JJ")
+    parser.add_argument("--hilos", type=int, default=max(settings.JOBS_WORKERS, 1),
+                        help="Cantidad de hilos que ejecutan trabajos")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from app.services import tareas  # noqa: F401 - registra las tareas
+    from app.services.trabajo_service import ejecutor
+
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    signal.signal(signal.SIGINT, lambda *_: detener.set())
+
+    ejecutor.iniciar(args.hilos)
+    logger.info(f"👷 Worker de trabajos {ejecutor.worker} esperando trabajos (Ctrl+C para salir)")
+    detener.wait()
+
+    logger.info("👋 Deteniendo worker de trabajos...")
+    ejecutor.detener()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
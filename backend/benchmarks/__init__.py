@@ -0,0 +1,3 @@
+"""
+Benchmarks y pruebas de carga de la API
+"""
\ No newline at end of file
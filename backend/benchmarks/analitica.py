@@ -0,0 +1,152 @@
+"""
+Tiempo de las consultas de la analítica de ventas en memoria.
+
+Carga N ventas sintéticas (las columnas que lee analitica_service) en una
+InstantaneaVentas, de a lotes como al refrescar, y mide:
+
+- la carga (codificar textos, interpretar montos, fechas a datetime64) y la
+  memoria por fila de las columnas;
+- el mejor tiempo de varias repeticiones de consultas típicas de gerencia
+  (filtros y agrupaciones).
+
+Con `--sql` mide también el mismo GROUP BY en una tabla SQLite en memoria,
+solo contando ventas (SQLite no suma los montos de texto).
+
+Uso (desde backend/):
+    python -m benchmarks.analitica
+    python -m benchmarks.analitica --filas 5000000 --sql
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from app.services.analitica_service import CAMPOS, InstantaneaVentas
+
+PROVINCIAS = {
+    "Lima": ["Miraflores", "San Isidro", "Surco", "La Molina"],
+    "Arequipa": ["Cayma", "Yanahuara"],
+    "Cusco": ["Wanchaq", "San Sebastián"],
+    "Piura": ["Castilla"],
+}
+AUTOS = [
+    (marca, modelo, anio)
+    for marca, modelos in (
+        ("Toyota", ["Corolla", "Hilux", "RAV4", "Yaris"]),
+        ("Kia", ["Rio", "Sportage", "Seltos"]),
+        ("Hyundai", ["Tucson", "Accent", "Creta"]),
+        ("Nissan", ["Frontier", "Kicks"]),
+    )
+    for modelo in modelos
+    for anio in (2024, 2025, 2026)
+]
+
+CONSULTAS = (
+    ("total del año", {}, ["anio"]),
+    ("provincia x tipo de compra", {}, ["sucursal_provincia", "tipo_compra"]),
+    ("marca x modelo, 2025, Lima", {"anio": [2025], "sucursal_provincia": ["Lima"]}, ["marca", "modelo"]),
+    ("ventas por mes", {}, ["mes"]),
+    ("ventas por día, Crédito", {"tipo_compra": ["Crédito"]}, ["dia"]),
+    ("top vendedores", {}, ["vendedor"]),
+    ("distrito x modelo x mes", {}, ["sucursal_distrito", "modelo", "mes"]),
+)
+
+
+def generar(filas: int, lote: int):
+    """Lotes de ventas con las columnas de CAMPOS"""
+    azar = random.Random(42)
+    inicio = datetime(2025, 1, 1)
+    sucursales = [(p, d) for p, distritos in PROVINCIAS.items() for d in distritos]
+    vendedores = [(i, f"Vendedor {i}") for i in range(1, 301)]
+    for desde in range(0, filas, lote):
+        ventas = []
+        for i in range(desde + 1, min(desde + lote, filas) + 1):
+            provincia, distrito = azar.choice(sucursales)
+            vendedor_id, nombre = azar.choice(vendedores)
+            auto = azar.randrange(len(AUTOS))
+            marca, modelo, anio = AUTOS[auto]
+            ventas.append((
+                i,
+                (inicio + timedelta(minutes=azar.randint(0, 900_000))).isoformat(sep=" "),
+                vendedor_id, nombre, auto + 1, marca, modelo, anio,
+                azar.choice(["Cash", "Crédito"]),
+                f"S/. {azar.randrange(60, 400) * 500:,}.00",
+                provincia, distrito,
+            ))
+        yield ventas
+
+
+def mejor_tiempo(funcion: Callable[[], object], repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def crear_tabla(lotes) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE ventas ({', '.join(CAMPOS)})")
+    for ventas in lotes:
+        conn.executemany(f"INSERT INTO ventas VALUES ({', '.join('?' * len(CAMPOS))})", ventas)
+    conn.commit()
+    return conn
+
+
+def consulta_sql(filtros, agrupar) -> tuple:
+    columnas = {
+        "vendedor": "vendedor_id",
+        "mes": "substr(fecha_venta, 1, 7)",
+        "dia": "substr(fecha_venta, 1, 10)",
+    }
+    grupos = ", ".join(columnas.get(d, d) for d in agrupar)
+    condiciones = [f"{campo} IN ({', '.join('?' * len(valores))})" for campo, valores in filtros.items()]
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    params = tuple(v for valores in filtros.values() for v in valores)
+    return f"SELECT {grupos}, COUNT(*) FROM ventas {where} GROUP BY {grupos}", params
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide las consultas de la analítica de ventas en memoria")
+    parser.add_argument("--filas", type=int, default=2_000_000, help="Ventas en memoria")
+    parser.add_argument("--lote", type=int, default=20_000, help="Filas por lote de carga (ANALITICA_LOTE_LECTURA)")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones por consulta (se usa la mejor)")
+    parser.add_argument("--sql", action="store_true", help="Comparar con GROUP BY en SQLite en memoria")
+    args = parser.parse_args(argv)
+
+    instantanea = InstantaneaVentas()
+    inicio = time.perf_counter()
+    for ventas in generar(args.filas, args.lote):
+        instantanea.agregar(ventas)
+    carga = time.perf_counter() - inicio
+
+    columnas, _ = instantanea.vista()
+    bytes_fila = sum(columna.nbytes for columna in columnas.values()) / max(len(instantanea), 1)
+    print(f"📊 {len(instantanea)} ventas en memoria, {bytes_fila:.0f} bytes/fila")
+    print(f"   carga (generar + agregar de a {args.lote}): {carga:.1f} s\n")
+
+    conn = crear_tabla(generar(args.filas, args.lote)) if args.sql else None
+
+    encabezado = f"{'consulta':<30}{'grupos':>8}{'memoria (ms)':>14}"
+    print(encabezado + (f"{'SQLite (ms)':>14}" if conn else ""))
+    for nombre, filtros, agrupar in CONSULTAS:
+        resultado = instantanea.consultar(filtros, agrupar=agrupar, top=100)
+        tiempo = mejor_tiempo(lambda: instantanea.consultar(filtros, agrupar=agrupar, top=100), args.repeticiones)
+        linea = f"{nombre:<30}{resultado['total_grupos']:>8}{tiempo * 1000:>14.1f}"
+        if conn:
+            sql, params = consulta_sql(filtros, agrupar)
+            tiempo_sql = mejor_tiempo(lambda: conn.execute(sql, params).fetchall(), args.repeticiones)
+            linea += f"{tiempo_sql * 1000:>14.1f}   ({tiempo_sql / tiempo:.0f}x)"
+        print(linea)
+
+    if conn:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Costo de materializar filas de consultas: dict(row) contra MapaFilas.
+
+Crea una base SQLite en memoria con N ventas (las columnas de
+get_ventas_by_vendedor) y compara tres formas de convertir el resultado:
+
+- `dict(row)` con sqlite3.Row (lo que hacían los servicios)
+- `dict(zip(columnas, fila))` con tuplas (lo que funciona con pyodbc)
+- `MapaFilas.todas(cursor)` (objetos con __slots__, app/utils/filas.py)
+
+Para cada una mide el mejor tiempo de varias repeticiones (fetch + armado),
+la memoria retenida por fila (valores incluidos) con tracemalloc, el tiempo
+de serializar la lista a JSON como lo hace el estado compartido y el de la
+respuesta completa de la API (fetch + armado + cuerpo): los dicts pasan por
+jsonable_encoder y JSONResponse, como en una ruta que retorna un dict; las
+filas por RespuestaFilas, como en /venta/mis-ventas.
+
+Uso (desde backend/):
+    python -m benchmarks.filas
+    python -m benchmarks.filas --filas 50000 --repeticiones 7
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.services.venta_service import VENTA_VENDEDOR
+from app.utils.filas import a_json
+from app.utils.profiling import RespuestaFilas
+
+CONSULTA = f"SELECT {', '.join(VENTA_VENDEDOR.campos)} FROM ventas"
+
+
+def crear_base(filas: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute('''
+        CREATE TABLE ventas (
+            id INTEGER PRIMARY KEY,
+            fecha_venta TIMESTAMP,
+            monto_fisco TEXT,
+            nombre_comprador TEXT,
+            dni_comprador TEXT,
+            contacto_comprador TEXT,
+            auto TEXT,
+            tipo_compra TEXT,
+            sucursal_provincia TEXT,
+            sucursal_distrito TEXT
+        )
+    ''')
+    azar = random.Random(42)
+    inicio = datetime(2024, 1, 1)
+    conn.executemany(
+        f"INSERT INTO ventas VALUES ({', '.join('?' * 10)})",
+        (
+            (
+                i,
+                inicio + timedelta(minutes=azar.randint(0, 900_000)),
+                f"{azar.uniform(15000, 120000):.2f}",
+                f"Comprador {i}",
+                f"{azar.randint(10_000_000, 79_999_999)}",
+                f"9{azar.randint(10_000_000, 99_999_999)}",
+                azar.choice(["Toyota Hilux 2024", "Kia Rio 2023", "Hyundai Tucson 2025"]),
+                azar.choice(["cash", "credito"]),
+                "Lima",
+                azar.choice(["Miraflores", "San Isidro", "Surco"]),
+            )
+            for i in range(1, filas + 1)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def con_row(conn: sqlite3.Connection) -> List:
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(CONSULTA).fetchall()]
+    finally:
+        conn.row_factory = None
+
+
+def con_zip(conn: sqlite3.Connection) -> List:
+    cursor = conn.execute(CONSULTA)
+    columnas = [c[0] for c in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+def con_mapa(conn: sqlite3.Connection) -> List:
+    return VENTA_VENDEDOR.todas(conn.execute(CONSULTA))
+
+
+def respuesta_dicts(ventas: List) -> bytes:
+    return JSONResponse(jsonable_encoder({"ventas": ventas})).body
+
+
+def respuesta_filas(ventas: List) -> bytes:
+    return RespuestaFilas({"ventas": ventas}).body
+
+
+def mejor_tiempo(funcion: Callable[[], object], repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def bytes_retenidos(conn: sqlite3.Connection, convertir: Callable) -> float:
+    """Memoria por fila que retiene el resultado de `convertir`"""
+    tracemalloc.start()
+    resultado = convertir(conn)
+    retenidos = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return retenidos / max(len(resultado), 1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dict(row) con MapaFilas al materializar filas")
+    parser.add_argument("--filas", type=int, default=10_000, help="Filas de la consulta")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones por variante (se usa la mejor)")
+    args = parser.parse_args(argv)
+
+    conn = crear_base(args.filas)
+    variantes = (
+        ("dict(row)", con_row, respuesta_dicts),
+        ("dict(zip)", con_zip, respuesta_dicts),
+        ("MapaFilas", con_mapa, respuesta_filas),
+    )
+
+    print(f"📊 {args.filas} filas x {len(VENTA_VENDEDOR.campos)} columnas, mejor de {args.repeticiones}\n")
+    print(f"{'variante':<12}{'armar (ms)':>12}{'bytes/fila':>12}{'json (ms)':>12}{'API (ms)':>12}")
+
+    base = None
+    for nombre, convertir, responder in variantes:
+        armar = mejor_tiempo(lambda: convertir(conn), args.repeticiones)
+        memoria = bytes_retenidos(conn, convertir)
+        resultado = convertir(conn)
+        serializar = mejor_tiempo(lambda: json.dumps(resultado, default=a_json), args.repeticiones)
+        api = mejor_tiempo(lambda: responder(convertir(conn)), args.repeticiones)
+        base = base or (armar, memoria, api)
+
+        print(
+            f"{nombre:<12}{armar * 1000:>12.1f}{memoria:>12.0f}{serializar * 1000:>12.1f}{api * 1000:>12.1f}"
+            f"   ({armar / base[0]:.2f}x tiempo, {memoria / base[1]:.2f}x memoria, {api / base[2]:.2f}x API)"
+        )
+
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
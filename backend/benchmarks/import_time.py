@@ -0,0 +1,117 @@
+"""
+Presupuesto de tiempo de importación del backend.
+
+Importa los módulos de entrada (por defecto `app.main` y `app.worker`) en
+procesos nuevos con `python -X importtime` y verifica que:
+
+- el tiempo acumulado de cada módulo quede dentro del presupuesto
+- con DB_TYPE=sqlite no se carguen los drivers y librerías que solo hacen
+  falta en otros despliegues o en el primer uso (pyodbc, python-jose,
+  passlib/bcrypt, pyarrow, redis, numpy)
+
+Muestra también los paquetes que más tiempo propio consumen. Sale con código
+1 si algún chequeo falla, para usarlo en CI.
+
+Uso (desde backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --presupuesto-ms 800 --repeticiones 5
+    python -m benchmarks.import_time --modulo app.main
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS = ("app.main", "app.worker")
+
+# Tiempo acumulado máximo por módulo de entrada (también lo usa tests/test_import_time.py)
+PRESUPUESTO_MS = 1500.0
+
+# Paquetes que un arranque con SQLite no debe importar
+PROHIBIDOS = ("pyodbc", "jose", "passlib", "bcrypt", "cryptography", "pyarrow", "redis", "numpy")
+
+
+def medir(modulo: str) -> Dict[str, Tuple[int, int]]:
+    """Importa `modulo` en un proceso nuevo; retorna {módulo: (propio_us, acumulado_us)}"""
+    entorno = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])),
+        "DB_TYPE": "sqlite",
+    }
+    entorno.setdefault("SECRET_KEY", "presupuesto-importacion")
+
+    # En un directorio temporal: app.main crea sus archivos de log al importarse
+    with tempfile.TemporaryDirectory(prefix="automotriz_import_") as directorio:
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+            cwd=directorio,
+            env=entorno,
+            capture_output=True,
+            text=True,
+        )
+
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+
+    tiempos = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "imported package" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        tiempos[nombre.strip()] = (int(propio), int(acumulado))
+    return tiempos
+
+
+def mejor_de(modulo: str, repeticiones: int) -> Dict[str, Tuple[int, int]]:
+    """La medición más rápida de varias (descarta el ruido de la máquina)"""
+    mediciones = [medir(modulo) for _ in range(max(repeticiones, 1))]
+    return min(mediciones, key=lambda t: t.get(modulo, (0, 0))[1])
+
+
+def por_paquete(tiempos: Dict[str, Tuple[int, int]]) -> List[Tuple[str, int]]:
+    """Tiempo propio sumado por paquete de primer nivel, de mayor a menor"""
+    totales: Dict[str, int] = defaultdict(int)
+    for nombre, (propio, _) in tiempos.items():
+        totales[nombre.split(".")[0]] += propio
+    return sorted(totales.items(), key=lambda t: t[1], reverse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verifica el presupuesto de tiempo de importación del backend")
+    parser.add_argument("--modulo", action="append", help="Módulo a importar (repetible; por defecto app.main y app.worker)")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS,
+                        help="Tiempo acumulado máximo por módulo, en milisegundos")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Mediciones por módulo (se usa la mejor)")
+    parser.add_argument("--top", type=int, default=10, help="Paquetes más lentos a mostrar")
+    args = parser.parse_args(argv)
+
+    fallos = 0
+    for modulo in args.modulo or MODULOS:
+        tiempos = mejor_de(modulo, args.repeticiones)
+        total_ms = tiempos.get(modulo, (0, 0))[1] / 1000
+        cargados = {nombre.split(".")[0] for nombre in tiempos}
+        prohibidos = [p for p in PROHIBIDOS if p in cargados]
+
+        dentro = total_ms <= args.presupuesto_ms
+        estado = "✅" if dentro and not prohibidos else "❌"
+        print(f"{estado} {modulo}: {total_ms:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms), {len(tiempos)} módulos")
+
+        for paquete, propio in por_paquete(tiempos)[:args.top]:
+            print(f"   {propio / 1000:8.1f} ms  {paquete}")
+
+        if prohibidos:
+            print(f"   ⚠️  importó paquetes que deberían cargarse bajo demanda: {', '.join(prohibidos)}")
+        if not dentro or prohibidos:
+            fallos += 1
+        print()
+
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
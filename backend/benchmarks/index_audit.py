@@ -0,0 +1,521 @@
+"""
+Auditoría de índices contra las consultas reales de los servicios.
+
+Ejecuta las funciones de servicio (login, catálogo, venta, mis-ventas,
+export, compradores, idempotencia, cambios, sincronización, pronóstico de
+demanda) sobre una base SQLite sembrada en un directorio temporal, captura
+cada consulta con sus parámetros y muestra su plan de ejecución:
+
+- SQLite: `EXPLAIN QUERY PLAN`
+- Azure SQL (`--motor azure`): `SET SHOWPLAN_XML ON` sobre la base
+  configurada en `.env` (el plan se compila, la consulta no se ejecuta)
+
+Marca los recorridos completos de tabla, los ordenamientos en memoria y los
+índices que ninguna consulta usa, y lista los cambios que el bootstrap del
+esquema (`aplicar_indices`, conjunto `INDICES` de app/database.py) aplicaría
+sobre la base auditada.
+
+Uso (desde backend/):
+    python -m benchmarks.index_audit
+    python -m benchmarks.index_audit --db automotriz_jj.db   # copia de una base existente
+    python -m benchmarks.index_audit --motor azure --strict
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Set, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_ESPACIOS = re.compile(r"\s+")
+_PASO_SQLITE = re.compile(
+    r"^(SCAN|SEARCH) (\S+)(?: AS \S+)?(?: USING (?:COVERING )?INDEX (\S+))?(?: USING (INTEGER )?PRIMARY KEY)?"
+)
+_SHOWPLAN_NS = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+# Solo se explican lecturas y escrituras con WHERE; un INSERT ... VALUES no
+# tiene plan de acceso interesante
+_EXPLICABLES = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+class Consulta:
+    """Consulta capturada (SQL normalizado + parámetros del primer uso)"""
+
+    def __init__(self, sql: str, params: tuple, origen: str):
+        self.sql = sql
+        self.params = params
+        self.origenes = [origen]
+        self.plan: List[str] = []
+        self.indices: Set[str] = set()
+        self.avisos: List[str] = []
+        self.error: Optional[str] = None
+
+    def a_dict(self) -> Dict:
+        return {
+            "sql": self.sql,
+            "origenes": self.origenes,
+            "plan": self.plan,
+            "indices": sorted(self.indices),
+            "avisos": self.avisos,
+            "error": self.error,
+        }
+
+
+class _Captura:
+    """Registro de consultas ejecutadas durante la carga de trabajo"""
+
+    def __init__(self):
+        self.consultas: Dict[str, Consulta] = {}
+
+    def registrar(self, sql: str, params: tuple):
+        normalizado = _ESPACIOS.sub(" ", sql).strip()
+        if not normalizado.upper().startswith(_EXPLICABLES):
+            return
+        origen = _origen_servicio()
+        existente = self.consultas.get(normalizado)
+        if existente is None:
+            self.consultas[normalizado] = Consulta(normalizado, params, origen)
+        elif origen not in existente.origenes:
+            existente.origenes.append(origen)
+
+
+def _origen_servicio() -> str:
+    """
+    Primer frame dentro de app/services, p. ej. 'venta_service.get_autos_disponibles'.
+    Las funciones anidadas (las que se ejecutan en cada base de ventas) llevan
+    el nombre de la que las contiene: 'archivo_service.meses_por_archivar.leer'.
+    """
+    for frame in inspect.stack()[2:]:
+        ruta = frame.filename.replace(os.sep, "/")
+        if "/app/services/" in ruta:
+            nombre = getattr(frame.frame.f_code, "co_qualname", frame.function).replace(".<locals>", "")
+            return f"{os.path.splitext(os.path.basename(ruta))[0]}.{nombre}"
+    return "?"
+
+
+class _CursorGrabado:
+    __slots__ = ("_cursor", "_captura")
+
+    def __init__(self, cursor, captura: _Captura):
+        self._cursor = cursor
+        self._captura = captura
+
+    def execute(self, sql: str, params: tuple = ()):
+        self._captura.registrar(sql, tuple(params))
+        return self._cursor.execute(sql, params)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class _ConexionGrabada:
+    __slots__ = ("_conn", "_captura")
+
+    def __init__(self, conn, captura: _Captura):
+        self._conn = conn
+        self._captura = captura
+
+    def cursor(self, *args, **kwargs):
+        return _CursorGrabado(self._conn.cursor(*args, **kwargs), self._captura)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+def _preparar_base(db_origen: Optional[str], semilla: int):
+    """Crea (o copia) la base SQLite en el directorio de trabajo actual"""
+    from app.database import db_manager
+
+    if db_origen:
+        db_manager.clonar_desde(db_origen)
+        return
+
+    random.seed(semilla)
+    from app.database import init_database, seed_initial_data
+    init_database()
+    seed_initial_data()
+
+
+def _valor(sql: str, params: tuple = ()):
+    """Consulta auxiliar de la auditoría (no se captura)"""
+    from app.database import db_manager
+
+    conn = db_manager._connect()
+    try:
+        row = conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def ejecutar_carga() -> _Captura:
+    """Ejecuta las funciones de servicio capturando sus consultas"""
+    from datetime import datetime, timedelta
+    from app.database import db_manager
+    from app.services import (
+        analitica_service, archivo_service, auth_service, catalogo_service, cdc_service, cliente_service,
+        credito_service, dashboard_service, idempotencia_service, pronostico_service, ranking_service,
+        sesion_service, sync_service, tareas, trabajo_service, venta_service
+    )
+
+    captura = _Captura()
+    conectar = db_manager._connect
+    db_manager._connect = lambda *args: _ConexionGrabada(conectar(*args), captura)
+
+    try:
+        username = _valor("SELECT username FROM vendedores WHERE is_active = 1 ORDER BY id")
+        user = auth_service.get_user(username)
+        auth_service.get_user_by_id(user["id"])
+
+        autos = venta_service.get_autos_disponibles()
+        venta_service.get_autos_disponibles("toy")
+
+        dni = _valor("SELECT dni_comprador FROM registro_venta ORDER BY id") or "12345678"
+        if autos:
+            venta_service.registrar_venta(
+                user["id"], autos[0]["id"], "Cash", "10000", "Cliente Auditoría", dni,
+                "999999999", user["sucursal_provincia"], user["sucursal_distrito"],
+                user["full_name"], clave_idempotencia="auditoria-indices",
+                huella_idempotencia="0" * 32
+            )
+
+        if autos:
+            credito_service.get_auto_precio(autos[0]["id"])
+
+        venta_service.get_ventas_by_vendedor(user["id"], 50, user["sucursal_provincia"])
+        venta_service.contar_ventas_export(user["sucursal_provincia"], user["sucursal_distrito"])
+
+        hoy = datetime.now()
+        for distrito, desde, hasta in (
+            (user["sucursal_distrito"], None, None),
+            (user["sucursal_distrito"], hoy - timedelta(days=30), hoy),
+            (None, hoy - timedelta(days=30), hoy),
+        ):
+            for _ in venta_service.iter_ventas_export(
+                user["sucursal_provincia"], distrito, desde, hasta, batch_size=500
+            ):
+                pass
+
+        cliente_service.get_comprador(dni)
+        cliente_service.buscar_compradores(dni[:3])
+        cliente_service.buscar_compradores("mar")
+
+        desde_mes = dashboard_service.inicio_de_mes(hoy)
+        dashboard_service.get_totales_mes(user["id"], desde_mes, user["sucursal_provincia"])
+        ranking_service.reconstruir()
+        archivo_service.meses_archivados()
+        archivo_service.meses_por_archivar()
+
+        cdc_service.validar_cursor(0)
+        for _ in cdc_service.iter_cambios(0, 100, batch_size=50):
+            pass
+        cdc_service.purgar_cambios()
+
+        if autos:
+            lista = f"marca,modelo,anio,precio_referencial\n{autos[0]['marca']},{autos[0]['modelo']},{autos[0]['anio']},1000\n"
+            catalogo_service.importar_lista(catalogo_service.leer_lista(
+                (lista + "Auditoría,Índices,2026,1000\n").encode(), "csv"
+            ))
+
+        sync_service.sincronizar(user, {"catalogo": None, "ventas": None})
+        sync_service.sincronizar(user, {"catalogo": 0, "ventas": 0})
+
+        pronostico_service.actualizar_ventas_diarias()
+        pronostico_service.calcular_pronosticos()
+        pronostico_service.get_reposicion(user["sucursal_provincia"], user["sucursal_distrito"])
+
+        analitica_service.refrescar(forzar=True)
+
+        idempotencia_service._buscar_en_db(user["id"], "auditoria-indices", user["sucursal_provincia"])
+        idempotencia_service.purgar_claves_expiradas()
+
+        refresh = sesion_service.emitir_refresh(user["id"])
+        refresh = sesion_service.rotar_refresh(refresh)["refresh_token"]
+        sesion_service.revocar_sesion(refresh, user["id"])
+        sesion_service.purgar_refresh_expirados()
+
+        trabajo_id = trabajo_service.encolar(tareas.purgar_idempotencia.__name__, creado_por=user["id"])
+        trabajo = trabajo_service.reclamar_siguiente("auditoria-indices")
+        if trabajo:
+            trabajo_service.reportar_progreso(trabajo, "auditoria-indices", 50)
+            trabajo_service.completar(trabajo, "auditoria-indices", None)
+        trabajo_service.get_trabajo(trabajo_id)
+        trabajo_service.recuperar_colgados()
+        trabajo_service.purgar_finalizados()
+    finally:
+        db_manager._connect = conectar
+
+    return captura
+
+
+def _explicar_sqlite(consultas: List[Consulta]):
+    from app.database import db_manager
+
+    conn = db_manager._connect()
+    try:
+        for consulta in consultas:
+            try:
+                filas = conn.execute(f"EXPLAIN QUERY PLAN {consulta.sql}", consulta.params).fetchall()
+            except Exception as e:
+                consulta.error = str(e)
+                continue
+
+            for fila in filas:
+                detalle = fila[3]
+                consulta.plan.append(detalle)
+                paso = _PASO_SQLITE.match(detalle)
+                if paso:
+                    operacion, tabla, indice, _ = paso.groups()
+                    if indice:
+                        consulta.indices.add(indice)
+                    if operacion == "SCAN" and not indice and "PRIMARY KEY" not in detalle:
+                        consulta.avisos.append(f"recorrido completo de {tabla}")
+                    elif operacion == "SCAN" and indice:
+                        consulta.avisos.append(f"recorrido completo del índice {indice}")
+                elif detalle.startswith("USE TEMP B-TREE"):
+                    consulta.avisos.append(f"ordenamiento en memoria ({detalle[len('USE TEMP B-TREE '):].lower()})")
+    finally:
+        conn.close()
+
+
+def _indices_sqlite() -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """Retorna ({índice: tabla} explícitos, {índice: columnas FK que soporta})"""
+    from app.database import db_manager
+
+    conn = db_manager._connect()
+    try:
+        indices = {
+            nombre: tabla for nombre, tabla in conn.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+            )
+        }
+        soporte_fk: Dict[str, List[str]] = {}
+        for nombre, tabla in indices.items():
+            columnas = [fila[2] for fila in conn.execute(f"PRAGMA index_info({nombre})")]
+            claves_fk = {fila[3] for fila in conn.execute(f"PRAGMA foreign_key_list({tabla})")}
+            if columnas and columnas[0] in claves_fk:
+                soporte_fk[nombre] = [f"{tabla}.{columnas[0]}"]
+        return indices, soporte_fk
+    finally:
+        conn.close()
+
+
+def _explicar_azure(consultas: List[Consulta]):
+    import pyodbc
+    from app.config import settings
+
+    conn = pyodbc.connect(settings.azure_connection_string, autocommit=True)
+    try:
+        cursor = conn.cursor()
+        for consulta in consultas:
+            try:
+                cursor.execute("SET SHOWPLAN_XML ON")
+                cursor.execute(consulta.sql, consulta.params)
+                plan_xml = cursor.fetchone()[0]
+            except Exception as e:
+                consulta.error = str(e).splitlines()[0]
+                continue
+            finally:
+                try:
+                    cursor.execute("SET SHOWPLAN_XML OFF")
+                except Exception:
+                    pass
+
+            for relop in ET.fromstring(plan_xml).iter(f"{_SHOWPLAN_NS}RelOp"):
+                operacion = relop.get("PhysicalOp")
+                objeto = next(relop.iter(f"{_SHOWPLAN_NS}Object"), None)
+                tabla = (objeto.get("Table") or "").strip("[]") if objeto is not None else ""
+                indice = (objeto.get("Index") or "").strip("[]") if objeto is not None else ""
+                consulta.plan.append(f"{operacion} {tabla} {indice}".strip())
+                if indice:
+                    consulta.indices.add(indice)
+                if operacion in ("Table Scan", "Clustered Index Scan"):
+                    consulta.avisos.append(f"recorrido completo de {tabla}")
+                elif operacion == "Index Scan":
+                    consulta.avisos.append(f"recorrido completo del índice {indice}")
+                elif operacion == "Sort":
+                    consulta.avisos.append("ordenamiento en memoria")
+    finally:
+        conn.close()
+
+
+def _indices_azure() -> Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, int]]:
+    """Índices secundarios, columnas FK que soportan y lecturas según sys.dm_db_index_usage_stats"""
+    import pyodbc
+    from app.config import settings
+
+    conn = pyodbc.connect(settings.azure_connection_string)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT i.name, OBJECT_NAME(i.object_id),
+                   ISNULL(SUM(u.user_seeks + u.user_scans + u.user_lookups), 0)
+            FROM sys.indexes i
+            LEFT JOIN sys.dm_db_index_usage_stats u
+                ON u.object_id = i.object_id AND u.index_id = i.index_id AND u.database_id = DB_ID()
+            WHERE i.type > 0 AND i.is_primary_key = 0 AND i.is_unique_constraint = 0
+                AND OBJECTPROPERTY(i.object_id, 'IsUserTable') = 1
+            GROUP BY i.name, i.object_id
+        ''')
+        indices, lecturas = {}, {}
+        for nombre, tabla, usos in cursor.fetchall():
+            indices[nombre] = tabla
+            lecturas[nombre] = usos
+
+        cursor.execute('''
+            SELECT i.name, OBJECT_NAME(fkc.parent_object_id) + '.' + COL_NAME(fkc.parent_object_id, fkc.parent_column_id)
+            FROM sys.foreign_key_columns fkc
+            JOIN sys.index_columns ic
+                ON ic.object_id = fkc.parent_object_id AND ic.column_id = fkc.parent_column_id AND ic.key_ordinal = 1
+            JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+        ''')
+        soporte_fk: Dict[str, List[str]] = {}
+        for nombre, columna in cursor.fetchall():
+            soporte_fk.setdefault(nombre, []).append(columna)
+        return indices, soporte_fk, lecturas
+    finally:
+        conn.close()
+
+
+def auditar(motor: str) -> Dict:
+    """Explica las consultas capturadas y compara contra el conjunto declarado"""
+    from app.database import INDICES, INDICES_OBSOLETOS
+
+    consultas = list(ejecutar_carga().consultas.values())
+    lecturas: Dict[str, int] = {}
+
+    if motor == "azure":
+        _explicar_azure(consultas)
+        existentes, soporte_fk, lecturas = _indices_azure()
+    else:
+        _explicar_sqlite(consultas)
+        existentes, soporte_fk = _indices_sqlite()
+
+    usados = set().union(*(c.indices for c in consultas)) if consultas else set()
+    sin_uso = []
+    for nombre in sorted(existentes):
+        if nombre in usados:
+            continue
+        entrada = {"indice": nombre, "tabla": existentes[nombre], "soporta_fk": soporte_fk.get(nombre, [])}
+        if nombre in lecturas:
+            entrada["lecturas_produccion"] = lecturas[nombre]
+        sin_uso.append(entrada)
+
+    declarados = {indice.nombre for indice in INDICES}
+    propuesta = {
+        "crear": [
+            f"CREATE INDEX {i.nombre} ON {i.sql_azure() if motor == 'azure' else i.sql_sqlite()}"
+            for i in INDICES if i.nombre not in existentes
+        ],
+        "eliminar": [
+            f"DROP INDEX {nombre}" for nombre in sorted(existentes) if nombre in INDICES_OBSOLETOS
+        ],
+        "no_declarados": sorted(n for n in existentes if n not in declarados and n not in INDICES_OBSOLETOS),
+    }
+
+    return {
+        "motor": motor,
+        "consultas": [c.a_dict() for c in consultas],
+        "indices_sin_uso": sin_uso,
+        "propuesta": propuesta,
+    }
+
+
+def imprimir_reporte(reporte: Dict):
+    print(f"\n🔎 Auditoría de índices ({reporte['motor']}) - {len(reporte['consultas'])} consultas\n")
+
+    for consulta in reporte["consultas"]:
+        marca = "❌" if consulta["error"] else ("⚠️ " if consulta["avisos"] else "✅")
+        print(f"{marca} {', '.join(consulta['origenes'])}")
+        print(f"   {consulta['sql'][:160]}{'...' if len(consulta['sql']) > 160 else ''}")
+        if consulta["error"]:
+            print(f"   error: {consulta['error']}")
+        for paso in consulta["plan"]:
+            print(f"   · {paso}")
+        for aviso in consulta["avisos"]:
+            print(f"   ⚠️  {aviso}")
+        print()
+
+    print("📉 Índices sin uso en estas consultas:")
+    if not reporte["indices_sin_uso"]:
+        print("   (ninguno)")
+    for entrada in reporte["indices_sin_uso"]:
+        detalle = f"soporta FK {', '.join(entrada['soporta_fk'])}" if entrada["soporta_fk"] else "candidato a eliminar"
+        if "lecturas_produccion" in entrada:
+            detalle += f", {entrada['lecturas_produccion']} lecturas en producción"
+        print(f"   - {entrada['indice']} ({entrada['tabla']}): {detalle}")
+
+    propuesta = reporte["propuesta"]
+    print("\n🛠️  Cambios que aplicaría el bootstrap (app/database.py: INDICES / INDICES_OBSOLETOS):")
+    if not propuesta["crear"] and not propuesta["eliminar"]:
+        print("   (la base ya tiene el conjunto declarado)")
+    for sql in propuesta["eliminar"] + propuesta["crear"]:
+        print(f"   {sql}")
+    for nombre in propuesta["no_declarados"]:
+        print(f"   ? {nombre}: no está declarado en INDICES (revisar)")
+    print()
+
+
+def _hay_problemas(reporte: Dict) -> bool:
+    return (
+        any(c["avisos"] or c["error"] for c in reporte["consultas"])
+        or any(not e["soporta_fk"] for e in reporte["indices_sin_uso"])
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Auditoría de índices contra las consultas de los servicios")
+    parser.add_argument("--motor", choices=("sqlite", "azure"), default="sqlite",
+                        help="Motor donde se explican las consultas")
+    parser.add_argument("--db", help="Auditar una copia de esta base SQLite en vez de una base sembrada")
+    parser.add_argument("--seed", type=int, default=2020, help="Semilla de los datos sembrados")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el reporte")
+    parser.add_argument("--strict", action="store_true",
+                        help="Salir con código 1 si hay recorridos completos, ordenamientos o índices sin uso")
+    args = parser.parse_args(argv)
+
+    db_origen = os.path.abspath(args.db) if args.db else None
+    output = os.path.abspath(args.output) if args.output else None
+
+    # La captura siempre corre sobre SQLite en un directorio temporal
+    os.environ["DB_TYPE"] = "sqlite" if args.motor == "sqlite" else os.environ.get("DB_TYPE", "azure")
+    sys.path.insert(0, BACKEND_DIR)
+    workdir = tempfile.mkdtemp(prefix="automotriz_indices_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    try:
+        from app.database import db_manager
+        motor_configurado = db_manager.db_type
+        db_manager.db_type = "sqlite"
+        try:
+            _preparar_base(db_origen, args.seed)
+            reporte = auditar(args.motor)
+        finally:
+            db_manager.db_type = motor_configurado
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    imprimir_reporte(reporte)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False, default=str)
+        print(f"💾 Reporte guardado en {output}")
+
+    return 1 if args.strict and _hay_problemas(reporte) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,491 @@
+"""
+Prueba de carga HTTP de extremo a extremo para la API de Automotriz JJ.
+
+Levanta la aplicación con uvicorn sobre una base de datos SQLite sembrada en
+un directorio temporal y ejecuta mezclas de tráfico realistas:
+
+- login:    ráfagas de inicio de sesión
+- catalogo: búsqueda de autos mientras el vendedor escribe ("t", "to", "toy"...)
+- venta:    registro de ventas
+- historial: consulta de mis-ventas
+- mixto:    mezcla ponderada de todo lo anterior
+
+Antes de cada escenario se repone el stock de todos los autos (`--stock`),
+para que las ventas de un escenario no agoten el catálogo del siguiente. Las
+ventas rechazadas por falta de stock (409) se cuentan aparte de los errores.
+
+Reporta throughput y latencias p50/p95/p99 por endpoint, guarda el resultado
+en JSON y, si se indica una línea base, falla cuando alguna métrica empeora
+más allá del umbral. Solo usa la biblioteca estándar y funciona sin red.
+
+Uso (desde backend/):
+    python -m benchmarks.loadtest --output benchmarks/results/actual.json
+    python -m benchmarks.loadtest --baseline benchmarks/results/base.json --threshold 0.20
+    python -m benchmarks.loadtest --scenarios venta,mixto --sharding
+"""
+import argparse
+import glob
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Credenciales sembradas por seed_initial_data
+VENDEDORES = [
+    ("cmendoza", "carlos2020"),
+    ("svargas", "sofia2020"),
+    ("mrojas", "miguel2020"),
+    ("ldiaz", "laura2020"),
+    ("dcruz", "diego2020"),
+    ("alopez", "andrea2020"),
+    ("rsilva", "roberto2020"),
+    ("ptorres", "patricia2020"),
+    ("fcampos", "fernando2020"),
+    ("vmorales", "valentina2020"),
+    ("mquispe", "marco2020"),
+    ("chuaman", "carmen2020"),
+]
+
+# Palabras que se "teclean" letra por letra en el buscador de autos
+BUSQUEDAS = ["toyota", "honda", "nissan", "hyundai", "mazda", "kia", "2025", "cr-v", "sportage"]
+
+ESCENARIOS = ("login", "catalogo", "venta", "historial", "mixto")
+
+
+class ClienteHTTP:
+    """Cliente HTTP mínimo con conexión keep-alive por hilo"""
+    
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+    
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Reabrir la conexión si el servidor la cerró
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+    
+    def close(self):
+        self.conn.close()
+
+
+class Registro:
+    """Acumula latencias, errores y rechazos por endpoint de forma segura entre hilos"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias: Dict[str, List[float]] = {}
+        self.errores: Dict[str, int] = {}
+        self.rechazos: Dict[str, int] = {}
+    
+    def agregar(self, endpoint: str, segundos: float, ok: bool, rechazo: bool = False):
+        with self._lock:
+            self.latencias.setdefault(endpoint, []).append(segundos)
+            if rechazo:
+                self.rechazos[endpoint] = self.rechazos.get(endpoint, 0) + 1
+            elif not ok:
+                self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def _puerto_libre() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _entorno(workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env["DB_TYPE"] = "sqlite"
+    env.setdefault("SECRET_KEY", "benchmark-secret-key-no-usar-en-produccion")
+    return env
+
+
+def preparar_base_datos(workdir: str, semilla: int):
+    """Crea y siembra automotriz_jj.db dentro de workdir"""
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.seed", "--seed", str(semilla)],
+        cwd=workdir, env=_entorno(workdir), check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def reponer_stock(workdir: str, stock: int):
+    """
+    Deja `stock` unidades de cada auto activo (la API lee el stock de la base
+    en cada request). Con sharding, también vacía los cupos de las sucursales.
+    """
+    directorio = os.environ.get("SQLITE_SHARDS_DIR") or os.path.join(workdir, "sucursales")
+    for ruta in glob.glob(os.path.join(directorio, "*.db")):
+        conn = sqlite3.connect(ruta, timeout=30)
+        try:
+            conn.execute("UPDATE stock_sucursal SET disponible = 0, vendidas = 0")
+            conn.commit()
+        finally:
+            conn.close()
+    
+    conn = sqlite3.connect(os.path.join(workdir, "automotriz_jj.db"), timeout=30)
+    try:
+        conn.execute("UPDATE autos_disponibles SET stock = ? WHERE is_active = 1", (stock,))
+        conn.execute("DELETE FROM stock_asignado")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def iniciar_servidor(workdir: str, port: int, workers: int) -> subprocess.Popen:
+    """Inicia uvicorn en segundo plano y espera a que /health responda"""
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=_entorno(workdir),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    
+    limite = time.time() + 60
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de estar disponible")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proceso
+        except OSError:
+            time.sleep(0.2)
+    
+    proceso.terminate()
+    raise RuntimeError("El servidor no respondió a /health en 60 segundos")
+
+
+def _login(cliente: ClienteHTTP, username: str, password: str) -> Tuple[int, Optional[str]]:
+    body = urlencode({"username": username, "password": password}).encode()
+    status, data = cliente.request(
+        "POST", "/auth/login", body=body,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    token = json.loads(data)["access_token"] if status == 200 else None
+    return status, token
+
+
+class Trabajador:
+    """Un vendedor simulado que ejecuta operaciones de un escenario"""
+    
+    def __init__(self, host: str, port: int, registro: Registro, rng: random.Random):
+        self.cliente = ClienteHTTP(host, port)
+        self.registro = registro
+        self.rng = rng
+        self.username, self.password = rng.choice(VENDEDORES)
+        status, self.token = _login(self.cliente, self.username, self.password)
+        if status != 200:
+            raise RuntimeError(f"No se pudo autenticar a {self.username}: HTTP {status}")
+        self.auto_ids = self._cargar_auto_ids()
+    
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+    
+    def _cargar_auto_ids(self) -> List[int]:
+        status, data = self.cliente.request("GET", "/venta/autos", headers=self.headers)
+        if status != 200:
+            return []
+        return [auto["id"] for auto in json.loads(data)["autos"]]
+    
+    def _medir(self, endpoint: str, method: str, path: str, body: Optional[bytes] = None,
+               headers: Optional[Dict[str, str]] = None, esperado: int = 200,
+               rechazo: Optional[int] = None):
+        """`rechazo` es un status de negocio (p. ej. 409 sin stock) que no cuenta como error"""
+        inicio = time.perf_counter()
+        status = None
+        try:
+            status, _ = self.cliente.request(method, path, body=body, headers=headers)
+            ok = status == esperado
+        except (http.client.HTTPException, OSError):
+            ok = False
+        self.registro.agregar(endpoint, time.perf_counter() - inicio, ok,
+                              rechazo=rechazo is not None and status == rechazo)
+    
+    def login(self):
+        username, password = self.rng.choice(VENDEDORES)
+        body = urlencode({"username": username, "password": password}).encode()
+        self._medir("POST /auth/login", "POST", "/auth/login", body=body,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"})
+    
+    def catalogo(self):
+        palabra = self.rng.choice(BUSQUEDAS)
+        for i in range(1, len(palabra) + 1):
+            path = "/venta/autos?" + urlencode({"search": palabra[:i]})
+            self._medir("GET /venta/autos", "GET", path, headers=self.headers)
+    
+    def venta(self):
+        if not self.auto_ids:
+            return
+        payload = {
+            "auto_id": self.rng.choice(self.auto_ids),
+            "tipo_compra": self.rng.choice(["Cash", "Crédito"]),
+            "monto_fisco": f"S/. {self.rng.randint(60000, 250000):,.2f}",
+            "nombre_comprador": "Cliente Benchmark",
+            "dni_comprador": str(self.rng.randint(10000000, 99999999)),
+            "contacto_comprador": f"9{self.rng.randint(10000000, 99999999)}",
+        }
+        headers = dict(self.headers)
+        headers["Content-Type"] = "application/json"
+        self._medir("POST /venta/registrar", "POST", "/venta/registrar",
+                    body=json.dumps(payload).encode(), headers=headers, rechazo=409)
+    
+    def historial(self):
+        self._medir("GET /venta/mis-ventas", "GET", "/venta/mis-ventas?limit=50", headers=self.headers)
+    
+    def mixto(self):
+        operacion = self.rng.choices(
+            [self.catalogo, self.historial, self.venta, self.login],
+            weights=[55, 25, 15, 5],
+        )[0]
+        operacion()
+    
+    def close(self):
+        self.cliente.close()
+
+
+def ejecutar_escenario(nombre: str, host: str, port: int, concurrencia: int,
+                       duracion: float, semilla: int) -> Dict:
+    """Ejecuta un escenario con N hilos durante `duracion` segundos"""
+    registro = Registro()
+    fin = threading.Event()
+    listos = threading.Barrier(concurrencia + 1)
+    errores_inicio: List[str] = []
+    
+    def hilo(indice: int):
+        rng = random.Random(semilla * 1000 + indice)
+        try:
+            trabajador = Trabajador(host, port, registro, rng)
+        except Exception as e:
+            errores_inicio.append(str(e))
+            listos.abort()
+            return
+        operacion: Callable[[], None] = getattr(trabajador, nombre)
+        try:
+            listos.wait()
+            while not fin.is_set():
+                operacion()
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            trabajador.close()
+    
+    hilos = [threading.Thread(target=hilo, args=(i,), daemon=True) for i in range(concurrencia)]
+    for h in hilos:
+        h.start()
+    
+    try:
+        listos.wait()
+    except threading.BrokenBarrierError:
+        fin.set()
+        raise RuntimeError(f"Escenario '{nombre}' no pudo iniciar: {errores_inicio[:1]}")
+    
+    inicio = time.perf_counter()
+    time.sleep(duracion)
+    fin.set()
+    for h in hilos:
+        h.join()
+    transcurrido = time.perf_counter() - inicio
+    
+    endpoints = {}
+    for endpoint, latencias in sorted(registro.latencias.items()):
+        ordenadas = sorted(latencias)
+        endpoints[endpoint] = {
+            "requests": len(ordenadas),
+            "errors": registro.errores.get(endpoint, 0),
+            "rejected": registro.rechazos.get(endpoint, 0),
+            "throughput_rps": round(len(ordenadas) / transcurrido, 2),
+            "mean_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 3),
+            "p50_ms": round(percentil(ordenadas, 50) * 1000, 3),
+            "p95_ms": round(percentil(ordenadas, 95) * 1000, 3),
+            "p99_ms": round(percentil(ordenadas, 99) * 1000, 3),
+        }
+    
+    return {"duration_s": round(transcurrido, 3), "concurrency": concurrencia, "endpoints": endpoints}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual: Dict, base: Dict, umbral: float) -> List[str]:
+    """
+    Compara dos resultados y retorna la lista de regresiones.
+    
+    Una regresión es un p95 mayor que base * (1 + umbral) o un throughput
+    menor que base * (1 - umbral) para el mismo escenario y endpoint.
+    """
+    regresiones = []
+    for escenario, datos_base in base.get("scenarios", {}).items():
+        datos_actual = actual.get("scenarios", {}).get(escenario)
+        if not datos_actual:
+            continue
+        for endpoint, m_base in datos_base["endpoints"].items():
+            m_actual = datos_actual["endpoints"].get(endpoint)
+            if not m_actual:
+                continue
+            if m_base["p95_ms"] > 0 and m_actual["p95_ms"] > m_base["p95_ms"] * (1 + umbral):
+                regresiones.append(
+                    f"{escenario} {endpoint}: p95 {m_base['p95_ms']:.2f}ms -> {m_actual['p95_ms']:.2f}ms"
+                )
+            if m_actual["throughput_rps"] < m_base["throughput_rps"] * (1 - umbral):
+                regresiones.append(
+                    f"{escenario} {endpoint}: throughput {m_base['throughput_rps']:.1f} -> "
+                    f"{m_actual['throughput_rps']:.1f} req/s"
+                )
+    return regresiones
+
+
+def imprimir_reporte(resultado: Dict):
+    print(f"\nCommit: {resultado['commit'] or '-'}  |  {resultado['timestamp']}")
+    encabezado = (
+        f"{'escenario':<10} {'endpoint':<24} {'req':>7} {'err':>5} {'rech':>5} "
+        f"{'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    print(encabezado)
+    print("-" * len(encabezado))
+    for escenario, datos in resultado["scenarios"].items():
+        for endpoint, m in datos["endpoints"].items():
+            print(
+                f"{escenario:<10} {endpoint:<24} {m['requests']:>7} {m['errors']:>5} "
+                f"{m.get('rejected', 0):>5} {m['throughput_rps']:>9.1f} {m['p50_ms']:>7.2f}ms {m['p95_ms']:>7.2f}ms {m['p99_ms']:>7.2f}ms"
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de Automotriz JJ")
+    parser.add_argument("--scenarios", default=",".join(ESCENARIOS),
+                        help=f"Escenarios separados por coma ({', '.join(ESCENARIOS)})")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Vendedores simultáneos")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--seed", type=int, default=2020, help="Semilla de datos y tráfico")
+    parser.add_argument("--stock", type=int, default=100_000,
+                        help="Stock de cada auto al iniciar cada escenario")
+    parser.add_argument("--sharding", action="store_true",
+                        help="Una base de ventas por sucursal (SQLITE_SHARDING)")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--baseline", help="Resultado JSON previo para comparar")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="Regresión tolerada como fracción (0.20 = 20%%)")
+    parser.add_argument("--keep-workdir", action="store_true", help="No borrar el directorio temporal")
+    args = parser.parse_args(argv)
+    
+    escenarios = [e.strip() for e in args.scenarios.split(",") if e.strip()]
+    desconocidos = [e for e in escenarios if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+    
+    if args.sharding:
+        os.environ["SQLITE_SHARDING"] = "true"
+    
+    workdir = tempfile.mkdtemp(prefix="automotriz_bench_")
+    port = _puerto_libre()
+    servidor = None
+    
+    try:
+        print(f"📦 Sembrando base de datos en {workdir}")
+        preparar_base_datos(workdir, args.seed)
+        
+        print(f"🚀 Iniciando servidor en 127.0.0.1:{port} ({args.workers} worker(s))")
+        servidor = iniciar_servidor(workdir, port, args.workers)
+        
+        resultado = {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "duration_s": args.duration,
+                "concurrency": args.concurrency,
+                "workers": args.workers,
+                "seed": args.seed,
+                "stock": args.stock,
+                "sharding": args.sharding,
+            },
+            "scenarios": {},
+        }
+        
+        for nombre in escenarios:
+            print(f"⏱️  Escenario '{nombre}' durante {args.duration:.0f}s...")
+            reponer_stock(workdir, args.stock)
+            resultado["scenarios"][nombre] = ejecutar_escenario(
+                nombre, "127.0.0.1", port, args.concurrency, args.duration, args.seed
+            )
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            try:
+                servidor.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                servidor.kill()
+        if args.keep_workdir:
+            print(f"📁 Directorio de trabajo conservado: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    imprimir_reporte(resultado)
+    
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultado guardado en {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+        regresiones = comparar(resultado, base, args.threshold)
+        if regresiones:
+            print(f"\n❌ Regresiones mayores a {args.threshold:.0%} respecto a {base.get('commit') or args.baseline}:")
+            for r in regresiones:
+                print(f"   - {r}")
+            return 1
+        print(f"\n✅ Sin regresiones mayores a {args.threshold:.0%}")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
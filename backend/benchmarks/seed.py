@@ -0,0 +1,27 @@
+"""
+Siembra determinista de la base de datos SQLite usada por los benchmarks.
+
+Se ejecuta en un subproceso con el directorio de trabajo apuntando al
+directorio temporal del benchmark, de modo que `automotriz_jj.db` se crea
+ahí y no toca la base de datos de desarrollo.
+"""
+import argparse
+import random
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea y siembra la base de datos del benchmark")
+    parser.add_argument("--seed", type=int, default=2020, help="Semilla para los datos aleatorios")
+    args = parser.parse_args()
+
+    # Fijar la semilla antes de generar ventas para que cada corrida sea comparable
+    random.seed(args.seed)
+
+    from app.database import init_database, seed_initial_data
+
+    init_database()
+    seed_initial_data()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Fixtures de pruebas del backend.
+
+Cada prueba trabaja sobre su propia base SQLite en memoria (caché
+compartida), clonada con la API de backup desde una plantilla que se crea
+una sola vez por sesión. No se toca el disco y las pruebas no comparten
+datos, así que se pueden correr en paralelo:
+    
+    pip install pytest pytest-xdist
+    python -m pytest -n auto
+"""
+import os
+import random
+import uuid
+
+# La configuración se lee al importar app.config: debe quedar lista antes
+os.environ.setdefault("SECRET_KEY", "clave-de-pruebas")
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+os.environ["DB_INIT_ON_STARTUP"] = "false"
+os.environ["JOBS_WORKERS"] = "0"
+os.environ["WEB_CONCURRENCY"] = "1"
+os.environ["SHARED_STATE_BACKEND"] = "memory"
+
+import pytest
+
+from app.database import conectar_sqlite, db_manager, init_database, seed_initial_data
+
+SEMILLA = 20240101
+
+# Vendedor de los datos iniciales (seed_initial_data)
+VENDEDOR = ("cmendoza", "carlos2020")
+
+
+def _uri_memoria(nombre: str) -> str:
+    return f"file:{nombre}_{os.getpid()}_{uuid.uuid4().hex}?mode=memory&cache=shared"
+
+
+def _reiniciar_estado_proceso():
+    """Olvida cachés y estado en memoria que apuntaban a la base anterior"""
+    from app.services import analitica_service, idempotencia_service, ranking_service
+    from app.utils import shared_state
+    
+    shared_state._estado = None
+    with idempotencia_service._lock:
+        idempotencia_service._cache.clear()
+    with analitica_service._lock:
+        analitica_service._instantanea = analitica_service.InstantaneaVentas()
+        analitica_service._topes.clear()
+        analitica_service._meses_archivados.clear()
+        analitica_service._refrescado = 0.0
+        analitica_service._actualizado_at = None
+    ranking_service.reconstruir()
+
+
+@pytest.fixture(scope="session")
+def plantilla_db():
+    """Base con el esquema y los datos iniciales, creada una vez por sesión (y por worker de xdist)"""
+    uri = _uri_memoria("plantilla")
+    ancla = conectar_sqlite(uri, check_same_thread=False)
+    
+    db_manager.usar_sqlite(uri)
+    random.seed(SEMILLA)
+    init_database()
+    seed_initial_data()
+    
+    yield uri
+    
+    db_manager.usar_sqlite(":memory:")
+    ancla.close()
+
+
+@pytest.fixture
+def db(plantilla_db):
+    """Copia privada de la plantilla en memoria; se descarta al terminar la prueba"""
+    db_manager.usar_sqlite(_uri_memoria("prueba"))
+    db_manager.clonar_desde(plantilla_db)
+    _reiniciar_estado_proceso()
+    
+    yield db_manager
+    
+    db_manager.usar_sqlite(plantilla_db)
+
+
+@pytest.fixture
+def db_archivo(plantilla_db, tmp_path):
+    """Como `db`, pero en un archivo temporal (para pruebas que abren la base desde otro proceso)"""
+    db_manager.usar_sqlite(str(tmp_path / "automotriz_jj.db"))
+    db_manager.clonar_desde(plantilla_db)
+    _reiniciar_estado_proceso()
+    
+    yield db_manager
+    
+    db_manager.usar_sqlite(plantilla_db)
+
+
+@pytest.fixture
+def client(db):
+    """Cliente HTTP de la API sobre la base de la prueba"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    
+    with TestClient(app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Headers con un token de un vendedor de los datos iniciales"""
+    usuario, password = VENDEDOR
+    respuesta = client.post("/auth/login", data={"username": usuario, "password": password})
+    assert respuesta.status_code == 200, respuesta.text
+    return {"Authorization": f"Bearer {respuesta.json()['access_token']}"}
\ No newline at end of file
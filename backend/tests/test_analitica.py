@@ -0,0 +1,108 @@
+"""Analítica en memoria: filtros, agrupaciones y orden sobre una copia armada a mano"""
+from datetime import datetime
+
+import pytest
+
+from app.database import get_db_connection
+from app.services import analitica_service
+from app.services.analitica_service import ConsultaAnaliticaInvalidaError, InstantaneaVentas
+
+# id, fecha_venta, vendedor_id, nombre_vendedor, auto_id, marca, modelo, anio,
+# tipo_compra, monto_fisco, sucursal_provincia, sucursal_distrito
+FILAS = [
+    (1, "2026-01-05 10:00:00", 1, "Carlos", 1, "Toyota", "Yaris", 2024, "Cash", "S/. 80,000.00", "LIMA", "Miraflores"),
+    (2, "2026-01-20 11:00:00", 1, "Carlos", 2, "Kia", "Rio", 2025, "Crédito", "S/. 60,000.50", "LIMA", "Miraflores"),
+    (3, "2026-02-03 09:30:00", 2, "Sofía", 1, "Toyota", "Yaris", 2024, "Crédito", "80000", "LIMA", "Surco"),
+    (4, "2026-02-14 16:45:00", 3, "Fernando", 3, "Toyota", "Corolla", 2025, "Cash", "95.000,00", "PIURA", "Piura Centro"),
+    (5, "2026-03-01 08:00:00", 3, "Fernando", 2, "Kia", "Rio", 2025, "Cash", "S/. 60,000.00", "PIURA", "Piura Centro"),
+]
+
+
+@pytest.fixture
+def instantanea():
+    instantanea = InstantaneaVentas()
+    # En dos lotes, como en los refrescos
+    instantanea.agregar(FILAS[:2])
+    instantanea.agregar(FILAS[2:])
+    return instantanea
+
+
+def test_totales_sin_agrupar(instantanea):
+    resultado = instantanea.consultar({})
+    
+    assert resultado["ventas"] == 5
+    assert resultado["monto_total"] == 375000.5
+    assert resultado["grupos"] == []
+    assert resultado["filas_en_memoria"] == 5
+
+
+def test_filtros_por_texto_numero_y_fechas(instantanea):
+    assert instantanea.consultar({"marca": ["Toyota"]})["ventas"] == 3
+    assert instantanea.consultar({"marca": ["Toyota", "Kia"], "anio": [2025]})["ventas"] == 3
+    assert instantanea.consultar({"vendedor_id": [1, 3]})["ventas"] == 4
+    # Un valor que nunca apareció no tiene filas
+    assert instantanea.consultar({"marca": ["Hyundai"]})["ventas"] == 0
+    
+    febrero = instantanea.consultar({}, desde=datetime(2026, 2, 1), hasta=datetime(2026, 3, 1))
+    assert febrero["ventas"] == 2
+    assert febrero["monto_total"] == 175000.0
+
+
+def test_agrupar_por_dos_dimensiones_ordena_por_monto(instantanea):
+    resultado = instantanea.consultar({}, agrupar=["sucursal_provincia", "tipo_compra"])
+    
+    assert resultado["total_grupos"] == 3
+    assert [(g["sucursal_provincia"], g["tipo_compra"], g["ventas"], g["monto_total"]) for g in resultado["grupos"]] == [
+        ("PIURA", "Cash", 2, 155000.0),
+        ("LIMA", "Crédito", 2, 140000.5),
+        ("LIMA", "Cash", 1, 80000.0),
+    ]
+    assert resultado["grupos"][1]["ticket_promedio"] == 70000.25
+
+
+def test_agrupar_por_mes_y_vendedor_en_orden_de_grupo(instantanea):
+    resultado = instantanea.consultar({}, agrupar=["mes", "vendedor"], orden="grupo", top=3)
+    
+    assert resultado["total_grupos"] == 4
+    assert [(g["mes"], g["vendedor_id"], g["nombre_vendedor"], g["ventas"]) for g in resultado["grupos"]] == [
+        ("2026-01", 1, "Carlos", 2),
+        ("2026-02", 2, "Sofía", 1),
+        ("2026-02", 3, "Fernando", 1),
+    ]
+
+
+def test_agrupar_por_modelo_ordena_por_ventas(instantanea):
+    grupos = instantanea.consultar({}, agrupar=["modelo"], orden="ventas")["grupos"]
+    
+    assert [(g["modelo"], g["ventas"]) for g in grupos] == [("Yaris", 2), ("Rio", 2), ("Corolla", 1)]
+
+
+def test_descartar_meses_archivados(instantanea):
+    assert instantanea.descartar_meses(["2026-01"]) == 2
+    
+    resultado = instantanea.consultar({}, agrupar=["dia"], orden="grupo")
+    assert resultado["ventas"] == 3
+    assert [g["dia"] for g in resultado["grupos"]] == ["2026-02-03", "2026-02-14", "2026-03-01"]
+
+
+def test_dimension_u_orden_desconocidos(instantanea):
+    with pytest.raises(ConsultaAnaliticaInvalidaError):
+        instantanea.consultar({}, agrupar=["color"])
+    with pytest.raises(ConsultaAnaliticaInvalidaError):
+        instantanea.consultar({}, orden="fecha")
+
+def test_refrescar_completa_con_las_ventas_nuevas(client, auth_headers):
+    def ventas_en_base():
+        conn = get_db_connection()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM registro_venta").fetchone()[0]
+        finally:
+            conn.close()
+    
+    assert len(analitica_service.refrescar(forzar=True)) == ventas_en_base()
+    
+    venta = {"auto_id": 1, "tipo_compra": "Cash", "monto_fisco": "S/. 95,000.00", "nombre_comprador": "Lucía Ramírez",
+             "dni_comprador": "45678912", "contacto_comprador": "987654321"}
+    assert client.post("/venta/registrar", headers=auth_headers, json=venta).status_code == 200
+    
+    assert len(analitica_service.refrescar(forzar=True)) == ventas_en_base()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Archivo de meses fríos: lectura desde la copia en disco y límite de meses por consulta"""
+import os
+
+import pytest
+
+from app.config import settings
+from app.database import get_db_connection
+from app.services import archivo_service
+
+
+@pytest.fixture
+def archivo(db, tmp_path, monkeypatch):
+    """Archiva todos los meses sembrados salvo el actual"""
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ARCHIVE_HOT_MONTHS", 1)
+    meses = archivo_service.archivar_meses_frios()
+    assert len(meses) >= 3
+    return tmp_path
+
+
+def _ventas_del_vendedor(vendedor_id: int) -> int:
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            "SELECT COALESCE(SUM(unidades), 0) FROM ventas_resumen_mensual WHERE vendedor_id = ?", (vendedor_id,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_meses_se_leen_desde_la_copia_en_disco(archivo):
+    ventas = archivo_service.ultimas_ventas("vendedor_id", 1, 5)
+    
+    assert len(ventas) == 5
+    assert [v["fecha_venta"] for v in ventas] == sorted((v["fecha_venta"] for v in ventas), reverse=True)
+    copias = os.listdir(archivo / "lectura")
+    assert copias and all(copia.endswith(".db") for copia in copias)
+    
+    # Un mes vuelto a archivar cambia su .gz: la copia se rehace
+    mes = archivo_service.meses_archivados()[-1]
+    os.utime(mes["ubicacion"], ns=(1, 1))
+    archivo_service.ultimas_ventas("vendedor_id", 1, 5)
+    copia = archivo / "lectura" / os.path.basename(mes["ubicacion"])[:-len(".gz")]
+    assert os.stat(copia).st_mtime_ns == 1
+
+
+def test_ver_anteriores_abre_como_mucho_el_limite_de_meses(archivo, monkeypatch):
+    total = _ventas_del_vendedor(1)
+    assert len(archivo_service.ultimas_ventas("vendedor_id", 1, 1000)) == total
+    
+    monkeypatch.setattr(settings, "ARCHIVE_MAX_MESES_CONSULTA", 1)
+    ventas = archivo_service.ultimas_ventas("vendedor_id", 1, 1000)
+    
+    assert 0 < len(ventas) < total
+    assert len({v["fecha_venta"][:7] for v in ventas}) == 1
\ No newline at end of file
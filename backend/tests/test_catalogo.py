@@ -0,0 +1,103 @@
+"""Importación de listas de precios: validación de filas y formatos"""
+import pytest
+
+from app.config import settings
+from app.database import get_db_connection
+from app.services.catalogo_service import ListaPreciosInvalidaError, _validar, leer_lista
+
+
+def _fila(**cambios) -> dict:
+    return {"marca": "Toyota", "modelo": "Yaris", "anio": "2024", "precio_referencial": "85000", **cambios}
+
+
+@pytest.mark.parametrize("precio, esperado", [
+    ("85000", 85000.0),
+    ("85000.50", 85000.5),
+    ("85,000.00", 85000.0),
+    ("85.000,50", 85000.5),
+    ("S/. 85,000.00", 85000.0),
+    (85000, 85000.0),
+])
+def test_precios_en_formatos_conocidos(precio, esperado):
+    auto, errores = _validar(_fila(precio_referencial=precio))
+    
+    assert errores == []
+    assert auto["precio_referencial"] == esperado
+
+
+@pytest.mark.parametrize("precio", ["-85000", "abc12", "85000 o 90000", "85,000,00", "0", "85000.505", True])
+def test_precios_invalidos_se_rechazan(precio):
+    _, errores = _validar(_fila(precio_referencial=precio))
+    
+    assert errores == [f"precio_referencial inválido: {precio!r}"]
+
+
+def test_validar_informa_cada_problema():
+    auto, errores = _validar(_fila(anio="2019", stock="-1", is_active="quizás"))
+    
+    assert errores == ["anio 2019 fuera de rango (2020-2030)", "stock negativo", "is_active inválido: 'quizás'"]
+    assert _validar({"marca": "Kia"}) == (None, ["falta modelo", "falta anio", "falta precio_referencial"])
+
+
+def test_leer_lista_csv_con_punto_y_coma_y_alias():
+    contenido = "Marca;Modelo;Año;Precio;Stock\nToyota;Yaris;2024;85.000,00;3\nKia;Rio;2025;62000;\n".encode()
+    
+    autos = leer_lista(contenido, "csv")
+    
+    assert [(a["marca"], a["anio"], a["precio_referencial"], a["stock"]) for a in autos] == [
+        ("Toyota", 2024, 85000.0, 3),
+        ("Kia", 2025, 62000.0, None),
+    ]
+
+
+def test_leer_lista_json_rechaza_la_lista_completa():
+    contenido = b'{"autos": [{"marca": "Toyota", "modelo": "Yaris", "anio": 2024, "precio": "85000"},' \
+                b' {"marca": "toyota", "modelo": "YARIS", "anio": 2024, "precio": "-1"},' \
+                b' {"marca": "Kia", "modelo": "Rio", "anio": 2024, "precio": "62000"},' \
+                b' {"marca": "KIA", "modelo": "rio", "anio": 2024, "precio": "62000"}]}'
+    
+    with pytest.raises(ListaPreciosInvalidaError) as error:
+        leer_lista(contenido, "json")
+    
+    assert error.value.errores == [
+        "fila 2: precio_referencial inválido: '-1'",
+        "fila 4: repite KIA rio 2024 (fila 3)",
+    ]
+
+
+@pytest.fixture
+def admin_headers(client, auth_headers):
+    conn = get_db_connection()
+    try:
+        username = client.get("/auth/me", headers=auth_headers).json()["username"]
+        conn.execute("UPDATE vendedores SET role = 'admin' WHERE username = ?", (username,))
+        conn.commit()
+    finally:
+        conn.close()
+    return auth_headers
+
+
+def test_importar_rechaza_por_content_length(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOGO_IMPORT_MAX_BYTES", 100)
+    
+    respuesta = client.post(
+        "/catalogo/importar?dry_run=true", content=b"x" * 101,
+        headers={**admin_headers, "Content-Type": "text/csv"}
+    )
+    
+    assert respuesta.status_code == 413
+
+
+def test_importar_corta_un_cuerpo_sin_content_length(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOGO_IMPORT_MAX_BYTES", 100)
+    
+    def partes():
+        for _ in range(50):
+            yield b"x" * 40
+    
+    respuesta = client.post(
+        "/catalogo/importar?dry_run=true", content=partes(),
+        headers={**admin_headers, "Content-Type": "text/csv"}
+    )
+    
+    assert respuesta.status_code == 413
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""Resumen del dashboard: los errores no quedan cacheados como ceros"""
+import sqlite3
+
+from app.services import dashboard_service, venta_service
+
+
+class _BaseBloqueada:
+    def en_sucursales(self, fn, provincias=None):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_resumen_parcial_no_se_cachea(client, auth_headers, monkeypatch):
+    def falla(*args, **kwargs):
+        raise ValueError("columna inesperada")
+    
+    monkeypatch.setattr(venta_service, "ultimas_ventas_vendedor", falla)
+    
+    for _ in range(2):
+        respuesta = client.get("/dashboard/resumen", headers=auth_headers)
+        assert respuesta.status_code == 200, respuesta.text
+        assert respuesta.headers["X-Cache"] == "MISS"
+        assert respuesta.json()["parcial"] is True
+        assert respuesta.json()["ventas_recientes"] == []
+    
+    monkeypatch.undo()
+    respuesta = client.get("/dashboard/resumen", headers=auth_headers)
+    assert respuesta.json()["parcial"] is False
+    assert client.get("/dashboard/resumen", headers=auth_headers).headers["X-Cache"] == "HIT"
+
+
+def test_error_transitorio_en_totales_responde_503(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(dashboard_service, "db_manager", _BaseBloqueada())
+    
+    assert client.get("/dashboard/resumen", headers=auth_headers).status_code == 503
+    
+    monkeypatch.undo()
+    respuesta = client.get("/dashboard/resumen", headers=auth_headers)
+    assert respuesta.status_code == 200
+    assert respuesta.headers["X-Cache"] == "MISS"
+    assert respuesta.json()["parcial"] is False
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Export de ventas de la sucursal en CSV"""
+import csv
+import io
+from datetime import date
+
+from app.database import get_db_connection
+from app.services.venta_service import EXPORT_COLUMNAS
+
+
+def _leer_csv(respuesta) -> list:
+    texto = respuesta.content.decode("utf-8")
+    assert texto.startswith("\ufeff"), "el CSV lleva BOM para Excel"
+    return list(csv.reader(io.StringIO(texto[1:])))
+
+
+def _sucursal(client, headers):
+    me = client.get("/auth/me", headers=headers).json()
+    return me["sucursal_provincia"], me["sucursal_distrito"]
+
+
+def test_export_csv_de_la_sucursal(client, auth_headers):
+    provincia, distrito = _sucursal(client, auth_headers)
+    
+    respuesta = client.get("/venta/export", headers=auth_headers)
+    
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/csv")
+    assert "attachment" in respuesta.headers["content-disposition"]
+    encabezado, *filas = _leer_csv(respuesta)
+    assert encabezado == list(EXPORT_COLUMNAS)
+    
+    conn = get_db_connection()
+    try:
+        esperadas = conn.execute(
+            "SELECT COUNT(*) FROM registro_venta WHERE sucursal_provincia = ? AND sucursal_distrito = ?",
+            (provincia, distrito)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    assert esperadas > 0
+    assert len(filas) == esperadas
+    
+    i_provincia = EXPORT_COLUMNAS.index("sucursal_provincia")
+    i_distrito = EXPORT_COLUMNAS.index("sucursal_distrito")
+    assert {(fila[i_provincia], fila[i_distrito]) for fila in filas} == {(provincia, distrito)}
+    # En orden de fecha
+    i_fecha = EXPORT_COLUMNAS.index("fecha_venta")
+    assert [fila[i_fecha] for fila in filas] == sorted(fila[i_fecha] for fila in filas)
+
+
+def test_export_por_rango_incluye_la_venta_nueva(client, auth_headers):
+    auto = client.get("/venta/autos", headers=auth_headers).json()["autos"][0]
+    venta = client.post("/venta/registrar", headers=auth_headers, json={
+        "auto_id": auto["id"],
+        "tipo_compra": "Crédito",
+        "monto_fisco": "S/. 120,500.00",
+        "nombre_comprador": "Jorge Salazar",
+        "dni_comprador": "70112233",
+        "contacto_comprador": "912345678",
+    }).json()
+    hoy = date.today().isoformat()
+    
+    respuesta = client.get("/venta/export", headers=auth_headers, params={"desde": hoy, "hasta": hoy})
+    
+    assert respuesta.status_code == 200
+    _, *filas = _leer_csv(respuesta)
+    exportada = next(fila for fila in filas if fila[0] == str(venta["venta_id"]))
+    assert exportada[EXPORT_COLUMNAS.index("dni_comprador")] == "70112233"
+    assert exportada[EXPORT_COLUMNAS.index("marca")] == auto["marca"]
+    assert all(fila[EXPORT_COLUMNAS.index("fecha_venta")].startswith(hoy) for fila in filas)
+
+
+def test_export_de_otra_sucursal_prohibido_para_vendedor(client, auth_headers):
+    provincia, _ = _sucursal(client, auth_headers)
+    otra = "AREQUIPA" if provincia != "AREQUIPA" else "CUSCO"
+    
+    respuesta = client.get("/venta/export", headers=auth_headers, params={"provincia": otra})
+    
+    assert respuesta.status_code == 403
+
+
+def test_export_rango_invertido(client, auth_headers):
+    respuesta = client.get("/venta/export", headers=auth_headers, params={"desde": "2025-02-01", "hasta": "2025-01-01"})
+    
+    assert respuesta.status_code == 400
\ No newline at end of file
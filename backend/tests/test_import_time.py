@@ -0,0 +1,24 @@
+"""
+Presupuesto de importación (benchmarks/import_time.py) como prueba: cada
+módulo de entrada se importa en un proceso nuevo con `-X importtime`.
+"""
+import pytest
+
+from benchmarks.import_time import MODULOS, PRESUPUESTO_MS, PROHIBIDOS, mejor_de, medir
+
+
+@pytest.mark.parametrize("modulo", MODULOS)
+def test_importacion_dentro_del_presupuesto(modulo):
+    # La mejor de dos mediciones: una sola puede salir lenta por la máquina
+    tiempos = mejor_de(modulo, 2)
+    
+    total_ms = tiempos[modulo][1] / 1000
+    assert total_ms <= PRESUPUESTO_MS, f"{modulo} tardó {total_ms:.0f} ms en importarse"
+
+
+@pytest.mark.parametrize("modulo", MODULOS)
+def test_sqlite_no_importa_dependencias_opcionales(modulo):
+    cargados = {nombre.split(".")[0] for nombre in medir(modulo)}
+    
+    importados = [paquete for paquete in PROHIBIDOS if paquete in cargados]
+    assert not importados, f"{modulo} importó al arrancar con SQLite: {', '.join(importados)}"
\ No newline at end of file
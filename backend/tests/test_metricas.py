@@ -0,0 +1,27 @@
+"""/metrics: solo para METRICS_ROLES y sin las claves de las consultas en curso"""
+from app.database import get_db_connection
+
+
+def _hacer_admin(username: str):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE vendedores SET role = 'admin' WHERE username = ?", (username,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_metricas_requieren_rol_admin(client, auth_headers):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth_headers).status_code == 403
+
+
+def test_metricas_solo_con_conteos(client, auth_headers):
+    _hacer_admin(client.get("/auth/me", headers=auth_headers).json()["username"])
+    
+    respuesta = client.get("/metrics", headers=auth_headers)
+    
+    assert respuesta.status_code == 200, respuesta.text
+    for grupo in respuesta.json()["single_flight"].values():
+        assert isinstance(grupo["en_vuelo"], int)
+        assert isinstance(grupo["esperando"], int)
\ No newline at end of file
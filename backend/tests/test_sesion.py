@@ -0,0 +1,70 @@
+"""Refresh tokens: rotación, reuso y cierre de sesión"""
+import pytest
+
+from app.config import settings
+from conftest import VENDEDOR
+
+
+@pytest.fixture
+def sesion(client):
+    """Respuesta de login (access token y refresh token) del vendedor de prueba"""
+    usuario, password = VENDEDOR
+    respuesta = client.post("/auth/login", data={"username": usuario, "password": password})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def _renovar(client, refresh_token: str):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rota_el_token(client, sesion):
+    respuesta = _renovar(client, sesion["refresh_token"])
+    
+    assert respuesta.status_code == 200, respuesta.text
+    tokens = respuesta.json()
+    assert tokens["refresh_token"] != sesion["refresh_token"]
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert me.status_code == 200
+    assert me.json()["username"] == VENDEDOR[0]
+    
+    # El token nuevo también rota
+    assert _renovar(client, tokens["refresh_token"]).status_code == 200
+
+
+def test_refresh_usado_dentro_del_margen_no_revoca_la_sesion(client, sesion):
+    """Dos pestañas que renuevan a la vez: la segunda falla, la sesión sigue"""
+    nuevo = _renovar(client, sesion["refresh_token"]).json()["refresh_token"]
+    
+    assert _renovar(client, sesion["refresh_token"]).status_code == 401
+    assert _renovar(client, nuevo).status_code == 200
+
+
+def test_reuso_fuera_del_margen_revoca_la_familia(client, sesion, monkeypatch):
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", -1)
+    nuevo = _renovar(client, sesion["refresh_token"]).json()["refresh_token"]
+    
+    reuso = _renovar(client, sesion["refresh_token"])
+    
+    assert reuso.status_code == 401
+    # Se asume robado: el token legítimo de la misma sesión tampoco sirve
+    assert _renovar(client, nuevo).status_code == 401
+
+
+def test_refresh_invalido(client, sesion):
+    token_id, _, _ = sesion["refresh_token"].partition(".")
+    
+    assert _renovar(client, f"{token_id}.otro-secreto").status_code == 401
+    assert _renovar(client, "sin-punto").status_code == 401
+    # Un intento fallido no consume el token
+    assert _renovar(client, sesion["refresh_token"]).status_code == 200
+
+
+def test_logout_revoca_access_y_refresh(client, sesion):
+    headers = {"Authorization": f"Bearer {sesion['access_token']}"}
+    
+    respuesta = client.post("/auth/logout", headers=headers, json={"refresh_token": sesion["refresh_token"]})
+    
+    assert respuesta.status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert _renovar(client, sesion["refresh_token"]).status_code == 401
\ No newline at end of file
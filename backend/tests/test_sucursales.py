@@ -0,0 +1,133 @@
+"""Bases de ventas por sucursal: una venta solo escribe en su sucursal y la consolidación la pasa a la central"""
+import pytest
+
+from app.database import db_manager, get_db_connection, migrar_ventas_a_sucursales
+from app.services import consolidacion_service, idempotencia_service
+from app.utils import shared_state
+
+# Vendedor de otra provincia en los datos iniciales
+VENDEDOR_PIURA = ("fcampos", "fernando2020")
+
+
+def _venta(auto_id: int, **cambios) -> dict:
+    return {
+        "auto_id": auto_id,
+        "tipo_compra": "Crédito",
+        "monto_fisco": "S/. 120,000.00",
+        "nombre_comprador": "Rosa Chávez",
+        "dni_comprador": "71234568",
+        "contacto_comprador": "912345678",
+        **cambios,
+    }
+
+
+def _central(sql: str, params: tuple = ()):
+    conn = get_db_connection()
+    try:
+        return conn.execute(sql, params).fetchone()
+    finally:
+        conn.close()
+
+
+def _fijar_stock(auto_id: int, stock: int):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE autos_disponibles SET stock = ? WHERE id = ?", (stock, auto_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def sucursales(client, monkeypatch):
+    """La base de la prueba con sharding, con las ventas sembradas ya movidas a cada sucursal"""
+    monkeypatch.setattr(db_manager, "sharding", True)
+    migrar_ventas_a_sucursales()
+    return db_manager
+
+
+@pytest.fixture
+def headers_piura(client):
+    usuario, password = VENDEDOR_PIURA
+    respuesta = client.post("/auth/login", data={"username": usuario, "password": password})
+    assert respuesta.status_code == 200, respuesta.text
+    return {"Authorization": f"Bearer {respuesta.json()['access_token']}"}
+
+
+def test_ventas_sembradas_movidas_a_sus_sucursales(sucursales):
+    assert _central("SELECT COUNT(*) FROM registro_venta")[0] == 0
+    
+    conteos = sucursales.en_sucursales(
+        lambda conn: conn.execute("SELECT COUNT(*) FROM main.registro_venta").fetchone()[0]
+    )
+    assert sorted(sucursales.sucursales_ventas()) == ["AYACUCHO", "LIMA", "PIURA"]
+    assert sum(conteos) == 432
+
+
+def test_venta_se_consolida_en_la_central(client, auth_headers, sucursales):
+    auto = 1
+    stock = _central("SELECT stock FROM autos_disponibles WHERE id = ?", (auto,))[0]
+    cambios = _central("SELECT COUNT(*) FROM cambios")[0]
+    
+    respuesta = client.post("/venta/registrar", headers=auth_headers, json=_venta(auto))
+    assert respuesta.status_code == 200, respuesta.text
+    
+    # Hasta consolidar, la central solo ve el cupo que tomó la sucursal
+    assert _central("SELECT stock FROM autos_disponibles WHERE id = ?", (auto,))[0] == stock
+    assert _central("SELECT COUNT(*) FROM cambios")[0] == cambios
+    assert _central("SELECT COUNT(*) FROM compradores WHERE dni = '71234568'")[0] == 0
+    assert client.get("/venta/clientes/71234568", headers=auth_headers).json()["total_compras"] == 1
+    
+    resultado = consolidacion_service.consolidar()
+    
+    assert resultado["vendidas"] == 1
+    assert _central("SELECT stock FROM autos_disponibles WHERE id = ?", (auto,))[0] == stock - 1
+    assert _central("SELECT total_compras FROM compradores WHERE dni = '71234568'")[0] == 1
+    assert _central("SELECT COUNT(*) FROM cambios")[0] == cambios + 2
+    assert consolidacion_service.consolidar() == {"vendidas": 0, "compradores": 0, "cambios": 0, "devueltas": 0}
+
+
+def test_cupos_no_venden_mas_que_el_stock(client, auth_headers, headers_piura, sucursales):
+    auto = 2
+    _fijar_stock(auto, 2)
+    
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 200
+    assert client.post("/venta/registrar", headers=headers_piura, json=_venta(auto)).status_code == 200
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 409
+    assert client.post("/venta/registrar", headers=headers_piura, json=_venta(auto)).status_code == 409
+    
+    consolidacion_service.consolidar()
+    assert _central("SELECT stock FROM autos_disponibles WHERE id = ?", (auto,))[0] == 0
+    assert _central("SELECT unidades FROM stock_asignado WHERE auto_id = ?", (auto,))[0] == 0
+
+
+def test_cupo_sin_vender_vuelve_a_la_central(client, auth_headers, headers_piura, sucursales):
+    auto = 3
+    _fijar_stock(auto, 2)
+    
+    # LIMA vende una unidad; PIURA toma la última como cupo y no la vende
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 200
+    conn = get_db_connection("PIURA")
+    try:
+        assert consolidacion_service._tomar_cupo(conn.cursor(), auto)
+        conn.commit()
+    finally:
+        conn.close()
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 409
+    
+    assert consolidacion_service.consolidar()["devueltas"] == 1
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 200
+
+
+def test_reintento_idempotente_en_la_sucursal(client, auth_headers, sucursales):
+    headers = {**auth_headers, "Idempotency-Key": "venta-sucursal-1"}
+    
+    primera = client.post("/venta/registrar", headers=headers, json=_venta(4))
+    with idempotencia_service._lock:
+        idempotencia_service._cache.clear()
+    shared_state._estado = None
+    segunda = client.post("/venta/registrar", headers=headers, json=_venta(4))
+    
+    assert primera.status_code == segunda.status_code == 200
+    assert segunda.json()["venta_id"] == primera.json()["venta_id"]
+    assert _central("SELECT COUNT(*) FROM idempotencia_ventas WHERE clave = 'venta-sucursal-1'")[0] == 0
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""Sincronización de clientes de sucursal: ventas sin conexión y deltas"""
+from app.services import venta_service
+
+
+def _venta_offline(id_local: str, auto_id: int = 1) -> dict:
+    return {
+        "id_local": id_local,
+        "auto_id": auto_id,
+        "tipo_compra": "Cash",
+        "monto_fisco": "S/. 95,000.00",
+        "nombre_comprador": "Lucía Ramírez",
+        "dni_comprador": "45678912",
+        "contacto_comprador": "987654321",
+    }
+
+
+def test_venta_que_falla_no_bloquea_la_sincronizacion(client, auth_headers, monkeypatch):
+    registrar_venta = venta_service.registrar_venta
+    
+    def registrar_o_fallar(**datos):
+        if datos["clave_idempotencia"] == "offline-falla":
+            raise RuntimeError("falla de prueba")
+        return registrar_venta(**datos)
+    
+    monkeypatch.setattr(venta_service, "registrar_venta", registrar_o_fallar)
+    
+    respuesta = client.post("/sync", headers=auth_headers, json={
+        "ventas_offline": [_venta_offline("offline-falla"), _venta_offline("offline-ok")]
+    })
+    
+    assert respuesta.status_code == 200, respuesta.text
+    estados = {r["id_local"]: r["estado"] for r in respuesta.json()["ventas_offline"]}
+    assert estados == {"offline-falla": "error", "offline-ok": "registrada"}
+    
+    # Reenviada en la siguiente sincronización, la venta se registra una sola vez
+    monkeypatch.setattr(venta_service, "registrar_venta", registrar_venta)
+    respuesta = client.post("/sync", headers=auth_headers, json={
+        "ventas_offline": [_venta_offline("offline-falla"), _venta_offline("offline-ok")]
+    })
+    estados = {r["id_local"]: r["estado"] for r in respuesta.json()["ventas_offline"]}
+    assert estados == {"offline-falla": "registrada", "offline-ok": "duplicada"}
\ No newline at end of file
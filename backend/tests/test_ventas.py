@@ -0,0 +1,140 @@
+"""Registro de ventas: stock, reintentos idempotentes y conflictos"""
+import pytest
+
+from app.database import get_db_connection
+from app.services import idempotencia_service
+from app.utils import shared_state
+
+
+def _venta(auto_id: int, **cambios) -> dict:
+    return {
+        "auto_id": auto_id,
+        "tipo_compra": "Cash",
+        "monto_fisco": "S/. 95,000.00",
+        "nombre_comprador": "Lucía Ramírez",
+        "dni_comprador": "45678912",
+        "contacto_comprador": "987654321",
+        **cambios,
+    }
+
+
+def _stock(client, headers, auto_id: int):
+    """Stock que muestra el catálogo (None si el auto ya no aparece)"""
+    autos = client.get("/venta/autos", headers=headers).json()["autos"]
+    return next((auto["stock"] for auto in autos if auto["id"] == auto_id), None)
+
+
+def _fijar_stock(auto_id: int, stock: int):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE autos_disponibles SET stock = ? WHERE id = ?", (stock, auto_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def auto(client, auth_headers):
+    """Un auto del catálogo con al menos 3 unidades"""
+    auto = client.get("/venta/autos", headers=auth_headers).json()["autos"][0]
+    _fijar_stock(auto["id"], 3)
+    return auto["id"]
+
+
+def test_registrar_venta_descuenta_stock(client, auth_headers, auto):
+    respuesta = client.post("/venta/registrar", headers=auth_headers, json=_venta(auto))
+    
+    assert respuesta.status_code == 200, respuesta.text
+    venta_id = respuesta.json()["venta_id"]
+    assert _stock(client, auth_headers, auto) == 2
+    
+    ventas = client.get("/venta/mis-ventas", headers=auth_headers).json()["ventas"]
+    assert ventas[0]["id"] == venta_id
+    assert ventas[0]["dni_comprador"] == "45678912"
+
+
+def test_sin_stock_responde_409(client, auth_headers, auto):
+    _fijar_stock(auto, 1)
+    
+    assert client.post("/venta/registrar", headers=auth_headers, json=_venta(auto)).status_code == 200
+    respuesta = client.post("/venta/registrar", headers=auth_headers, json=_venta(auto))
+    
+    assert respuesta.status_code == 409
+    # Sin stock el auto sale del catálogo
+    assert _stock(client, auth_headers, auto) is None
+
+
+def test_reintento_idempotente_no_duplica_la_venta(client, auth_headers, auto):
+    headers = {**auth_headers, "Idempotency-Key": "venta-0001"}
+    
+    primera = client.post("/venta/registrar", headers=headers, json=_venta(auto))
+    reintento = client.post("/venta/registrar", headers=headers, json=_venta(auto))
+    
+    assert primera.status_code == reintento.status_code == 200
+    assert reintento.json()["venta_id"] == primera.json()["venta_id"]
+    assert reintento.headers.get("Idempotent-Replayed") == "true"
+    assert "Idempotent-Replayed" not in primera.headers
+    assert _stock(client, auth_headers, auto) == 2
+
+
+def test_reintento_idempotente_desde_la_base(client, auth_headers, auto):
+    """Sin las cachés (otro worker, o tras reiniciar) la clave se lee de la base"""
+    headers = {**auth_headers, "Idempotency-Key": "venta-0002"}
+    venta_id = client.post("/venta/registrar", headers=headers, json=_venta(auto)).json()["venta_id"]
+    
+    with idempotencia_service._lock:
+        idempotencia_service._cache.clear()
+    shared_state._estado = None
+    reintento = client.post("/venta/registrar", headers=headers, json=_venta(auto))
+    
+    assert reintento.status_code == 200
+    assert reintento.json()["venta_id"] == venta_id
+    assert _stock(client, auth_headers, auto) == 2
+
+
+def test_misma_clave_con_otra_venta_es_conflicto(client, auth_headers, auto):
+    headers = {**auth_headers, "Idempotency-Key": "venta-0003"}
+    assert client.post("/venta/registrar", headers=headers, json=_venta(auto)).status_code == 200
+    
+    respuesta = client.post("/venta/registrar", headers=headers, json=_venta(auto, dni_comprador="11111111"))
+    
+    assert respuesta.status_code == 422
+    assert _stock(client, auth_headers, auto) == 2
+
+
+def test_clave_idempotencia_invalida(client, auth_headers, auto):
+    headers = {**auth_headers, "Idempotency-Key": "clave con espacios"}
+    
+    respuesta = client.post("/venta/registrar", headers=headers, json=_venta(auto))
+    
+    assert respuesta.status_code == 400
+    assert _stock(client, auth_headers, auto) == 3
+
+
+def test_clave_expirada_se_puede_reutilizar(client, auth_headers, auto):
+    headers = {**auth_headers, "Idempotency-Key": "venta-0004"}
+    primera = client.post("/venta/registrar", headers=headers, json=_venta(auto)).json()["venta_id"]
+    
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE idempotencia_ventas SET created_at = '2000-01-01 00:00:00' WHERE clave = 'venta-0004'")
+        conn.commit()
+    finally:
+        conn.close()
+    with idempotencia_service._lock:
+        idempotencia_service._cache.clear()
+    shared_state._estado = None
+    
+    respuesta = client.post("/venta/registrar", headers=headers, json=_venta(auto))
+    
+    # La clave expiró: es una venta nueva y la clave pasa a apuntar a ella
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["venta_id"] != primera
+    assert "Idempotent-Replayed" not in respuesta.headers
+    assert _stock(client, auth_headers, auto) == 1
+    conn = get_db_connection()
+    try:
+        fila = conn.execute("SELECT venta_id FROM idempotencia_ventas WHERE clave = 'venta-0004'").fetchone()
+    finally:
+        conn.close()
+    assert fila[0] == respuesta.json()["venta_id"]
\ No newline at end of file
@@ -1,5 +1,6 @@
 import { useState, useEffect, useRef } from 'react'
-import { getAutosDisponibles } from '../services/api'
+import { getAutosDisponibles, suscribirCambiosCatalogo } from '../services/api'
+import { getCatalogoLocal, sincronizar } from '../services/sync'
 
 const AutoSearchSelect = ({ value, onChange, required = false }) => {
   const [search, setSearch] = useState('')
@@ -15,6 +16,21 @@ const AutoSearchSelect = ({ value, onChange, required = false }) => {
     loadAutos()
   }, [])
 
+  // Mantener el stock actualizado con los cambios que envía el servidor
+  useEffect(() => {
+    const cerrar = suscribirCambiosCatalogo({
+      onStock: ({ id, stock }) => {
+        setAutos(prev =>
+          stock > 0
+            ? prev.map(auto => (auto.id === id ? { ...auto, stock } : auto))
+            : prev.filter(auto => auto.id !== id)
+        )
+      },
+      onResync: () => loadAutos()
+    })
+    return cerrar
+  }, [])
+
   // Filtrar autos según búsqueda
   useEffect(() => {
     if (search.trim() === '') {
@@ -41,14 +57,27 @@ const AutoSearchSelect = ({ value, onChange, required = false }) => {
     return () => document.removeEventListener('mousedown', handleClickOutside)
   }, [])
 
+  // Primero el catálogo guardado en el equipo; la sincronización solo trae
+  // los autos que cambiaron desde la última vez
   const loadAutos = async () => {
+    const locales = getCatalogoLocal()
+    if (locales.length) {
+      setAutos(locales)
+    }
     try {
-      setLoading(true)
-      const response = await getAutosDisponibles()
-      setAutos(response.autos || [])
-      setFilteredAutos(response.autos || [])
+      setLoading(!locales.length)
+      const { autos: sincronizados } = await sincronizar()
+      setAutos(sincronizados)
     } catch (error) {
-      console.error('Error al cargar autos:', error)
+      console.error('Error al sincronizar autos:', error)
+      if (!locales.length) {
+        try {
+          const response = await getAutosDisponibles()
+          setAutos(response.autos || [])
+        } catch (errorCatalogo) {
+          console.error('Error al cargar autos:', errorCatalogo)
+        }
+      }
     } finally {
       setLoading(false)
     }
@@ -1,6 +1,12 @@
 import { createContext, useContext, useState, useEffect } from 'react'
-import { loginUser } from '../services/api'
-import { getStoredToken, setStoredToken, removeStoredToken } from '../utils/auth'
+import { loginUser, logoutUser } from '../services/api'
+import {
+  getStoredToken,
+  setStoredToken,
+  removeStoredToken,
+  setStoredRefreshToken,
+  removeStoredRefreshToken
+} from '../utils/auth'
 
 const AuthContext = createContext()
 
@@ -35,6 +41,9 @@ export const AuthProvider = ({ children }) => {
       
       if (response.access_token) {
         setStoredToken(response.access_token)
+        if (response.refresh_token) {
+          setStoredRefreshToken(response.refresh_token)
+        }
         
         const userData = {
           token: response.access_token,
@@ -66,8 +75,11 @@ export const AuthProvider = ({ children }) => {
     }
   }
 
-  const logout = () => {
+  const logout = async () => {
+    // Revoca la sesión en el servidor (también el refresh token) antes de limpiar
+    await logoutUser()
     removeStoredToken()
+    removeStoredRefreshToken()
     localStorage.removeItem('user_data')
     setUser(null)
     setIsAuthenticated(false)
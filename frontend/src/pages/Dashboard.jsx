@@ -1,6 +1,23 @@
+import { useState, useEffect } from 'react'
 import WelcomeCard from '../components/WelcomeCard'
+import { getResumenDashboard } from '../services/api'
+
+const formatoSoles = (monto) =>
+  `S/. ${Number(monto || 0).toLocaleString('es-PE', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`
 
 const Dashboard = () => {
+  // Resumen del vendedor (totales del mes, ranking y últimas ventas) en una sola llamada
+  const [resumen, setResumen] = useState(null)
+
+  useEffect(() => {
+    getResumenDashboard()
+      .then(setResumen)
+      .catch(() => setResumen(null))
+  }, [])
+
+  const totales = resumen?.totales_mes
+  const ranking = resumen?.ranking_sucursal
+
   return (
     <div className="min-h-screen py-12">
       <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
@@ -62,23 +79,71 @@ const Dashboard = () => {
           </div>
         </div>
 
-        {/* Estadísticas rápidas */}
-        <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
+        {/* Estadísticas del mes */}
+        <div className="grid grid-cols-1 md:grid-cols-3 gap-6 mb-12">
           <div className="card p-6 text-center">
-            <div className="text-3xl font-bold text-primary-blue mb-2">150+</div>
-            <div className="text-gray-600">Vehículos en Stock</div>
+            <div className="text-3xl font-bold text-primary-blue mb-2">
+              {totales ? totales.unidades : '—'}
+            </div>
+            <div className="text-gray-600">Ventas del mes</div>
           </div>
 
           <div className="card p-6 text-center">
-            <div className="text-3xl font-bold text-primary-blue mb-2">500+</div>
-            <div className="text-gray-600">Clientes Activos</div>
+            <div className="text-3xl font-bold text-primary-blue mb-2">
+              {totales ? formatoSoles(totales.monto) : '—'}
+            </div>
+            <div className="text-gray-600">Monto vendido en el mes</div>
           </div>
 
           <div className="card p-6 text-center">
-            <div className="text-3xl font-bold text-primary-blue mb-2">98%</div>
-            <div className="text-gray-600">Satisfacción del Cliente</div>
+            <div className="text-3xl font-bold text-primary-blue mb-2">
+              {ranking?.mi_puesto ? `#${ranking.mi_puesto}` : '—'}
+            </div>
+            <div className="text-gray-600">
+              Puesto en {resumen ? `${resumen.perfil.sucursal_provincia}/${resumen.perfil.sucursal_distrito}` : 'la sucursal'}
+            </div>
           </div>
         </div>
+
+        {resumen && (
+          <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
+            {/* Ranking de la sucursal */}
+            <div className="card p-6">
+              <h3 className="text-lg font-semibold text-gray-900 mb-4">Ranking de la sucursal</h3>
+              {ranking.vendedores.length === 0 ? (
+                <p className="text-gray-600 text-sm">Aún no hay ventas este mes</p>
+              ) : (
+                <ol className="space-y-2">
+                  {ranking.vendedores.map(v => (
+                    <li key={v.vendedor_id} className="flex justify-between text-sm">
+                      <span className={v.puesto === ranking.mi_puesto ? 'font-semibold text-primary-blue' : 'text-gray-700'}>
+                        #{v.puesto} {v.nombre_vendedor}
+                      </span>
+                      <span className="text-gray-600">{v.unidades} u. · {formatoSoles(v.monto)}</span>
+                    </li>
+                  ))}
+                </ol>
+              )}
+            </div>
+
+            {/* Últimas ventas */}
+            <div className="card p-6">
+              <h3 className="text-lg font-semibold text-gray-900 mb-4">Últimas ventas</h3>
+              {resumen.ventas_recientes.length === 0 ? (
+                <p className="text-gray-600 text-sm">Todavía no registraste ventas</p>
+              ) : (
+                <ul className="space-y-2">
+                  {resumen.ventas_recientes.map(venta => (
+                    <li key={venta.id} className="flex justify-between text-sm">
+                      <span className="text-gray-700">{venta.marca} {venta.modelo} · {venta.nombre_comprador}</span>
+                      <span className="text-gray-600">{venta.monto_fisco}</span>
+                    </li>
+                  ))}
+                </ul>
+              )}
+            </div>
+          </div>
+        )}
       </div>
     </div>
   )
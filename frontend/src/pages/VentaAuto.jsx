@@ -1,20 +1,23 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useAuth } from '../context/AuthContext'
 import Modal from '../components/Modal'
 import AutoSearchSelect from '../components/AutoSearchSelect'
-import { registrarVenta } from '../services/api'
+import { registrarVenta, nuevaClaveIdempotencia, getCliente, esErrorReintentable } from '../services/api'
+import { encolarVentaOffline, getVentasPendientes, sincronizar } from '../services/sync'
+
+const FORMULARIO_VACIO = {
+  auto_id: '',
+  auto_text: '',
+  tipo_compra: '',
+  montoFisco: '',
+  nombreComprador: '',
+  dniComprador: '',
+  contactoComprador: ''
+}
 
 const VentaAuto = () => {
   const { user } = useAuth()
-  const [formData, setFormData] = useState({
-    auto_id: '',
-    auto_text: '',
-    tipo_compra: '',
-    montoFisco: '',
-    nombreComprador: '',
-    dniComprador: '',
-    contactoComprador: ''
-  })
+  const [formData, setFormData] = useState(FORMULARIO_VACIO)
 
   const [fechaActual, setFechaActual] = useState('')
   const [modalOpen, setModalOpen] = useState(false)
@@ -24,6 +27,10 @@ const VentaAuto = () => {
     type: 'success'
   })
   const [loading, setLoading] = useState(false)
+  const [pendientes, setPendientes] = useState(() => getVentasPendientes().length)
+  // Clave de idempotencia de la venta en curso: se reutiliza si el usuario
+  // reintenta tras un error y se descarta al cambiar el formulario
+  const claveVentaRef = useRef(null)
 
   useEffect(() => {
     const hoy = new Date()
@@ -31,15 +38,65 @@ const VentaAuto = () => {
     setFechaActual(hoy.toLocaleDateString('es-ES', opciones))
   }, [])
 
+  // Ventas guardadas sin conexión: se envían al cargar la página y cuando
+  // vuelve la conexión; el servidor decide si cada una se registra
+  useEffect(() => {
+    const enviarPendientes = async () => {
+      if (!getVentasPendientes().length) return
+      try {
+        const { pendientes: restantes, resultados } = await sincronizar()
+        setPendientes(restantes.length)
+        const rechazadas = resultados.filter(r => r.estado === 'rechazada').length
+        if (rechazadas) {
+          setModalConfig({
+            title: 'Gestor de Ventas',
+            message: `⚠️ ${rechazadas} venta(s) registrada(s) sin conexión no se pudieron completar: el auto ya no tenía stock.`,
+            type: 'error'
+          })
+          setModalOpen(true)
+        }
+      } catch (error) {
+        console.warn('⏳ Ventas pendientes sin enviar:', error)
+      }
+    }
+
+    enviarPendientes()
+    window.addEventListener('online', enviarPendientes)
+    return () => window.removeEventListener('online', enviarPendientes)
+  }, [])
+
   const handleChange = (e) => {
     const { name, value } = e.target
+    claveVentaRef.current = null
     setFormData(prev => ({
       ...prev,
       [name]: value
     }))
   }
 
+  // Cliente recurrente: al completar el DNI se rellenan nombre y contacto
+  // si el formulario aún no los tiene
+  useEffect(() => {
+    const dni = formData.dniComprador
+    if (dni.length !== 8 || !/^\d+$/.test(dni)) return
+
+    let cancelado = false
+    getCliente(dni)
+      .then(cliente => {
+        if (cancelado || !cliente) return
+        setFormData(prev => ({
+          ...prev,
+          nombreComprador: prev.nombreComprador || cliente.nombre,
+          contactoComprador: prev.contactoComprador || cliente.contacto
+        }))
+      })
+      .catch(() => {})
+
+    return () => { cancelado = true }
+  }, [formData.dniComprador])
+
   const handleAutoChange = (autoId, autoText) => {
+    claveVentaRef.current = null
     setFormData(prev => ({
       ...prev,
       auto_id: autoId,
@@ -86,19 +143,24 @@ const VentaAuto = () => {
       return
     }
 
+    const ventaData = {
+      auto_id: parseInt(formData.auto_id),
+      tipo_compra: formData.tipo_compra,
+      monto_fisco: formData.montoFisco,
+      nombre_comprador: formData.nombreComprador,
+      dni_comprador: formData.dniComprador,
+      contacto_comprador: formData.contactoComprador
+    }
+
     try {
       setLoading(true)
 
-      const ventaData = {
-        auto_id: parseInt(formData.auto_id),
-        tipo_compra: formData.tipo_compra,
-        monto_fisco: formData.montoFisco,
-        nombre_comprador: formData.nombreComprador,
-        dni_comprador: formData.dniComprador,
-        contacto_comprador: formData.contactoComprador
+      if (!claveVentaRef.current) {
+        claveVentaRef.current = nuevaClaveIdempotencia()
       }
 
-      const response = await registrarVenta(ventaData)
+      const response = await registrarVenta(ventaData, claveVentaRef.current)
+      claveVentaRef.current = null
 
       setModalConfig({
         title: 'Gestor de Ventas',
@@ -107,18 +169,23 @@ const VentaAuto = () => {
       })
       setModalOpen(true)
 
-      setFormData({
-        auto_id: '',
-        auto_text: '',
-        tipo_compra: '',
-        montoFisco: '',
-        nombreComprador: '',
-        dniComprador: '',
-        contactoComprador: ''
-      })
+      setFormData(FORMULARIO_VACIO)
 
     } catch (error) {
       console.error('Error al registrar venta:', error)
+      if (esErrorReintentable(error)) {
+        // Sin conexión: la venta queda en el equipo con su misma clave
+        setPendientes(encolarVentaOffline(ventaData, claveVentaRef.current))
+        claveVentaRef.current = null
+        setFormData(FORMULARIO_VACIO)
+        setModalConfig({
+          title: 'Gestor de Ventas',
+          message: '📴 Sin conexión. La venta se guardó en este equipo y se enviará al recuperar la conexión.',
+          type: 'success'
+        })
+        setModalOpen(true)
+        return
+      }
       setModalConfig({
         title: 'Gestor de Ventas',
         message: '⚠️ Error al registrar la venta. Por favor intente nuevamente.',
@@ -286,6 +353,12 @@ const VentaAuto = () => {
             <span className="text-red-500 font-bold"> *</span> son obligatorios. 
             Asegúrese de verificar los datos antes de registrar la venta.
           </p>
+          {pendientes > 0 && (
+            <p className="text-sm text-blue-700 mt-2">
+              <span className="font-semibold">Sin enviar:</span> {pendientes} venta(s) guardada(s) en este
+              equipo. Se enviarán automáticamente al recuperar la conexión.
+            </p>
+          )}
         </div>
       </div>
 
@@ -1,5 +1,13 @@
 import axios from 'axios'
-import { getStoredToken } from '../utils/auth'
+import {
+  getStoredRefreshToken,
+  getStoredToken,
+  removeStoredRefreshToken,
+  removeStoredToken,
+  setStoredRefreshToken,
+  setStoredToken,
+  tokenExpiraPronto,
+} from '../utils/auth'
 
 const API_BASE_URL = 'http://localhost:8000'
 
@@ -11,9 +19,55 @@ const apiClient = axios.create({
   timeout: 10000,
 })
 
+const cerrarSesionLocal = () => {
+  removeStoredToken()
+  removeStoredRefreshToken()
+  localStorage.removeItem('user_data')
+  window.location.href = '/login'
+}
+
+// Renovación del access token con el refresh token. Las requests que la
+// necesitan a la vez comparten una sola llamada a /auth/refresh.
+let renovacionEnCurso = null
+
+export const renovarSesion = () => {
+  if (!renovacionEnCurso) {
+    const refreshToken = getStoredRefreshToken()
+    renovacionEnCurso = (async () => {
+      if (!refreshToken) throw new Error('Sin refresh token')
+      try {
+        // axios directo: sin los interceptores de apiClient
+        const { data } = await axios.post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken })
+        setStoredToken(data.access_token)
+        setStoredRefreshToken(data.refresh_token)
+        return data.access_token
+      } catch (error) {
+        // Otra pestaña pudo haber rotado el refresh token primero
+        if (getStoredRefreshToken() !== refreshToken && getStoredToken()) {
+          return getStoredToken()
+        }
+        throw error
+      }
+    })().finally(() => {
+      renovacionEnCurso = null
+    })
+  }
+  return renovacionEnCurso
+}
+
+const esRutaDeAuth = (url = '') => url.startsWith('/auth/login') || url.startsWith('/auth/refresh')
+
 apiClient.interceptors.request.use(
-  (config) => {
-    const token = getStoredToken()
+  async (config) => {
+    let token = getStoredToken()
+    // Sesión deslizante: si el access token está por vencer se renueva antes
+    if (token && getStoredRefreshToken() && !esRutaDeAuth(config.url) && tokenExpiraPronto(token)) {
+      try {
+        token = await renovarSesion()
+      } catch (error) {
+        console.warn('⚠️ No se pudo renovar la sesión:', error)
+      }
+    }
     if (token) {
       config.headers.Authorization = `Bearer ${token}`
     }
@@ -26,11 +80,20 @@ apiClient.interceptors.request.use(
 
 apiClient.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      localStorage.removeItem('auth_token')
-      localStorage.removeItem('user_data')
-      window.location.href = '/login'
+  async (error) => {
+    const original = error.config
+    if (error.response?.status === 401 && original && !esRutaDeAuth(original.url)) {
+      if (!original._reintentado && getStoredRefreshToken()) {
+        original._reintentado = true
+        try {
+          const token = await renovarSesion()
+          original.headers.Authorization = `Bearer ${token}`
+          return apiClient(original)
+        } catch (refreshError) {
+          console.warn('⚠️ Sesión expirada:', refreshError)
+        }
+      }
+      cerrarSesionLocal()
     }
     return Promise.reject(error)
   }
@@ -59,6 +122,15 @@ export const loginUser = async (username, password) => {
   }
 }
 
+export const logoutUser = async () => {
+  const refreshToken = getStoredRefreshToken()
+  try {
+    await apiClient.post('/auth/logout', refreshToken ? { refresh_token: refreshToken } : undefined)
+  } catch (error) {
+    console.error('❌ Error en logout:', error)
+  }
+}
+
 export const getUserProfile = async () => {
   try {
     const response = await apiClient.get('/auth/me')
@@ -80,10 +152,97 @@ export const getAutosDisponibles = async (search = '') => {
   }
 }
 
-export const registrarVenta = async (ventaData) => {
+// Suscripción SSE a cambios de stock del catálogo; `resync` pide recargar la
+// lista completa (por ejemplo tras una importación del catálogo).
+// Retorna una función para cerrar la conexión.
+export const suscribirCambiosCatalogo = ({ onStock, onResync }) => {
+  const token = getStoredToken()
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {}
+  }
+
+  let source = null
+  let cerrada = false
+  let reintento = null
+  let espera = 3000
+
+  const abrir = (tokenActual) => {
+    const url = `${API_BASE_URL}/venta/autos/stream?token=${encodeURIComponent(tokenActual)}`
+    source = new EventSource(url)
+
+    source.addEventListener('hola', () => {
+      espera = 3000
+    })
+
+    source.addEventListener('stock', (event) => {
+      try {
+        onStock?.(JSON.parse(event.data))
+      } catch (error) {
+        console.error('❌ Evento de catálogo inválido:', error)
+      }
+    })
+
+    source.addEventListener('resync', () => {
+      onResync?.()
+    })
+
+    // El navegador reconectaría solo, pero con la misma URL y el token ya
+    // vencido; se cierra y se reabre con un token renovado. Los eventos
+    // perdidos mientras tanto se cubren recargando el catálogo.
+    source.onerror = () => {
+      source.close()
+      if (cerrada || reintento) return
+      reintento = setTimeout(async () => {
+        reintento = null
+        if (cerrada) return
+        try {
+          const nuevoToken = await renovarSesion()
+          if (cerrada) return
+          abrir(nuevoToken)
+          onResync?.()
+        } catch (error) {
+          console.warn('⚠️ No se pudo renovar la suscripción al catálogo:', error)
+          espera = Math.min(espera * 2, 60000)
+          source.onerror()
+        }
+      }, espera)
+    }
+  }
+
+  abrir(token)
+
+  return () => {
+    cerrada = true
+    clearTimeout(reintento)
+    source.close()
+  }
+}
+
+// Genera una clave única para el header Idempotency-Key
+export const nuevaClaveIdempotencia = () => {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) {
+    return crypto.randomUUID()
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+}
+
+// Errores en los que la venta pudo haberse guardado aunque no llegó respuesta
+export const esErrorReintentable = (error) =>
+  error.code === 'ECONNABORTED' || (!error.response && !!error.request)
+
+export const registrarVenta = async (ventaData, idempotencyKey = nuevaClaveIdempotencia()) => {
+  const config = { headers: { 'Idempotency-Key': idempotencyKey } }
   try {
     console.log('📝 Registrando venta:', ventaData)
-    const response = await apiClient.post('/venta/registrar', ventaData)
+    let response
+    try {
+      response = await apiClient.post('/venta/registrar', ventaData, config)
+    } catch (error) {
+      if (!esErrorReintentable(error)) throw error
+      // Reintento seguro: con la misma clave el servidor no duplica la venta
+      console.warn('⏳ Sin respuesta al registrar venta, reintentando con la misma clave')
+      response = await apiClient.post('/venta/registrar', ventaData, config)
+    }
     console.log('✅ Venta registrada:', response.data)
     return response.data
   } catch (error) {
@@ -92,10 +251,12 @@ export const registrarVenta = async (ventaData) => {
   }
 }
 
-export const getMisVentas = async (limit = 50) => {
+// Ventas de los meses recientes; con incluirArchivo ("ver anteriores") se
+// completan con las de meses archivados
+export const getMisVentas = async (limit = 50, incluirArchivo = false) => {
   try {
     const response = await apiClient.get('/venta/mis-ventas', {
-      params: { limit }
+      params: { limit, incluir_archivo: incluirArchivo }
     })
     return response.data
   } catch (error) {
@@ -104,6 +265,42 @@ export const getMisVentas = async (limit = 50) => {
   }
 }
 
+// Sincronización incremental (ver services/sync.js)
+export const sincronizarCliente = async (payload) => {
+  try {
+    const response = await apiClient.post('/sync', payload)
+    return response.data
+  } catch (error) {
+    console.error('❌ Error al sincronizar:', error)
+    throw error
+  }
+}
+
+export const getCliente = async (dni) => {
+  try {
+    const response = await apiClient.get(`/venta/clientes/${dni}`, {
+      params: { limit: 5 }
+    })
+    return response.data
+  } catch (error) {
+    if (error.response?.status === 404) {
+      return null
+    }
+    console.error('❌ Error al obtener cliente:', error)
+    throw error
+  }
+}
+
+export const getResumenDashboard = async () => {
+  try {
+    const response = await apiClient.get('/dashboard/resumen')
+    return response.data
+  } catch (error) {
+    console.error('❌ Error al obtener resumen del dashboard:', error)
+    throw error
+  }
+}
+
 export const checkServerHealth = async () => {
   try {
     const response = await apiClient.get('/health')
@@ -0,0 +1,118 @@
+import { sincronizarCliente } from './api'
+import { decodeToken, getStoredToken } from '../utils/auth'
+
+// Copia local del catálogo y de las ventas propias, con la versión que
+// tiene de cada una y las ventas registradas sin conexión. Cada
+// sincronización trae solo los cambios desde esa versión.
+const SYNC_KEY = 'sync_local'
+const MAX_VENTAS_LOCALES = 200
+
+const estadoVacio = (usuario) => ({
+  usuario,
+  version: { catalogo: null, ventas: null },
+  autos: [],
+  ventas: [],
+  pendientes: [],
+})
+
+const usuarioActual = () => {
+  const token = getStoredToken()
+  return token ? decodeToken(token)?.sub ?? null : null
+}
+
+const leerEstado = () => {
+  const usuario = usuarioActual()
+  try {
+    const estado = JSON.parse(localStorage.getItem(SYNC_KEY))
+    // Otro vendedor en el mismo equipo: no se reutilizan sus datos
+    if (estado && estado.usuario === usuario) return estado
+  } catch (error) {
+    console.error('Error al leer datos locales:', error)
+  }
+  return estadoVacio(usuario)
+}
+
+const guardarEstado = (estado) => {
+  try {
+    localStorage.setItem(SYNC_KEY, JSON.stringify(estado))
+  } catch (error) {
+    console.error('Error al guardar datos locales:', error)
+  }
+}
+
+// Filas [[...], ...] + columnas -> objetos
+const aObjetos = ({ columnas, filas }) =>
+  filas.map(fila => Object.fromEntries(columnas.map((columna, i) => [columna, fila[i]])))
+
+const ordenCatalogo = (a, b) =>
+  b.anio - a.anio || a.marca.localeCompare(b.marca) || a.modelo.localeCompare(b.modelo)
+
+export const getCatalogoLocal = () => leerEstado().autos
+
+export const getVentasLocales = () => leerEstado().ventas
+
+export const getVentasPendientes = () => leerEstado().pendientes
+
+// Guarda una venta que no se pudo enviar; `idLocal` es su Idempotency-Key,
+// así el servidor la reconoce si el primer envío sí llegó
+export const encolarVentaOffline = (ventaData, idLocal) => {
+  const estado = leerEstado()
+  if (!estado.pendientes.some(venta => venta.id_local === idLocal)) {
+    estado.pendientes.push({ ...ventaData, id_local: idLocal, registrada_en: new Date().toISOString() })
+    guardarEstado(estado)
+  }
+  return estado.pendientes.length
+}
+
+const aplicarCambios = (estado, respuesta) => {
+  const autos = aObjetos(respuesta.catalogo)
+  if (respuesta.catalogo.completo) {
+    estado.autos = autos
+  } else if (autos.length || respuesta.catalogo.eliminados.length) {
+    const porId = new Map(estado.autos.map(auto => [auto.id, auto]))
+    respuesta.catalogo.eliminados.forEach(id => porId.delete(id))
+    autos.forEach(auto => porId.set(auto.id, auto))
+    estado.autos = [...porId.values()].sort(ordenCatalogo)
+  }
+
+  const ventas = aObjetos(respuesta.ventas)
+  if (ventas.length) {
+    estado.ventas = [...ventas.reverse(), ...estado.ventas].slice(0, MAX_VENTAS_LOCALES)
+  }
+
+  // Las ventas con error se reenvían en la siguiente sincronización
+  const resueltas = new Set(
+    respuesta.ventas_offline.filter(r => r.estado !== 'error').map(r => r.id_local)
+  )
+  estado.pendientes = estado.pendientes.filter(venta => !resueltas.has(venta.id_local))
+  estado.version = respuesta.version
+}
+
+let sincronizacionEnCurso = null
+
+// Envía las ventas pendientes y aplica los cambios del servidor. Las
+// llamadas simultáneas comparten la misma sincronización.
+export const sincronizar = () => {
+  if (!sincronizacionEnCurso) {
+    sincronizacionEnCurso = (async () => {
+      let estado = leerEstado()
+      let resultados = []
+      let respuesta
+      let pendientes = estado.pendientes
+      do {
+        respuesta = await sincronizarCliente({ version: estado.version, ventas_offline: pendientes })
+        pendientes = []
+        // Puede haber cambiado mientras tanto (p. ej. otra venta encolada)
+        estado = leerEstado()
+        aplicarCambios(estado, respuesta)
+        guardarEstado(estado)
+        resultados = resultados.concat(respuesta.ventas_offline)
+      } while (respuesta.ventas.hay_mas)
+
+      return { autos: estado.autos, ventas: estado.ventas, pendientes: estado.pendientes, resultados }
+    })().finally(() => {
+      sincronizacionEnCurso = null
+    })
+  }
+  return sincronizacionEnCurso
+}
\ No newline at end of file
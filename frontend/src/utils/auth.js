@@ -29,6 +29,34 @@ export const removeStoredToken = () => {
   }
 }
 
+// Clave del refresh token (renueva el access token sin pedir la contraseña)
+const REFRESH_TOKEN_KEY = 'refresh_token'
+
+export const getStoredRefreshToken = () => {
+  try {
+    return localStorage.getItem(REFRESH_TOKEN_KEY)
+  } catch (error) {
+    console.error('Error al obtener refresh token:', error)
+    return null
+  }
+}
+
+export const setStoredRefreshToken = (token) => {
+  try {
+    localStorage.setItem(REFRESH_TOKEN_KEY, token)
+  } catch (error) {
+    console.error('Error al guardar refresh token:', error)
+  }
+}
+
+export const removeStoredRefreshToken = () => {
+  try {
+    localStorage.removeItem(REFRESH_TOKEN_KEY)
+  } catch (error) {
+    console.error('Error al eliminar refresh token:', error)
+  }
+}
+
 // Verificar si el token existe y no está vacío
 export const hasValidToken = () => {
   const token = getStoredToken()
@@ -65,4 +93,11 @@ export const isTokenExpired = (token) => {
     console.error('Error al verificar expiración del token:', error)
     return true
   }
+}
+
+// Verificar si el token vence dentro de los próximos `margenSegundos`
+export const tokenExpiraPronto = (token, margenSegundos = 60) => {
+  const decoded = decodeToken(token)
+  if (!decoded || !decoded.exp) return true
+  return decoded.exp - Date.now() / 1000 < margenSegundos
 }
\ No newline at end of file